@@ -0,0 +1,113 @@
+"""Microbenchmark of dimension record json encoding.
+
+Compare the throughput (records/sec) of the original per-value
+`encode_record_dict` with the per-element `RecordEncoder`.
+
+Run with ``python benchmarks/bench_encode_records.py [num_records]``.
+"""
+
+import argparse
+import time
+import typing
+
+import astropy.time
+import lsst.daf.butler
+
+from butlerservice import record_encoder
+from butlerservice.resolvers.simple_query_dimension_records import (
+    encode_record_dict,
+)
+
+
+def make_exposure_records(
+    num_records: int,
+) -> typing.List[lsst.daf.butler.DimensionRecord]:
+    """Make synthetic exposure records."""
+    universe = lsst.daf.butler.DimensionUniverse()
+    element = universe["exposure"]
+    field_names = set(element.RecordClass.fields.standard.names)
+    begin = astropy.time.Time("2020-01-01T00:00:00", scale="tai")
+    records = []
+    for i in range(num_records):
+        values = dict(
+            instrument="HSC",
+            id=i,
+            physical_filter="HSC-R",
+            exposure_time=30.0,
+            dark_time=30.0,
+            observation_type="science",
+            day_obs=20200101,
+            seq_num=i,
+            group_name=str(i),
+            group_id=i,
+            obs_id=f"HSCA{i:08d}",
+            target_name="field",
+            science_program="survey",
+            tracking_ra=10.0,
+            tracking_dec=20.0,
+            sky_angle=0.0,
+            zenith_angle=30.0,
+        )
+        values = {
+            name: value
+            for name, value in values.items()
+            if name in field_names
+        }
+        values["timespan"] = lsst.daf.butler.Timespan(
+            begin=begin, end=begin + astropy.time.TimeDelta(30, format="sec")
+        )
+        records.append(element.RecordClass(**values))
+    return records
+
+
+def encode_old(records: typing.List[lsst.daf.butler.DimensionRecord]) -> None:
+    """Encode records the original way."""
+    for record in records:
+        encode_record_dict(record.toDict())
+
+
+def encode_new(records: typing.List[lsst.daf.butler.DimensionRecord]) -> None:
+    """Encode records using a `RecordEncoder`."""
+    encoder = record_encoder.get_record_encoder(records[0].definition)
+    for record in records:
+        encoder.encode(record)
+
+
+def measure(
+    func: typing.Callable[[typing.List[typing.Any]], None],
+    records: typing.List[lsst.daf.butler.DimensionRecord],
+    repeat: int,
+) -> float:
+    """Return the best throughput (records/sec) of ``repeat`` runs."""
+    best_duration = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(records)
+        best_duration = min(best_duration, time.perf_counter() - t0)
+    return len(records) / best_duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "num_records",
+        type=int,
+        nargs="?",
+        default=10000,
+        help="Number of records to encode.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of runs of each method."
+    )
+    args = parser.parse_args()
+    records = make_exposure_records(args.num_records)
+    backend = "json" if record_encoder.orjson is None else "orjson"
+    old_rate = measure(encode_old, records, repeat=args.repeat)
+    new_rate = measure(encode_new, records, repeat=args.repeat)
+    print(f"encode_record_dict: {old_rate:10.0f} records/sec")
+    print(f"RecordEncoder ({backend}): {new_rate:10.0f} records/sec")
+    print(f"speedup: {new_rate / old_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
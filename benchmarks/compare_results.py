@@ -0,0 +1,66 @@
+"""Compare two benchmark results files written by ``run_benchmarks.py``.
+
+Print the ratio (new/old) of median latency and throughput
+for each measurement, and exit with status 1 if the median latency
+of any measurement increased by more than a threshold.
+
+Run with ``python benchmarks/compare_results.py old.json new.json``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> dict:
+    """Load a results file as a dict of
+    (num_exposures, level, field): result.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    return {
+        (result["num_exposures"], result["level"], result["field"]): result
+        for result in data["results"]
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("old", help="Path of the old (reference) results.")
+    parser.add_argument("new", help="Path of the new results.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="Maximum acceptable ratio of new/old median latency.",
+    )
+    args = parser.parse_args()
+
+    old_results = load_results(args.old)
+    new_results = load_results(args.new)
+    regressed = False
+    for key in sorted(old_results.keys() & new_results.keys()):
+        old_result = old_results[key]
+        new_result = new_results[key]
+        latency_ratio = (
+            new_result["latency_msec"]["p50"]
+            / old_result["latency_msec"]["p50"]
+        )
+        throughput_ratio = new_result["throughput"] / old_result["throughput"]
+        flag = ""
+        if latency_ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        num_exposures, level, field = key
+        print(
+            f"{num_exposures:>8} {level:>8} {field:<32} "
+            f"p50 latency x{latency_ratio:.2f} "
+            f"throughput x{throughput_ratio:.2f}{flag}"
+        )
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Build a synthetic butler repository for benchmarking.
+
+The repository has one instrument, a few physical filters
+and the specified number of exposures, spread over a sequence of nights.
+The registry is SQLite, the default for a new repository.
+
+Run with ``python benchmarks/make_registry.py path num_exposures``.
+"""
+
+from __future__ import annotations
+
+__all__ = ["INSTRUMENT", "make_registry"]
+
+import argparse
+import datetime
+import typing
+
+import lsst.daf.butler
+
+INSTRUMENT = "HSC"
+
+BANDS = "grizy"
+
+FIRST_DATE = datetime.date(2020, 1, 1)
+
+# Number of exposures inserted per call to insertDimensionData.
+INSERT_BATCH_SIZE = 10000
+
+
+def day_obs_for_night(night: int) -> int:
+    """Return the day_obs (YYYYMMDD as an int) of a night."""
+    date = FIRST_DATE + datetime.timedelta(days=night)
+    return int(date.strftime("%Y%m%d"))
+
+
+def _filter_fields(
+    element: lsst.daf.butler.DimensionElement, values: dict
+) -> dict:
+    """Remove values for fields the element does not have.
+
+    This allows the same values to be used with different
+    versions of the dimension universe.
+    """
+    field_names = set(element.RecordClass.fields.names)
+    return {
+        name: value for name, value in values.items() if name in field_names
+    }
+
+
+def _make_exposure_values(i: int, exposures_per_night: int) -> dict:
+    """Make the values of exposure record ``i``."""
+    band = BANDS[i % len(BANDS)]
+    obs_id = f"{INSTRUMENT}A{i:08d}"
+    return dict(
+        instrument=INSTRUMENT,
+        id=i,
+        name=obs_id,
+        obs_id=obs_id,
+        physical_filter=f"{INSTRUMENT}-{band.upper()}",
+        exposure_time=30.0,
+        dark_time=30.0,
+        observation_type="science",
+        observation_reason="science",
+        day_obs=day_obs_for_night(i // exposures_per_night),
+        seq_num=i % exposures_per_night,
+        group=obs_id,
+        group_name=obs_id,
+        group_id=i,
+        target_name="field",
+        science_program="survey",
+    )
+
+
+def make_registry(
+    path: str, num_exposures: int, exposures_per_night: int = 500
+) -> None:
+    """Make a butler repository with synthetic dimension records.
+
+    Parameters
+    ----------
+    path
+        Path of the new repository; must not already contain one.
+    num_exposures
+        Number of exposures.
+    exposures_per_night
+        Number of exposures per night (day_obs).
+    """
+    lsst.daf.butler.Butler.makeRepo(path)
+    butler = lsst.daf.butler.Butler(path, writeable=True)
+    registry = butler.registry
+    universe = registry.dimensions
+    element_names = {element.name for element in universe.getStaticElements()}
+
+    def insert(element_name: str, values_list: typing.List[dict]) -> None:
+        element = universe[element_name]
+        registry.insertDimensionData(
+            element_name,
+            *[_filter_fields(element, values) for values in values_list],
+        )
+
+    insert(
+        "instrument",
+        [
+            dict(
+                name=INSTRUMENT,
+                visit_max=2**31 - 1,
+                exposure_max=2**31 - 1,
+                detector_max=200,
+                class_name="lsst.obs.subaru.HyperSuprimeCam",
+            )
+        ],
+    )
+    insert(
+        "physical_filter",
+        [
+            dict(
+                instrument=INSTRUMENT,
+                name=f"{INSTRUMENT}-{band.upper()}",
+                band=band,
+            )
+            for band in BANDS
+        ],
+    )
+    if "day_obs" in element_names:
+        num_nights = (num_exposures - 1) // exposures_per_night + 1
+        insert(
+            "day_obs",
+            [
+                dict(instrument=INSTRUMENT, id=day_obs_for_night(night))
+                for night in range(num_nights)
+            ],
+        )
+    for start in range(0, num_exposures, INSERT_BATCH_SIZE):
+        values_list = [
+            _make_exposure_values(i, exposures_per_night=exposures_per_night)
+            for i in range(
+                start, min(start + INSERT_BATCH_SIZE, num_exposures)
+            )
+        ]
+        if "group" in element_names:
+            insert(
+                "group",
+                [
+                    dict(instrument=INSTRUMENT, name=values["group"])
+                    for values in values_list
+                ],
+            )
+        insert("exposure", values_list)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="Path of the new repository.")
+    parser.add_argument("num_exposures", type=int, help="Number of exposures.")
+    parser.add_argument(
+        "--exposures-per-night",
+        type=int,
+        default=500,
+        help="Number of exposures per night.",
+    )
+    args = parser.parse_args()
+    make_registry(
+        path=args.path,
+        num_exposures=args.num_exposures,
+        exposures_per_night=args.exposures_per_night,
+    )
+
+
+if __name__ == "__main__":
+    main()
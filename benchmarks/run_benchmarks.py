@@ -0,0 +1,307 @@
+"""Benchmark the butler service resolvers and the full HTTP path.
+
+For each registry size, build (or reuse) a synthetic repository
+with `make_registry`, then measure, for each GraphQL field:
+
+* resolver: the resolver function, called directly.
+* http: a GraphQL POST request to the service, via an aiohttp test client.
+
+Each measurement reports latency percentiles of sequential queries
+and the throughput of concurrent queries. The result cache is bypassed,
+and each query differs (see `get_query_args`) so concurrent queries
+are not merged by single-flight: every query reaches the registry.
+
+Results are written as json; compare two such files
+with ``python benchmarks/compare_results.py``.
+
+Run with ``python benchmarks/run_benchmarks.py --sizes 1000 10000``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import pathlib
+import platform
+import statistics
+import subprocess
+import time
+import types
+import typing
+
+import aiohttp.test_utils
+from make_registry import INSTRUMENT, day_obs_for_night, make_registry
+
+from butlerservice.app import create_app
+from butlerservice.resolvers.simple_query_data_ids import simple_query_data_ids
+from butlerservice.resolvers.simple_query_dimension_records import (
+    simple_query_dimension_records,
+)
+from butlerservice.testutils import Requestor, assert_good_response
+
+# Field name: (resolver, fields to request, args).
+# Each query selects one night of exposures; see `get_query_args`.
+FIELDS = dict(
+    simple_query_data_ids=(
+        simple_query_data_ids,
+        ["data_id"],
+        dict(
+            dimensions=["exposure"],
+            dataid=json.dumps(dict(instrument=INSTRUMENT)),
+            where="exposure.day_obs = night AND exposure != query_id",
+            bind=dict(night=day_obs_for_night(0)),
+            usecache=False,
+        ),
+    ),
+    simple_query_dimension_records=(
+        simple_query_dimension_records,
+        ["record"],
+        dict(
+            element="exposure",
+            dataid=json.dumps(dict(instrument=INSTRUMENT)),
+            where="exposure.day_obs = night AND exposure != query_id",
+            bind=dict(night=day_obs_for_night(0)),
+            usecache=False,
+        ),
+    ),
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def get_query_args(args: dict, index: int) -> dict:
+    """Get the arguments of one query of a field.
+
+    Each query binds a different ``query_id``, which matches no exposure,
+    so the queries return the same rows but are distinct queries;
+    otherwise concurrent queries would be merged into one registry query
+    by `butlerservice.single_flight.SingleFlight`.
+
+    Parameters
+    ----------
+    args
+        Query arguments from `FIELDS`.
+    index
+        Index of the query; exposure IDs are not negative.
+    """
+    return dict(args, bind=json.dumps(dict(args["bind"], query_id=-1 - index)))
+
+
+def summarize_latencies(latencies: typing.List[float]) -> dict:
+    """Summarize latencies (sec) as a dict of statistics in msec."""
+    latencies = sorted(latencies)
+    summary = {
+        f"p{percentile}": 1000
+        * latencies[
+            min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        ]
+        for percentile in PERCENTILES
+    }
+    summary["mean"] = 1000 * statistics.mean(latencies)
+    summary["max"] = 1000 * latencies[-1]
+    return summary
+
+
+async def measure(
+    query: typing.Callable[[int], typing.Awaitable[int]],
+    num_queries: int,
+    concurrency: int,
+) -> dict:
+    """Measure latency and throughput of a query.
+
+    Parameters
+    ----------
+    query
+        Async function that runs a query and returns the number of rows,
+        given the index of the query (see `get_query_args`).
+    num_queries
+        Number of queries to run for each of the two measurements.
+    concurrency
+        Number of queries to run at once when measuring throughput.
+
+    Returns
+    -------
+    result
+        A dict with items num_rows, latency_msec (a dict of statistics)
+        and throughput (queries/sec).
+    """
+    # Warm up, e.g. create pooled registries.
+    num_rows = await query(0)
+
+    latencies = []
+    for index in range(num_queries):
+        t0 = time.perf_counter()
+        await query(index)
+        latencies.append(time.perf_counter() - t0)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited_query(index: int) -> None:
+        async with semaphore:
+            await query(index)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(
+        *[limited_query(index) for index in range(num_queries)]
+    )
+    duration = time.perf_counter() - t0
+
+    return dict(
+        num_rows=num_rows,
+        latency_msec=summarize_latencies(latencies),
+        throughput=num_queries / duration,
+    )
+
+
+async def benchmark_repo(
+    repo_path: pathlib.Path, num_queries: int, concurrency: int
+) -> typing.List[dict]:
+    """Benchmark all fields against one repository."""
+    results = []
+
+    app = create_app(butler_uri=str(repo_path))
+    info = types.SimpleNamespace(context=dict())
+    for field_name, (resolver, _, args) in FIELDS.items():
+
+        async def query_resolver(index: int) -> int:
+            return len(
+                await resolver(app, info, **get_query_args(args, index))
+            )
+
+        result = await measure(
+            query_resolver, num_queries=num_queries, concurrency=concurrency
+        )
+        results.append(dict(level="resolver", field=field_name, **result))
+    app["butlerservice/executor"].shutdown()
+
+    app = create_app(butler_uri=str(repo_path))
+    client = aiohttp.test_utils.TestClient(aiohttp.test_utils.TestServer(app))
+    await client.start_server()
+    try:
+        for field_name, (_, fields, args) in FIELDS.items():
+            requestor = Requestor(
+                client=client,
+                category="query",
+                command=field_name,
+                fields=fields,
+                url_suffix="/butlerservice",
+            )
+
+            async def query_http(index: int) -> int:
+                response = await requestor(get_query_args(args, index))
+                return len(
+                    await assert_good_response(response, command=field_name)
+                )
+
+            result = await measure(
+                query_http, num_queries=num_queries, concurrency=concurrency
+            )
+            results.append(dict(level="http", field=field_name, **result))
+    finally:
+        await client.close()
+    return results
+
+
+def get_git_commit() -> typing.Optional[str]:
+    """Get the current git commit, or None if unknown."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="Numbers of exposures in the synthetic registries.",
+    )
+    parser.add_argument(
+        "--exposures-per-night",
+        type=int,
+        default=500,
+        help="Number of exposures per night; each query returns one night.",
+    )
+    parser.add_argument(
+        "--num-queries",
+        type=int,
+        default=20,
+        help="Number of queries per measurement.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of concurrent queries when measuring throughput.",
+    )
+    parser.add_argument(
+        "--repo-dir",
+        default="benchmark_repos",
+        help="Directory for the synthetic repositories, "
+        "which are reused if they exist.",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark_results.json",
+        help="Path of the json results file.",
+    )
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        repo_path = (
+            pathlib.Path(args.repo_dir)
+            / f"exposures_{size}_{args.exposures_per_night}"
+        )
+        if not (repo_path / "butler.yaml").exists():
+            print(f"Making a registry with {size} exposures in {repo_path}")
+            make_registry(
+                str(repo_path),
+                num_exposures=size,
+                exposures_per_night=args.exposures_per_night,
+            )
+        for result in asyncio.run(
+            benchmark_repo(
+                repo_path,
+                num_queries=args.num_queries,
+                concurrency=args.concurrency,
+            )
+        ):
+            result = dict(num_exposures=size, **result)
+            latency = result["latency_msec"]
+            print(
+                f"{size:>8} {result['level']:>8} {result['field']:<32} "
+                f"p50={latency['p50']:8.1f} ms p99={latency['p99']:8.1f} ms "
+                f"{result['throughput']:8.1f} queries/sec"
+            )
+            results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            dict(
+                git_commit=get_git_commit(),
+                time=datetime.datetime.now().isoformat(),
+                python_version=platform.python_version(),
+                platform=platform.platform(),
+                num_queries=args.num_queries,
+                concurrency=args.concurrency,
+                exposures_per_night=args.exposures_per_night,
+                results=results,
+            ),
+            f,
+            indent=2,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,50 @@ __all__ = ["create_app"]
 import typing
 
 from aiohttp import web
-from graphql_server.aiohttp import GraphQLView
 from lsst.daf.butler import Butler
 from safir.http import init_http_session
 from safir.logging import configure_logging
 from safir.metadata import setup_metadata
 from safir.middleware import bind_logger
 
+from butlerservice.change_marker import (
+    ChangeMarker,
+    resolve_table_names,
+    run_change_marker_sampler,
+    sample_change_marker,
+)
+from butlerservice.client_identity import identify_client
+from butlerservice.compression import compress_response
 from butlerservice.config import Configuration
-from butlerservice.schemas.app_schema import app_schema
+from butlerservice.document_cache import DocumentCache
+from butlerservice.encoding_pool import EncodingPool
+from butlerservice.graphql_view import ButlerGraphQLView
+from butlerservice.handlers.metrics import get_metrics
+from butlerservice.handlers.snapshot import post_refresh_snapshot
+from butlerservice.handlers.status import get_status
+from butlerservice.handlers.stream_query import (
+    stream_query_data_ids,
+    stream_query_dimension_records,
+)
+from butlerservice.metrics import (
+    ServiceMetrics,
+    graphql_metrics_middleware,
+    http_metrics_middleware,
+)
+from butlerservice.profiling import graphql_profiling_middleware
+from butlerservice.query_analyzer import QueryBudget
+from butlerservice.query_scheduler import parse_client_weights
+from butlerservice.record_snapshot import (
+    RecordSnapshot,
+    load_element_records,
+    run_snapshot_refresher,
+)
+from butlerservice.registry_executor import RegistryExecutor
+from butlerservice.registry_pool import RegistryPool
+from butlerservice.result_cache import ResultCache
+from butlerservice.schemas.app_schema import make_app_schema
+from butlerservice.single_flight import SingleFlight
+from butlerservice.subscriptions import SubscriptionHub, run_subscription_hub
 
 
 def create_app(**configs: typing.Any) -> web.Application:
@@ -30,25 +65,139 @@ def create_app(**configs: typing.Any) -> web.Application:
     if not config.butler_uri:
         raise ValueError("Must specify BUTLER_URI")
     butler = Butler(config.butler_uri)
+    registry_pool = RegistryPool(
+        butler_uri=config.butler_uri,
+        max_size=config.registry_pool_size or config.registry_threads,
+        health_check_interval=config.registry_health_check_interval,
+        butler=butler,
+    )
+    record_snapshot = RecordSnapshot(
+        element_names=[
+            name.strip()
+            for name in config.preload_elements.split(",")
+            if name.strip()
+        ],
+        refresh_interval=config.preload_refresh_interval,
+    )
+    if record_snapshot.enabled:
+        element_names = butler.registry.dimensions.getStaticElements().names
+        for element_name in record_snapshot.element_names:
+            if element_name not in element_names:
+                raise ValueError(
+                    f"Unknown dimension element {element_name!r} "
+                    "in BUTLERSERVICE_PRELOAD_ELEMENTS"
+                )
+        record_snapshot.set_records(
+            universe=butler.registry.dimensions,
+            records=load_element_records(
+                butler.registry, record_snapshot.element_names
+            ),
+        )
+    change_marker = ChangeMarker(
+        table_names=resolve_table_names(
+            butler.registry,
+            [
+                name.strip()
+                for name in config.change_marker_tables.split(",")
+                if name.strip()
+            ],
+        ),
+        sample_interval=config.change_marker_interval,
+        count_rows=config.change_marker_count_rows,
+    )
+    if change_marker.enabled:
+        change_marker.set_value(
+            sample_change_marker(
+                butler.registry,
+                change_marker.table_names,
+                count_rows=change_marker.count_rows,
+            )
+        )
+    executor = RegistryExecutor(
+        max_workers=config.registry_threads,
+        max_queued=config.registry_queue_size,
+        max_per_client=config.client_max_concurrent,
+        client_weights=parse_client_weights(config.client_weights),
+    )
 
     root_app = web.Application()
     root_app["safir/config"] = config
     root_app["butlerservice/butler"] = butler
+    root_app["butlerservice/change_marker"] = change_marker
+    root_app["butlerservice/compressed_cache"] = ResultCache(
+        max_bytes=config.compressed_cache_bytes, ttl=config.result_cache_ttl
+    )
+    root_app["butlerservice/document_cache"] = DocumentCache(
+        max_size=config.document_cache_size
+    )
+    root_app["butlerservice/encoding_pool"] = EncodingPool(
+        max_workers=config.encoding_processes,
+        min_rows=config.encoding_min_rows,
+    )
+    root_app["butlerservice/executor"] = executor
+    root_app["butlerservice/metrics"] = ServiceMetrics(root_app)
+    root_app["butlerservice/query_budget"] = QueryBudget(
+        max_cost=config.max_query_cost,
+        max_plan_cost=config.max_plan_cost,
+        max_unpaginated_rows=config.max_unpaginated_rows,
+    )
+    root_app["butlerservice/record_snapshot"] = record_snapshot
+    root_app["butlerservice/registry_pool"] = registry_pool
+    root_app["butlerservice/result_cache"] = ResultCache(
+        max_bytes=config.result_cache_bytes, ttl=config.result_cache_ttl
+    )
+    root_app["butlerservice/single_flight"] = SingleFlight()
+    root_app["butlerservice/subscription_hub"] = SubscriptionHub(
+        app=root_app, poll_interval=config.subscription_poll_interval
+    )
     setup_metadata(package_name="butlerservice", app=root_app)
     setup_middleware(root_app)
+    # Only the root app records HTTP metrics and compresses responses;
+    # its middleware also handles requests to the sub-app.
+    root_app.middlewares.append(http_metrics_middleware)
+    # Inside the metrics middleware, so it records the compressed size.
+    root_app.middlewares.append(compress_response)
     root_app.cleanup_ctx.append(init_http_session)
+    root_app.cleanup_ctx.append(run_snapshot_refresher)
+    root_app.cleanup_ctx.append(run_change_marker_sampler)
+    root_app.cleanup_ctx.append(run_subscription_hub)
+    root_app.on_cleanup.append(shutdown_executor)
+    root_app.on_cleanup.append(shutdown_encoding_pool)
 
-    GraphQLView.attach(
+    ButlerGraphQLView.attach(
         root_app,
-        schema=app_schema,
+        schema=make_app_schema(butler.registry.dimensions),
+        change_marker=change_marker if change_marker.enabled else None,
+        document_cache=root_app["butlerservice/document_cache"],
+        metrics=root_app["butlerservice/metrics"],
+        subscription_hub=root_app["butlerservice/subscription_hub"],
+        # The last middleware is the outermost;
+        # profiles include the timing breakdown of the metrics.
+        middleware=[graphql_profiling_middleware, graphql_metrics_middleware],
         route_path="/butlerservice",
         root_value=root_app,
         enable_async=True,
         graphiql=True,
     )
 
+    root_app.router.add_get("/metrics", get_metrics)
+
     sub_app = web.Application()
     setup_middleware(sub_app)
+    sub_app.add_routes(
+        [
+            web.get("/status", get_status),
+            web.post("/snapshot/refresh", post_refresh_snapshot),
+            web.get("/stream/data_ids", stream_query_data_ids),
+            web.post("/stream/data_ids", stream_query_data_ids),
+            web.get(
+                "/stream/dimension_records", stream_query_dimension_records
+            ),
+            web.post(
+                "/stream/dimension_records", stream_query_dimension_records
+            ),
+        ]
+    )
     root_app.add_subapp(f'/{root_app["safir/config"].name}', sub_app)
 
     return root_app
@@ -57,3 +206,14 @@ def create_app(**configs: typing.Any) -> web.Application:
 def setup_middleware(app: web.Application) -> None:
     """Add middleware to the application."""
     app.middlewares.append(bind_logger)
+    app.middlewares.append(identify_client)
+
+
+async def shutdown_executor(app: web.Application) -> None:
+    """Shut down the registry executor."""
+    app["butlerservice/executor"].shutdown()
+
+
+async def shutdown_encoding_pool(app: web.Application) -> None:
+    """Shut down the encoding process pool."""
+    app["butlerservice/encoding_pool"].shutdown()
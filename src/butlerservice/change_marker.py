@@ -0,0 +1,295 @@
+"""A marker that changes when the contents of the registry change."""
+
+from __future__ import annotations
+
+__all__ = [
+    "DIMENSION_TABLES",
+    "ChangeMarker",
+    "get_dimension_table_names",
+    "refresh_change_marker",
+    "resolve_table_names",
+    "run_change_marker_sampler",
+    "sample_change_marker",
+]
+
+import asyncio
+import contextlib
+import functools
+import hashlib
+import logging
+import time
+import typing
+
+import lsst.daf.butler
+import sqlalchemy
+
+from .record_snapshot import refresh_record_snapshot
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+
+# A name that stands for the tables of all dimension elements
+# in a list of change marker tables; see `resolve_table_names`.
+DIMENSION_TABLES = "dimensions"
+
+
+def _get_table(
+    registry: lsst.daf.butler.Registry, table_name: str
+) -> sqlalchemy.Table:
+    """Get a registry database table by name.
+
+    Raises
+    ------
+    ValueError
+        If the table is not found.
+    """
+    # The database is not part of the public registry API.
+    database = getattr(registry, "_registry", registry)._db
+    key = (
+        table_name
+        if database.namespace is None
+        else f"{database.namespace}.{table_name}"
+    )
+    table = database._metadata.tables.get(key)
+    if table is None:
+        raise ValueError(f"Unknown registry table {table_name!r}")
+    return table
+
+
+def get_dimension_table_names(
+    registry: lsst.daf.butler.Registry,
+) -> typing.List[str]:
+    """Get the names of the tables of all dimension elements
+    that have their own table.
+
+    Skypix dimensions and elements that are views of another element's
+    table (such as "band") have none.
+    """
+    return [
+        element.name
+        for element in registry.dimensions.getStaticElements()
+        if element.hasTable() and getattr(element, "viewOf", None) is None
+    ]
+
+
+def resolve_table_names(
+    registry: lsst.daf.butler.Registry, table_names: typing.Iterable[str]
+) -> typing.List[str]:
+    """Replace `DIMENSION_TABLES` in a list of change marker tables
+    with the tables of all dimension elements, and remove duplicates.
+
+    Parameters
+    ----------
+    registry
+        Butler registry.
+    table_names
+        Names of registry database tables, or `DIMENSION_TABLES`.
+    """
+    resolved_names: typing.Dict[str, None] = dict()
+    for table_name in table_names:
+        if table_name == DIMENSION_TABLES:
+            for name in get_dimension_table_names(registry):
+                resolved_names[name] = None
+        else:
+            resolved_names[table_name] = None
+    return list(resolved_names)
+
+
+def sample_change_marker(
+    registry: lsst.daf.butler.Registry,
+    table_names: typing.Iterable[str],
+    count_rows: bool = False,
+) -> str:
+    """Sample the state of registry tables, as a short string
+    that changes when rows are inserted into them.
+
+    The marker is a hash of the maximum value of each integer
+    primary key column of each table, read in one SQL statement.
+    These are read from the primary key indexes, without reading
+    the tables: by one index lookup if the integer column leads
+    the key (as for "collection"), else by an index-only scan
+    (as for "exposure", whose key is instrument, id).
+    Updates of existing rows do not change the marker; nor do
+    deletions, or insertions into tables with no integer primary key
+    column (such as "dataset", whose ids are UUIDs, and
+    "physical_filter"), unless ``count_rows`` is true.
+
+    Parameters
+    ----------
+    registry
+        Butler registry.
+    table_names
+        Names of the registry database tables to sample,
+        e.g. "collection" and "exposure".
+    count_rows
+        Also sample the number of rows of each table,
+        and the maximum ingest date of tables that have one?
+        This detects all insertions and deletions, but scans
+        each table, which is slow for large tables on PostgreSQL.
+
+    Raises
+    ------
+    ValueError
+        If a table is not found.
+    """
+    columns = []
+    for table_name in table_names:
+        table = _get_table(registry, table_name)
+        if count_rows:
+            columns.append(
+                sqlalchemy.select(sqlalchemy.func.count())
+                .select_from(table)
+                .scalar_subquery()
+            )
+        for column in table.columns:
+            if (count_rows and column.name == "ingest_date") or (
+                column.primary_key
+                and isinstance(column.type, sqlalchemy.Integer)
+            ):
+                columns.append(
+                    sqlalchemy.select(
+                        sqlalchemy.func.max(column)
+                    ).scalar_subquery()
+                )
+    if not columns:
+        return ""
+    database = getattr(registry, "_registry", registry)._db
+    with database.query(sqlalchemy.select(*columns)) as result:
+        row = tuple(result.one())
+    return hashlib.sha256(repr(row).encode()).hexdigest()[:16]
+
+
+class ChangeMarker:
+    """The most recently sampled change marker of the registry;
+    see `sample_change_marker`.
+
+    Parameters
+    ----------
+    table_names
+        Names of the registry tables to sample.
+    sample_interval
+        The interval at which to sample the tables (sec).
+        If 0 then the marker is disabled.
+    count_rows
+        Also sample the number of rows of each table;
+        see `sample_change_marker`.
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+    """
+
+    def __init__(
+        self,
+        table_names: typing.Iterable[str],
+        sample_interval: float,
+        count_rows: bool = False,
+    ) -> None:
+        self.table_names = list(table_names)
+        self.sample_interval = sample_interval
+        self.count_rows = count_rows
+        self.value: typing.Optional[str] = None
+        self.sample_time: typing.Optional[float] = None
+        self.num_samples = 0
+        self.num_changes = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Is the marker enabled?"""
+        return bool(self.table_names) and self.sample_interval > 0
+
+    def set_value(self, value: str) -> bool:
+        """Set a newly sampled value and return True if it changed
+        (not counting the first value).
+
+        A value that follows a failed sample (see `clear`) always counts
+        as a change.
+        """
+        changed = self.num_samples > 0 and value != self.value
+        self.value = value
+        self.sample_time = time.time()
+        self.num_samples += 1
+        if changed:
+            self.num_changes += 1
+        return changed
+
+    def clear(self) -> None:
+        """Forget the value, e.g. because the registry could not be sampled.
+
+        The registry may change while the value is unknown.
+        """
+        self.value = None
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the current state of the marker as a dict."""
+        return dict(
+            tables=self.table_names,
+            sample_interval=self.sample_interval,
+            count_rows=self.count_rows,
+            value=self.value,
+            sample_time=self.sample_time,
+            num_samples=self.num_samples,
+            num_changes=self.num_changes,
+        )
+
+
+async def refresh_change_marker(app: aiohttp.web.Application) -> None:
+    """Sample the change marker of an application.
+
+    The tables are sampled in the registry executor.
+    If the marker changed then the result cache and the record snapshot
+    are cleared, so that no result older than the marker is returned,
+    and the snapshot is reloaded.
+    """
+    marker = app["butlerservice/change_marker"]
+    if not marker.enabled:
+        return
+    query_func = functools.partial(
+        app["butlerservice/registry_pool"].call,
+        sample_change_marker,
+        table_names=marker.table_names,
+        count_rows=marker.count_rows,
+    )
+    value = await app["butlerservice/executor"].run(query_func)
+    if marker.set_value(value):
+        app["butlerservice/result_cache"].clear()
+        snapshot = app["butlerservice/record_snapshot"]
+        if snapshot.enabled:
+            snapshot.clear()
+            try:
+                await refresh_record_snapshot(app)
+            except Exception as e:
+                # Queries are answered by the registry meanwhile.
+                logging.getLogger("butlerservice").warning(
+                    f"Could not reload the record snapshot: {e}"
+                )
+
+
+async def run_change_marker_sampler(
+    app: aiohttp.web.Application,
+) -> typing.AsyncIterator[None]:
+    """Periodically sample the change marker of an application,
+    while the application is running.
+
+    For use in ``app.cleanup_ctx``.
+    """
+    marker = app["butlerservice/change_marker"]
+
+    async def sample_periodically() -> None:
+        log = logging.getLogger("butlerservice")
+        while True:
+            await asyncio.sleep(marker.sample_interval)
+            try:
+                await refresh_change_marker(app)
+            except Exception as e:
+                log.warning(f"Could not sample the change marker: {e}")
+                marker.clear()
+
+    task = None
+    if marker.enabled:
+        task = asyncio.ensure_future(sample_periodically())
+    yield
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
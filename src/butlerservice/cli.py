@@ -8,6 +8,7 @@ import click
 from aiohttp.web import run_app
 
 from butlerservice.app import create_app
+from butlerservice.workers import run_workers
 
 # Add -h as a help shortcut option
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
@@ -48,8 +49,18 @@ def help(ctx: click.Context, topic: Union[None, str], **kw: Any) -> None:
     type=int,
     help="Port on which to run the application.",
 )
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes. "
+    "If more than one, they share the port and each has its own butler.",
+)
 @click.pass_context
-def run(ctx: click.Context, port: int) -> None:
+def run(ctx: click.Context, port: int, workers: int) -> None:
     """Run the application (for production)."""
-    app = create_app()
-    run_app(app, port=port)
+    if workers > 1:
+        run_workers(port=port, num_workers=workers)
+    else:
+        app = create_app()
+        run_app(app, port=port)
@@ -0,0 +1,105 @@
+"""Identify the client that sent a request."""
+
+from __future__ import annotations
+
+__all__ = [
+    "get_client_identity",
+    "get_current_client",
+    "identify_client",
+    "set_current_client",
+]
+
+import contextvars
+import hashlib
+import typing
+
+from aiohttp import web
+
+# Identity of requests whose client cannot be identified.
+UNKNOWN_CLIENT = "unknown"
+
+_current_client: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "butlerservice_client", default=UNKNOWN_CLIENT
+)
+
+
+def get_client_identity(
+    request: web.Request, trust_proxy_headers: bool = False
+) -> str:
+    """Get the identity of the client that sent a request.
+
+    In order of preference this is:
+
+    * "user:<name>" from the ``X-Auth-Request-User`` header
+      set by an authenticating proxy, if ``trust_proxy_headers``.
+    * "token:<hash>" from a bearer token in the ``Authorization`` header,
+      where ``<hash>`` is the start of the SHA-256 hex digest of the token
+      (so that tokens are not exposed in the status or logs).
+    * "ip:<address>" from the first address in the ``X-Forwarded-For``
+      header, if ``trust_proxy_headers``, else from the peer address.
+
+    Parameters
+    ----------
+    request
+        HTTP request.
+    trust_proxy_headers
+        Trust headers set by the proxy in front of the service?
+        Only enable this if the proxy sets or strips these headers,
+        since clients could otherwise impersonate each other.
+    """
+    if trust_proxy_headers:
+        user = request.headers.get("X-Auth-Request-User")
+        if user:
+            return f"user:{user}"
+    authorization = request.headers.get("Authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        digest = hashlib.sha256(token.strip().encode()).hexdigest()
+        return f"token:{digest[:16]}"
+    if trust_proxy_headers:
+        forwarded_for = request.headers.get("X-Forwarded-For", "")
+        address = forwarded_for.split(",")[0].strip()
+        if address:
+            return f"ip:{address}"
+    if request.remote:
+        return f"ip:{request.remote}"
+    return UNKNOWN_CLIENT
+
+
+def get_current_client() -> str:
+    """Get the identity of the client whose request is being handled."""
+    return _current_client.get()
+
+
+def set_current_client(client: str) -> None:
+    """Set the identity of the current client, e.g. in a background task
+    that runs registry queries on behalf of many clients.
+
+    The identity is a context variable, so this only affects the current
+    task (and tasks it starts).
+    """
+    _current_client.set(client)
+
+
+@web.middleware
+async def identify_client(
+    request: web.Request,
+    handler: typing.Callable[[web.Request], typing.Awaitable],
+) -> web.StreamResponse:
+    """aiohttp middleware that identifies the client of each request.
+
+    The identity (see `get_client_identity`) is stored in the request
+    as "butlerservice/client", and in a context variable that is read
+    by `get_current_client`, e.g. to schedule the client's
+    registry queries fairly.
+    """
+    config = request.config_dict["safir/config"]
+    client = get_client_identity(
+        request, trust_proxy_headers=config.trust_proxy_headers
+    )
+    request["butlerservice/client"] = client
+    token = _current_client.set(client)
+    try:
+        return await handler(request)
+    finally:
+        _current_client.reset(token)
@@ -0,0 +1,209 @@
+"""Convert dimension records to columns."""
+
+from __future__ import annotations
+
+__all__ = ["make_columnar_records"]
+
+import typing
+
+import lsst.daf.butler
+import lsst.sphgeom
+import numpy as np
+
+# Initial capacity of a numeric column (rows); doubled as needed.
+INITIAL_CAPACITY = 1024
+
+# Dictionary-encode a string column if the number of distinct values
+# is at most this fraction of the number of rows.
+MAX_DICTIONARY_FRACTION = 0.5
+
+
+class _Column:
+    """Accumulate the values of one column.
+
+    Parameters
+    ----------
+    name
+        Column name.
+    column_type
+        Column type, as reported to the client.
+    """
+
+    def __init__(self, name: str, column_type: str) -> None:
+        self.name = name
+        self.column_type = column_type
+        self.values: typing.List[typing.Any] = []
+
+    def append(self, value: typing.Any) -> None:
+        self.values.append(value)
+
+    def finish(self) -> dict:
+        """Return the column as a dict with items name, type, values,
+        dictionary and indices.
+        """
+        return dict(
+            name=self.name,
+            type=self.column_type,
+            values=self.values,
+            dictionary=None,
+            indices=None,
+        )
+
+
+class _NumericColumn(_Column):
+    """Accumulate numeric values in a numpy array, with a null mask."""
+
+    def __init__(self, name: str, column_type: str, dtype: type) -> None:
+        super().__init__(name=name, column_type=column_type)
+        self.array = np.zeros(INITIAL_CAPACITY, dtype=dtype)
+        self.is_null = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.size = 0
+
+    def append(self, value: typing.Any) -> None:
+        if self.size == len(self.array):
+            self.array = np.resize(self.array, 2 * self.size)
+            self.is_null = np.resize(self.is_null, 2 * self.size)
+        if value is None:
+            self.is_null[self.size] = True
+        else:
+            self.array[self.size] = value
+            self.is_null[self.size] = False
+        self.size += 1
+
+    def finish(self) -> dict:
+        values = self.array[: self.size].tolist()
+        for i in np.flatnonzero(self.is_null[: self.size]):
+            values[i] = None
+        self.values = values
+        return super().finish()
+
+
+class _StringColumn(_Column):
+    """Accumulate string values, dictionary-encoding them if
+    there are few distinct values (e.g. instrument or physical_filter).
+    """
+
+    def __init__(self, name: str, column_type: str) -> None:
+        super().__init__(name=name, column_type=column_type)
+        self.index_dict: typing.Dict[str, int] = {}
+
+    def append(self, value: typing.Any) -> None:
+        if value is not None and value not in self.index_dict:
+            self.index_dict[value] = len(self.index_dict)
+        self.values.append(value)
+
+    def finish(self) -> dict:
+        num_rows = len(self.values)
+        # Do not bother to encode an empty or all-null column.
+        if (
+            not self.index_dict
+            or len(self.index_dict) > num_rows * MAX_DICTIONARY_FRACTION
+        ):
+            return super().finish()
+        index_dict = self.index_dict
+        return dict(
+            name=self.name,
+            type=self.column_type,
+            values=None,
+            dictionary=list(index_dict.keys()),
+            indices=[
+                None if value is None else index_dict[value]
+                for value in self.values
+            ],
+        )
+
+
+class _TimespanColumn(_Column):
+    """Accumulate timespans as [begin, end] ISO strings."""
+
+    def append(self, value: typing.Any) -> None:
+        if value is not None:
+            value = [
+                None if value.begin is None else value.begin.isot,
+                None if value.end is None else value.end.isot,
+            ]
+        self.values.append(value)
+
+
+class _RegionColumn(_Column):
+    """Accumulate regions as hex-encoded `lsst.sphgeom.Region.encode`."""
+
+    def append(self, value: typing.Any) -> None:
+        if isinstance(value, lsst.sphgeom.Region):
+            value = value.encode().hex()
+        self.values.append(value)
+
+
+def _make_columns(
+    element: lsst.daf.butler.DimensionElement,
+) -> typing.List[_Column]:
+    """Make one column accumulator per field of a dimension element."""
+    columns: typing.List[_Column] = []
+    for field_spec in element.RecordClass.fields.standard:
+        python_type = field_spec.getPythonType()
+        if python_type is int:
+            columns.append(
+                _NumericColumn(
+                    field_spec.name, column_type="int", dtype=np.int64
+                )
+            )
+        elif python_type is float:
+            columns.append(
+                _NumericColumn(
+                    field_spec.name, column_type="float", dtype=np.float64
+                )
+            )
+        elif python_type is str:
+            columns.append(
+                _StringColumn(field_spec.name, column_type="string")
+            )
+        elif python_type is bool:
+            columns.append(_Column(field_spec.name, column_type="bool"))
+        else:
+            columns.append(_Column(field_spec.name, column_type="other"))
+    if element.temporal is not None:
+        columns.append(_TimespanColumn("timespan", column_type="timespan"))
+    if element.spatial is not None:
+        columns.append(_RegionColumn("region", column_type="region"))
+    return columns
+
+
+def make_columnar_records(
+    element: lsst.daf.butler.DimensionElement,
+    records: typing.Iterable[lsst.daf.butler.DimensionRecord],
+) -> dict:
+    """Convert dimension records to columns, in a single pass.
+
+    Numeric columns are accumulated in numpy arrays;
+    string columns with few distinct values are dictionary-encoded.
+
+    Parameters
+    ----------
+    element
+        The dimension element of the records.
+    records
+        The records.
+
+    Returns
+    -------
+    columnar_records
+        A dict with items:
+
+        * num_rows: the number of records.
+        * columns: a list of dicts, one per field, with items:
+          name, type ("int", "float", "string", "bool", "timespan",
+          "region" or "other"), values (a list with one value per row,
+          or None if dictionary-encoded), dictionary and indices
+          (None unless dictionary-encoded, in which case the value for
+          row i is dictionary[indices[i]], or null if indices[i] is null).
+    """
+    columns = _make_columns(element)
+    column_getters = [(column.append, column.name) for column in columns]
+    num_rows = 0
+    for record in records:
+        for append, name in column_getters:
+            append(getattr(record, name))
+        num_rows += 1
+    return dict(
+        num_rows=num_rows, columns=[column.finish() for column in columns]
+    )
@@ -0,0 +1,213 @@
+"""Compression of HTTP responses, negotiated from ``Accept-Encoding``."""
+
+from __future__ import annotations
+
+__all__ = [
+    "CACHE_COMPRESSED_KEY",
+    "choose_encoding",
+    "compress",
+    "compress_response",
+    "enable_stream_compression",
+    "get_encodings",
+]
+
+import asyncio
+import gzip
+import hashlib
+import typing
+
+from aiohttp import hdrs, web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Request key: set to True by a handler whose response is built from
+# cached data (e.g. query results answered from the result cache), so the
+# same body is likely to be sent again. Its compressed copy is cached.
+CACHE_COMPRESSED_KEY = "butlerservice/cache_compressed"
+
+# Content types of responses that are compressed.
+COMPRESSIBLE_CONTENT_TYPES = frozenset(
+    (
+        "application/json",
+        "application/x-ndjson",
+        "text/html",
+        "text/plain",
+    )
+)
+
+# Bodies larger than this (bytes) are compressed in a worker thread,
+# so as not to block the event loop; all the compressors release the GIL.
+INLINE_MAX_BYTES = 64 * 1024
+
+
+def _gzip_compress(data: bytes, level: int) -> bytes:
+    # mtime=0 makes the output depend only on the data.
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def _brotli_compress(data: bytes, level: int) -> bytes:
+    return brotli.compress(data, quality=min(level, 11))
+
+
+def _zstd_compress(data: bytes, level: int) -> bytes:
+    # Compressors are not thread safe, so make one for each body.
+    return zstandard.ZstdCompressor(level=min(level, 22)).compress(data)
+
+
+# Dict of encoding: compression function, in order of preference.
+_COMPRESSORS: typing.Dict[str, typing.Callable[[bytes, int], bytes]] = dict()
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = _zstd_compress
+if brotli is not None:
+    _COMPRESSORS["br"] = _brotli_compress
+_COMPRESSORS["gzip"] = _gzip_compress
+
+
+def get_encodings() -> typing.List[str]:
+    """Get the supported content encodings, in order of preference.
+
+    gzip is always supported; brotli ("br") and zstd are supported
+    if the ``brotli`` and ``zstandard`` packages are installed, as by
+    ``pip install butlerservice[compression]``.
+    """
+    return list(_COMPRESSORS)
+
+
+def choose_encoding(
+    accept_encoding: str,
+    encodings: typing.Optional[typing.Iterable[str]] = None,
+) -> typing.Optional[str]:
+    """Choose the content encoding of a response.
+
+    Parameters
+    ----------
+    accept_encoding
+        Value of the ``Accept-Encoding`` header of the request.
+    encodings
+        The encodings to choose from, in order of preference.
+        If None then use `get_encodings`.
+
+    Returns
+    -------
+    encoding
+        The supported encoding with the highest quality value
+        (and, of encodings with equal quality values, the one
+        that compresses best), or None if the client accepts none.
+    """
+    qualities: typing.Dict[str, float] = dict()
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    best_encoding = None
+    best_quality = 0.0
+    for encoding in _COMPRESSORS if encodings is None else encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding, best_quality = encoding, quality
+    return best_encoding
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress data.
+
+    Parameters
+    ----------
+    data
+        Data to compress.
+    encoding
+        Content encoding; one of `get_encodings`.
+    level
+        Compression level; clamped to the maximum level of the encoding.
+    """
+    return _COMPRESSORS[encoding](data, max(level, 1))
+
+
+def enable_stream_compression(
+    request: web.Request, response: web.StreamResponse
+) -> None:
+    """Compress a streamed response with gzip, if the client accepts it
+    and compression is enabled.
+
+    Call this before preparing the response. aiohttp compresses each chunk
+    as it is written, at zlib's default level.
+    """
+    config = request.config_dict["safir/config"]
+    if config.compression_level <= 0:
+        return
+    response.headers.add(hdrs.VARY, hdrs.ACCEPT_ENCODING)
+    if choose_encoding(
+        request.headers.get(hdrs.ACCEPT_ENCODING, ""), encodings=["gzip"]
+    ):
+        response.enable_compression(web.ContentCoding.gzip)
+
+
+@web.middleware
+async def compress_response(
+    request: web.Request,
+    handler: typing.Callable[[web.Request], typing.Awaitable],
+) -> web.StreamResponse:
+    """aiohttp middleware that compresses response bodies.
+
+    The encoding is negotiated from the ``Accept-Encoding`` header
+    (see `choose_encoding`). Only json and text bodies of at least
+    ``config.compression_min_bytes`` bytes are compressed;
+    streamed responses are not (see `enable_stream_compression`).
+
+    If the handler set `CACHE_COMPRESSED_KEY` in the request then
+    the compressed body is cached in "butlerservice/compressed_cache",
+    keyed by the SHA-256 digest of the body, so that sending the same
+    body again costs a hash rather than another compression.
+
+    Add it to the root application only.
+    """
+    response = await handler(request)
+    config = request.config_dict["safir/config"]
+    if (
+        config.compression_level <= 0
+        or type(response) is not web.Response
+        or not isinstance(response.body, (bytes, bytearray))
+        or len(response.body) < config.compression_min_bytes
+        or response.content_type not in COMPRESSIBLE_CONTENT_TYPES
+        or hdrs.CONTENT_ENCODING in response.headers
+    ):
+        return response
+    response.headers.add(hdrs.VARY, hdrs.ACCEPT_ENCODING)
+    encoding = choose_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ""))
+    if encoding is None:
+        return response
+
+    body = bytes(response.body)
+    compressed_cache = request.config_dict["butlerservice/compressed_cache"]
+    cache_key = None
+    compressed = None
+    if compressed_cache.enabled and request.get(CACHE_COMPRESSED_KEY):
+        cache_key = (encoding, hashlib.sha256(body).digest())
+        compressed = compressed_cache.get(cache_key)
+    if compressed is None:
+        if len(body) > INLINE_MAX_BYTES:
+            compressed = await asyncio.get_running_loop().run_in_executor(
+                None, compress, body, encoding, config.compression_level
+            )
+        else:
+            compressed = compress(body, encoding, config.compression_level)
+        if cache_key is not None:
+            compressed_cache.put(cache_key, compressed)
+    response.body = compressed
+    response.headers[hdrs.CONTENT_ENCODING] = encoding
+    return response
@@ -2,10 +2,31 @@
 
 __all__ = ["Configuration"]
 
+import dataclasses
 import os
+import typing
 from dataclasses import dataclass
 
 
+def str_to_bool(value: str) -> bool:
+    """Convert a string such as "true" or "0" to a bool."""
+    lower_value = value.strip().lower()
+    if lower_value in ("1", "true", "t", "yes", "y", "on"):
+        return True
+    elif lower_value in ("0", "false", "f", "no", "n", "off", ""):
+        return False
+    raise ValueError(f"Cannot interpret {value!r} as a bool")
+
+
+# Functions to convert a string to the type of a configuration field,
+# for field types other than str.
+_CONVERTERS: typing.Dict[typing.Any, typing.Callable[[str], typing.Any]] = {
+    bool: str_to_bool,
+    float: float,
+    int: int,
+}
+
+
 @dataclass
 class Configuration:
     """Configuration for butlerservice."""
@@ -41,3 +62,322 @@ class Configuration:
 
     Set with the ``SAFIR_LOG_LEVEL`` environment variable.
     """
+
+    registry_threads: int = int(
+        os.getenv("BUTLERSERVICE_REGISTRY_THREADS", "4")
+    )
+    """The number of threads used to run registry queries.
+
+    Set with the ``BUTLERSERVICE_REGISTRY_THREADS`` environment variable.
+    """
+
+    registry_queue_size: int = int(
+        os.getenv("BUTLERSERVICE_REGISTRY_QUEUE_SIZE", "100")
+    )
+    """The maximum number of registry queries that may wait for a thread.
+
+    Queries that arrive when the queue is full are rejected
+    with a "server busy" error, rather than waiting.
+    Set with the ``BUTLERSERVICE_REGISTRY_QUEUE_SIZE`` environment variable.
+    """
+
+    registry_pool_size: int = int(
+        os.getenv("BUTLERSERVICE_REGISTRY_POOL_SIZE", "0")
+    )
+    """The maximum number of butler registries (database connections).
+
+    Each registry thread checks out a registry while running a query.
+    0 (the default) means one registry per registry thread.
+    Set with the ``BUTLERSERVICE_REGISTRY_POOL_SIZE`` environment variable.
+    """
+
+    registry_health_check_interval: float = float(
+        os.getenv("BUTLERSERVICE_REGISTRY_HEALTH_CHECK_INTERVAL", "60")
+    )
+    """Check a pooled registry before using it, if it has been idle
+    for longer than this (seconds).
+
+    Set with the ``BUTLERSERVICE_REGISTRY_HEALTH_CHECK_INTERVAL``
+    environment variable.
+    """
+
+    result_cache_bytes: int = int(
+        os.getenv("BUTLERSERVICE_RESULT_CACHE_BYTES", "100000000")
+    )
+    """The approximate maximum memory used to cache query results (bytes).
+
+    0 disables the cache.
+    Set with the ``BUTLERSERVICE_RESULT_CACHE_BYTES`` environment variable.
+    """
+
+    result_cache_ttl: float = float(
+        os.getenv("BUTLERSERVICE_RESULT_CACHE_TTL", "60")
+    )
+    """The time after which a cached query result expires (seconds).
+
+    Set with the ``BUTLERSERVICE_RESULT_CACHE_TTL`` environment variable.
+    """
+
+    compression_level: int = int(
+        os.getenv("BUTLERSERVICE_COMPRESSION_LEVEL", "6")
+    )
+    """The level at which responses are compressed.
+
+    Clamped to the range of each encoding (1-9 for gzip, 1-11 for brotli,
+    1-22 for zstd). 0 disables compression.
+    Set with the ``BUTLERSERVICE_COMPRESSION_LEVEL`` environment variable.
+    """
+
+    compression_min_bytes: int = int(
+        os.getenv("BUTLERSERVICE_COMPRESSION_MIN_BYTES", "1024")
+    )
+    """The minimum size of a response body that is compressed (bytes).
+
+    Set with the ``BUTLERSERVICE_COMPRESSION_MIN_BYTES`` environment
+    variable.
+    """
+
+    compressed_cache_bytes: int = int(
+        os.getenv("BUTLERSERVICE_COMPRESSED_CACHE_BYTES", "50000000")
+    )
+    """The approximate maximum memory used to cache compressed
+    response bodies (bytes).
+
+    0 disables the cache.
+    Set with the ``BUTLERSERVICE_COMPRESSED_CACHE_BYTES`` environment
+    variable.
+    """
+
+    change_marker_tables: str = os.getenv(
+        "BUTLERSERVICE_CHANGE_MARKER_TABLES", "collection,dataset,dimensions"
+    )
+    """Comma-separated names of the registry database tables
+    whose changes change the ETags of GET queries.
+
+    "dimensions" stands for the tables of all dimension elements,
+    so that the ETag of any dimension record or data ID query changes
+    when rows are added. Only list fewer tables if the others never change.
+
+    Set with the ``BUTLERSERVICE_CHANGE_MARKER_TABLES`` environment
+    variable.
+    """
+
+    change_marker_interval: float = float(
+        os.getenv("BUTLERSERVICE_CHANGE_MARKER_INTERVAL", "10")
+    )
+    """The interval at which the change marker tables are sampled (seconds).
+
+    0 disables ETags.
+    Set with the ``BUTLERSERVICE_CHANGE_MARKER_INTERVAL`` environment
+    variable.
+    """
+
+    change_marker_count_rows: bool = str_to_bool(
+        os.getenv("BUTLERSERVICE_CHANGE_MARKER_COUNT_ROWS", "false")
+    )
+    """Also sample the number of rows (and latest ingest date)
+    of each change marker table?
+
+    By default only the maximum of the integer primary key columns
+    is sampled, which is cheap, but does not detect deletions,
+    nor insertions into tables with no integer key, such as ``dataset``.
+    Counting rows detects both, but scans each table every
+    ``change_marker_interval``, which is slow for large tables.
+    Set with the ``BUTLERSERVICE_CHANGE_MARKER_COUNT_ROWS`` environment
+    variable.
+    """
+
+    subscription_poll_interval: float = float(
+        os.getenv("BUTLERSERVICE_SUBSCRIPTION_POLL_INTERVAL", "5")
+    )
+    """The interval at which the registry is polled for new records
+    for GraphQL subscriptions (seconds).
+
+    Subscriptions with the same arguments share one poller.
+    0 disables subscriptions.
+    Set with the ``BUTLERSERVICE_SUBSCRIPTION_POLL_INTERVAL``
+    environment variable.
+    """
+
+    document_cache_size: int = int(
+        os.getenv("BUTLERSERVICE_DOCUMENT_CACHE_SIZE", "1000")
+    )
+    """The maximum number of parsed and validated GraphQL queries to cache.
+
+    This is also the maximum number of persisted queries.
+    0 disables the cache (and persisted queries).
+    Set with the ``BUTLERSERVICE_DOCUMENT_CACHE_SIZE`` environment variable.
+    """
+
+    max_page_size: int = int(os.getenv("BUTLERSERVICE_MAX_PAGE_SIZE", "10000"))
+    """The maximum number of rows in one page of a paginated query.
+
+    Set with the ``BUTLERSERVICE_MAX_PAGE_SIZE`` environment variable.
+    """
+
+    stream_chunk_size: int = int(
+        os.getenv("BUTLERSERVICE_STREAM_CHUNK_SIZE", "1000")
+    )
+    """The number of rows encoded and sent at a time by the streaming
+    query endpoints.
+
+    Set with the ``BUTLERSERVICE_STREAM_CHUNK_SIZE`` environment variable.
+    """
+
+    max_batch_size: int = int(
+        os.getenv("BUTLERSERVICE_MAX_BATCH_SIZE", "1000")
+    )
+    """The maximum number of entries in one batch query.
+
+    Set with the ``BUTLERSERVICE_MAX_BATCH_SIZE`` environment variable.
+    """
+
+    encoding_processes: int = int(
+        os.getenv("BUTLERSERVICE_ENCODING_PROCESSES", "0")
+    )
+    """The number of worker processes used to json-encode large query
+    results. If 0 then results are encoded in the registry threads.
+
+    Set with the ``BUTLERSERVICE_ENCODING_PROCESSES`` environment variable.
+    """
+
+    encoding_min_rows: int = int(
+        os.getenv("BUTLERSERVICE_ENCODING_MIN_ROWS", "10000")
+    )
+    """The minimum number of rows for which query results are json-encoded
+    in the encoding processes; smaller results are encoded in the registry
+    threads. Ignored if ``encoding_processes`` is 0.
+
+    Set with the ``BUTLERSERVICE_ENCODING_MIN_ROWS`` environment variable.
+    """
+
+    preload_elements: str = os.getenv("BUTLERSERVICE_PRELOAD_ELEMENTS", "")
+    """Comma-separated names of dimension elements whose records are
+    loaded into memory at startup, e.g. "instrument,physical_filter".
+
+    Queries for the records of these elements that only have
+    data ID constraints are answered from memory.
+    Only list elements that are small and rarely change.
+    Set with the ``BUTLERSERVICE_PRELOAD_ELEMENTS`` environment variable.
+    """
+
+    preload_refresh_interval: float = float(
+        os.getenv("BUTLERSERVICE_PRELOAD_REFRESH_INTERVAL", "300")
+    )
+    """The interval at which preloaded records are reloaded (seconds).
+
+    0 to only reload them on demand.
+    Set with the ``BUTLERSERVICE_PRELOAD_REFRESH_INTERVAL``
+    environment variable.
+    """
+
+    client_max_concurrent: int = int(
+        os.getenv("BUTLERSERVICE_CLIENT_MAX_CONCURRENT", "0")
+    )
+    """The maximum number of registry queries one client may run at once.
+
+    Clients are identified by user name (from a trusted proxy),
+    bearer token or IP address. 0 for no limit.
+    Set with the ``BUTLERSERVICE_CLIENT_MAX_CONCURRENT`` environment variable.
+    """
+
+    client_weights: str = os.getenv("BUTLERSERVICE_CLIENT_WEIGHTS", "")
+    """Weights of clients for fair scheduling of registry queries,
+    as comma-separated ``<client>=<weight>`` items,
+    e.g. "user:prompt-processing=4,ip:10.0.0.5=0.5".
+
+    A client with weight 2 gets twice the share of registry threads
+    of a client with the default weight of 1, when both are waiting.
+    Set with the ``BUTLERSERVICE_CLIENT_WEIGHTS`` environment variable.
+    """
+
+    trust_proxy_headers: bool = str_to_bool(
+        os.getenv("BUTLERSERVICE_TRUST_PROXY_HEADERS", "false")
+    )
+    """Identify clients by the ``X-Auth-Request-User`` and
+    ``X-Forwarded-For`` headers?
+
+    Only enable this if the proxy in front of the service sets
+    or strips these headers.
+    Set with the ``BUTLERSERVICE_TRUST_PROXY_HEADERS`` environment variable.
+    """
+
+    query_timeout: float = float(
+        os.getenv("BUTLERSERVICE_QUERY_TIMEOUT", "300")
+    )
+    """The maximum time allowed for the registry queries of one request
+    (seconds), including time spent waiting for a registry thread.
+
+    Queries that take longer are cancelled, interrupting their SQL
+    statements, and reported as errors. Clients may specify a shorter
+    timeout with the ``X-Butlerservice-Timeout`` header. 0 for no limit.
+    Set with the ``BUTLERSERVICE_QUERY_TIMEOUT`` environment variable.
+    """
+
+    max_query_cost: float = float(
+        os.getenv("BUTLERSERVICE_MAX_QUERY_COST", "0")
+    )
+    """The maximum estimated cost of a registry query, checked before
+    it is run; see `butlerservice.query_cost.estimate_query_cost`.
+
+    The estimate grows with the number of dimensions, dataset types and
+    collections, and with each governor dimension (e.g. instrument)
+    the query does not constrain. 0 for no limit.
+    Set with the ``BUTLERSERVICE_MAX_QUERY_COST`` environment variable.
+    """
+
+    max_plan_cost: float = float(os.getenv("BUTLERSERVICE_MAX_PLAN_COST", "0"))
+    """The maximum cost of a registry query estimated by the database
+    (from EXPLAIN, in its own units), checked before the query is run.
+
+    Only supported for PostgreSQL. 0 for no limit.
+    Set with the ``BUTLERSERVICE_MAX_PLAN_COST`` environment variable.
+    """
+
+    max_unpaginated_rows: float = float(
+        os.getenv("BUTLERSERVICE_MAX_UNPAGINATED_ROWS", "0")
+    )
+    """The maximum number of rows, estimated by the database,
+    of a registry query that is not paginated.
+
+    Larger queries must use a ``_connection`` field or a streaming endpoint.
+    Only supported for PostgreSQL. 0 for no limit.
+    Set with the ``BUTLERSERVICE_MAX_UNPAGINATED_ROWS`` environment
+    variable.
+    """
+
+    slow_query_threshold: float = float(
+        os.getenv("BUTLERSERVICE_SLOW_QUERY_THRESHOLD", "10")
+    )
+    """Queries that take at least this long (seconds) are logged,
+    with their arguments, timing breakdown and SQL statements.
+
+    0 disables the slow-query log.
+    Set with the ``BUTLERSERVICE_SLOW_QUERY_THRESHOLD`` environment variable.
+    """
+
+    allow_profile_header: bool = str_to_bool(
+        os.getenv("BUTLERSERVICE_ALLOW_PROFILE_HEADER", "false")
+    )
+    """Let clients ask for a profile of their queries with the
+    ``X-Butlerservice-Profile`` header?
+
+    Profiles include the SQL statements and their query plans,
+    so only enable this for trusted clients.
+    Set with the ``BUTLERSERVICE_ALLOW_PROFILE_HEADER`` environment variable.
+    """
+
+    def __post_init__(self) -> None:
+        # Values from environment variables (and those passed to create_app)
+        # are strings; cast them to the type of the field.
+        for field in dataclasses.fields(self):
+            value = getattr(self, field.name)
+            converter = _CONVERTERS.get(field.type)
+            if converter is not None and isinstance(value, str):
+                try:
+                    setattr(self, field.name, converter(value))
+                except ValueError as e:
+                    raise ValueError(
+                        f"Cannot convert {field.name}={value!r} "
+                        f"to {field.type.__name__}: {e}"
+                    )
@@ -0,0 +1,331 @@
+"""Query deadlines, and cancellation of registry queries."""
+
+from __future__ import annotations
+
+__all__ = [
+    "DEADLINE_CONTEXT_KEY",
+    "QueryCanceller",
+    "QueryTimeoutError",
+    "TIMEOUT_HEADER",
+    "get_cancellation_error",
+    "get_deadline",
+    "get_request_deadline",
+    "get_request_timeout",
+    "make_timeout_error",
+    "release_cancellable_connection",
+    "run_cancellable",
+    "start_deadline",
+    "wait_with_deadline",
+]
+
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+import typing
+
+from .sql_hooks import (
+    StatementHook,
+    get_dbapi_connection,
+    get_statement_hook,
+    hook_statements,
+)
+
+if typing.TYPE_CHECKING:
+    import sqlalchemy
+    from aiohttp import web
+
+    from .config import Configuration
+
+T = typing.TypeVar("T")
+
+# HTTP header with which a client may specify a shorter timeout (seconds)
+# for its request than the configured ``query_timeout``.
+TIMEOUT_HEADER = "X-Butlerservice-Timeout"
+
+# Key of the deadline of a GraphQL request in the GraphQL context
+# (a per-request dict). All query fields of a request share one deadline.
+DEADLINE_CONTEXT_KEY = "butlerservice/deadline"
+
+
+class QueryTimeoutError(RuntimeError):
+    """A query did not finish before its deadline."""
+
+
+def get_request_timeout(
+    request: typing.Optional[web.Request], config: Configuration
+) -> typing.Optional[float]:
+    """Get the timeout for a request (sec), or None if no timeout.
+
+    This is ``config.query_timeout``, or the value of the `TIMEOUT_HEADER`
+    header of the request, if shorter.
+
+    Raises
+    ------
+    ValueError
+        If the header is not a positive number.
+    """
+    timeout = config.query_timeout if config.query_timeout > 0 else None
+    if request is None or TIMEOUT_HEADER not in request.headers:
+        return timeout
+    header_value = request.headers[TIMEOUT_HEADER]
+    try:
+        requested_timeout = float(header_value)
+    except ValueError:
+        requested_timeout = 0
+    if not requested_timeout > 0:
+        raise ValueError(
+            f"{TIMEOUT_HEADER}={header_value!r} must be a positive number"
+        )
+    return (
+        requested_timeout
+        if timeout is None
+        else min(requested_timeout, timeout)
+    )
+
+
+_current_deadline: contextvars.ContextVar[typing.Optional[float]] = (
+    contextvars.ContextVar("butlerservice_deadline", default=None)
+)
+
+
+def get_deadline() -> typing.Optional[float]:
+    """Get the deadline of the current query, as a `time.monotonic` time,
+    or None if none.
+    """
+    return _current_deadline.get()
+
+
+@contextlib.contextmanager
+def start_deadline(
+    deadline: typing.Optional[float],
+    replace: bool = False,
+) -> typing.Iterator[typing.Optional[float]]:
+    """Set the deadline of queries run in this context,
+    while the context is active.
+
+    Parameters
+    ----------
+    deadline
+        The deadline, as a `time.monotonic` time, or None if none.
+        If there already is an earlier deadline then it is kept,
+        unless ``replace`` is true.
+    replace
+        Replace the current deadline, even if it is earlier?
+        For work shared by callers with different deadlines,
+        which started in the context of one of them.
+
+    Notes
+    -----
+    The deadline is in a context variable, so it applies to code that runs
+    in this context and in tasks started in this context; in particular
+    `butlerservice.registry_executor.RegistryExecutor.run` enforces it.
+    """
+    current_deadline = _current_deadline.get()
+    if not replace and (
+        deadline is None
+        or (current_deadline is not None and current_deadline <= deadline)
+    ):
+        deadline = current_deadline
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def make_timeout_error() -> QueryTimeoutError:
+    """Make the error reported when a query does not finish
+    before its deadline.
+    """
+    return QueryTimeoutError(
+        "Query timed out; narrow the query or ask for fewer rows, "
+        "or paginate the results"
+    )
+
+
+def get_request_deadline(
+    context: typing.Dict[str, typing.Any], config: Configuration
+) -> typing.Optional[float]:
+    """Get the deadline of a GraphQL request, as a `time.monotonic` time,
+    or None if none.
+
+    The deadline is set the first time this is called for a request,
+    from the timeout given by `get_request_timeout`.
+
+    Parameters
+    ----------
+    context
+        The GraphQL context of the request.
+    config
+        Application configuration.
+
+    Raises
+    ------
+    ValueError
+        If the request's `TIMEOUT_HEADER` header is invalid.
+    """
+    if DEADLINE_CONTEXT_KEY not in context:
+        timeout = get_request_timeout(context.get("request"), config)
+        context[DEADLINE_CONTEXT_KEY] = (
+            None if timeout is None else time.monotonic() + timeout
+        )
+    return context[DEADLINE_CONTEXT_KEY]
+
+
+async def wait_with_deadline(awaitable: typing.Awaitable[T]) -> T:
+    """Await ``awaitable``, giving up when the current deadline passes.
+
+    Raises
+    ------
+    QueryTimeoutError
+        If the deadline passes first. ``awaitable`` is cancelled.
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(
+            awaitable, max(deadline - time.monotonic(), 0)
+        )
+    except asyncio.TimeoutError:
+        raise make_timeout_error()
+
+
+class QueryCanceller:
+    """Cancel a query being run by a registry thread,
+    interrupting the SQL statement it is executing, if any.
+
+    Notes
+    -----
+    `run_cancellable` runs the query and keeps track of the database
+    connection of the statement being executed.
+    `cancel` may be called from any thread.
+    """
+
+    def __init__(self) -> None:
+        self.error: typing.Optional[Exception] = None
+        self._dbapi_connection: typing.Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        """Has the query been cancelled?"""
+        return self.error is not None
+
+    def cancel(self, error: Exception) -> None:
+        """Cancel the query.
+
+        Parameters
+        ----------
+        error
+            The error that the query should raise.
+        """
+        with self._lock:
+            if self.error is not None:
+                return
+            self.error = error
+            if self._dbapi_connection is not None:
+                _interrupt(self._dbapi_connection)
+
+    def check(self) -> None:
+        """Raise the cancellation error, if the query was cancelled."""
+        if self.error is not None:
+            raise self.error
+
+    def set_connection(self, dbapi_connection: typing.Any) -> None:
+        """Set the DBAPI connection that is about to execute
+        a statement of the query.
+
+        Raise the cancellation error if the query was cancelled.
+        """
+        with self._lock:
+            self.check()
+            self._dbapi_connection = dbapi_connection
+
+    def clear_connection(self) -> None:
+        """Forget the DBAPI connection, when the query is done with it."""
+        with self._lock:
+            self._dbapi_connection = None
+
+
+def _interrupt(dbapi_connection: typing.Any) -> None:
+    """Interrupt the statement being executed by a DBAPI connection,
+    if the database driver supports that.
+
+    ``interrupt`` is supported by sqlite3,
+    and ``cancel`` by psycopg2 (which sends a cancel request to the server).
+    """
+    for method_name in ("interrupt", "cancel"):
+        method = getattr(dbapi_connection, method_name, None)
+        if method is not None:
+            with contextlib.suppress(Exception):
+                method()
+            return
+
+
+class _CancellationHook(StatementHook):
+    """Give each SQL statement's DBAPI connection to a canceller,
+    so it can interrupt the statement.
+    """
+
+    def __init__(self, canceller: QueryCanceller) -> None:
+        self.canceller = canceller
+
+    def before_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        self.canceller.set_connection(get_dbapi_connection(conn))
+
+
+def run_cancellable(
+    func: typing.Callable[[], T], canceller: QueryCanceller
+) -> T:
+    """Call ``func`` such that ``canceller`` can interrupt its SQL
+    statements. Call this in the registry thread that runs the query.
+
+    Raises
+    ------
+    Exception
+        The cancellation error, if the query was cancelled,
+        else any exception raised by ``func``.
+    """
+    canceller.check()
+    try:
+        with hook_statements("deadline", _CancellationHook(canceller)):
+            return func()
+    except Exception as e:
+        error = canceller.error
+        if error is not None and e is not error:
+            # E.g. "interrupted" from the database driver.
+            raise error from e
+        raise
+    finally:
+        canceller.clear_connection()
+
+
+def release_cancellable_connection() -> None:
+    """Forget the DBAPI connection of the query being run by this
+    registry thread, if any, so the query's canceller cannot interrupt it.
+
+    Call this before the registry of the query is returned to a pool,
+    where another query may use the connection.
+    """
+    hook = get_statement_hook("deadline")
+    if isinstance(hook, _CancellationHook):
+        hook.canceller.clear_connection()
+
+
+def get_cancellation_error() -> typing.Optional[Exception]:
+    """Get the error with which the query being run by this registry
+    thread was cancelled, or None if the query was not cancelled.
+    """
+    hook = get_statement_hook("deadline")
+    if not isinstance(hook, _CancellationHook):
+        return None
+    return hook.canceller.error
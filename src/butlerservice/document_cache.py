@@ -0,0 +1,152 @@
+"""Cache of parsed and validated GraphQL documents."""
+
+from __future__ import annotations
+
+__all__ = ["CachedDocument", "DocumentCache", "hash_query"]
+
+import collections
+import hashlib
+import typing
+
+import graphql
+
+
+def hash_query(query: str) -> str:
+    """Compute the hash of a GraphQL query: the SHA-256 hex digest
+    of the UTF-8 encoded query text.
+
+    This is the hash used by persisted queries.
+    """
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class CachedDocument(typing.NamedTuple):
+    """A GraphQL query, parsed and validated."""
+
+    query: str
+    """The query text."""
+
+    document: typing.Optional[graphql.DocumentNode]
+    """The parsed query, or None if the query could not be parsed."""
+
+    errors: typing.List[graphql.GraphQLError]
+    """Errors found while parsing or validating the query, if any."""
+
+    normalized_hash: typing.Optional[str] = None
+    """The hash of the query with insignificant whitespace, commas and
+    comments removed, or None if the query is not valid.
+    """
+
+
+class DocumentCache:
+    """A least-recently-used cache of parsed and validated
+    GraphQL documents, keyed by query hash (see `hash_query`).
+
+    Parsing and validating a query takes much longer than looking it up,
+    and clients such as dashboards send the same queries over and over.
+    The cache also holds the query text, so clients may send
+    just the hash of a recently used query (a persisted query).
+
+    Parameters
+    ----------
+    max_size
+        The maximum number of cached documents.
+        If 0 then the cache is disabled.
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+        self._entries: typing.OrderedDict[str, CachedDocument] = (
+            collections.OrderedDict()
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Is the cache enabled?"""
+        return self.max_size > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query_hash: str) -> typing.Optional[CachedDocument]:
+        """Get a cached document by query hash, or None if not found.
+
+        Updates the hit and miss counters.
+        """
+        entry = self._entries.get(query_hash)
+        if entry is None:
+            self.num_misses += 1
+            return None
+        self._entries.move_to_end(query_hash)
+        self.num_hits += 1
+        return entry
+
+    def parse(
+        self,
+        schema: graphql.GraphQLSchema,
+        query: str,
+        rules: typing.Optional[typing.Collection[typing.Type]] = None,
+        query_hash: typing.Optional[str] = None,
+    ) -> CachedDocument:
+        """Parse and validate a query, or get the result from the cache.
+
+        Parameters
+        ----------
+        schema
+            The schema against which to validate the query.
+            Use one cache per schema.
+        query
+            The query text.
+        rules
+            Validation rules; if None then use the standard rules.
+        query_hash
+            The hash of the query, if already known.
+
+        Returns
+        -------
+        document
+            The parsed and validated query.
+        """
+        if query_hash is None:
+            query_hash = hash_query(query)
+        entry = self.get(query_hash)
+        if entry is not None:
+            return entry
+        try:
+            document = graphql.parse(query)
+        except graphql.GraphQLError as e:
+            return CachedDocument(query=query, document=None, errors=[e])
+        errors = graphql.validate(schema, document, rules=rules)
+        entry = CachedDocument(
+            query=query,
+            document=document,
+            errors=errors,
+            normalized_hash=(
+                None if errors else hash_query(graphql.print_ast(document))
+            ),
+        )
+        if self.enabled:
+            self._entries[query_hash] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.num_evictions += 1
+        return entry
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the current state of the cache as a dict."""
+        num_lookups = self.num_hits + self.num_misses
+        return dict(
+            max_size=self.max_size,
+            num_entries=len(self._entries),
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+            num_evictions=self.num_evictions,
+            hit_rate=self.num_hits / num_lookups if num_lookups else 0.0,
+        )
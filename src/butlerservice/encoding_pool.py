@@ -0,0 +1,241 @@
+"""Encode query results as json, optionally in a pool of processes."""
+
+from __future__ import annotations
+
+__all__ = [
+    "EncodingPool",
+    "RawRowBatch",
+    "encode_raw_rows",
+    "make_data_id_batch",
+    "make_record_batch",
+]
+
+import concurrent.futures
+import multiprocessing
+import threading
+import typing
+
+import astropy.time
+import lsst.daf.butler
+import lsst.daf.butler.time_utils
+import numpy as np
+
+from .record_encoder import dumps_lines, get_record_encoder
+
+NSEC_PER_DAY = 24 * 3600 * 1_000_000_000
+
+
+class RawRowBatch(typing.NamedTuple):
+    """A batch of query result rows in a compact form that is cheap
+    to make, to pickle, and to send to another process.
+    """
+
+    names: typing.Tuple[str, ...]
+    """Field names."""
+
+    rows: typing.List[tuple]
+    """Rows: one tuple of plain old data per row,
+    with one value per field.
+    """
+
+    timespan_index: typing.Optional[int] = None
+    """Index of the timespan field, if any. Timespans are represented
+    as ``(begin, end)`` TAI nanoseconds since the
+    `lsst.daf.butler.time_utils.TimeConverter` epoch, or None.
+    """
+
+
+def make_record_batch(
+    element: lsst.daf.butler.DimensionElement,
+    records: typing.Iterable[lsst.daf.butler.DimensionRecord],
+) -> RawRowBatch:
+    """Make a batch of raw rows from dimension records of one element.
+
+    Regions are encoded (as hex strings) here;
+    timespans are left as nanoseconds, for `encode_raw_rows`.
+    """
+    record_encoder = get_record_encoder(element)
+    names = tuple(record_encoder.plain_names)
+    has_timespan = element.temporal is not None
+    has_region = element.spatial is not None
+    rows = []
+    for record in records:
+        row = tuple(getattr(record, name) for name in names)
+        if has_timespan:
+            timespan = record.timespan
+            row += (None if timespan is None else tuple(timespan.nsec),)
+        if has_region:
+            region = record.region
+            row += (None if region is None else region.encode().hex(),)
+        rows.append(row)
+    timespan_index = None
+    if has_timespan:
+        timespan_index = len(names)
+        names += ("timespan",)
+    if has_region:
+        names += ("region",)
+    return RawRowBatch(names=names, rows=rows, timespan_index=timespan_index)
+
+
+def make_data_id_batch(
+    data_ids: typing.Iterable[lsst.daf.butler.DataCoordinate],
+) -> RawRowBatch:
+    """Make a batch of raw rows from data IDs with the same dimensions."""
+    names: typing.Tuple[str, ...] = ()
+    rows = []
+    for data_id in data_ids:
+        if not rows:
+            names = tuple(key.name for key in data_id.keys())
+        rows.append(tuple(data_id.values()))
+    return RawRowBatch(names=names, rows=rows)
+
+
+def _convert_timespans(
+    nsec_pairs: typing.List[typing.Optional[typing.Tuple[int, int]]],
+) -> typing.List[typing.Optional[typing.Tuple[typing.Optional[str], ...]]]:
+    """Convert timespans, as TAI nanosecond pairs, to pairs of TAI ISO
+    strings (None if unbounded), all at once.
+
+    This is much faster than converting the timespans one at a time.
+    """
+    converter = lsst.daf.butler.time_utils.TimeConverter()
+    nsec = np.array(
+        [(0, 0) if pair is None else pair for pair in nsec_pairs],
+        dtype=np.int64,
+    ).reshape(len(nsec_pairs), 2)
+    unbounded = np.zeros(nsec.shape, dtype=bool)
+    unbounded[:, 0] = nsec[:, 0] <= converter.min_nsec
+    unbounded[:, 1] = nsec[:, 1] >= converter.max_nsec
+    nsec[unbounded] = 0
+    jd1, jd2 = np.divmod(nsec, NSEC_PER_DAY)
+    delta = astropy.time.TimeDelta(
+        jd1.astype(float), jd2 / NSEC_PER_DAY, format="jd", scale="tai"
+    )
+    isot = (converter.epoch + delta).isot.tolist()
+    result: typing.List[
+        typing.Optional[typing.Tuple[typing.Optional[str], ...]]
+    ] = []
+    for pair, isot_pair, unbounded_pair in zip(
+        nsec_pairs, isot, unbounded.tolist()
+    ):
+        if pair is None:
+            result.append(None)
+        else:
+            result.append(
+                tuple(
+                    None if is_unbounded else value
+                    for value, is_unbounded in zip(isot_pair, unbounded_pair)
+                )
+            )
+    return result
+
+
+def encode_raw_rows(batch: RawRowBatch) -> bytes:
+    """Encode a batch of raw rows as newline-delimited json:
+    one json-encoded dict of field name: value per row.
+
+    Timespans are encoded as ``(begin, end)`` TAI ISO strings,
+    or None if unbounded, as by `butlerservice.record_encoder.RecordEncoder`.
+    """
+    rows = batch.rows
+    index = batch.timespan_index
+    if index is not None and rows:
+        timespans = _convert_timespans([row[index] for row in rows])
+        rows = [
+            row[:index] + (timespan,) + row[index + 1 :]
+            for row, timespan in zip(rows, timespans)
+        ]
+    names = batch.names
+    return dumps_lines(dict(zip(names, row)) for row in rows)
+
+
+class EncodingPool:
+    """Encode batches of raw rows as json, using a pool of processes
+    for large batches.
+
+    Converting query results to json is CPU-bound and holds the GIL,
+    so encoding a large result in a registry thread stalls
+    the other threads and the event loop.
+    This pool encodes large batches in separate processes instead.
+
+    Parameters
+    ----------
+    max_workers
+        The maximum number of worker processes.
+        If 0 then all batches are encoded in the calling thread.
+    min_rows
+        Batches with fewer rows than this are encoded
+        in the calling thread, since the overhead of sending them
+        to another process outweighs the benefit.
+        Larger batches are split into up to ``max_workers`` parts
+        of at least this many rows, which are encoded in parallel.
+    """
+
+    def __init__(self, max_workers: int, min_rows: int) -> None:
+        if max_workers < 0:
+            raise ValueError(f"max_workers={max_workers} must be >= 0")
+        self.max_workers = max_workers
+        self.min_rows = max(min_rows, 1)
+        self.num_thread_batches = 0
+        self.num_process_batches = 0
+        self._lock = threading.Lock()
+        self._executor: typing.Optional[
+            concurrent.futures.ProcessPoolExecutor
+        ] = None
+        if max_workers > 0:
+            # Use "spawn" so the workers do not inherit the state
+            # (e.g. database connections and threads) of this process.
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    @property
+    def enabled(self) -> bool:
+        """Are large batches encoded in worker processes?"""
+        return self._executor is not None
+
+    def encode(self, batch: RawRowBatch) -> bytes:
+        """Encode a batch of raw rows as newline-delimited json.
+
+        See `encode_raw_rows` for details. Blocks until done,
+        so call this from a worker thread, not from the event loop.
+        """
+        num_rows = len(batch.rows)
+        if self._executor is None or num_rows < self.min_rows:
+            with self._lock:
+                self.num_thread_batches += 1
+            return encode_raw_rows(batch)
+        part_size = max(self.min_rows, -(-num_rows // self.max_workers))
+        futures = [
+            self._executor.submit(
+                encode_raw_rows,
+                batch._replace(rows=batch.rows[start : start + part_size]),
+            )
+            for start in range(0, num_rows, part_size)
+        ]
+        with self._lock:
+            self.num_process_batches += len(futures)
+        return b"".join(future.result() for future in futures)
+
+    def encode_lines(self, batch: RawRowBatch) -> typing.List[str]:
+        """Encode a batch of raw rows as a list of json strings,
+        one per row.
+        """
+        # Do not use splitlines, which also splits on characters
+        # that may appear unescaped in json strings, e.g. U+2028.
+        return self.encode(batch).decode().split("\n")[:-1]
+
+    def get_status(self) -> typing.Dict[str, int]:
+        """Get the current state of the pool as a dict."""
+        return dict(
+            max_workers=self.max_workers,
+            min_rows=self.min_rows,
+            num_thread_batches=self.num_thread_batches,
+            num_process_batches=self.num_process_batches,
+        )
+
+    def shutdown(self) -> None:
+        """Shut down the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
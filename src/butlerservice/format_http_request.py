@@ -10,6 +10,13 @@ def convert_item(key: str, value: typing.Any) -> typing.Any:
     if isinstance(value, tuple) or isinstance(value, list):
         formatted_items = [convert_item(key, item) for item in value]
         return f'[{", ".join(formatted_items)}]'
+    if isinstance(value, dict):
+        # A GraphQL input object
+        formatted_items = [
+            f"{item_key}: {convert_item(item_key, item)}"
+            for item_key, item in value.items()
+        ]
+        return f'{{{", ".join(formatted_items)}}}'
     if isinstance(value, str):
         # json forces double quotes around the string
         # and escapes special characters.
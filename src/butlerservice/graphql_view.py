@@ -0,0 +1,702 @@
+"""The GraphQL view of the butler service."""
+
+from __future__ import annotations
+
+__all__ = [
+    "ButlerGraphQLView",
+    "GRAPHQL_TRANSPORT_WS_PROTOCOL",
+    "PERSISTED_QUERY_NOT_FOUND",
+    "ParsedQuery",
+]
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+import typing
+
+import graphql
+from aiohttp import WSMsgType, hdrs, web
+from graphql.pyutils import is_awaitable
+from graphql_server import (
+    GraphQLParams,
+    HttpQueryError,
+    encode_execution_results,
+    format_execution_result,
+    get_graphql_params,
+)
+from graphql_server.aiohttp import GraphQLView
+
+from . import __version__
+from .change_marker import ChangeMarker
+from .compression import CACHE_COMPRESSED_KEY
+from .document_cache import CachedDocument, DocumentCache, hash_query
+from .metrics import FIELDS_CONTEXT_KEY, ServiceMetrics, get_fields_label
+from .profiling import PROFILES_CONTEXT_KEY
+from .registry_query import UNCACHED_CONTEXT_KEY
+from .subscriptions import SubscriptionHub
+
+# Message of the error returned if a client sends the hash
+# of a persisted query that is not known (e.g. because it was evicted).
+# The client should then send the query again, with its hash.
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
+# WebSocket subprotocol for GraphQL subscriptions, as implemented
+# by the ``graphql-ws`` client library:
+# https://github.com/enisdenjo/graphql-ws/blob/master/PROTOCOL.md
+GRAPHQL_TRANSPORT_WS_PROTOCOL = "graphql-transport-ws"
+
+# The time allowed for a WebSocket client to send "connection_init" (sec).
+CONNECTION_INIT_TIMEOUT = 10
+
+# The interval at which WebSocket connections are pinged (sec),
+# so that the subscriptions of dead connections are dropped.
+WEBSOCKET_HEARTBEAT = 30
+
+
+class _WebSocketProtocolError(Exception):
+    """A WebSocket client violated the protocol;
+    the connection is closed with the given code and reason.
+    """
+
+    def __init__(self, code: int, reason: str) -> None:
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+def _get_persisted_query_hash(
+    data: typing.Mapping[str, typing.Any],
+    query_data: typing.Mapping[str, typing.Any],
+) -> typing.Optional[str]:
+    """Get the hash of a persisted query from the ``extensions``
+    request parameter, or None if not specified.
+
+    The format is that of Apollo automatic persisted queries:
+    ``{"persistedQuery": {"version": 1, "sha256Hash": <hash>}}``.
+    """
+    extensions = data.get("extensions") or query_data.get("extensions")
+    if not extensions:
+        return None
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except json.JSONDecodeError:
+            raise HttpQueryError(400, "Extensions are invalid JSON.")
+    if not isinstance(extensions, dict):
+        raise HttpQueryError(400, "Extensions must be a JSON object.")
+    persisted_query = extensions.get("persistedQuery")
+    if not persisted_query:
+        return None
+    if not isinstance(persisted_query, dict):
+        raise HttpQueryError(400, "persistedQuery must be a JSON object.")
+    if persisted_query.get("version", 1) != 1:
+        raise HttpQueryError(400, "Unsupported persisted query version.")
+    query_hash = persisted_query.get("sha256Hash")
+    if not isinstance(query_hash, str):
+        raise HttpQueryError(400, "Persisted query has no sha256Hash.")
+    return query_hash.lower()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Return True if the value of an ``If-None-Match`` header
+    matches an ETag, using weak comparison.
+    """
+    value = etag[2:] if etag.startswith("W/") else etag
+    for item in if_none_match.split(","):
+        item = item.strip()
+        if item == "*":
+            return True
+        if (item[2:] if item.startswith("W/") else item) == value:
+            return True
+    return False
+
+
+class ParsedQuery(typing.NamedTuple):
+    """The parameters of a GraphQL request, and its parsed query."""
+
+    params: GraphQLParams
+    """The query, variables and operation name."""
+
+    cached_document: CachedDocument
+    """The parsed and validated query."""
+
+
+class ButlerGraphQLView(GraphQLView):
+    """GraphQL view that caches parsed and validated queries,
+    and supports persisted queries.
+
+    Non-batch GET and POST requests that do not ask for GraphiQL
+    are handled here; other requests are handled by `GraphQLView`.
+
+    To send a persisted query, specify the ``extensions`` parameter
+    ``{"persistedQuery": {"version": 1, "sha256Hash": <hash>}}``,
+    where ``<hash>`` is the SHA-256 hex digest of the query,
+    and omit the ``query`` parameter. If the server does not know
+    the query it returns a `PERSISTED_QUERY_NOT_FOUND` error;
+    the client should then send the request again with both the hash
+    and the query.
+
+    If ``metrics`` is specified then the time to serialize each result
+    is recorded.
+
+    Query profiles (see `butlerservice.profiling`) are returned in the
+    ``profile`` list of the ``extensions`` of the response.
+
+    If ``change_marker`` is specified then responses to GET queries
+    have an ETag (see `get_etag`), and requests whose ``If-None-Match``
+    header matches it are answered with status 304 (Not Modified),
+    without running the query.
+
+    Responses built without running a registry query are marked
+    with `butlerservice.compression.CACHE_COMPRESSED_KEY`,
+    so that their compressed bodies are cached.
+
+    If ``subscription_hub`` is specified and enabled then WebSocket
+    requests are handled by `handle_websocket`, which runs subscriptions
+    (and other operations) using the `GRAPHQL_TRANSPORT_WS_PROTOCOL`.
+    """
+
+    change_marker: typing.Optional[ChangeMarker] = None
+    document_cache: typing.Optional[DocumentCache] = None
+    metrics: typing.Optional[ServiceMetrics] = None
+    subscription_hub: typing.Optional[SubscriptionHub] = None
+    # Also defined here, with the methods that return them, because
+    # older versions of `GraphQLView` (before graphql-server 3.0.0b7)
+    # do not have them.
+    validation_rules: typing.Optional[
+        typing.Collection[typing.Type[graphql.ASTValidationRule]]
+    ] = None
+    execution_context_class: typing.Optional[
+        typing.Type[graphql.ExecutionContext]
+    ] = None
+
+    def __init__(self, **kwargs: typing.Any) -> None:
+        super().__init__(**kwargs)
+        if self.document_cache is None:
+            self.document_cache = DocumentCache(max_size=0)
+
+    def get_validation_rules(
+        self,
+    ) -> typing.Collection[typing.Type[graphql.ASTValidationRule]]:
+        """Get the rules used to validate queries."""
+        if self.validation_rules is None:
+            return graphql.specified_rules
+        return self.validation_rules
+
+    def get_execution_context_class(
+        self,
+    ) -> typing.Type[graphql.ExecutionContext]:
+        """Get the class used to execute queries."""
+        if self.execution_context_class is None:
+            return graphql.ExecutionContext
+        return self.execution_context_class
+
+    async def __call__(self, request: web.Request) -> web.StreamResponse:
+        if self.subscription_hub is not None and self.subscription_hub.enabled:
+            ws = web.WebSocketResponse(
+                protocols=(GRAPHQL_TRANSPORT_WS_PROTOCOL,),
+                heartbeat=WEBSOCKET_HEARTBEAT,
+            )
+            if ws.can_prepare(request).ok:
+                return await self.handle_websocket(request, ws)
+        request_method = request.method.lower()
+        if request_method not in ("get", "post") or self.is_graphiql(request):
+            return await super().__call__(request)
+        try:
+            data = await self.parse_body(request)
+            if isinstance(data, list):
+                # The body is cached by aiohttp, so it can be read again.
+                return await super().__call__(request)
+            context = self.get_context(request)
+            parsed_query = None
+            etag = None
+            if request_method == "get":
+                parsed_query = self.parse_query(data, request.query)
+                etag = self.get_etag(parsed_query)
+                if etag is not None and _etag_matches(
+                    request.headers.get(hdrs.IF_NONE_MATCH, ""), etag
+                ):
+                    return web.Response(
+                        status=304,
+                        headers={
+                            hdrs.ETAG: etag,
+                            hdrs.CACHE_CONTROL: "no-cache",
+                        },
+                    )
+            result = await self.execute_query(
+                request=request,
+                data=data,
+                query_data=request.query,
+                context=context,
+                parsed_query=parsed_query,
+            )
+            start_time = time.perf_counter()
+            if context.get(PROFILES_CONTEXT_KEY):
+                # encode_execution_results drops the extensions.
+                formatted = format_execution_result(result, self.format_error)
+                body = formatted.result or {}
+                body["extensions"] = dict(
+                    profile=context[PROFILES_CONTEXT_KEY]
+                )
+                text = self.encode(body, pretty=self.is_pretty(request))
+                status_code = formatted.status_code
+            else:
+                text, status_code = encode_execution_results(
+                    [result],
+                    format_error=self.format_error,
+                    encode=functools.partial(
+                        self.encode, pretty=self.is_pretty(request)
+                    ),
+                )
+            if self.metrics is not None and context.get(FIELDS_CONTEXT_KEY):
+                self.metrics.phase_seconds.labels(
+                    field=get_fields_label(context[FIELDS_CONTEXT_KEY]),
+                    phase="serialization",
+                ).observe(time.perf_counter() - start_time)
+            if status_code == 200 and not context.get(UNCACHED_CONTEXT_KEY):
+                # Built from cached results; likely to be sent again.
+                request[CACHE_COMPRESSED_KEY] = True
+            headers = dict()
+            if etag is not None and status_code == 200 and not result.errors:
+                # Errors (such as timeouts) may be temporary; a client
+                # must not keep them with If-None-Match.
+                headers[hdrs.ETAG] = etag
+                headers[hdrs.CACHE_CONTROL] = "no-cache"
+            return web.Response(
+                text=text,
+                status=status_code,
+                headers=headers,
+                content_type="application/json",
+            )
+        except HttpQueryError as err:
+            parsed_error = graphql.GraphQLError(err.message)
+            return web.Response(
+                body=self.encode(
+                    dict(errors=[self.format_error(parsed_error)])
+                ),
+                status=err.status_code,
+                headers=err.headers,
+                content_type="application/json",
+            )
+
+    async def execute_query(
+        self,
+        request: web.Request,
+        data: typing.Mapping[str, typing.Any],
+        query_data: typing.Mapping[str, typing.Any],
+        context: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        parsed_query: typing.Optional[ParsedQuery] = None,
+    ) -> graphql.ExecutionResult:
+        """Parse (using the document cache), validate and execute
+        a single GraphQL request.
+
+        Parameters
+        ----------
+        request
+            The HTTP request.
+        data
+            Parameters from the request body.
+        query_data
+            Parameters from the query string.
+        context
+            The context value for the resolvers. If None then use
+            ``self.get_context(request)``.
+        parsed_query
+            The value returned by `parse_query`, if already known.
+
+        Raises
+        ------
+        HttpQueryError
+            If the request is invalid.
+        """
+        if parsed_query is None:
+            parsed_query = self.parse_query(data, query_data)
+        params, cached_document = parsed_query
+        if cached_document.errors:
+            return graphql.ExecutionResult(
+                data=None, errors=cached_document.errors
+            )
+        document = cached_document.document
+        assert document is not None  # for mypy
+
+        operation_ast = graphql.get_operation_ast(
+            document, params.operation_name
+        )
+        if (
+            operation_ast is not None
+            and operation_ast.operation == graphql.OperationType.SUBSCRIPTION
+        ):
+            return graphql.ExecutionResult(
+                data=None,
+                errors=[
+                    graphql.GraphQLError(
+                        "Subscriptions must be sent over a WebSocket "
+                        f"connection, using {GRAPHQL_TRANSPORT_WS_PROTOCOL}."
+                    )
+                ],
+            )
+        if request.method.lower() == "get":
+            if (
+                operation_ast is not None
+                and operation_ast.operation != graphql.OperationType.QUERY
+            ):
+                operation = operation_ast.operation.value
+                raise HttpQueryError(
+                    405,
+                    f"Can only perform a {operation} operation "
+                    "from a POST request.",
+                    headers={"Allow": "POST"},
+                )
+
+        result = graphql.execute(
+            self.schema,
+            document,
+            root_value=self.get_root_value(),
+            context_value=(
+                self.get_context(request) if context is None else context
+            ),
+            variable_values=params.variables,
+            operation_name=params.operation_name,
+            middleware=self.get_middleware(),
+            execution_context_class=self.get_execution_context_class(),
+        )
+        if is_awaitable(result):
+            result = await result
+        return result
+
+    async def handle_websocket(
+        self, request: web.Request, ws: web.WebSocketResponse
+    ) -> web.WebSocketResponse:
+        """Handle a WebSocket connection that uses the
+        `GRAPHQL_TRANSPORT_WS_PROTOCOL`.
+
+        Each "subscribe" message starts an operation (see `run_operation`),
+        which runs until it ends, the client sends a "complete" message
+        for it, or the connection is closed.
+        """
+        await ws.prepare(request)
+        operations: typing.Dict[str, asyncio.Future] = dict()
+        send_lock = asyncio.Lock()
+        acknowledged = False
+
+        async def send(message: typing.Dict[str, typing.Any]) -> None:
+            async with send_lock:
+                if not ws.closed:
+                    await ws.send_str(self.encode(message))
+
+        def forget_operation(id: str, task: asyncio.Future) -> None:
+            if operations.get(id) is task:
+                del operations[id]
+
+        init_timer = asyncio.get_event_loop().call_later(
+            CONNECTION_INIT_TIMEOUT,
+            lambda: asyncio.ensure_future(
+                ws.close(
+                    code=4408, message=b"Connection initialisation timeout"
+                )
+            ),
+        )
+        try:
+            async for ws_message in ws:
+                if ws_message.type != WSMsgType.TEXT:
+                    raise _WebSocketProtocolError(4400, "Invalid message")
+                try:
+                    message = json.loads(ws_message.data)
+                    message_type = message["type"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    raise _WebSocketProtocolError(4400, "Invalid message")
+                if message_type == "connection_init":
+                    if acknowledged:
+                        raise _WebSocketProtocolError(
+                            4429, "Too many initialisation requests"
+                        )
+                    init_timer.cancel()
+                    acknowledged = True
+                    await send(dict(type="connection_ack"))
+                elif message_type == "ping":
+                    await send(dict(type="pong"))
+                elif message_type == "pong":
+                    pass
+                elif message_type == "subscribe":
+                    if not acknowledged:
+                        raise _WebSocketProtocolError(4401, "Unauthorized")
+                    id = message.get("id")
+                    payload = message.get("payload")
+                    if not isinstance(id, str) or not isinstance(
+                        payload, dict
+                    ):
+                        raise _WebSocketProtocolError(
+                            4400, "Invalid subscribe message"
+                        )
+                    if id in operations:
+                        raise _WebSocketProtocolError(
+                            4409, f"Subscriber for {id} already exists"
+                        )
+                    task = asyncio.ensure_future(
+                        self.run_operation(request, id, payload, send)
+                    )
+                    operations[id] = task
+                    task.add_done_callback(
+                        functools.partial(forget_operation, id)
+                    )
+                elif message_type == "complete":
+                    task = operations.pop(message.get("id"), None)
+                    if task is not None:
+                        task.cancel()
+                else:
+                    raise _WebSocketProtocolError(
+                        4400, f"Unknown message type {message_type!r}"
+                    )
+        except _WebSocketProtocolError as e:
+            await ws.close(code=e.code, message=e.reason.encode())
+        finally:
+            init_timer.cancel()
+            tasks = list(operations.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return ws
+
+    async def run_operation(
+        self,
+        request: web.Request,
+        id: str,
+        payload: typing.Mapping[str, typing.Any],
+        send: typing.Callable[
+            [typing.Dict[str, typing.Any]], typing.Awaitable
+        ],
+    ) -> None:
+        """Run one operation of a WebSocket connection,
+        sending its results as "next" messages, then a "complete" message.
+
+        Requests that cannot be executed (e.g. invalid queries)
+        are answered with an "error" message.
+
+        Parameters
+        ----------
+        request
+            The HTTP request that opened the WebSocket connection.
+        id
+            The ID of the operation, chosen by the client.
+        payload
+            The payload of the "subscribe" message: the query, variables,
+            operation name and extensions, as for a POST request.
+        send
+            Async function that sends a message to the client.
+        """
+
+        def format_errors(
+            errors: typing.Iterable[graphql.GraphQLError],
+        ) -> typing.List[typing.Dict[str, typing.Any]]:
+            return [self.format_error(error) for error in errors]
+
+        try:
+            parsed_query = self.parse_query(payload, {})
+        except HttpQueryError as err:
+            await send(
+                dict(
+                    id=id,
+                    type="error",
+                    payload=format_errors([graphql.GraphQLError(err.message)]),
+                )
+            )
+            return
+        params, cached_document = parsed_query
+        if cached_document.errors:
+            await send(
+                dict(
+                    id=id,
+                    type="error",
+                    payload=format_errors(cached_document.errors),
+                )
+            )
+            return
+        document = cached_document.document
+        assert document is not None  # for mypy
+
+        context = self.get_context(request)
+        operation_ast = graphql.get_operation_ast(
+            document, params.operation_name
+        )
+        if (
+            operation_ast is not None
+            and operation_ast.operation == graphql.OperationType.SUBSCRIPTION
+        ):
+            result_or_stream = await graphql.subscribe(
+                self.schema,
+                document,
+                root_value=self.get_root_value(),
+                context_value=context,
+                variable_values=params.variables,
+                operation_name=params.operation_name,
+            )
+            if isinstance(result_or_stream, graphql.ExecutionResult):
+                # The subscription could not be started.
+                await send(
+                    dict(
+                        id=id,
+                        type="error",
+                        payload=format_errors(result_or_stream.errors or []),
+                    )
+                )
+                return
+            try:
+                async for result in result_or_stream:
+                    await send(
+                        dict(
+                            id=id,
+                            type="next",
+                            payload=format_execution_result(
+                                result, self.format_error
+                            ).result,
+                        )
+                    )
+            except Exception as e:
+                # E.g. the client fell too far behind.
+                await send(
+                    dict(
+                        id=id,
+                        type="next",
+                        payload=dict(
+                            errors=format_errors(
+                                [graphql.GraphQLError(str(e))]
+                            )
+                        ),
+                    )
+                )
+            finally:
+                await result_or_stream.aclose()
+        else:
+            try:
+                result = await self.execute_query(
+                    request=request,
+                    data=payload,
+                    query_data={},
+                    context=context,
+                    parsed_query=parsed_query,
+                )
+            except HttpQueryError as err:
+                await send(
+                    dict(
+                        id=id,
+                        type="error",
+                        payload=format_errors(
+                            [graphql.GraphQLError(err.message)]
+                        ),
+                    )
+                )
+                return
+            await send(
+                dict(
+                    id=id,
+                    type="next",
+                    payload=format_execution_result(
+                        result, self.format_error
+                    ).result,
+                )
+            )
+        await send(dict(id=id, type="complete"))
+
+    def parse_query(
+        self,
+        data: typing.Mapping[str, typing.Any],
+        query_data: typing.Mapping[str, typing.Any],
+    ) -> ParsedQuery:
+        """Get the parameters of a GraphQL request, and the query,
+        parsed and validated (using the document cache).
+
+        If the request specifies the hash of an unknown persisted query
+        then the returned document has a `PERSISTED_QUERY_NOT_FOUND` error.
+
+        Parameters
+        ----------
+        data
+            Parameters from the request body.
+        query_data
+            Parameters from the query string.
+
+        Raises
+        ------
+        HttpQueryError
+            If the request is invalid.
+        """
+        assert self.document_cache is not None  # for mypy
+        params = get_graphql_params(data, query_data)
+        query_hash = _get_persisted_query_hash(data, query_data)
+        if params.query:
+            if not isinstance(params.query, str):
+                raise HttpQueryError(400, "Unexpected query type.")
+            if query_hash is not None and query_hash != hash_query(
+                params.query
+            ):
+                raise HttpQueryError(
+                    400, "Persisted query hash does not match the query."
+                )
+            cached_document = self.document_cache.parse(
+                schema=self.schema,
+                query=params.query,
+                rules=self.get_validation_rules(),
+                query_hash=query_hash,
+            )
+        elif query_hash is not None:
+            found_document = self.document_cache.get(query_hash)
+            if found_document is None:
+                found_document = CachedDocument(
+                    query="",
+                    document=None,
+                    errors=[
+                        graphql.GraphQLError(
+                            PERSISTED_QUERY_NOT_FOUND,
+                            extensions=dict(code="PERSISTED_QUERY_NOT_FOUND"),
+                        )
+                    ],
+                )
+            cached_document = found_document
+        else:
+            raise HttpQueryError(400, "Must provide query string.")
+        return ParsedQuery(params=params, cached_document=cached_document)
+
+    def get_etag(self, parsed_query: ParsedQuery) -> typing.Optional[str]:
+        """Get the ETag of the response to a query.
+
+        The ETag is a weak ETag computed from the normalized query,
+        the variables and operation name, and the registry change marker
+        (see `butlerservice.change_marker`). The registry is not queried.
+
+        Returns
+        -------
+        etag
+            The ETag, or None if the response should not have one:
+            the change marker is disabled or unknown,
+            or the request is not a valid query operation.
+        """
+        params, cached_document = parsed_query
+        if (
+            self.change_marker is None
+            or self.change_marker.value is None
+            or cached_document.document is None
+            or cached_document.normalized_hash is None
+        ):
+            return None
+        operation_ast = graphql.get_operation_ast(
+            cached_document.document, params.operation_name
+        )
+        if (
+            operation_ast is None
+            or operation_ast.operation != graphql.OperationType.QUERY
+        ):
+            return None
+        key = json.dumps(
+            [
+                __version__,
+                cached_document.normalized_hash,
+                params.variables,
+                params.operation_name,
+                self.change_marker.value,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
@@ -0,0 +1,23 @@
+"""Handler for the metrics endpoint."""
+
+from __future__ import annotations
+
+__all__ = ["get_metrics"]
+
+import prometheus_client
+from aiohttp import web
+
+
+async def get_metrics(request: web.Request) -> web.Response:
+    """Report metrics in Prometheus text exposition format.
+
+    See `butlerservice.metrics.ServiceMetrics` for the metrics.
+    """
+    metrics = request.config_dict["butlerservice/metrics"]
+    return web.Response(
+        body=metrics.render().encode(),
+        headers={
+            "Content-Type": prometheus_client.CONTENT_TYPE_LATEST,
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
@@ -0,0 +1,20 @@
+"""Handler for the record snapshot endpoint."""
+
+from __future__ import annotations
+
+__all__ = ["post_refresh_snapshot"]
+
+from aiohttp import web
+
+from butlerservice.record_snapshot import refresh_record_snapshot
+
+
+async def post_refresh_snapshot(request: web.Request) -> web.Response:
+    """Reload the preloaded dimension records from the registry now.
+
+    Respond with the new state of the snapshot as a json-encoded dict;
+    see `RecordSnapshot.get_status`.
+    """
+    app = request.config_dict
+    await refresh_record_snapshot(app)
+    return web.json_response(app["butlerservice/record_snapshot"].get_status())
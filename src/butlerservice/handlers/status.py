@@ -0,0 +1,70 @@
+"""Handler for the status endpoint."""
+
+from __future__ import annotations
+
+__all__ = ["get_status"]
+
+from aiohttp import web
+
+from butlerservice.utils import get_arg_cache_status
+
+
+async def get_status(request: web.Request) -> web.Response:
+    """Report the load on the service as a json-encoded dict.
+
+    The "argument_caches" item describes the caches of compiled
+    regular expressions and decoded json arguments;
+    see `butlerservice.utils.get_arg_cache_status`.
+    The "change_marker" item describes the registry change marker
+    used for ETags; see `ChangeMarker.get_status`.
+    The "compressed_cache" item describes the cache of compressed
+    response bodies; see `ResultCache.get_status`.
+    The "document_cache" item describes the cache of parsed GraphQL
+    queries; see `DocumentCache.get_status`.
+    The "encoding_pool" item describes the json encoding process pool;
+    see `EncodingPool.get_status`.
+    The "executor" item describes the registry thread pool;
+    see `RegistryExecutor.get_status`.
+    The "query_budget" item describes the limits on the estimated cost
+    of queries; see `QueryBudget.get_status`.
+    The "scheduler" item describes the registry queries of each client;
+    see `QueryScheduler.get_status`.
+    The "record_snapshot" item describes the preloaded dimension records;
+    see `RecordSnapshot.get_status`.
+    The "registry_pool" item describes the pool of registries;
+    see `RegistryPool.get_status`.
+    The "result_cache" item describes the query result cache;
+    see `ResultCache.get_status`.
+    The "single_flight" item describes coalescing of identical
+    concurrent queries; see `SingleFlight.get_status`.
+    The "subscriptions" item describes the pollers of GraphQL
+    subscriptions; see `SubscriptionHub.get_status`.
+    """
+    change_marker = request.config_dict["butlerservice/change_marker"]
+    compressed_cache = request.config_dict["butlerservice/compressed_cache"]
+    document_cache = request.config_dict["butlerservice/document_cache"]
+    encoding_pool = request.config_dict["butlerservice/encoding_pool"]
+    executor = request.config_dict["butlerservice/executor"]
+    query_budget = request.config_dict["butlerservice/query_budget"]
+    record_snapshot = request.config_dict["butlerservice/record_snapshot"]
+    registry_pool = request.config_dict["butlerservice/registry_pool"]
+    result_cache = request.config_dict["butlerservice/result_cache"]
+    single_flight = request.config_dict["butlerservice/single_flight"]
+    subscription_hub = request.config_dict["butlerservice/subscription_hub"]
+    return web.json_response(
+        dict(
+            argument_caches=get_arg_cache_status(),
+            change_marker=change_marker.get_status(),
+            compressed_cache=compressed_cache.get_status(),
+            document_cache=document_cache.get_status(),
+            encoding_pool=encoding_pool.get_status(),
+            executor=executor.get_status(),
+            query_budget=query_budget.get_status(),
+            record_snapshot=record_snapshot.get_status(),
+            registry_pool=registry_pool.get_status(),
+            result_cache=result_cache.get_status(),
+            scheduler=executor.scheduler.get_status(),
+            single_flight=single_flight.get_status(),
+            subscriptions=subscription_hub.get_status(),
+        )
+    )
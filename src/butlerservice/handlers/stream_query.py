@@ -0,0 +1,684 @@
+"""Handlers that stream large query results as NDJSON or Arrow IPC."""
+
+from __future__ import annotations
+
+__all__ = ["stream_query_data_ids", "stream_query_dimension_records"]
+
+import abc
+import asyncio
+import concurrent.futures
+import contextlib
+import functools
+import io
+import json
+import threading
+import time
+import typing
+
+from aiohttp import web
+
+from ..compression import enable_stream_compression
+from ..deadline import (
+    QueryTimeoutError,
+    get_cancellation_error,
+    get_request_timeout,
+    start_deadline,
+)
+from ..encoding_pool import (
+    EncodingPool,
+    RawRowBatch,
+    make_data_id_batch,
+    make_record_batch,
+)
+from ..metrics import record_phase, start_query_timer
+from ..profiling import QueryProfile, log_slow_query, start_query_profile
+from ..query_cost import estimate_query_cost
+from ..record_encoder import get_record_encoder
+from ..registry_executor import RegistryBusyError
+from ..resolvers.simple_query_data_ids import convert_data_id
+from ..utils import combine_strs_and_regex, load_json_arg
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+if typing.TYPE_CHECKING:
+    import lsst.daf.butler
+
+    from ..registry_pool import RegistryPool
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+# Arguments that are lists of strings.
+LIST_ARG_NAMES = frozenset(
+    (
+        "dimensions",
+        "datasets",
+        "datasetregexs",
+        "collections",
+        "collectionregexs",
+    )
+)
+
+# Arguments that are json-encoded dicts.
+JSON_ARG_NAMES = ("dataid", "bind", "kwargs")
+
+# Arguments that are booleans.
+BOOL_ARG_NAMES = frozenset(("components", "check"))
+
+# Maximum number of encoded chunks buffered between the registry thread
+# and the HTTP response. Limits memory use if the client reads slowly.
+MAX_QUEUED_CHUNKS = 4
+
+
+class _StreamCancelled(Exception):
+    """The client stopped reading the stream."""
+
+
+async def stream_query_data_ids(request: web.Request) -> web.StreamResponse:
+    """Stream the results of registry.queryDataIds.
+
+    Arguments are the same as for the simple_query_data_ids GraphQL field,
+    specified as query parameters (GET; repeat list parameters once per
+    item) or as a json-encoded dict (POST).
+    See `stream_query` for the output format.
+    """
+    return await stream_query(
+        request=request,
+        query_method_name="queryDataIds",
+        required_arg_name="dimensions",
+        convert_row=convert_data_id,
+        make_batch=make_data_id_batch,
+        make_schema=make_data_ids_schema,
+    )
+
+
+async def stream_query_dimension_records(
+    request: web.Request,
+) -> web.StreamResponse:
+    """Stream the results of registry.queryDimensionRecords.
+
+    Arguments are the same as for the simple_query_dimension_records
+    GraphQL field, specified as query parameters (GET; repeat list
+    parameters once per item) or as a json-encoded dict (POST).
+    See `stream_query` for the output format.
+    """
+    return await stream_query(
+        request=request,
+        query_method_name="queryDimensionRecords",
+        required_arg_name="element",
+        convert_row=convert_record,
+        make_batch=make_records_batch,
+        make_schema=make_records_schema,
+    )
+
+
+def convert_record(record: lsst.daf.butler.DimensionRecord) -> dict:
+    """Convert a dimension record to a dict of plain old data."""
+    return get_record_encoder(record.definition).to_dict(record)
+
+
+def make_records_batch(
+    records: typing.List[lsst.daf.butler.DimensionRecord],
+) -> RawRowBatch:
+    """Make a batch of raw rows from a non-empty list of dimension records
+    of one element.
+    """
+    return make_record_batch(records[0].definition, records)
+
+
+def _get_arrow_type(field_spec: lsst.daf.butler.ddl.FieldSpec) -> typing.Any:
+    """Get the Arrow type of the values of a registry table field."""
+    try:
+        python_type = field_spec.dtype().python_type
+    except NotImplementedError:
+        python_type = None
+    return {
+        bool: pyarrow.bool_(),
+        int: pyarrow.int64(),
+        float: pyarrow.float64(),
+    }.get(python_type, pyarrow.string())
+
+
+def make_data_ids_schema(
+    universe: lsst.daf.butler.DimensionUniverse,
+    query_kwargs: typing.Dict[str, typing.Any],
+) -> typing.Any:
+    """Make the Arrow schema of the data IDs of a registry.queryDataIds
+    query, as converted by `convert_data_id`.
+    """
+    dimensions = query_kwargs["dimensions"]
+    if isinstance(dimensions, str):
+        dimensions = [dimensions]
+    return pyarrow.schema(
+        [
+            (dimension.name, _get_arrow_type(dimension.primaryKey))
+            for dimension in universe.extract(dimensions).dimensions
+        ]
+    )
+
+
+def make_records_schema(
+    universe: lsst.daf.butler.DimensionUniverse,
+    query_kwargs: typing.Dict[str, typing.Any],
+) -> typing.Any:
+    """Make the Arrow schema of the records of a
+    registry.queryDimensionRecords query, as converted by `convert_record`.
+    """
+    element = universe[query_kwargs["element"]]
+    fields = [
+        (field_spec.name, _get_arrow_type(field_spec))
+        for field_spec in element.RecordClass.fields.standard
+    ]
+    if element.temporal is not None:
+        fields.append(("timespan", pyarrow.list_(pyarrow.string())))
+    if element.spatial is not None:
+        fields.append(("region", pyarrow.string()))
+    return pyarrow.schema(fields)
+
+
+async def stream_query(
+    request: web.Request,
+    query_method_name: str,
+    required_arg_name: str,
+    convert_row: typing.Callable[[typing.Any], dict],
+    make_batch: typing.Callable[[typing.List[typing.Any]], RawRowBatch],
+    make_schema: typing.Callable[
+        [lsst.daf.butler.DimensionUniverse, typing.Dict[str, typing.Any]],
+        typing.Any,
+    ],
+) -> web.StreamResponse:
+    """Run a registry query and stream the results.
+
+    The rows are produced by iterating over the registry query results
+    in a registry thread, and are sent in chunks as they are produced,
+    using chunked transfer encoding, so neither time to first byte
+    nor peak memory grows with the size of the result.
+
+    The output format is specified by the ``format`` argument
+    ("ndjson" or "arrow") or else by the ``Accept`` header;
+    the default is NDJSON: one json-encoded dict per line.
+    Arrow IPC streaming format requires pyarrow;
+    the column types are given by the definitions of the dimensions
+    (so an empty result is a stream with just the schema).
+
+    If the query fails before any data is sent, the response has
+    status 400 (or 503 if the server is too busy, or 504 if the query
+    timed out) and a json-encoded dict with an "error" item.
+    If it fails after data is sent, the stream is truncated;
+    for NDJSON the last line is a dict with an "error" item.
+    The request's timeout is given by
+    `butlerservice.deadline.get_request_timeout`.
+
+    Parameters
+    ----------
+    request
+        HTTP request.
+    query_method_name
+        Name of the `lsst.daf.butler.Registry` query method.
+    required_arg_name
+        Name of the required query argument.
+    convert_row
+        Function to convert one result row to a plain old data dict.
+        Used for Arrow output.
+    make_batch
+        Function to convert a list of result rows to a `RawRowBatch`.
+        Used for NDJSON output, which is encoded with the encoding pool.
+    make_schema
+        Function to make the Arrow schema of the results, given the
+        dimension universe and the registry query keyword arguments.
+        Used for Arrow output.
+    """
+    try:
+        args = await _get_args(request)
+        output_format = args.pop("format", None) or _format_from_accept(
+            request
+        )
+        if output_format not in ("ndjson", "arrow"):
+            raise ValueError(
+                f"format={output_format!r} must be one of 'ndjson' or 'arrow'"
+            )
+        if output_format == "arrow" and pyarrow is None:
+            raise ValueError(
+                "format='arrow' is not available (no pyarrow; "
+                "install butlerservice[arrow])"
+            )
+        query_kwargs = _make_query_kwargs(args, required_arg_name)
+        timeout = get_request_timeout(
+            request, request.config_dict["safir/config"]
+        )
+    except ValueError as e:
+        raise web.HTTPBadRequest(
+            text=json.dumps(dict(error=str(e))),
+            content_type="application/json",
+        )
+
+    config = request.config_dict["safir/config"]
+    encoder: _ChunkEncoder
+    if output_format == "arrow":
+        encoder = _ArrowEncoder(
+            convert_row=convert_row,
+            make_schema=functools.partial(
+                make_schema,
+                request.config_dict[
+                    "butlerservice/butler"
+                ].registry.dimensions,
+                query_kwargs,
+            ),
+        )
+    else:
+        encoder = _NdjsonEncoder(
+            encoding_pool=request.config_dict["butlerservice/encoding_pool"],
+            make_batch=make_batch,
+        )
+    loop = asyncio.get_running_loop()
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_CHUNKS)
+    cancelled = threading.Event()
+    producer = functools.partial(
+        _produce_chunks,
+        registry_pool=request.config_dict["butlerservice/registry_pool"],
+        query_method_name=query_method_name,
+        query_kwargs=query_kwargs,
+        encoder=encoder,
+        chunk_size=config.stream_chunk_size,
+        put=functools.partial(
+            _put_chunk, loop=loop, queue=chunk_queue, cancelled=cancelled
+        ),
+    )
+    metrics = request.config_dict["butlerservice/metrics"]
+    start_time = time.perf_counter()
+    # Start the producer with a query timer, to record the time
+    # spent in each phase of the query, and a profile for the
+    # slow-query log.
+    profile = QueryProfile(
+        field=f"stream/{query_method_name}", args=query_kwargs
+    )
+    with contextlib.ExitStack() as stack:
+        timer = stack.enter_context(start_query_timer())
+        if timeout is not None:
+            stack.enter_context(start_deadline(time.monotonic() + timeout))
+        if config.slow_query_threshold > 0:
+            stack.enter_context(start_query_profile(profile))
+        producer_task = asyncio.ensure_future(
+            request.config_dict["butlerservice/executor"].run(
+                producer, cost=_estimate_cost(request, query_kwargs)
+            )
+        )
+    chunk = None
+    finished = False
+    try:
+        chunk = await _get_chunk(chunk_queue, producer_task)
+        if isinstance(chunk, RegistryBusyError):
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps(dict(error=str(chunk))),
+                content_type="application/json",
+            )
+        elif isinstance(chunk, QueryTimeoutError):
+            raise web.HTTPGatewayTimeout(
+                text=json.dumps(dict(error=str(chunk))),
+                content_type="application/json",
+            )
+        elif isinstance(chunk, Exception):
+            raise web.HTTPBadRequest(
+                text=json.dumps(dict(error=str(chunk))),
+                content_type="application/json",
+            )
+        response = web.StreamResponse(
+            headers={
+                "Content-Type": (
+                    ARROW_CONTENT_TYPE
+                    if output_format == "arrow"
+                    else NDJSON_CONTENT_TYPE
+                )
+            }
+        )
+        response.enable_chunked_encoding()
+        enable_stream_compression(request, response)
+        await response.prepare(request)
+        while chunk is not None:
+            if isinstance(chunk, Exception):
+                if output_format == "ndjson":
+                    await response.write(
+                        json.dumps(dict(error=str(chunk))).encode() + b"\n"
+                    )
+                break
+            await response.write(chunk)
+            chunk = await _get_chunk(chunk_queue, producer_task)
+        # The producer sent all the rows (rather than an error).
+        finished = chunk is None
+        await response.write_eof()
+        return response
+    finally:
+        # Stop the producer, unless it sent all the rows: the client may
+        # have gone away or the deadline expired, even before the first
+        # chunk. Cancelling the task interrupts its SQL statement, if any.
+        cancelled.set()
+        if not finished:
+            producer_task.cancel()
+        while not chunk_queue.empty():
+            chunk_queue.get_nowait()
+        # Wait for the producer to finish; it has already reported
+        # any exception that matters.
+        (num_rows,) = await asyncio.gather(
+            producer_task, return_exceptions=True
+        )
+        error = isinstance(num_rows, BaseException) or isinstance(
+            chunk, Exception
+        )
+        duration = time.perf_counter() - start_time
+        metrics.observe_query(
+            field=profile.field,
+            duration=duration,
+            timer=timer,
+            num_rows=None if error else num_rows,
+            error=error,
+        )
+        if 0 < config.slow_query_threshold <= duration:
+            log_slow_query(
+                config.logger_name,
+                profile.to_dict(
+                    duration=duration,
+                    timer=timer,
+                    num_rows=None if error else num_rows,
+                    error=str(chunk) if isinstance(chunk, Exception) else None,
+                ),
+            )
+
+
+async def _get_args(request: web.Request) -> typing.Dict[str, typing.Any]:
+    """Get the query arguments from a request as a dict.
+
+    For GET requests the arguments are query parameters; list arguments
+    may be repeated. For POST requests the body is a json-encoded dict.
+    """
+    if request.method == "POST":
+        try:
+            args = await request.json()
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Cannot decode request body: {e}")
+        if not isinstance(args, dict):
+            raise ValueError("Request body must be a json-encoded dict")
+        return args
+    args = {}
+    for key in request.query.keys():
+        if key in LIST_ARG_NAMES:
+            args[key] = request.query.getall(key)
+        else:
+            args[key] = request.query[key]
+    return args
+
+
+def _format_from_accept(request: web.Request) -> str:
+    """Get the output format from the Accept header."""
+    if ARROW_CONTENT_TYPE in request.headers.get("Accept", ""):
+        return "arrow"
+    return "ndjson"
+
+
+def _make_query_kwargs(
+    args: typing.Dict[str, typing.Any], required_arg_name: str
+) -> typing.Dict[str, typing.Any]:
+    """Convert request arguments to registry query keyword arguments.
+
+    Raises
+    ------
+    ValueError
+        If the arguments are invalid.
+    """
+    args = dict(args)
+    if required_arg_name not in args:
+        raise ValueError(f"Argument {required_arg_name} is required")
+    for name in JSON_ARG_NAMES:
+        value = args.get(name)
+        if isinstance(value, str):
+            try:
+                args[name] = load_json_arg(value)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Cannot decode {name}: {e}")
+    for name in BOOL_ARG_NAMES:
+        value = args.get(name)
+        if isinstance(value, str):
+            args[name] = value.lower() in ("1", "true")
+    # Copy kwargs, because decoded arguments are shared.
+    query_kwargs = dict(args.pop("kwargs", None) or {})
+    query_kwargs.update(
+        {
+            required_arg_name: args.pop(required_arg_name),
+            "dataId": args.pop("dataid", None),
+            "datasets": combine_strs_and_regex(
+                str_list=args.pop("datasets", None),
+                regex_list=args.pop("datasetregexs", None),
+            ),
+            "collections": combine_strs_and_regex(
+                str_list=args.pop("collections", None),
+                regex_list=args.pop("collectionregexs", None),
+            ),
+            "where": args.pop("where", None),
+            "components": args.pop("components", None),
+            "bind": args.pop("bind", None),
+            "check": args.pop("check", True),
+        }
+    )
+    if args:
+        raise ValueError(f"Unrecognized arguments: {sorted(args)}")
+    return query_kwargs
+
+
+def _estimate_cost(
+    request: web.Request, query_kwargs: typing.Dict[str, typing.Any]
+) -> float:
+    """Estimate the relative cost of a streamed registry query;
+    see `butlerservice.query_cost.estimate_query_cost`.
+    """
+    element = query_kwargs.get("element")
+    dimensions = query_kwargs.get("dimensions") or ()
+    if isinstance(dimensions, str):
+        dimensions = [dimensions]
+    return estimate_query_cost(
+        request.config_dict["butlerservice/butler"].registry.dimensions,
+        dimensions=dimensions,
+        element=element if isinstance(element, str) else None,
+        datasets=query_kwargs.get("datasets"),
+        where=query_kwargs.get("where"),
+    )
+
+
+async def _get_chunk(
+    chunk_queue: asyncio.Queue, producer_task: asyncio.Future
+) -> typing.Any:
+    """Get the next chunk from the producer.
+
+    Return the chunk, None if there are no more chunks,
+    or an exception if the producer failed.
+    """
+    get_task = asyncio.ensure_future(chunk_queue.get())
+    await asyncio.wait(
+        [get_task, producer_task], return_when=asyncio.FIRST_COMPLETED
+    )
+    if get_task.done():
+        return get_task.result()
+    get_task.cancel()
+    if not chunk_queue.empty():
+        return chunk_queue.get_nowait()
+    # The producer finished without queuing a final value.
+    exception = producer_task.exception()
+    return exception if exception is not None else None
+
+
+def _put_chunk(
+    chunk: typing.Any,
+    loop: asyncio.AbstractEventLoop,
+    queue: asyncio.Queue,
+    cancelled: threading.Event,
+) -> None:
+    """Put a chunk on the queue, from a registry thread.
+
+    Blocks while the queue is full.
+
+    Raises
+    ------
+    _StreamCancelled
+        If the stream is cancelled.
+    """
+    while not cancelled.is_set():
+        future = asyncio.run_coroutine_threadsafe(queue.put(chunk), loop)
+        try:
+            future.result(timeout=1)
+            return
+        except concurrent.futures.TimeoutError:
+            if not future.cancel():
+                # The put finished after all.
+                return
+    raise _StreamCancelled()
+
+
+def _produce_chunks(
+    registry_pool: RegistryPool,
+    query_method_name: str,
+    query_kwargs: typing.Dict[str, typing.Any],
+    encoder: _ChunkEncoder,
+    chunk_size: int,
+    put: typing.Callable[[typing.Any], None],
+) -> int:
+    """Run a registry query and put encoded chunks of rows.
+
+    Run in a registry thread. Put None when done, or an exception
+    if the query fails. Return the number of rows.
+
+    Record the time spent encoding rows, and the rest of the time
+    not spent waiting to put chunks as registry query time;
+    see `butlerservice.metrics.record_phase`.
+    """
+    start_time = time.perf_counter()
+    # Time spent encoding and putting chunks (sec).
+    durations = dict(encoding=0.0, put=0.0)
+
+    def encode_and_put(rows: typing.List[typing.Any]) -> None:
+        encode_start_time = time.perf_counter()
+        chunk = encoder.encode(rows)
+        put_start_time = time.perf_counter()
+        put(chunk)
+        durations["encoding"] += put_start_time - encode_start_time
+        durations["put"] += time.perf_counter() - put_start_time
+
+    num_rows = 0
+    try:
+        with registry_pool.registry() as registry:
+            results = getattr(registry, query_method_name)(**query_kwargs)
+            rows = []
+            for result in results:
+                rows.append(result)
+                if len(rows) >= chunk_size:
+                    num_rows += len(rows)
+                    encode_and_put(rows)
+                    rows = []
+            if rows:
+                num_rows += len(rows)
+                encode_and_put(rows)
+        final_chunk = encoder.finish()
+        if final_chunk:
+            put(final_chunk)
+    except _StreamCancelled:
+        raise
+    except Exception as e:
+        put(get_cancellation_error() or e)
+        return num_rows
+    finally:
+        record_phase("encoding", durations["encoding"])
+        record_phase(
+            "registry_query",
+            time.perf_counter()
+            - start_time
+            - durations["encoding"]
+            - durations["put"],
+        )
+    put(None)
+    return num_rows
+
+
+class _ChunkEncoder(abc.ABC):
+    """Encode chunks of rows for output."""
+
+    @abc.abstractmethod
+    def encode(self, rows: typing.List[typing.Any]) -> bytes:
+        """Encode a chunk of registry query result rows."""
+        raise NotImplementedError()
+
+    def finish(self) -> bytes:
+        """Return data that ends the stream, if any."""
+        return b""
+
+
+class _NdjsonEncoder(_ChunkEncoder):
+    """Encode rows as newline-delimited json, using an encoding pool.
+
+    Parameters
+    ----------
+    encoding_pool
+        The pool that encodes the rows.
+    make_batch
+        Function to convert a list of result rows to a `RawRowBatch`.
+    """
+
+    def __init__(
+        self,
+        encoding_pool: EncodingPool,
+        make_batch: typing.Callable[[typing.List[typing.Any]], RawRowBatch],
+    ) -> None:
+        self.encoding_pool = encoding_pool
+        self.make_batch = make_batch
+
+    def encode(self, rows: typing.List[typing.Any]) -> bytes:
+        return self.encoding_pool.encode(self.make_batch(rows))
+
+
+class _ArrowEncoder(_ChunkEncoder):
+    """Encode rows as Arrow IPC streaming format record batches.
+
+    Parameters
+    ----------
+    convert_row
+        Function to convert one result row to a plain old data dict.
+    make_schema
+        Function to make the schema.
+    """
+
+    def __init__(
+        self,
+        convert_row: typing.Callable[[typing.Any], dict],
+        make_schema: typing.Callable[[], typing.Any],
+    ) -> None:
+        self.convert_row = convert_row
+        self.make_schema = make_schema
+        self.buffer = io.BytesIO()
+        self.schema: typing.Any = None
+        self.writer: typing.Any = None
+
+    def encode(self, rows: typing.List[typing.Any]) -> bytes:
+        self._start()
+        batch = pyarrow.RecordBatch.from_pylist(
+            [self.convert_row(row) for row in rows], schema=self.schema
+        )
+        self.writer.write_batch(batch)
+        return self._pop_data()
+
+    def finish(self) -> bytes:
+        # If there were no rows this sends just the schema,
+        # so clients can still read the column types.
+        self._start()
+        self.writer.close()
+        return self._pop_data()
+
+    def _start(self) -> None:
+        """Start the stream, if not already started."""
+        if self.writer is None:
+            self.schema = self.make_schema()
+            self.writer = pyarrow.ipc.new_stream(self.buffer, self.schema)
+
+    def _pop_data(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
@@ -0,0 +1,437 @@
+"""Metrics, in Prometheus text exposition format."""
+
+from __future__ import annotations
+
+__all__ = [
+    "BYTES_BUCKETS",
+    "FIELDS_CONTEXT_KEY",
+    "LATENCY_BUCKETS",
+    "MULTIPROCESS_DIR_ENV",
+    "MULTIPLE_FIELDS_LABEL",
+    "QueryTimer",
+    "ServiceMetrics",
+    "StatusCollector",
+    "count_rows",
+    "get_fields_label",
+    "get_query_timer",
+    "graphql_metrics_middleware",
+    "http_metrics_middleware",
+    "record_phase",
+    "start_query_timer",
+    "time_phase",
+]
+
+import contextlib
+import contextvars
+import inspect
+import os
+import time
+import typing
+
+import prometheus_client
+import prometheus_client.multiprocess
+from aiohttp import web
+from prometheus_client.core import GaugeMetricFamily
+
+if typing.TYPE_CHECKING:
+    import graphql
+
+# Upper bounds of histogram buckets for durations (sec).
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Upper bounds of histogram buckets for sizes (bytes).
+BYTES_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+# Environment variable with the directory in which the processes
+# of a multi-process service (see `butlerservice.workers`) write
+# their metrics; see `prometheus_client.multiprocess`.
+# It must be set before `prometheus_client` is imported.
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Key of the list of names of the top-level fields being resolved
+# in the GraphQL context (a per-request dict).
+FIELDS_CONTEXT_KEY = "butlerservice/fields"
+
+# Field label of metrics of a request with several top-level fields;
+# one label value per combination of fields would be unbounded.
+MULTIPLE_FIELDS_LABEL = "(multiple)"
+
+# Components whose numeric status items are reported as gauges:
+# (app key, metric name prefix, description).
+STATUS_COMPONENTS = (
+    ("butlerservice/executor", "executor", "registry executor"),
+    ("butlerservice/registry_pool", "registry_pool", "registry pool"),
+    ("butlerservice/encoding_pool", "encoding_pool", "encoding pool"),
+    ("butlerservice/result_cache", "result_cache", "result cache"),
+    (
+        "butlerservice/compressed_cache",
+        "compressed_cache",
+        "compressed response cache",
+    ),
+    ("butlerservice/document_cache", "document_cache", "query cache"),
+    ("butlerservice/single_flight", "single_flight", "single flight"),
+    ("butlerservice/record_snapshot", "record_snapshot", "record snapshot"),
+    ("butlerservice/change_marker", "change_marker", "change marker"),
+    ("butlerservice/query_budget", "query_budget", "query budget"),
+    ("butlerservice/subscription_hub", "subscriptions", "subscription hub"),
+)
+
+
+class StatusCollector:
+    """A Prometheus collector that reports the numeric status items
+    of the components of an application as gauges.
+
+    The gauges are computed when the metrics are rendered, from the
+    ``get_status`` method of each component in `STATUS_COMPONENTS`,
+    so they show the current saturation of the executor, pools and caches.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    """
+
+    def __init__(self, app: web.Application) -> None:
+        self.app = app
+
+    def collect(self) -> typing.Iterator[GaugeMetricFamily]:
+        for key, prefix, description in STATUS_COMPONENTS:
+            component = self.app.get(key)
+            if component is None:
+                continue
+            for name, value in component.get_status().items():
+                if isinstance(value, bool) or not isinstance(
+                    value, (int, float)
+                ):
+                    continue
+                yield GaugeMetricFamily(
+                    f"butlerservice_{prefix}_{name}",
+                    f"Status item {name} of the {description}.",
+                    value=value,
+                )
+
+
+class QueryTimer:
+    """Time spent in each phase of one query (sec).
+
+    Phases are "queue_wait" (waiting for a registry thread),
+    "registry_query" (running the query and reading the rows),
+    and "encoding" (converting the rows to the returned form).
+    """
+
+    def __init__(self) -> None:
+        self.durations: typing.Dict[str, float] = dict()
+
+
+_current_timer: contextvars.ContextVar[typing.Optional[QueryTimer]] = (
+    contextvars.ContextVar("butlerservice_query_timer", default=None)
+)
+
+
+@contextlib.contextmanager
+def start_query_timer() -> typing.Iterator[QueryTimer]:
+    """Make a query timer that `record_phase` and `time_phase` update
+    while the context is active.
+
+    The timer is in a context variable, so it is updated by code
+    that runs in this context, in tasks started in this context,
+    and in registry threads started by
+    `butlerservice.registry_executor.RegistryExecutor.run`
+    in this context.
+    """
+    timer = QueryTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+def get_query_timer() -> typing.Optional[QueryTimer]:
+    """Get the timer of the current query, or None if none."""
+    return _current_timer.get()
+
+
+def record_phase(phase: str, duration: float) -> None:
+    """Add time spent in a phase of the current query, if any."""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.durations[phase] = timer.durations.get(phase, 0) + duration
+
+
+@contextlib.contextmanager
+def time_phase(phase: str) -> typing.Iterator[None]:
+    """Time the body of a with statement, as a phase
+    of the current query, if any.
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - start_time)
+
+
+def get_fields_label(fields: typing.Sequence[str]) -> str:
+    """Get the field label of the metrics of a whole request
+    (such as the time to serialize its response).
+
+    Parameters
+    ----------
+    fields
+        Names of the top-level fields of the request.
+
+    Returns
+    -------
+    label : `str`
+        The name of the field if there is only one
+        (distinct) field, else `MULTIPLE_FIELDS_LABEL`.
+    """
+    if len(set(fields)) == 1:
+        return fields[0]
+    return MULTIPLE_FIELDS_LABEL
+
+
+def count_rows(result: typing.Any) -> typing.Optional[int]:
+    """Count the rows in the result of a query field.
+
+    Handle lists of rows, lists of lists of rows (batch queries),
+    connections (dicts with "edges") and columnar results (dicts with
+    "num_rows"). Return None for other results.
+    """
+    if isinstance(result, list):
+        if result and isinstance(result[0], list):
+            return sum(len(item) for item in result)
+        return len(result)
+    if isinstance(result, dict):
+        if "edges" in result:
+            return len(result["edges"])
+        if "num_rows" in result:
+            return result["num_rows"]
+    return None
+
+
+class ServiceMetrics:
+    """The metrics of the butler service.
+
+    The metrics are in their own `prometheus_client.CollectorRegistry`,
+    so each application has its own.
+
+    If `MULTIPROCESS_DIR_ENV` is set (as it is in the worker processes
+    started by `butlerservice.workers.run_workers`), counters and
+    histograms are written to files in that directory, and the rendered
+    metrics are the totals over all the processes, so they do not depend
+    on which worker answers a scrape. The gauges of `StatusCollector`
+    are still those of the process that renders the metrics.
+
+    Parameters
+    ----------
+    app
+        aiohttp application. Gauges of its executor, pools and caches
+        are reported; see `StatusCollector`.
+    """
+
+    def __init__(self, app: web.Application) -> None:
+        self.app = app
+        self.registry = prometheus_client.CollectorRegistry()
+        self.http_requests = prometheus_client.Counter(
+            "butlerservice_http_requests_total",
+            "HTTP requests, by route, method and status.",
+            ("route", "method", "status"),
+            registry=self.registry,
+        )
+        self.http_request_seconds = prometheus_client.Histogram(
+            "butlerservice_http_request_seconds",
+            "Time to handle an HTTP request (sec), by route.",
+            ("route",),
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.http_response_bytes = prometheus_client.Histogram(
+            "butlerservice_http_response_bytes",
+            "Size of HTTP response bodies (bytes), by route.",
+            ("route",),
+            buckets=BYTES_BUCKETS,
+            registry=self.registry,
+        )
+        self.field_requests = prometheus_client.Counter(
+            "butlerservice_field_requests_total",
+            "Requests for a query field, by field and status "
+            '("ok" or "error").',
+            ("field", "status"),
+            registry=self.registry,
+        )
+        self.field_seconds = prometheus_client.Histogram(
+            "butlerservice_field_seconds",
+            "Time to resolve a query field (sec), by field.",
+            ("field",),
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.phase_seconds = prometheus_client.Histogram(
+            "butlerservice_phase_seconds",
+            "Time spent in each phase of a query (sec), by field and phase "
+            '("queue_wait", "registry_query", "encoding" or '
+            '"serialization").',
+            ("field", "phase"),
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.rows_returned = prometheus_client.Counter(
+            "butlerservice_rows_returned_total",
+            "Rows returned by query fields, by field.",
+            ("field",),
+            registry=self.registry,
+        )
+        status_collector = StatusCollector(app)
+        self.registry.register(status_collector)
+        # Registry of the rendered metrics.
+        self.exposition_registry = self.registry
+        if os.environ.get(MULTIPROCESS_DIR_ENV):
+            self.exposition_registry = prometheus_client.CollectorRegistry()
+            prometheus_client.multiprocess.MultiProcessCollector(
+                self.exposition_registry
+            )
+            self.exposition_registry.register(status_collector)
+
+    def observe_query(
+        self,
+        field: str,
+        duration: float,
+        timer: QueryTimer,
+        num_rows: typing.Optional[int] = None,
+        error: bool = False,
+    ) -> None:
+        """Record the metrics of one query.
+
+        Parameters
+        ----------
+        field
+            Name of the query field (or streaming endpoint).
+        duration
+            Total time (sec).
+        timer
+            Durations of the phases of the query.
+        num_rows
+            The number of rows returned, if known; see `count_rows`.
+        error
+            Did the query fail?
+        """
+        self.field_requests.labels(
+            field=field, status="error" if error else "ok"
+        ).inc()
+        self.field_seconds.labels(field=field).observe(duration)
+        for phase, phase_duration in timer.durations.items():
+            self.phase_seconds.labels(field=field, phase=phase).observe(
+                phase_duration
+            )
+        if num_rows is not None:
+            self.rows_returned.labels(field=field).inc(num_rows)
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format."""
+        return prometheus_client.generate_latest(
+            self.exposition_registry
+        ).decode()
+
+
+def graphql_metrics_middleware(
+    next_: typing.Callable[..., typing.Any],
+    root: typing.Any,
+    info: graphql.GraphQLResolveInfo,
+    **args: typing.Any,
+) -> typing.Any:
+    """GraphQL middleware that records the metrics
+    of each top-level query field.
+
+    The root value must be the aiohttp application.
+    Nested fields are resolved without overhead.
+    The names of the top-level fields are appended to the list
+    `FIELDS_CONTEXT_KEY` in the context.
+    """
+    if info.path.prev is not None:
+        return next_(root, info, **args)
+    if isinstance(info.context, dict):
+        info.context.setdefault(FIELDS_CONTEXT_KEY, []).append(info.field_name)
+    return _resolve_with_metrics(next_, root, info, args)
+
+
+async def _resolve_with_metrics(
+    next_: typing.Callable[..., typing.Any],
+    root: typing.Any,
+    info: graphql.GraphQLResolveInfo,
+    args: typing.Dict[str, typing.Any],
+) -> typing.Any:
+    metrics = info.root_value["butlerservice/metrics"]
+    start_time = time.perf_counter()
+    error = True
+    result = None
+    with start_query_timer() as timer:
+        try:
+            result = next_(root, info, **args)
+            if inspect.isawaitable(result):
+                result = await result
+            error = False
+            return result
+        finally:
+            metrics.observe_query(
+                field=info.field_name,
+                duration=time.perf_counter() - start_time,
+                timer=timer,
+                num_rows=count_rows(result),
+                error=error,
+            )
+
+
+@web.middleware
+async def http_metrics_middleware(
+    request: web.Request,
+    handler: typing.Callable[[web.Request], typing.Awaitable],
+) -> web.StreamResponse:
+    """aiohttp middleware that records the metrics of each HTTP request.
+
+    Add it to the root application only.
+    """
+    metrics = request.config_dict["butlerservice/metrics"]
+    resource = request.match_info.route.resource
+    route = "unmatched" if resource is None else resource.canonical
+    start_time = time.perf_counter()
+    status = 500
+    body_size: typing.Optional[int] = None
+    try:
+        response = await handler(request)
+        status = response.status
+        if isinstance(response, web.Response) and isinstance(
+            response.body, (bytes, bytearray)
+        ):
+            body_size = len(response.body)
+        else:
+            # Streamed responses have already been sent.
+            body_size = response.body_length
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        metrics.http_requests.labels(
+            route=route, method=request.method, status=str(status)
+        ).inc()
+        metrics.http_request_seconds.labels(route=route).observe(duration)
+        if body_size is not None:
+            metrics.http_response_bytes.labels(route=route).observe(body_size)
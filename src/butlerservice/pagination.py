@@ -0,0 +1,77 @@
+"""Support for Relay-style cursor-based pagination."""
+
+from __future__ import annotations
+
+__all__ = ["decode_cursor", "encode_cursor", "make_connection"]
+
+import base64
+import binascii
+import typing
+
+# Prefix of a decoded cursor; makes cursors a bit less likely to be
+# mistaken for (or constructed as) plain offsets by clients.
+CURSOR_PREFIX = "offset:"
+
+
+def encode_cursor(offset: int) -> str:
+    """Encode the offset of a row as an opaque cursor string."""
+    return base64.b64encode(f"{CURSOR_PREFIX}{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: typing.Optional[str]) -> int:
+    """Decode a cursor string into the offset of the row *after* it.
+
+    Return 0 if cursor is None (meaning start at the beginning).
+
+    Raises
+    ------
+    RuntimeError
+        If the cursor is invalid.
+    """
+    if cursor is None:
+        return 0
+    try:
+        decoded_cursor = base64.b64decode(cursor.encode()).decode()
+        if not decoded_cursor.startswith(CURSOR_PREFIX):
+            raise ValueError("wrong prefix")
+        offset = int(decoded_cursor[len(CURSOR_PREFIX) :])
+        if offset < 0:
+            raise ValueError("negative offset")
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise RuntimeError(f"Invalid cursor {cursor!r}: {e}")
+    return offset + 1
+
+
+def make_connection(
+    rows: typing.Sequence[dict], first: int, offset: int
+) -> dict:
+    """Make a connection dict from one page of rows.
+
+    Parameters
+    ----------
+    rows
+        Rows found, starting at ``offset``. To determine whether there
+        is a next page, query for one more row than ``first``.
+    first
+        Maximum number of rows in the page.
+    offset
+        Offset of ``rows[0]`` in the full query result.
+
+    Returns
+    -------
+    connection
+        Dict with items "edges" (a list of dicts with items "cursor"
+        and "node") and "page_info" (a dict with items "has_next_page",
+        "has_previous_page", "start_cursor" and "end_cursor").
+    """
+    edges = [
+        dict(cursor=encode_cursor(offset + i), node=row)
+        for i, row in enumerate(rows[:first])
+    ]
+    page_info = dict(
+        has_next_page=len(rows) > first,
+        has_previous_page=offset > 0,
+        start_cursor=edges[0]["cursor"] if edges else None,
+        end_cursor=edges[-1]["cursor"] if edges else None,
+    )
+    return dict(edges=edges, page_info=page_info)
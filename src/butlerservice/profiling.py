@@ -0,0 +1,385 @@
+"""Profiling of queries, and the slow-query log."""
+
+from __future__ import annotations
+
+__all__ = [
+    "PROFILE_HEADER",
+    "PROFILES_CONTEXT_KEY",
+    "QueryProfile",
+    "explain_statement",
+    "graphql_profiling_middleware",
+    "log_slow_query",
+    "run_profiled",
+    "start_query_profile",
+]
+
+import contextlib
+import contextvars
+import cProfile
+import inspect
+import io
+import pstats
+import threading
+import time
+import typing
+
+import structlog
+
+from .metrics import QueryTimer, count_rows, get_query_timer
+from .sql_hooks import StatementHook, hook_statements
+
+if typing.TYPE_CHECKING:
+    import graphql
+    import sqlalchemy
+
+# HTTP header with which a client asks for a profile of its query.
+# Values: "1" or "true" for the timing breakdown, SQL statements and their
+# query plans (EXPLAIN); "cprofile" to also profile the registry thread.
+PROFILE_HEADER = "X-Butlerservice-Profile"
+
+# Key of the list of profiles of the query fields of a request
+# in the GraphQL context (a per-request dict).
+# The profiles are returned in the "extensions" of the response.
+PROFILES_CONTEXT_KEY = "butlerservice/profiles"
+
+# Maximum length of the string representation of SQL parameters.
+MAX_PARAMETERS_LENGTH = 1000
+
+# Number of functions reported by a cProfile profile.
+CPROFILE_NUM_LINES = 40
+
+# EXPLAIN prefix for each supported database dialect.
+_EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+# Databases on which a failed statement aborts the transaction,
+# so EXPLAIN is run in a savepoint, lest it break the statement explained.
+_SAVEPOINT_DIALECTS = frozenset(("postgresql",))
+
+_EXPLAIN_SAVEPOINT = "butlerservice_explain"
+
+# Statements whose query plans are reported: queries.
+EXPLAINABLE_PREFIXES = ("SELECT", "WITH")
+
+
+class QueryProfile:
+    """Information about one query, for profiling
+    and the slow-query log.
+
+    Parameters
+    ----------
+    field
+        Name of the query field (or streaming endpoint).
+    args
+        Query arguments.
+    capture_sql
+        Capture the SQL statements, their parameters and durations?
+        This costs time and memory for every statement, so it is only
+        done for profiles requested by the client; the slow-query log
+        has the time spent in each phase instead.
+    explain
+        Get the query plan of each SQL statement?
+        This runs an extra EXPLAIN statement per statement.
+        Ignored unless ``capture_sql`` is true.
+    use_cprofile
+        Profile the registry thread(s) with cProfile?
+
+    Notes
+    -----
+    SQL statements are captured by `run_profiled`, in registry threads.
+    """
+
+    def __init__(
+        self,
+        field: str,
+        args: typing.Dict[str, typing.Any],
+        capture_sql: bool = False,
+        explain: bool = False,
+        use_cprofile: bool = False,
+    ) -> None:
+        self.field = field
+        self.args = args
+        self.capture_sql = capture_sql
+        self.explain = explain
+        self.use_cprofile = use_cprofile
+        self.sql: typing.List[typing.Dict[str, typing.Any]] = []
+        self.cprofile_stats: typing.List[str] = []
+        self._lock = threading.Lock()
+
+    def add_sql(self, entry: typing.Dict[str, typing.Any]) -> None:
+        """Add information about one SQL statement."""
+        with self._lock:
+            self.sql.append(entry)
+
+    def add_cprofile(self, profiler: cProfile.Profile) -> None:
+        """Add the report of a cProfile profiler."""
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(CPROFILE_NUM_LINES)
+        with self._lock:
+            self.cprofile_stats.append(stream.getvalue())
+
+    def to_dict(
+        self,
+        duration: float,
+        timer: typing.Optional[QueryTimer] = None,
+        num_rows: typing.Optional[int] = None,
+        error: typing.Optional[str] = None,
+    ) -> typing.Dict[str, typing.Any]:
+        """Report the profile as a dict of plain old data.
+
+        Parameters
+        ----------
+        duration
+            Total time (sec).
+        timer
+            The timer of the query, if any, for the time spent
+            in each phase.
+        num_rows
+            The number of rows returned, if known.
+        error
+            The error message, if the query failed.
+        """
+        with self._lock:
+            result = dict(
+                field=self.field,
+                args=self.args,
+                duration=duration,
+                phases=dict(timer.durations) if timer is not None else {},
+                num_rows=num_rows,
+                error=error,
+            )
+            if self.capture_sql:
+                result["sql"] = list(self.sql)
+            if self.use_cprofile:
+                result["cprofile"] = "\n".join(self.cprofile_stats)
+        return result
+
+
+_current_profile: contextvars.ContextVar[typing.Optional[QueryProfile]] = (
+    contextvars.ContextVar("butlerservice_query_profile", default=None)
+)
+
+
+@contextlib.contextmanager
+def start_query_profile(
+    profile: QueryProfile,
+) -> typing.Iterator[QueryProfile]:
+    """Make ``profile`` the profile of queries run in this context,
+    while the context is active.
+
+    Like `butlerservice.metrics.start_query_timer` the profile is in
+    a context variable, so it is seen by registry threads started by
+    `butlerservice.registry_executor.RegistryExecutor.run`
+    in this context, which call `run_profiled`.
+    """
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def run_profiled(func: typing.Callable[[], typing.Any]) -> typing.Any:
+    """Call ``func``, capturing SQL statements (and optionally
+    a cProfile profile) for the current query profile, if it asks for them.
+
+    Call this in the registry thread that runs the query.
+    """
+    profile = _current_profile.get()
+    if profile is None or not (profile.capture_sql or profile.use_cprofile):
+        return func()
+    profiler = cProfile.Profile() if profile.use_cprofile else None
+    with contextlib.ExitStack() as stack:
+        if profile.capture_sql:
+            stack.enter_context(
+                hook_statements("profiling", _ProfilingHook(profile))
+            )
+        try:
+            if profiler is not None:
+                profiler.enable()
+            return func()
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profile.add_cprofile(profiler)
+
+
+class _ProfilingHook(StatementHook):
+    """Record SQL statements, their durations and (optionally)
+    their query plans in a query profile.
+    """
+
+    def __init__(self, profile: QueryProfile) -> None:
+        self.profile = profile
+        # The entry of the statement being executed, if any.
+        self.sql_entry: typing.Optional[typing.Dict[str, typing.Any]] = None
+
+    def before_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        entry: typing.Dict[str, typing.Any] = dict(
+            statement=statement,
+            parameters=repr(parameters)[:MAX_PARAMETERS_LENGTH],
+        )
+        if (
+            self.profile.explain
+            and not executemany
+            and statement.lstrip()[:6].upper() in EXPLAINABLE_PREFIXES
+        ):
+            entry["explain"] = explain_statement(conn, statement, parameters)
+        entry["start_time"] = time.perf_counter()
+        self.sql_entry = entry
+        self.profile.add_sql(entry)
+
+    def after_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        entry = self.sql_entry
+        if entry is None:
+            return
+        entry["execute_duration"] = time.perf_counter() - entry.pop(
+            "start_time"
+        )
+        self.sql_entry = None
+
+
+def explain_statement(
+    conn: sqlalchemy.engine.Connection, statement: str, parameters: typing.Any
+) -> typing.Optional[typing.List[str]]:
+    """Get the query plan of a SQL statement, as lines of text,
+    or None if not supported for this database.
+
+    EXPLAIN is run with the DBAPI connection of ``conn``, in its current
+    transaction. Where a failed statement would abort the transaction
+    (PostgreSQL) it is run in a savepoint, which is rolled back if it fails,
+    so the statement can still be run.
+    """
+    prefix = _EXPLAIN_PREFIXES.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    use_savepoint = conn.dialect.name in _SAVEPOINT_DIALECTS
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            if use_savepoint:
+                cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                if use_savepoint:
+                    cursor.execute(
+                        f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}"
+                    )
+                raise
+            if use_savepoint:
+                cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    return [" ".join(str(value) for value in row) for row in rows]
+
+
+def log_slow_query(
+    logger_name: str, profile_dict: typing.Dict[str, typing.Any]
+) -> None:
+    """Write a query profile to the slow-query log.
+
+    Parameters
+    ----------
+    logger_name
+        Name of the application's logger.
+    profile_dict
+        The profile, as returned by `QueryProfile.to_dict`.
+    """
+    logger = structlog.get_logger(logger_name)
+    logger.warning("Slow query", **profile_dict)
+
+
+def graphql_profiling_middleware(
+    next_: typing.Callable[..., typing.Any],
+    root: typing.Any,
+    info: graphql.GraphQLResolveInfo,
+    **args: typing.Any,
+) -> typing.Any:
+    """GraphQL middleware that profiles top-level query fields
+    if requested (see `PROFILE_HEADER`), and logs slow queries.
+
+    The root value must be the aiohttp application.
+    Requested profiles, with the SQL statements run, are appended
+    to the list `PROFILES_CONTEXT_KEY` in the context. Queries that take
+    longer than ``config.slow_query_threshold`` are logged by
+    `log_slow_query`, with the time spent in each phase (SQL statements
+    are not captured for them, since that would slow every query).
+    """
+    if info.path.prev is not None:
+        return next_(root, info, **args)
+    config = info.root_value["safir/config"]
+    requested_mode = ""
+    request = info.context.get("request")
+    if config.allow_profile_header and request is not None:
+        requested_mode = request.headers.get(PROFILE_HEADER, "").lower()
+    is_requested = requested_mode in ("1", "true", "cprofile")
+    if not is_requested and config.slow_query_threshold <= 0:
+        return next_(root, info, **args)
+    profile = QueryProfile(
+        field=info.field_name,
+        args=args,
+        capture_sql=is_requested,
+        explain=is_requested,
+        use_cprofile=requested_mode == "cprofile",
+    )
+    return _resolve_with_profile(
+        next_, root, info, args, profile, is_requested
+    )
+
+
+async def _resolve_with_profile(
+    next_: typing.Callable[..., typing.Any],
+    root: typing.Any,
+    info: graphql.GraphQLResolveInfo,
+    args: typing.Dict[str, typing.Any],
+    profile: QueryProfile,
+    is_requested: bool,
+) -> typing.Any:
+    config = info.root_value["safir/config"]
+    start_time = time.perf_counter()
+    result = None
+    error = None
+    with start_query_profile(profile):
+        try:
+            result = next_(root, info, **args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - start_time
+            is_slow = 0 < config.slow_query_threshold <= duration
+            if is_requested or is_slow:
+                profile_dict = profile.to_dict(
+                    duration=duration,
+                    timer=get_query_timer(),
+                    num_rows=count_rows(result),
+                    error=error,
+                )
+                if is_requested:
+                    info.context.setdefault(PROFILES_CONTEXT_KEY, []).append(
+                        profile_dict
+                    )
+                if is_slow:
+                    log_slow_query(config.logger_name, profile_dict)
@@ -0,0 +1,419 @@
+"""Estimates of the cost of registry queries before they are run,
+and limits on that cost.
+"""
+
+from __future__ import annotations
+
+__all__ = [
+    "QueryBudget",
+    "QueryBudgetError",
+    "QueryEstimate",
+    "analyze_query",
+    "explain_query",
+    "find_unconstrained_governors",
+    "parse_query_plan",
+]
+
+import re
+import threading
+import typing
+
+import lsst.daf.butler
+
+from .profiling import EXPLAINABLE_PREFIXES, explain_statement
+from .query_cost import estimate_query_cost
+from .sql_hooks import StatementHook, hook_statements
+
+if typing.TYPE_CHECKING:
+    import sqlalchemy
+
+# Estimated cost and rows of the top node of a PostgreSQL query plan,
+# e.g. "Hash Join  (cost=1.09..2.22 rows=3 width=40)".
+_POSTGRES_COST_RE = re.compile(r"cost=[\d.]+\.\.([\d.]+) rows=(\d+)")
+
+# A full scan of a table in a PostgreSQL or SQLite query plan,
+# e.g. "Seq Scan on exposure" or "SCAN exposure".
+_FULL_SCAN_RE = re.compile(r"(?:Seq Scan on |\bSCAN (?:TABLE )?)(\w+)")
+
+# Words that follow "SCAN" in SQLite query plans but are not tables.
+_NOT_TABLES = frozenset(("CONSTANT", "SUBQUERY"))
+
+
+class QueryEstimate(typing.NamedTuple):
+    """The estimated cost of a registry query."""
+
+    cost: float
+    """Rough relative cost; see `butlerservice.query_cost.estimate_query_cost`.
+    """
+
+    num_dimensions: int
+    """The number of dimensions the query spans, including implied ones."""
+
+    num_dataset_types: int
+    """The number of dataset types that constrain the query,
+    after expanding regular expressions.
+    """
+
+    num_collections: int
+    """The number of collections searched for datasets,
+    after expanding regular expressions and chains.
+    """
+
+    unconstrained_governors: typing.Tuple[str, ...]
+    """Governor dimensions (e.g. "instrument") that the query spans
+    but does not constrain, so it spans all their values.
+    """
+
+    plan_cost: typing.Optional[float] = None
+    """The database's estimate of the cost of the query,
+    in its own units, if known (PostgreSQL only).
+    """
+
+    plan_rows: typing.Optional[float] = None
+    """The database's estimate of the number of rows,
+    if known (PostgreSQL only).
+    """
+
+    full_scans: typing.Tuple[str, ...] = ()
+    """Tables that the database reads in full, according to the query plan.
+    """
+
+
+class _StatementExplained(Exception):
+    """Raised to stop a query once its SQL statement has been explained."""
+
+
+class _ExplainHook(StatementHook):
+    """Explain the first query statement, then stop it."""
+
+    def __init__(self) -> None:
+        self.plan: typing.Optional[typing.List[str]] = None
+
+    def before_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        if executemany or (
+            statement.lstrip()[:6].upper() not in EXPLAINABLE_PREFIXES
+        ):
+            return
+        self.plan = explain_statement(conn, statement, parameters)
+        raise _StatementExplained()
+
+
+def explain_query(
+    results: typing.Iterable[typing.Any],
+) -> typing.Optional[typing.List[str]]:
+    """Get the query plan of a lazy registry query, without running it.
+
+    The first query statement executed while iterating over ``results``
+    is explained, and then stopped before it is executed.
+    Call this in a registry thread.
+
+    Parameters
+    ----------
+    results
+        The (not yet iterated) results of a registry query method,
+        such as `lsst.daf.butler.Registry.queryDataIds`.
+
+    Returns
+    -------
+    plan
+        The query plan as lines of text; see
+        `butlerservice.profiling.explain_statement`.
+        None if the query does not need to run a statement
+        (e.g. because it is known to return no rows).
+    """
+    hook = _ExplainHook()
+    with hook_statements("query_analyzer", hook):
+        try:
+            for _ in results:
+                break
+        except _StatementExplained:
+            pass
+    return hook.plan
+
+
+def parse_query_plan(
+    plan: typing.Optional[typing.Sequence[str]],
+) -> typing.Tuple[
+    typing.Optional[float], typing.Optional[float], typing.Tuple[str, ...]
+]:
+    """Extract estimates from a query plan; see `explain_query`.
+
+    Returns
+    -------
+    plan_cost
+        The estimated total cost of the query, if known.
+    plan_rows
+        The estimated number of rows, if known.
+    full_scans
+        The names of tables that are read in full, sorted.
+    """
+    if not plan:
+        return None, None, ()
+    plan_cost = plan_rows = None
+    match = _POSTGRES_COST_RE.search(plan[0])
+    if match is not None:
+        plan_cost = float(match[1])
+        plan_rows = float(match[2])
+    full_scans = {
+        match[1]
+        for match in (_FULL_SCAN_RE.search(line) for line in plan)
+        if match is not None and match[1] not in _NOT_TABLES
+    }
+    return plan_cost, plan_rows, tuple(sorted(full_scans))
+
+
+def find_unconstrained_governors(
+    universe: lsst.daf.butler.DimensionUniverse,
+    dimensions: typing.Iterable[str],
+    dataid: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+    where: typing.Optional[str] = None,
+    kwargs: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+) -> typing.Tuple[str, ...]:
+    """Find the governor dimensions (e.g. "instrument") that a query spans
+    but does not constrain by data ID or ``where`` expression.
+
+    A query that only spans governor dimensions is cheap,
+    so it has no unconstrained governors.
+
+    Raises
+    ------
+    LookupError
+        If a dimension is not known.
+    """
+    graph = universe.extract(dimensions)
+    governor_names = set(graph.governors.names)
+    if not set(graph.dimensions.names) - governor_names:
+        return ()
+    constrained = set(dataid or ()) | set(kwargs or ())
+    return tuple(
+        name
+        for name in sorted(governor_names)
+        if name not in constrained
+        and not (where and re.search(rf"\b{name}\b", where))
+    )
+
+
+def analyze_query(
+    registry: lsst.daf.butler.Registry,
+    results: typing.Optional[typing.Iterable[typing.Any]],
+    dimensions: typing.Iterable[str] = (),
+    element: typing.Optional[str] = None,
+    dataid: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+    datasets: typing.Any = None,
+    collections: typing.Any = None,
+    where: typing.Optional[str] = None,
+    kwargs: typing.Optional[typing.Mapping[str, typing.Any]] = None,
+) -> QueryEstimate:
+    """Estimate the cost of a registry query, without running it.
+
+    Call this in a registry thread: dataset type and collection
+    expressions are expanded, and the query is explained, using
+    the registry. Each of these is a cheap query.
+
+    Parameters
+    ----------
+    registry
+        Butler registry.
+    results
+        The (not yet iterated) results of the query, to explain;
+        see `explain_query`. If None then do not explain the query.
+    dimensions
+        Names of the dimensions of the query.
+    element
+        Name of the dimension element whose records are queried, if any.
+    dataid, datasets, collections, where, kwargs
+        Arguments of the query.
+    """
+    universe = registry.dimensions
+    names = set(dimensions)
+    if element is not None:
+        names.update(universe[element].required.names)
+    num_dimensions = len(universe.extract(names).dimensions)
+    unconstrained_governors = find_unconstrained_governors(
+        universe, names, dataid=dataid, where=where, kwargs=kwargs
+    )
+    num_dataset_types = num_collections = 0
+    if datasets:
+        # Invalid expressions make the query itself fail,
+        # with a better message.
+        try:
+            num_dataset_types = len(list(registry.queryDatasetTypes(datasets)))
+        except Exception:
+            num_dataset_types = len(datasets)
+        if collections:
+            try:
+                num_collections = len(
+                    list(
+                        registry.queryCollections(
+                            collections, flattenChains=True
+                        )
+                    )
+                )
+            except Exception:
+                num_collections = len(collections)
+    plan_cost, plan_rows, full_scans = parse_query_plan(
+        None if results is None else explain_query(results)
+    )
+    return QueryEstimate(
+        cost=estimate_query_cost(
+            universe,
+            dimensions=names,
+            datasets=datasets,
+            where=where,
+            num_dataset_types=num_dataset_types,
+            num_collections=num_collections,
+            num_unconstrained_governors=len(unconstrained_governors),
+        ),
+        num_dimensions=num_dimensions,
+        num_dataset_types=num_dataset_types,
+        num_collections=num_collections,
+        unconstrained_governors=unconstrained_governors,
+        plan_cost=plan_cost,
+        plan_rows=plan_rows,
+        full_scans=full_scans,
+    )
+
+
+class QueryBudgetError(RuntimeError):
+    """A query is estimated to exceed the query budget."""
+
+
+class QueryBudget:
+    """Limits on the estimated cost of registry queries,
+    checked before they are run.
+
+    Parameters
+    ----------
+    max_cost
+        The maximum `QueryEstimate.cost`. 0 for no limit.
+    max_plan_cost
+        The maximum `QueryEstimate.plan_cost`. 0 for no limit.
+    max_unpaginated_rows
+        The maximum `QueryEstimate.plan_rows` of a query that is not
+        paginated. Larger queries must be paginated. 0 for no limit.
+
+    Notes
+    -----
+    The database estimates are only available for PostgreSQL;
+    ``max_plan_cost`` and ``max_unpaginated_rows`` are not enforced
+    for other databases.
+    """
+
+    def __init__(
+        self,
+        max_cost: float = 0,
+        max_plan_cost: float = 0,
+        max_unpaginated_rows: float = 0,
+    ) -> None:
+        self.max_cost = max_cost
+        self.max_plan_cost = max_plan_cost
+        self.max_unpaginated_rows = max_unpaginated_rows
+        self.num_checked = 0
+        self.num_rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Are there any limits?"""
+        return self.max_cost > 0 or self.explain
+
+    @property
+    def explain(self) -> bool:
+        """Do the limits need the database's estimates?"""
+        return self.max_plan_cost > 0 or self.max_unpaginated_rows > 0
+
+    def get_violation(
+        self, estimate: QueryEstimate, paginated: bool
+    ) -> typing.Optional[str]:
+        """Return the reason why a query exceeds the budget,
+        or None if it does not.
+
+        Parameters
+        ----------
+        estimate
+            The estimated cost of the query.
+        paginated
+            Does the query return one page of results?
+        """
+        reason = None
+        if self.max_cost > 0 and estimate.cost > self.max_cost:
+            reason = (
+                f"Estimated query cost {estimate.cost:g} "
+                f"exceeds the limit of {self.max_cost:g}"
+            )
+        elif (
+            self.max_plan_cost > 0
+            and estimate.plan_cost is not None
+            and estimate.plan_cost > self.max_plan_cost
+        ):
+            reason = (
+                f"Estimated database cost {estimate.plan_cost:g} "
+                f"exceeds the limit of {self.max_plan_cost:g}"
+            )
+        elif (
+            not paginated
+            and self.max_unpaginated_rows > 0
+            and estimate.plan_rows is not None
+            and estimate.plan_rows > self.max_unpaginated_rows
+        ):
+            reason = (
+                f"Estimated {estimate.plan_rows:g} rows exceeds the limit of "
+                f"{self.max_unpaginated_rows:g} for a query that is not "
+                "paginated; use a _connection field "
+                "or a streaming endpoint instead"
+            )
+        if reason is None:
+            return None
+        if estimate.unconstrained_governors:
+            reason += (
+                "; constrain "
+                + ", ".join(estimate.unconstrained_governors)
+                + " in dataid or where"
+            )
+        if estimate.num_collections > 1:
+            reason += (
+                f"; search fewer than {estimate.num_collections} collections"
+            )
+        return reason
+
+    def check(self, estimate: QueryEstimate, paginated: bool) -> None:
+        """Check that a query is within the budget.
+
+        Parameters
+        ----------
+        estimate
+            The estimated cost of the query.
+        paginated
+            Does the query return one page of results?
+
+        Raises
+        ------
+        QueryBudgetError
+            If the query exceeds the budget.
+        """
+        reason = self.get_violation(estimate, paginated=paginated)
+        with self._lock:
+            self.num_checked += 1
+            if reason is not None:
+                self.num_rejected += 1
+        if reason is not None:
+            raise QueryBudgetError(reason)
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the limits and the number of checked
+        and rejected queries, as a dict.
+        """
+        with self._lock:
+            return dict(
+                max_cost=self.max_cost,
+                max_plan_cost=self.max_plan_cost,
+                max_unpaginated_rows=self.max_unpaginated_rows,
+                num_checked=self.num_checked,
+                num_rejected=self.num_rejected,
+            )
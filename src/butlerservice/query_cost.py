@@ -0,0 +1,88 @@
+"""Estimates of the cost of registry queries."""
+
+from __future__ import annotations
+
+__all__ = ["estimate_query_cost"]
+
+import typing
+
+import lsst.daf.butler
+
+# Factor by which constraining a query by datasets multiplies its cost:
+# such queries join the dataset and collection tables.
+DATASET_COST_FACTOR = 4.0
+
+# Cost added by a ``where`` expression.
+WHERE_COST = 1.0
+
+# Factor by which each governor dimension (e.g. instrument) that a query
+# spans but does not constrain multiplies its cost.
+UNCONSTRAINED_GOVERNOR_FACTOR = 4.0
+
+
+def estimate_query_cost(
+    universe: lsst.daf.butler.DimensionUniverse,
+    dimensions: typing.Iterable[str] = (),
+    element: typing.Optional[str] = None,
+    datasets: typing.Any = None,
+    where: typing.Optional[str] = None,
+    num_queries: int = 1,
+    num_dataset_types: int = 1,
+    num_collections: int = 1,
+    num_unconstrained_governors: int = 0,
+) -> float:
+    """Estimate the relative cost of a registry query, without running it.
+
+    This is a cheap, rough estimate, used to let cheap queries run before
+    expensive ones: the number of dimensions the query spans
+    (including implied dimensions), multiplied by `DATASET_COST_FACTOR`
+    and the numbers of dataset types and collections if the query is
+    constrained by datasets, plus `WHERE_COST` if it has a ``where``
+    expression, multiplied by `UNCONSTRAINED_GOVERNOR_FACTOR` for each
+    unconstrained governor dimension. A lookup of one dimension costs 1.
+
+    The numbers of dataset types, collections and unconstrained governors
+    are only known after expanding the query's expressions in a registry
+    thread; see `butlerservice.query_analyzer.analyze_query`.
+
+    Parameters
+    ----------
+    universe
+        Dimension universe.
+    dimensions
+        Names of the dimensions of the query.
+    element
+        Name of the dimension element whose records are queried, if any.
+    datasets
+        The ``datasets`` argument of the query.
+    where
+        The ``where`` argument of the query.
+    num_queries
+        The number of such registry queries.
+    num_dataset_types
+        The number of dataset types, if known.
+    num_collections
+        The number of collections searched for datasets, if known.
+    num_unconstrained_governors
+        The number of governor dimensions that the query spans
+        but does not constrain, if known.
+    """
+    names = set(dimensions)
+    try:
+        if element is not None:
+            names.update(universe[element].required.names)
+        num_dimensions = len(universe.extract(names).dimensions)
+    except Exception:
+        # Unknown names; the query will fail quickly.
+        num_dimensions = 1
+    cost = float(max(num_dimensions, 1))
+    if datasets:
+        cost *= (
+            DATASET_COST_FACTOR
+            * max(num_dataset_types, 1)
+            * max(num_collections, 1)
+        )
+    if where:
+        cost += WHERE_COST
+    cost *= UNCONSTRAINED_GOVERNOR_FACTOR**num_unconstrained_governors
+    return cost * num_queries
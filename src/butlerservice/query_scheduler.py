@@ -0,0 +1,219 @@
+"""Fair scheduling of registry queries across clients."""
+
+from __future__ import annotations
+
+__all__ = ["QueryScheduler", "RegistryBusyError", "parse_client_weights"]
+
+import asyncio
+import dataclasses
+import heapq
+import itertools
+import typing
+
+
+class RegistryBusyError(RuntimeError):
+    """The registry executor has no room for another query."""
+
+
+def parse_client_weights(value: str) -> typing.Dict[str, float]:
+    """Parse client weights from a string of comma-separated
+    ``<client>=<weight>`` items, e.g. "user:alice=2,ip:10.0.0.5=0.5".
+
+    Raises
+    ------
+    ValueError
+        If the string cannot be parsed or a weight is not positive.
+    """
+    weights = dict()
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        client, sep, weight_str = item.rpartition("=")
+        if not sep or not client.strip():
+            raise ValueError(
+                f"Client weight {item!r} is not <client>=<weight>"
+            )
+        weight = float(weight_str)
+        if not weight > 0:
+            raise ValueError(f"Client weight {item!r} must be positive")
+        weights[client.strip()] = weight
+    return weights
+
+
+@dataclasses.dataclass
+class _ClientState:
+    """The queries of one client."""
+
+    weight: float
+    num_running: int = 0
+    # Heap of waiting queries: (cost, sequence number, future).
+    waiting: typing.List[typing.Tuple[float, int, asyncio.Future]] = (
+        dataclasses.field(default_factory=list)
+    )
+    # Virtual finish time of the client's last dispatched query.
+    last_finish: float = 0.0
+
+
+class QueryScheduler:
+    """Decide which waiting registry query runs next.
+
+    Queries are dispatched with weighted fair queuing across clients
+    (start-time fair queuing): each client's queries are charged
+    their cost divided by the client's weight, and the client whose next
+    query would finish first in this virtual time goes next, so a client
+    that sends many or expensive queries cannot starve the others.
+    Each client's own queries run cheapest first.
+    Optionally the number of queries each client may run at once is capped.
+
+    Parameters
+    ----------
+    max_running
+        The maximum number of queries running at once
+        (the number of registry threads).
+    max_queued
+        The maximum number of queries that may wait.
+    max_per_client
+        The maximum number of queries one client may run at once;
+        0 for no limit.
+    weights
+        Dict of client: weight. The default weight is 1.
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+    """
+
+    def __init__(
+        self,
+        max_running: int,
+        max_queued: int,
+        max_per_client: int = 0,
+        weights: typing.Optional[typing.Mapping[str, float]] = None,
+    ) -> None:
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self.weights = dict(weights or {})
+        self.num_running = 0
+        self.num_waiting = 0
+        self._clients: typing.Dict[str, _ClientState] = dict()
+        self._virtual_time = 0.0
+        self._counter = itertools.count()
+
+    async def acquire(self, client: str, cost: float = 1.0) -> None:
+        """Wait until a query may run. Call `release` when it is done.
+
+        Parameters
+        ----------
+        client
+            Identity of the client that sent the query.
+        cost
+            Estimated relative cost of the query (positive).
+
+        Raises
+        ------
+        RegistryBusyError
+            If the query would have to wait and the queue is full.
+        """
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _ClientState(
+                weight=self.weights.get(client, 1.0)
+            )
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(state.waiting, (cost, next(self._counter), future))
+        self.num_waiting += 1
+        self._dispatch()
+        if future.done():
+            return
+        if self.num_waiting > self.max_queued:
+            self._abandon(client, future)
+            raise RegistryBusyError(
+                f"Server busy: {self.num_waiting} registry queries are "
+                "already waiting; please try again later"
+            )
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._abandon(client, future)
+            else:
+                # Dispatched just as the caller was cancelled.
+                self.release(client)
+            raise
+
+    def release(self, client: str) -> None:
+        """Report that a query dispatched by `acquire` is done."""
+        state = self._clients[client]
+        state.num_running -= 1
+        self.num_running -= 1
+        self._forget_if_idle(client)
+        self._dispatch()
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the current state of the scheduler as a dict."""
+        return dict(
+            max_per_client=self.max_per_client,
+            num_clients=len(self._clients),
+            clients={
+                client: dict(
+                    num_running=state.num_running,
+                    num_waiting=len(state.waiting),
+                    weight=state.weight,
+                )
+                for client, state in self._clients.items()
+            },
+        )
+
+    def _abandon(self, client: str, future: asyncio.Future) -> None:
+        """Remove a query that is no longer waiting."""
+        future.cancel()
+        state = self._clients[client]
+        state.waiting = [
+            item for item in state.waiting if item[2] is not future
+        ]
+        heapq.heapify(state.waiting)
+        self.num_waiting -= 1
+        self._forget_if_idle(client)
+
+    def _forget_if_idle(self, client: str) -> None:
+        """Forget a client that has no running or waiting queries.
+
+        An idle client keeps no credit: when it returns its queries
+        start at the current virtual time.
+        """
+        state = self._clients[client]
+        if state.num_running == 0 and not state.waiting:
+            del self._clients[client]
+
+    def _dispatch(self) -> None:
+        """Start waiting queries, while there are free threads."""
+        while self.num_running < self.max_running and self.num_waiting > 0:
+            best_client = None
+            best_start = best_finish = 0.0
+            for client, state in self._clients.items():
+                if not state.waiting or (
+                    self.max_per_client > 0
+                    and state.num_running >= self.max_per_client
+                ):
+                    continue
+                start = max(self._virtual_time, state.last_finish)
+                finish = start + state.waiting[0][0] / state.weight
+                if best_client is None or finish < best_finish:
+                    best_client, best_start, best_finish = (
+                        client,
+                        start,
+                        finish,
+                    )
+            if best_client is None:
+                # Every waiting client is at its limit.
+                return
+            state = self._clients[best_client]
+            future = heapq.heappop(state.waiting)[2]
+            state.last_finish = best_finish
+            state.num_running += 1
+            self._virtual_time = max(self._virtual_time, best_start)
+            self.num_running += 1
+            self.num_waiting -= 1
+            future.set_result(None)
@@ -0,0 +1,117 @@
+"""Fast json encoding of dimension records."""
+
+from __future__ import annotations
+
+__all__ = ["RecordEncoder", "dumps", "dumps_lines", "get_record_encoder"]
+
+import functools
+import json
+import typing
+
+import lsst.daf.butler
+import lsst.sphgeom
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(value: typing.Any) -> str:
+    # Match the output of orjson.
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _orjson_dumps(value: typing.Any) -> str:
+    return orjson.dumps(value).decode()
+
+
+dumps: typing.Callable[[typing.Any], str] = (
+    _json_dumps if orjson is None else _orjson_dumps
+)
+"""Encode a value as json, using orjson if available (it is much faster).
+
+The output is the same either way: compact, without spaces.
+Install orjson with the ``orjson`` extra: ``butlerservice[orjson]``.
+"""
+
+
+def dumps_lines(values: typing.Iterable[typing.Any]) -> bytes:
+    """Encode values as newline-delimited json, using orjson if available."""
+    if orjson is not None:
+        option = orjson.OPT_APPEND_NEWLINE
+        return b"".join(orjson.dumps(value, option=option) for value in values)
+    return "".join(_json_dumps(value) + "\n" for value in values).encode()
+
+
+def _encode_timespan(
+    value: typing.Optional[lsst.daf.butler.Timespan],
+) -> typing.Optional[typing.Tuple[typing.Optional[str], ...]]:
+    if value is None:
+        return None
+    return (
+        None if value.begin is None else value.begin.isot,
+        None if value.end is None else value.end.isot,
+    )
+
+
+def _encode_region(
+    value: typing.Optional[lsst.sphgeom.Region],
+) -> typing.Optional[str]:
+    if value is None:
+        return None
+    return value.encode().hex()
+
+
+class RecordEncoder:
+    """Encode records of one dimension element as json.
+
+    The encoder determines, once, which fields need converting
+    (timespans and regions) so encoding a record does not need
+    to check the type of each value.
+
+    Parameters
+    ----------
+    element
+        The dimension element whose records are encoded.
+
+    Notes
+    -----
+    Timespans are encoded as ``(begin time, end time)``,
+    where both times are TAI ISO strings (or None if unbounded).
+    Regions are encoded as `lsst.sphgeom.Region.encode` as a hex string.
+    """
+
+    def __init__(self, element: lsst.daf.butler.DimensionElement) -> None:
+        self.element = element
+        # Fields whose values are plain old data.
+        self.plain_names = list(element.RecordClass.fields.standard.names)
+        # Fields whose values must be converted: (name, converter).
+        self.converted_fields: typing.List[
+            typing.Tuple[str, typing.Callable[[typing.Any], typing.Any]]
+        ] = []
+        if element.temporal is not None:
+            self.converted_fields.append(("timespan", _encode_timespan))
+        if element.spatial is not None:
+            self.converted_fields.append(("region", _encode_region))
+
+    def to_dict(self, record: lsst.daf.butler.DimensionRecord) -> dict:
+        """Convert a record to a dict of plain old data."""
+        record_dict = {
+            name: getattr(record, name) for name in self.plain_names
+        }
+        for name, converter in self.converted_fields:
+            record_dict[name] = converter(getattr(record, name))
+        return record_dict
+
+    def encode(self, record: lsst.daf.butler.DimensionRecord) -> str:
+        """Encode one record as a json string."""
+        return dumps(self.to_dict(record))
+
+
+@functools.lru_cache(maxsize=None)
+def get_record_encoder(
+    element: lsst.daf.butler.DimensionElement,
+) -> RecordEncoder:
+    """Get the (cached) record encoder for a dimension element."""
+    return RecordEncoder(element)
@@ -0,0 +1,326 @@
+"""In-memory snapshot of the records of small dimension elements."""
+
+from __future__ import annotations
+
+__all__ = [
+    "RecordSnapshot",
+    "load_element_records",
+    "refresh_record_snapshot",
+    "run_snapshot_refresher",
+]
+
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+import typing
+
+import lsst.daf.butler
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+
+
+def load_element_records(
+    registry: lsst.daf.butler.Registry, element_names: typing.Iterable[str]
+) -> typing.Dict[str, typing.List[lsst.daf.butler.DimensionRecord]]:
+    """Load all records of the specified dimension elements.
+
+    Returns
+    -------
+    records
+        Dict of element name: list of records,
+        sorted by the values of the element's required dimensions.
+    """
+    records = {}
+    for element_name in element_names:
+        element = registry.dimensions[element_name]
+        names = element.required.names
+        records[element_name] = sorted(
+            registry.queryDimensionRecords(element_name),
+            key=lambda record: tuple(record.dataId[name] for name in names),
+        )
+    return records
+
+
+class _ElementSnapshot:
+    """The records of one dimension element, and converted forms of them.
+
+    Parameters
+    ----------
+    element
+        Dimension element.
+    records
+        All records of the element, sorted by data ID.
+    """
+
+    def __init__(
+        self,
+        element: lsst.daf.butler.DimensionElement,
+        records: typing.List[lsst.daf.butler.DimensionRecord],
+    ) -> None:
+        self.element = element
+        self.records = records
+        self.field_names = set(element.RecordClass.fields.names)
+        # Dict of convert_row function: list of converted records.
+        self._converted: typing.Dict[typing.Callable, typing.List] = dict()
+
+    def get_field_name(self, key: str) -> typing.Optional[str]:
+        """Get the name of the record field that holds the value
+        of a data ID key, or None if there is no such field.
+        """
+        if key == self.element.name:
+            primary_key = getattr(self.element, "primaryKey", None)
+            return None if primary_key is None else primary_key.name
+        return key if key in self.field_names else None
+
+    def is_complete(self, dataid: typing.Mapping[str, typing.Any]) -> bool:
+        """Return True if the data ID includes the required dimensions
+        of each dimension it has a value for, as the registry requires.
+        """
+        universe = self.element.universe
+        dimension_names = universe.getStaticDimensions().names
+        return all(
+            name in dataid
+            for key in dataid
+            if key in dimension_names
+            for name in universe[key].required.names
+        )
+
+    def get_converted(self, convert_row: typing.Callable) -> typing.List:
+        """Get all records converted by ``convert_row``.
+
+        The converted records are computed once and reused.
+        """
+        converted = self._converted.get(convert_row)
+        if converted is None:
+            converted = [convert_row(record) for record in self.records]
+            self._converted[convert_row] = converted
+        return converted
+
+
+class RecordSnapshot:
+    """An in-memory snapshot of all records of a few dimension elements
+    that are small and rarely change, such as instrument and detector.
+
+    Queries for the records of these elements that only have
+    simple equality data ID constraints are answered from the snapshot,
+    without a registry query.
+
+    Parameters
+    ----------
+    element_names
+        Names of the dimension elements to hold.
+        If empty then the snapshot is disabled.
+    refresh_interval
+        The interval at which the snapshot should be reloaded (sec).
+        0 to only load it on demand. The owner is responsible
+        for calling `set_records` at this interval.
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+    Load records in a worker thread with `load_element_records`,
+    then call `set_records` from the event loop thread.
+
+    Each `clear` starts a new `generation`; records loaded before
+    a clear are dropped by `set_records`.
+    """
+
+    def __init__(
+        self, element_names: typing.Iterable[str], refresh_interval: float
+    ) -> None:
+        self.element_names = tuple(element_names)
+        self.refresh_interval = refresh_interval
+        self.num_hits = 0
+        self.num_refreshes = 0
+        self.load_time: typing.Optional[float] = None
+        self.generation = 0
+        self._elements: typing.Dict[str, _ElementSnapshot] = dict()
+
+    @property
+    def enabled(self) -> bool:
+        """Does the snapshot hold any elements?"""
+        return bool(self.element_names)
+
+    def set_records(
+        self,
+        universe: lsst.daf.butler.DimensionUniverse,
+        records: typing.Dict[
+            str, typing.List[lsst.daf.butler.DimensionRecord]
+        ],
+        generation: typing.Optional[int] = None,
+    ) -> None:
+        """Replace the snapshot with new records.
+
+        Parameters
+        ----------
+        universe
+            Dimension universe.
+        records
+            Dict of element name: records, as returned by
+            `load_element_records`.
+        generation
+            The `generation` when the records started loading.
+            If specified and older than the current generation
+            (the snapshot was cleared while they loaded),
+            the records are ignored.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._elements = {
+            element_name: _ElementSnapshot(
+                element=universe[element_name], records=element_records
+            )
+            for element_name, element_records in records.items()
+        }
+        self.load_time = time.time()
+        self.num_refreshes += 1
+
+    def clear(self) -> None:
+        """Remove all records and start a new generation,
+        e.g. because the registry changed.
+
+        Queries are answered by the registry until new records are set.
+        """
+        self._elements = dict()
+        self.generation += 1
+
+    def query(
+        self,
+        element: str,
+        dataid: typing.Optional[typing.Mapping[str, typing.Any]],
+        convert_row: typing.Callable[[typing.Any], typing.Any],
+        convert_results: typing.Optional[typing.Callable] = None,
+        limit: typing.Optional[int] = None,
+        offset: int = 0,
+    ) -> typing.Optional[typing.Any]:
+        """Query records from the snapshot, if possible.
+
+        Parameters
+        ----------
+        element
+            Name of the dimension element.
+        dataid
+            Data ID constraints: a dict of dimension or field name: value.
+        convert_row
+            Function that converts one record to the returned form.
+        convert_results
+            Function that converts all the results at once; if specified
+            then ``convert_row`` is ignored. It is called with two
+            arguments: the dimension element and a list of the records.
+        limit
+            Maximum number of rows to return. If None, return all rows.
+        offset
+            Number of rows to skip. Ignored unless ``limit`` is specified.
+
+        Returns
+        -------
+        record_list
+            Records that match ``dataid``, sorted by data ID and converted
+            as specified, in the same form as
+            `~butlerservice.resolvers.simple_query_dimension_records
+            .query_dimension_records` returns them.
+            None if the query cannot be answered from the snapshot,
+            because the element is not in the snapshot,
+            or the data ID is incomplete, or it has a key that is not
+            a field of the records or a value whose type does not match
+            the field.
+        """
+        element_snapshot = self._elements.get(element)
+        if element_snapshot is None:
+            return None
+        dataid = dataid or {}
+        if not element_snapshot.is_complete(dataid):
+            # Let the registry reject the data ID.
+            return None
+        records = element_snapshot.records
+        indices: typing.Iterable[int] = range(len(records))
+        for key, value in dataid.items():
+            field_name = element_snapshot.get_field_name(key)
+            if field_name is None:
+                return None
+            if records and type(getattr(records[0], field_name)) is not type(
+                value
+            ):
+                # Let the registry convert or reject the value.
+                return None
+            indices = [
+                i for i in indices if getattr(records[i], field_name) == value
+            ]
+        indices = list(indices)
+        if limit is not None:
+            indices = indices[offset : offset + limit]
+        self.num_hits += 1
+        if convert_results is not None:
+            return convert_results(
+                element_snapshot.element, [records[i] for i in indices]
+            )
+        converted = element_snapshot.get_converted(convert_row)
+        return [converted[i] for i in indices]
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the current state of the snapshot as a dict."""
+        return dict(
+            elements={
+                element_name: len(element_snapshot.records)
+                for element_name, element_snapshot in self._elements.items()
+            },
+            refresh_interval=self.refresh_interval,
+            load_time=self.load_time,
+            num_hits=self.num_hits,
+            num_refreshes=self.num_refreshes,
+        )
+
+
+async def refresh_record_snapshot(app: aiohttp.web.Application) -> None:
+    """Reload the record snapshot of an application from the registry.
+
+    The records are loaded in the registry executor.
+    """
+    snapshot = app["butlerservice/record_snapshot"]
+    if not snapshot.enabled:
+        return
+    generation = snapshot.generation
+    query_func = functools.partial(
+        app["butlerservice/registry_pool"].call,
+        load_element_records,
+        element_names=snapshot.element_names,
+    )
+    records = await app["butlerservice/executor"].run(query_func)
+    snapshot.set_records(
+        universe=app["butlerservice/butler"].registry.dimensions,
+        records=records,
+        generation=generation,
+    )
+
+
+async def run_snapshot_refresher(
+    app: aiohttp.web.Application,
+) -> typing.AsyncIterator[None]:
+    """Periodically refresh the record snapshot of an application,
+    while the application is running.
+
+    For use in ``app.cleanup_ctx``.
+    """
+    snapshot = app["butlerservice/record_snapshot"]
+
+    async def refresh_periodically() -> None:
+        log = logging.getLogger("butlerservice")
+        while True:
+            await asyncio.sleep(snapshot.refresh_interval)
+            try:
+                await refresh_record_snapshot(app)
+            except Exception as e:
+                # Keep serving the old snapshot.
+                log.warning(f"Could not refresh the record snapshot: {e}")
+
+    task = None
+    if snapshot.enabled and snapshot.refresh_interval > 0:
+        task = asyncio.ensure_future(refresh_periodically())
+    yield
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
@@ -0,0 +1,217 @@
+"""Thread pool used to run registry queries."""
+
+from __future__ import annotations
+
+__all__ = ["RegistryBusyError", "RegistryExecutor"]
+
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+import typing
+
+from .client_identity import get_current_client
+from .deadline import (
+    QueryCanceller,
+    get_deadline,
+    make_timeout_error,
+    run_cancellable,
+)
+from .metrics import record_phase
+from .profiling import run_profiled
+from .query_scheduler import QueryScheduler, RegistryBusyError
+
+T = typing.TypeVar("T")
+
+
+class RegistryExecutor:
+    """A dedicated, bounded thread pool for registry queries.
+
+    Parameters
+    ----------
+    max_workers
+        The number of threads that run registry queries.
+    max_queued
+        The maximum number of queries that may wait for a free thread.
+        A query submitted when this many queries are already waiting
+        is rejected with `RegistryBusyError`, so excess load is shed
+        quickly instead of piling up.
+    max_per_client
+        The maximum number of queries one client may run at once;
+        0 for no limit.
+    client_weights
+        Dict of client: weight, for fair queuing. The default weight is 1.
+
+    Notes
+    -----
+    Use a dedicated pool, rather than the event loop's default executor,
+    so that registry queries do not compete with other blocking work
+    and so that the pool's load can be monitored.
+    `num_queued` and `num_active` are intended for monitoring
+    (e.g. autoscaling).
+
+    Waiting queries are not queued in the thread pool, which runs them
+    in order of arrival; instead `scheduler` decides which runs next,
+    sharing the threads fairly among clients.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queued: int,
+        max_per_client: int = 0,
+        client_weights: typing.Optional[typing.Mapping[str, float]] = None,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError(f"max_workers={max_workers} must be positive")
+        if max_queued < 0:
+            raise ValueError(f"max_queued={max_queued} must not be negative")
+        if max_per_client < 0:
+            raise ValueError(
+                f"max_per_client={max_per_client} must not be negative"
+            )
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.scheduler = QueryScheduler(
+            max_running=max_workers,
+            max_queued=max_queued,
+            max_per_client=max_per_client,
+            weights=client_weights,
+        )
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="registry"
+        )
+        # Number of queries being run by a worker thread.
+        self._num_active = 0
+        # Protect the counters, which are modified by worker threads.
+        self._lock = threading.Lock()
+
+    @property
+    def num_active(self) -> int:
+        """The number of queries being run by a worker thread."""
+        return self._num_active
+
+    @property
+    def num_queued(self) -> int:
+        """The number of queries waiting for a free worker thread."""
+        return self.scheduler.num_waiting
+
+    def get_status(self) -> typing.Dict[str, int]:
+        """Get the current state of the executor as a dict."""
+        return dict(
+            max_workers=self.max_workers,
+            max_queued=self.max_queued,
+            num_active=self.num_active,
+            num_queued=self.num_queued,
+        )
+
+    async def run(self, func: typing.Callable[[], T], cost: float = 1) -> T:
+        """Run a function in a worker thread and return the result.
+
+        Parameters
+        ----------
+        func
+            The function to run. It takes no arguments;
+            use `functools.partial` to bind arguments.
+        cost
+            Estimated relative cost of the query, for scheduling
+            (see `butlerservice.query_cost.estimate_query_cost`).
+            Cheaper queries run first.
+
+        Raises
+        ------
+        RegistryBusyError
+            If the queue of waiting queries is full.
+        QueryTimeoutError
+            If the query does not finish before the current deadline
+            (see `butlerservice.deadline.start_deadline`).
+
+        Notes
+        -----
+        If the deadline passes, or the caller is cancelled, before the
+        query finishes, the query is cancelled: a waiting query is not
+        run, and the SQL statement of a running query is interrupted,
+        so the query releases its thread and database connection.
+        """
+        deadline = get_deadline()
+        if deadline is not None and deadline <= time.monotonic():
+            raise make_timeout_error()
+        submit_time = time.perf_counter()
+        client = get_current_client()
+        if deadline is None:
+            await self.scheduler.acquire(client, cost)
+        else:
+            try:
+                await asyncio.wait_for(
+                    self.scheduler.acquire(client, cost),
+                    deadline - time.monotonic(),
+                )
+            except asyncio.TimeoutError:
+                raise make_timeout_error()
+        # Run func in a copy of the current context, so that it can
+        # record the time spent in each phase of the query;
+        # see `butlerservice.metrics.start_query_timer`.
+        context = contextvars.copy_context()
+        canceller = QueryCanceller()
+        future = self._executor.submit(
+            context.run,
+            self._run_counted,
+            func,
+            submit_time,
+            canceller,
+        )
+        # Free the query's slot when the query actually finishes,
+        # rather than when the caller stops waiting for it.
+        future.add_done_callback(
+            functools.partial(
+                self._release, loop=asyncio.get_running_loop(), client=client
+            )
+        )
+        if deadline is None:
+            timeout = None
+        else:
+            timeout = deadline - time.monotonic()
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            error = make_timeout_error()
+            canceller.cancel(error)
+            raise error
+        except asyncio.CancelledError:
+            canceller.cancel(RuntimeError("Query cancelled"))
+            raise
+
+    def shutdown(self) -> None:
+        """Shut down the thread pool, without waiting for queries."""
+        self._executor.shutdown(wait=False)
+
+    def _release(
+        self,
+        future: concurrent.futures.Future,
+        loop: asyncio.AbstractEventLoop,
+        client: str,
+    ) -> None:
+        # Called in the worker thread (or the event loop thread,
+        # if the query was cancelled before it started).
+        with contextlib.suppress(RuntimeError):  # The loop is closed.
+            loop.call_soon_threadsafe(self.scheduler.release, client)
+
+    def _run_counted(
+        self,
+        func: typing.Callable[[], T],
+        submit_time: float,
+        canceller: QueryCanceller,
+    ) -> T:
+        record_phase("queue_wait", time.perf_counter() - submit_time)
+        with self._lock:
+            self._num_active += 1
+        try:
+            return run_cancellable(
+                functools.partial(run_profiled, func), canceller
+            )
+        finally:
+            with self._lock:
+                self._num_active -= 1
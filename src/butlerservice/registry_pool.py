@@ -0,0 +1,199 @@
+"""Pool of butler registries for use by worker threads."""
+
+from __future__ import annotations
+
+__all__ = ["RegistryPool"]
+
+import contextlib
+import logging
+import threading
+import time
+import typing
+
+import lsst.daf.butler
+
+from .deadline import release_cancellable_connection
+
+T = typing.TypeVar("T")
+
+
+class _PoolEntry:
+    """A butler in the pool, and when it was last known to be healthy."""
+
+    def __init__(self, butler: lsst.daf.butler.Butler) -> None:
+        self.butler = butler
+        self.last_healthy = time.monotonic()
+
+
+class RegistryPool:
+    """A pool of butler registries, each with its own database connection.
+
+    Each worker thread checks out a registry for the duration of a query,
+    so concurrent queries do not share (and serialize on) one connection.
+    A thread is given the registry it used last, if that is available,
+    so with ``max_size`` at least as large as the number of worker threads
+    each thread effectively owns one registry.
+
+    Parameters
+    ----------
+    butler_uri
+        URI of the butler repository.
+    max_size
+        The maximum number of butlers to create.
+        If all have been created and all are in use,
+        a thread that wants a registry waits for one to be returned.
+    health_check_interval
+        A registry that has not been used successfully for this long (sec)
+        is checked before it is handed out, and replaced if it is broken.
+        A registry that was being used when an exception was raised
+        is checked when it is returned.
+    butler
+        A butler to add to the pool, if you have one.
+        Others are created lazily, as needed.
+    """
+
+    def __init__(
+        self,
+        butler_uri: str,
+        max_size: int,
+        health_check_interval: float,
+        butler: typing.Optional[lsst.daf.butler.Butler] = None,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError(f"max_size={max_size} must be positive")
+        self.butler_uri = butler_uri
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self.log = logging.getLogger("butlerservice")
+        self._condition = threading.Condition()
+        self._idle: typing.List[_PoolEntry] = []
+        self._num_created = 0
+        # The entry most recently used by each thread.
+        self._local = threading.local()
+        if butler is not None:
+            self._idle.append(_PoolEntry(butler))
+            self._num_created = 1
+
+    @property
+    def num_created(self) -> int:
+        """The number of butlers in the pool, whether idle or in use."""
+        return self._num_created
+
+    @property
+    def num_idle(self) -> int:
+        """The number of butlers available for use."""
+        return len(self._idle)
+
+    def get_status(self) -> typing.Dict[str, int]:
+        """Get the current state of the pool as a dict."""
+        return dict(
+            max_size=self.max_size,
+            num_created=self.num_created,
+            num_idle=self.num_idle,
+        )
+
+    @contextlib.contextmanager
+    def registry(self) -> typing.Iterator[lsst.daf.butler.Registry]:
+        """Context manager to check out a registry.
+
+        Blocks if the pool is exhausted, so only call this
+        from a worker thread, not from the event loop.
+        """
+        entry = self._acquire()
+        succeeded = False
+        try:
+            yield entry.butler.registry
+            succeeded = True
+        finally:
+            # A deadline that passes after this must not interrupt
+            # the next query to use the registry.
+            release_cancellable_connection()
+            self._release(entry, succeeded=succeeded)
+
+    def call(
+        self, func: typing.Callable[..., T], /, **kwargs: typing.Any
+    ) -> T:
+        """Call ``func(registry=registry, **kwargs)`` with a pooled registry.
+
+        Blocks if the pool is exhausted, so only call this
+        from a worker thread, not from the event loop.
+        """
+        with self.registry() as registry:
+            return func(registry=registry, **kwargs)
+
+    def _acquire(self) -> _PoolEntry:
+        """Get an idle entry, creating or waiting for one if necessary."""
+        while True:
+            with self._condition:
+                entry = self._pop_idle()
+                while entry is None and self._num_created >= self.max_size:
+                    self._condition.wait()
+                    entry = self._pop_idle()
+                if entry is None:
+                    # Reserve a slot for a new butler,
+                    # then create it without holding the lock.
+                    self._num_created += 1
+            if entry is None:
+                try:
+                    entry = _PoolEntry(
+                        lsst.daf.butler.Butler(
+                            self.butler_uri, writeable=False
+                        )
+                    )
+                except Exception:
+                    self._discard()
+                    raise
+            elif (
+                time.monotonic() - entry.last_healthy
+                > self.health_check_interval
+            ):
+                if not self._check_health(entry):
+                    self._discard()
+                    continue
+            self._local.entry = entry
+            return entry
+
+    def _pop_idle(self) -> typing.Optional[_PoolEntry]:
+        """Pop an idle entry, preferring the one last used by this thread.
+
+        Call with the condition lock held.
+        """
+        if not self._idle:
+            return None
+        preferred_entry = getattr(self._local, "entry", None)
+        if preferred_entry is not None:
+            for i, entry in enumerate(self._idle):
+                if entry is preferred_entry:
+                    return self._idle.pop(i)
+        return self._idle.pop()
+
+    def _release(self, entry: _PoolEntry, succeeded: bool) -> None:
+        """Return an entry to the pool, or discard it if it is broken."""
+        if succeeded:
+            entry.last_healthy = time.monotonic()
+        elif not self._check_health(entry):
+            self._discard()
+            return
+        with self._condition:
+            self._idle.append(entry)
+            self._condition.notify()
+
+    def _discard(self) -> None:
+        """Forget a broken (or never created) entry."""
+        with self._condition:
+            self._num_created -= 1
+            self._condition.notify()
+
+    def _check_health(self, entry: _PoolEntry) -> bool:
+        """Check that a registry can run a simple query.
+
+        Update ``entry.last_healthy`` and return True if so.
+        """
+        try:
+            records = entry.butler.registry.queryDimensionRecords("instrument")
+            next(iter(records), None)
+        except Exception as e:
+            self.log.warning(f"Discarding unhealthy registry: {e}")
+            return False
+        entry.last_healthy = time.monotonic()
+        return True
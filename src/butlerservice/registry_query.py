@@ -0,0 +1,133 @@
+"""Run registry queries on behalf of resolvers."""
+
+from __future__ import annotations
+
+__all__ = [
+    "UNCACHED_CONTEXT_KEY",
+    "cache_bypass_requested",
+    "run_registry_query",
+]
+
+import time
+import typing
+
+from .deadline import (
+    get_request_deadline,
+    get_request_timeout,
+    start_deadline,
+    wait_with_deadline,
+)
+
+# GraphQL context key: set to True if a query was not answered
+# from the result cache.
+UNCACHED_CONTEXT_KEY = "butlerservice/uncached"
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+def cache_bypass_requested(info: graphql.GraphQLResolveInfo) -> bool:
+    """Return True if the HTTP request asks not to use cached results.
+
+    That is the case if the request has a ``Cache-Control`` header
+    containing ``no-cache`` or ``no-store``.
+    """
+    context = info.context
+    request = context.get("request") if isinstance(context, dict) else None
+    if request is None:
+        return False
+    cache_control = request.headers.get("Cache-Control", "").lower()
+    return "no-cache" in cache_control or "no-store" in cache_control
+
+
+async def run_registry_query(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    cache_key: typing.Hashable,
+    query_func: typing.Callable[[], typing.List[dict]],
+    usecache: bool = True,
+    cost: float = 1,
+) -> typing.List[dict]:
+    """Run a registry query in the registry executor,
+    using the result cache if permitted.
+
+    If an identical query is already running then wait for its result,
+    rather than running the query again.
+    If the result is not found in the cache then set
+    `UNCACHED_CONTEXT_KEY` in the GraphQL context.
+
+    This request stops waiting for the query at its deadline;
+    see `butlerservice.deadline.get_request_deadline`. The query itself
+    is cancelled when no request waits for it, or at the server's
+    deadline (``config.query_timeout``).
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    cache_key
+        Key for the result cache: the normalized query arguments,
+        including the name of the GraphQL field;
+        see `butlerservice.utils.make_hashable`.
+    query_func
+        Function that runs the query and returns the result.
+        It takes no arguments and is called in a worker thread.
+    usecache
+        If False, or if the HTTP request has a ``Cache-Control``
+        header containing ``no-cache`` or ``no-store``,
+        run the query even if the result is cached.
+        The new result is cached in any case.
+    cost
+        Estimated relative cost of the query, for scheduling;
+        see `butlerservice.query_cost.estimate_query_cost`.
+
+    Returns
+    -------
+    result
+        The value returned by ``query_func``.
+
+    Raises
+    ------
+    QueryTimeoutError
+        If the query does not finish before the deadline.
+    """
+    context = info.context if isinstance(info.context, dict) else {}
+    result_cache = app["butlerservice/result_cache"]
+    read_cache = (
+        usecache and result_cache.enabled and not cache_bypass_requested(info)
+    )
+    if read_cache:
+        result = result_cache.get(cache_key)
+        if result is not None:
+            return result
+    context[UNCACHED_CONTEXT_KEY] = True
+    # If the cache is cleared (because the registry changed) while
+    # the query runs, the result may be out of date: do not cache it,
+    # nor share it with queries that start after the clear.
+    generation = result_cache.generation
+
+    async def execute_query() -> typing.List[dict]:
+        # The query is shared by every request that asks for it
+        # while it runs, so it gets the server's timeout, not the
+        # (possibly shorter) one of the request that started it.
+        timeout = get_request_timeout(None, app["safir/config"])
+        with start_deadline(
+            None if timeout is None else time.monotonic() + timeout,
+            replace=True,
+        ):
+            result = await app["butlerservice/executor"].run(query_func, cost)
+        result_cache.put(cache_key, result, generation=generation)
+        return result
+
+    deadline = get_request_deadline(context, app["safir/config"])
+    with start_deadline(deadline):
+        # Each request waits for the shared query until its own deadline;
+        # the query is cancelled when no request is waiting for it.
+        return await wait_with_deadline(
+            app["butlerservice/single_flight"].run(
+                (generation, cache_key), execute_query
+            )
+        )
@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+__all__ = [
+    "BatchQuery",
+    "batch_query_dimension_records",
+    "plan_batch_queries",
+    "plan_data_id_queries",
+    "query_batch",
+]
+
+import functools
+import json
+import operator
+import re
+import typing
+from collections import defaultdict
+
+import lsst.daf.butler
+
+from ..encoding_pool import EncodingPool, make_record_batch
+from ..metrics import time_phase
+from ..query_cost import estimate_query_cost
+from ..registry_query import run_registry_query
+from ..utils import (
+    StrOrRegexList,
+    combine_strs_and_regex,
+    load_json_arg,
+    make_hashable,
+)
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+# A where expression that can be folded into a batch query:
+# "identifier = bind_name", e.g. "exposure.seq_num = seq".
+EQUALITY_WHERE_RE = re.compile(
+    r"^\s*([A-Za-z_][\w.]*)\s*=\s*([A-Za-z_]\w*)\s*$"
+)
+
+# Name of the bind value for the list of values in an IN clause.
+IN_BIND_NAME = "batch_in"
+
+
+class BatchQuery(typing.NamedTuple):
+    """One registry query that answers one or more batch entries."""
+
+    dataid: typing.Optional[dict]
+    """Data ID constraints."""
+
+    where: typing.Optional[str]
+    """Where expression."""
+
+    bind: typing.Optional[dict]
+    """Bind values for the where expression."""
+
+    indices: typing.Tuple[int, ...]
+    """Indices of the entries answered by this query."""
+
+    split_key: typing.Optional[str] = None
+    """Identifier whose value determines the entry to which each
+    record belongs, or None if each entry gets all the records.
+    """
+
+    split_values: typing.Tuple[typing.Any, ...] = ()
+    """The value of ``split_key`` for each entry in ``indices``."""
+
+
+def _make_value_getter(
+    element: lsst.daf.butler.DimensionElement, key: str
+) -> typing.Optional[typing.Callable[[typing.Any], typing.Any]]:
+    """Make a function that returns the value of a data ID key
+    or where identifier from a record of the element.
+
+    Return None if the value is not available from the record.
+    """
+    field_names = element.RecordClass.fields.names
+    if "." in key:
+        element_name, field_name = key.split(".", 1)
+        if element_name == element.name and field_name in field_names:
+            return operator.attrgetter(field_name)
+        return None
+    if key in field_names:
+        return operator.attrgetter(key)
+    if key == element.name and hasattr(element, "primaryKey"):
+        return operator.attrgetter(element.primaryKey.name)
+    return None
+
+
+def _decode_json(name: str, index: int, value: typing.Optional[str]) -> dict:
+    """Decode a json-encoded dict argument of a batch entry."""
+    if value is None:
+        return {}
+    try:
+        decoded = load_json_arg(value)
+    except json.JSONDecodeError as e:
+        raise RuntimeError(f"Cannot decode entries[{index}].{name}: {e}")
+    if not isinstance(decoded, dict):
+        raise RuntimeError(f"entries[{index}].{name} must encode a dict")
+    return decoded
+
+
+def plan_batch_queries(
+    element: lsst.daf.butler.DimensionElement,
+    entries: typing.List[dict],
+) -> typing.List[BatchQuery]:
+    """Plan the registry queries that answer a batch of entries.
+
+    Each entry is a dict with optional items dataid and bind
+    (json-encoded dicts) and where (a string), as for
+    the simple_query_dimension_records field.
+
+    An entry is "foldable" if its where expression is empty
+    or a simple equality ``identifier = bind_name``, and the value
+    of each constrained key can be read from the records.
+    Foldable entries that constrain the same keys are folded into
+    as few queries as possible: all but one of the keys must match,
+    and the values of the remaining key are combined with IN.
+    Other entries are each run as a separate query.
+    """
+    queries: typing.List[BatchQuery] = []
+    # Dict of sorted constrained keys: list of (index, constraints).
+    foldable: typing.Dict[
+        typing.Tuple[str, ...], typing.List[typing.Tuple[int, dict]]
+    ] = defaultdict(list)
+    for index, entry in enumerate(entries):
+        dataid = _decode_json("dataid", index, entry.get("dataid"))
+        bind = _decode_json("bind", index, entry.get("bind"))
+        where = entry.get("where") or None
+        constraints = dict(dataid)
+        is_foldable = True
+        if where is not None:
+            match = EQUALITY_WHERE_RE.match(where)
+            if match is None or set(bind) != {match.group(2)}:
+                is_foldable = False
+            else:
+                constraints[match.group(1)] = bind[match.group(2)]
+        is_foldable = is_foldable and all(
+            isinstance(value, (str, int))
+            and _make_value_getter(element, key) is not None
+            for key, value in constraints.items()
+        )
+        if is_foldable:
+            foldable[tuple(sorted(constraints))].append((index, constraints))
+        else:
+            queries.append(
+                BatchQuery(
+                    dataid=dataid or None,
+                    where=where,
+                    bind=bind or None,
+                    indices=(index,),
+                )
+            )
+    queries += _plan_folded_queries(element, foldable)
+    return queries
+
+
+def plan_data_id_queries(
+    element: lsst.daf.butler.DimensionElement,
+    data_ids: typing.List[dict],
+) -> typing.List[BatchQuery]:
+    """Plan the registry queries that find the records
+    of the specified data IDs of one element.
+
+    Parameters
+    ----------
+    element
+        Dimension element.
+    data_ids
+        Data IDs, as dicts of dimension name: value. Each must have
+        a value for each required dimension of the element (only).
+
+    Returns
+    -------
+    queries
+        The queries; see `plan_batch_queries` for details.
+    """
+    keys = tuple(sorted(element.required.names))
+    return _plan_folded_queries(
+        element,
+        {
+            keys: [
+                (index, dict(data_id))
+                for index, data_id in enumerate(data_ids)
+            ]
+        },
+    )
+
+
+def _plan_folded_queries(
+    element: lsst.daf.butler.DimensionElement,
+    foldable: typing.Dict[
+        typing.Tuple[str, ...], typing.List[typing.Tuple[int, dict]]
+    ],
+) -> typing.List[BatchQuery]:
+    """Plan the queries for foldable entries.
+
+    Parameters
+    ----------
+    element
+        Dimension element.
+    foldable
+        Dict of sorted constrained keys: list of (index, constraints),
+        where constraints is a dict of key: value.
+    """
+    queries: typing.List[BatchQuery] = []
+    governor_names = element.universe.getGovernorDimensions().names
+    for keys, group in foldable.items():
+        distinct_values = {
+            key: {constraints[key] for _, constraints in group} for key in keys
+        }
+        # Use IN for the key with the most distinct values,
+        # and run one query for each combination of the other values.
+        # Governor dimensions cannot be constrained by IN.
+        in_key_candidates = [
+            key
+            for key in keys
+            if len(distinct_values[key]) > 1 and key not in governor_names
+        ]
+        in_key = None
+        if in_key_candidates:
+            in_key = max(
+                in_key_candidates,
+                key=lambda key: (len(distinct_values[key]), key),
+            )
+        subgroups: typing.Dict[tuple, typing.List[typing.Tuple[int, dict]]] = (
+            defaultdict(list)
+        )
+        for index, constraints in group:
+            other_values = tuple(
+                constraints[key] for key in keys if key != in_key
+            )
+            subgroups[other_values].append((index, constraints))
+        for subgroup in subgroups.values():
+            queries.append(
+                _make_folded_query(
+                    constraints=subgroup[0][1],
+                    indices=tuple(index for index, _ in subgroup),
+                    in_key=in_key,
+                    in_values=(
+                        ()
+                        if in_key is None
+                        else tuple(
+                            constraints[in_key] for _, constraints in subgroup
+                        )
+                    ),
+                )
+            )
+    return queries
+
+
+def _make_folded_query(
+    constraints: dict,
+    indices: typing.Tuple[int, ...],
+    in_key: typing.Optional[str] = None,
+    in_values: typing.Tuple[typing.Any, ...] = (),
+) -> BatchQuery:
+    """Make a query for entries that share all constraints
+    except the value of ``in_key`` (if specified).
+
+    Data ID keys are specified in the data ID (so governor dimensions,
+    such as instrument, are constrained as the registry requires);
+    other identifiers are constrained in the where expression.
+    """
+    dataid = {}
+    where_terms = []
+    bind = {}
+    for key, value in sorted(constraints.items()):
+        if key == in_key:
+            continue
+        if "." in key:
+            bind_name = f"batch_{len(bind)}"
+            where_terms.append(f"{key} = {bind_name}")
+            bind[bind_name] = value
+        else:
+            dataid[key] = value
+    if in_key is not None:
+        where_terms.append(f"{in_key} IN ({IN_BIND_NAME})")
+        bind[IN_BIND_NAME] = sorted(set(in_values))
+    return BatchQuery(
+        dataid=dataid or None,
+        where=" AND ".join(where_terms) or None,
+        bind=bind or None,
+        indices=indices,
+        split_key=in_key,
+        split_values=in_values,
+    )
+
+
+async def batch_query_dimension_records(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    element: str,
+    entries: typing.List[dict],
+    datasets: typing.Optional[list] = None,
+    datasetregexs: typing.Optional[list] = None,
+    collections: typing.Optional[list] = None,
+    collectionregexs: typing.Optional[list] = None,
+    components: typing.Optional[bool] = None,
+    check: bool = True,
+    kwargs: typing.Optional[str] = None,
+    usecache: bool = True,
+) -> typing.List[typing.List[dict]]:
+    """Run a batch of dimension record queries for one element,
+    folding them into as few registry queries as possible.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    entries
+        The queries: a list of dicts with optional items
+        dataid, where and bind.
+    The remaining parameters are described in the schema;
+    they apply to every entry.
+
+    Returns
+    -------
+    record_lists
+        One list of records per entry, in order. Each record
+        is a dict with key=record, value=json-encoded dict.
+    """
+    config = app["safir/config"]
+    if len(entries) > config.max_batch_size:
+        raise RuntimeError(
+            f"len(entries)={len(entries)} > {config.max_batch_size}"
+        )
+    try:
+        dimension_element = app["butlerservice/butler"].registry.dimensions[
+            element
+        ]
+    except KeyError:
+        raise RuntimeError(f"Unknown dimension element {element!r}")
+    queries = plan_batch_queries(dimension_element, entries)
+
+    all_collections = combine_strs_and_regex(
+        str_list=collections, regex_list=collectionregexs
+    )
+    all_datasets = combine_strs_and_regex(
+        str_list=datasets, regex_list=datasetregexs
+    )
+    if kwargs is None:
+        kwargs_dict = {}
+    else:
+        kwargs_dict = load_json_arg(kwargs)
+
+    query_func = functools.partial(
+        app["butlerservice/registry_pool"].call,
+        query_batch,
+        element=element,
+        queries=queries,
+        num_entries=len(entries),
+        datasets=all_datasets,
+        collections=all_collections,
+        components=components,
+        check=check,
+        encoding_pool=app["butlerservice/encoding_pool"],
+        **kwargs_dict,
+    )
+    cache_key = make_hashable(
+        (
+            "batch_query_dimension_records",
+            element,
+            queries,
+            all_datasets,
+            all_collections,
+            components,
+            check,
+            kwargs_dict,
+        )
+    )
+    return await run_registry_query(
+        app=app,
+        info=info,
+        cache_key=cache_key,
+        query_func=query_func,
+        usecache=usecache,
+        cost=estimate_query_cost(
+            dimension_element.universe,
+            element=element,
+            datasets=all_datasets,
+            where=" ".join(query.where for query in queries if query.where),
+            num_queries=len(queries),
+        ),
+    )
+
+
+def query_batch(
+    registry: lsst.daf.butler.Registry,
+    element: str,
+    queries: typing.List[BatchQuery],
+    num_entries: int,
+    datasets: StrOrRegexList,
+    collections: StrOrRegexList,
+    components: list,
+    check: bool,
+    encoding_pool: typing.Optional[EncodingPool] = None,
+    convert_row: typing.Optional[typing.Callable[[typing.Any], dict]] = None,
+    **kwargs: dict,
+) -> typing.List[typing.List[dict]]:
+    """Run the queries planned by `plan_batch_queries`
+    and split the records by entry.
+
+    Parameters
+    ----------
+    registry
+        Butler registry.
+    element
+        Dimension element name.
+    queries
+        The queries.
+    num_entries
+        The number of entries in the batch.
+    encoding_pool
+        Pool with which to json-encode the records.
+        Ignored if ``convert_row`` is specified.
+    convert_row
+        Function that converts one record to the returned dict.
+        If None, each record is converted to a dict with key=record,
+        value=json-encoded dict, using ``encoding_pool``.
+    The remaining fields are described in
+    `lsst.daf.butler.Registry.queryDimensionRecords`.
+
+    Returns
+    -------
+    record_lists
+        One list of records per entry, in order,
+        each converted as specified by ``convert_row``.
+    """
+    dimension_element = registry.dimensions[element]
+    record_lists: typing.List[typing.List[dict]] = [
+        [] for _ in range(num_entries)
+    ]
+    for query in queries:
+        with time_phase("registry_query"):
+            records = list(
+                registry.queryDimensionRecords(
+                    element=element,
+                    dataId=query.dataid,
+                    datasets=datasets,
+                    collections=collections,
+                    where=query.where,
+                    components=components,
+                    bind=query.bind,
+                    check=check,
+                    **kwargs,
+                )
+            )
+        with time_phase("encoding"):
+            if convert_row is not None:
+                encoded_records = [convert_row(record) for record in records]
+            else:
+                assert encoding_pool is not None
+                encoded_records = [
+                    dict(record=encoded_record)
+                    for encoded_record in encoding_pool.encode_lines(
+                        make_record_batch(dimension_element, records)
+                    )
+                ]
+        if query.split_key is None:
+            for index in query.indices:
+                record_lists[index] = encoded_records
+            continue
+        get_value = _make_value_getter(dimension_element, query.split_key)
+        assert get_value is not None
+        indices_by_value = defaultdict(list)
+        for index, value in zip(query.indices, query.split_values):
+            indices_by_value[value].append(index)
+        for record, encoded_record in zip(records, encoded_records):
+            for index in indices_by_value.get(get_value(record), ()):
+                record_lists[index].append(encoded_record)
+    return record_lists
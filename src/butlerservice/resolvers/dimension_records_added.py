@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+__all__ = [
+    "resolve_dimension_records_added",
+    "subscribe_dimension_records_added",
+]
+
+import typing
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+    from ..subscriptions import Subscriber
+
+
+async def subscribe_dimension_records_added(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    element: str,
+    **kwargs: typing.Any,
+) -> Subscriber:
+    """Subscribe to the dimension records that are added from now on.
+
+    Subscriptions with the same arguments share one poller;
+    see `butlerservice.subscriptions.SubscriptionHub`.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    element
+        The dimension element to obtain.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    subscriber
+        Async iterator of events: dicts with items "nodes"
+        (a list of SimpleRecord dicts) and "watermark".
+
+    Raises
+    ------
+    RuntimeError
+        If subscriptions are disabled or the arguments are invalid.
+    """
+    return await app["butlerservice/subscription_hub"].subscribe(
+        element=element, **kwargs
+    )
+
+
+def resolve_dimension_records_added(
+    event: dict, info: graphql.GraphQLResolveInfo, **kwargs: typing.Any
+) -> dict:
+    """Return an event of a dimension_records_added subscription."""
+    return event
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+__all__ = [
+    "estimate_data_ids_query",
+    "estimate_dimension_records_query",
+    "estimate_query_data_ids",
+    "estimate_query_dimension_records",
+]
+
+import functools
+import json
+import typing
+
+import lsst.daf.butler
+
+from ..query_analyzer import QueryEstimate, analyze_query
+from ..registry_query import run_registry_query
+from ..utils import (
+    StrOrRegexList,
+    combine_strs_and_regex,
+    load_json_arg,
+    make_hashable,
+)
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+def _load_query_args(
+    dataid: typing.Optional[str],
+    datasets: typing.Optional[list],
+    datasetregexs: typing.Optional[list],
+    collections: typing.Optional[list],
+    collectionregexs: typing.Optional[list],
+    bind: typing.Optional[str],
+    kwargs: typing.Optional[str],
+    **other_args: typing.Any,
+) -> typing.Dict[str, typing.Any]:
+    """Decode the arguments of a query, as the query fields do."""
+    query_args = dict(other_args)
+    for name, value in (("dataid", dataid), ("bind", bind)):
+        if value is not None:
+            try:
+                value = load_json_arg(value)
+            except json.JSONDecodeError as e:
+                raise RuntimeError(f"Cannot decode {name}: {e}")
+        query_args[name] = value
+    query_args["datasets"] = combine_strs_and_regex(
+        str_list=datasets, regex_list=datasetregexs
+    )
+    query_args["collections"] = combine_strs_and_regex(
+        str_list=collections, regex_list=collectionregexs
+    )
+    query_args["kwargs"] = {} if kwargs is None else load_json_arg(kwargs)
+    return query_args
+
+
+async def _estimate_query(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    field: str,
+    estimate_func: typing.Callable[..., QueryEstimate],
+    query_args: typing.Dict[str, typing.Any],
+) -> dict:
+    """Estimate a query in the registry executor and return
+    the estimate as a dict, with the reasons it would be rejected.
+    """
+    budget = app["butlerservice/query_budget"]
+    query_func = functools.partial(
+        app["butlerservice/registry_pool"].call, estimate_func, **query_args
+    )
+    estimate = await run_registry_query(
+        app=app,
+        info=info,
+        cache_key=make_hashable((field, query_args)),
+        query_func=query_func,
+    )
+    return dict(
+        estimate._asdict(),
+        rejection=budget.get_violation(estimate, paginated=False),
+        paginated_rejection=budget.get_violation(estimate, paginated=True),
+    )
+
+
+async def estimate_query_data_ids(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    dimensions: typing.List[str],
+    dataid: typing.Optional[str] = None,
+    datasets: typing.Optional[list] = None,
+    datasetregexs: typing.Optional[list] = None,
+    collections: typing.Optional[list] = None,
+    collectionregexs: typing.Optional[list] = None,
+    where: typing.Optional[str] = None,
+    components: typing.Optional[bool] = None,
+    bind: typing.Optional[str] = None,
+    check: bool = True,
+    kwargs: typing.Optional[str] = None,
+) -> dict:
+    """Estimate the cost of a simple_query_data_ids query,
+    without running it.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    estimate
+        A `QueryEstimate` as a dict, with extra items "rejection"
+        and "paginated_rejection": the reason the query would be rejected
+        (see `QueryBudget.get_violation`), if not paginated and if
+        paginated, or None if it would not.
+    """
+    return await _estimate_query(
+        app,
+        info,
+        field="estimate_query_data_ids",
+        estimate_func=estimate_data_ids_query,
+        query_args=_load_query_args(
+            dimensions=dimensions,
+            dataid=dataid,
+            datasets=datasets,
+            datasetregexs=datasetregexs,
+            collections=collections,
+            collectionregexs=collectionregexs,
+            where=where,
+            components=components,
+            bind=bind,
+            check=check,
+            kwargs=kwargs,
+        ),
+    )
+
+
+async def estimate_query_dimension_records(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    element: str,
+    dataid: typing.Optional[str] = None,
+    datasets: typing.Optional[list] = None,
+    datasetregexs: typing.Optional[list] = None,
+    collections: typing.Optional[list] = None,
+    collectionregexs: typing.Optional[list] = None,
+    where: typing.Optional[str] = None,
+    components: typing.Optional[bool] = None,
+    bind: typing.Optional[str] = None,
+    check: bool = True,
+    kwargs: typing.Optional[str] = None,
+) -> dict:
+    """Estimate the cost of a simple_query_dimension_records query,
+    without running it.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    estimate
+        The estimate as a dict; see `estimate_query_data_ids`.
+    """
+    return await _estimate_query(
+        app,
+        info,
+        field="estimate_query_dimension_records",
+        estimate_func=estimate_dimension_records_query,
+        query_args=_load_query_args(
+            element=element,
+            dataid=dataid,
+            datasets=datasets,
+            datasetregexs=datasetregexs,
+            collections=collections,
+            collectionregexs=collectionregexs,
+            where=where,
+            components=components,
+            bind=bind,
+            check=check,
+            kwargs=kwargs,
+        ),
+    )
+
+
+def estimate_data_ids_query(
+    registry: lsst.daf.butler.Registry,
+    dimensions: typing.List[str],
+    dataid: typing.Optional[dict],
+    datasets: StrOrRegexList,
+    collections: StrOrRegexList,
+    where: typing.Optional[str],
+    components: typing.Optional[bool],
+    bind: typing.Optional[dict],
+    check: bool,
+    kwargs: dict,
+) -> QueryEstimate:
+    """Estimate the cost of a queryDataIds query on a butler registry;
+    see `butlerservice.query_analyzer.analyze_query`.
+    """
+    results = registry.queryDataIds(
+        dimensions=dimensions,
+        dataId=dataid,
+        datasets=datasets,
+        collections=collections,
+        where=where,
+        components=components,
+        bind=bind,
+        check=check,
+        **kwargs,
+    )
+    return analyze_query(
+        registry,
+        results,
+        dimensions=dimensions,
+        dataid=dataid,
+        datasets=datasets,
+        collections=collections,
+        where=where,
+        kwargs=kwargs,
+    )
+
+
+def estimate_dimension_records_query(
+    registry: lsst.daf.butler.Registry,
+    element: str,
+    dataid: typing.Optional[dict],
+    datasets: StrOrRegexList,
+    collections: StrOrRegexList,
+    where: typing.Optional[str],
+    components: typing.Optional[bool],
+    bind: typing.Optional[dict],
+    check: bool,
+    kwargs: dict,
+) -> QueryEstimate:
+    """Estimate the cost of a queryDimensionRecords query
+    on a butler registry; see `butlerservice.query_analyzer.analyze_query`.
+    """
+    results = registry.queryDimensionRecords(
+        element=element,
+        dataId=dataid,
+        datasets=datasets,
+        collections=collections,
+        where=where,
+        components=components,
+        bind=bind,
+        check=check,
+        **kwargs,
+    )
+    return analyze_query(
+        registry,
+        results,
+        element=element,
+        dataid=dataid,
+        datasets=datasets,
+        collections=collections,
+        where=where,
+        kwargs=kwargs,
+    )
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+__all__ = ["query_data_ids"]
+
+import typing
+
+from .simple_query_data_ids import convert_data_id, simple_query_data_ids
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+async def query_data_ids(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    **kwargs: typing.Any,
+) -> typing.List[dict]:
+    """Call registry.queryDataIds and return typed data IDs.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    data_id_list
+        List of data IDs as dicts of dimension name: value.
+    """
+    return await simple_query_data_ids(
+        app, info, convert_row=convert_data_id, **kwargs
+    )
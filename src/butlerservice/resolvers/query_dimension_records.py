@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+__all__ = ["make_typed_record", "query_dimension_records"]
+
+import typing
+
+import lsst.daf.butler
+import lsst.sphgeom
+
+from ..schemas.dimension_types import record_type_name
+from .simple_query_dimension_records import simple_query_dimension_records
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+def make_typed_record(record: lsst.daf.butler.DimensionRecord) -> dict:
+    """Convert a dimension record to a dict for a typed GraphQL record.
+
+    The dict includes item "__typename", the name of the GraphQL type.
+    Encode `lsst.daf.butler.Timespan` as a dict with items begin and end,
+    which are ISO strings (or None if unbounded).
+    Encode `sphgeom.Region` as `sphgeom.Region.encode` as a hex string.
+    """
+    typed_record = {"__typename": record_type_name(record.definition.name)}
+    for key, raw_value in record.toDict().items():
+        if isinstance(raw_value, lsst.daf.butler.Timespan):
+            value: typing.Any = dict(
+                begin=(
+                    None if raw_value.begin is None else raw_value.begin.isot
+                ),
+                end=None if raw_value.end is None else raw_value.end.isot,
+            )
+        elif isinstance(raw_value, lsst.sphgeom.Region):
+            value = raw_value.encode().hex()
+        else:
+            value = raw_value
+        typed_record[key] = value
+    return typed_record
+
+
+async def query_dimension_records(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    **kwargs: typing.Any,
+) -> typing.List[dict]:
+    """Call registry.queryDimensionRecords and return typed records.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    record_list
+        Found records, as dicts; see `make_typed_record`.
+    """
+    return await simple_query_dimension_records(
+        app, info, convert_row=make_typed_record, **kwargs
+    )
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+__all__ = ["query_dimension_records_columnar"]
+
+import typing
+
+from ..columnar import make_columnar_records
+from .simple_query_dimension_records import simple_query_dimension_records
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+async def query_dimension_records_columnar(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    **kwargs: typing.Any,
+) -> dict:
+    """Call registry.queryDimensionRecords and return the records
+    as columns.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    columnar_records
+        Records as columns;
+        see `butlerservice.columnar.make_columnar_records`.
+    """
+    return await simple_query_dimension_records(
+        app, info, convert_results=make_columnar_records, **kwargs
+    )
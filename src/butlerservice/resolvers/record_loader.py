@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+__all__ = ["RecordLoader", "get_record_loader", "resolve_data_id_record"]
+
+import asyncio
+import functools
+import typing
+
+from ..query_cost import estimate_query_cost
+from ..registry_query import run_registry_query
+from ..utils import make_hashable
+from .batch_query_dimension_records import plan_data_id_queries, query_batch
+from .query_dimension_records import make_typed_record
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+# Key of the record loader in the GraphQL context (a per-request dict).
+CONTEXT_KEY = "butlerservice/record_loader"
+
+# Number of event loop iterations to wait after the first lookup
+# for an element before running the query, so that lookups made by
+# sibling resolvers of other rows are included in the same query.
+DISPATCH_DELAY_ITERATIONS = 2
+
+
+class RecordLoader:
+    """Load dimension records by data ID, in bulk.
+
+    Lookups for one dimension element that are requested during
+    the same GraphQL execution tick (e.g. by the resolvers of a nested
+    field of each row in a list) are collected and run as a single
+    registry query per element. Results are memoized, so each record
+    is only looked up once per request.
+
+    Use one loader per request; see `get_record_loader`.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about the request.
+    """
+
+    def __init__(
+        self, app: aiohttp.web.Application, info: graphql.GraphQLResolveInfo
+    ) -> None:
+        self.app = app
+        self.info = info
+        self.num_queries = 0
+        # Dict of (element name, key): future record (or None).
+        self._memo: typing.Dict[typing.Tuple[str, tuple], asyncio.Future] = (
+            dict()
+        )
+        # Dict of element name: keys waiting to be loaded.
+        self._pending: typing.Dict[str, typing.List[tuple]] = dict()
+
+    def load(
+        self, element_name: str, data_id: typing.Mapping[str, typing.Any]
+    ) -> asyncio.Future:
+        """Load the record of a dimension element with a given data ID.
+
+        Parameters
+        ----------
+        element_name
+            Name of the dimension element.
+        data_id
+            Dict of dimension name: value. Must include the required
+            dimensions of the element; other items are ignored.
+
+        Returns
+        -------
+        record
+            A future whose result is the record as a dict
+            (see `make_typed_record`), or None if not found.
+        """
+        element = self.app["butlerservice/butler"].registry.dimensions[
+            element_name
+        ]
+        key = tuple(data_id[name] for name in element.required.names)
+        future = self._memo.get((element_name, key))
+        if future is not None:
+            return future
+        future = asyncio.get_running_loop().create_future()
+        self._memo[(element_name, key)] = future
+        pending_keys = self._pending.get(element_name)
+        if pending_keys is None:
+            pending_keys = self._pending[element_name] = []
+            asyncio.ensure_future(self._dispatch(element_name))
+        pending_keys.append(key)
+        return future
+
+    async def _dispatch(self, element_name: str) -> None:
+        """Wait for more lookups of an element, then run one query
+        for all of them and set the results.
+        """
+        for _ in range(DISPATCH_DELAY_ITERATIONS):
+            await asyncio.sleep(0)
+        keys = self._pending.pop(element_name)
+        futures = [self._memo[(element_name, key)] for key in keys]
+        try:
+            record_lists = await self._query(element_name, keys)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, record_list in zip(futures, record_lists):
+            if not future.done():
+                future.set_result(record_list[0] if record_list else None)
+
+    async def _query(
+        self, element_name: str, keys: typing.List[tuple]
+    ) -> typing.List[typing.List[dict]]:
+        """Query the records of an element with the specified keys
+        (values of the required dimensions).
+        """
+        element = self.app["butlerservice/butler"].registry.dimensions[
+            element_name
+        ]
+        names = element.required.names
+        queries = plan_data_id_queries(
+            element, [dict(zip(names, key)) for key in keys]
+        )
+        query_func = functools.partial(
+            self.app["butlerservice/registry_pool"].call,
+            query_batch,
+            element=element_name,
+            queries=queries,
+            num_entries=len(keys),
+            datasets=None,
+            collections=None,
+            components=None,
+            check=True,
+            convert_row=make_typed_record,
+        )
+        cache_key = make_hashable(
+            ("load_dimension_records", element_name, queries)
+        )
+        self.num_queries += 1
+        return await run_registry_query(
+            app=self.app,
+            info=self.info,
+            cache_key=cache_key,
+            query_func=query_func,
+            cost=estimate_query_cost(
+                element.universe,
+                element=element_name,
+                num_queries=len(queries),
+            ),
+        )
+
+
+def get_record_loader(
+    app: aiohttp.web.Application, info: graphql.GraphQLResolveInfo
+) -> RecordLoader:
+    """Get the record loader for the current request,
+    creating it if necessary.
+    """
+    loader = info.context.get(CONTEXT_KEY)
+    if loader is None:
+        loader = info.context[CONTEXT_KEY] = RecordLoader(app=app, info=info)
+    return loader
+
+
+async def resolve_data_id_record(
+    data_id: typing.Mapping[str, typing.Any],
+    info: graphql.GraphQLResolveInfo,
+    element_name: str,
+) -> typing.Optional[dict]:
+    """Resolve the record of a dimension element for a typed data ID.
+
+    Parameters
+    ----------
+    data_id
+        Data ID, as a dict of dimension name: value.
+    info
+        Information about this request. ``info.root_value``
+        is the aiohttp application.
+    element_name
+        Name of the dimension element.
+
+    Returns
+    -------
+    record
+        The record, as a dict (see `make_typed_record`), or None
+        if the data ID does not identify a record of the element.
+    """
+    app = info.root_value
+    element = app["butlerservice/butler"].registry.dimensions[element_name]
+    if any(data_id.get(name) is None for name in element.required.names):
+        return None
+    return await get_record_loader(app, info).load(element_name, data_id)
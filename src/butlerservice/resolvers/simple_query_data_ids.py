@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-__all__ = ["simple_query_data_ids"]
+__all__ = [
+    "convert_data_id",
+    "make_simple_data_id",
+    "simple_query_data_ids",
+]
 
-import asyncio
 import functools
 import json
 import typing
@@ -10,16 +13,40 @@ import typing
 import lsst.daf.butler
 import lsst.sphgeom
 
-from ..utils import StrOrRegexList, combine_strs_and_regex
+from ..encoding_pool import EncodingPool, make_data_id_batch
+from ..metrics import time_phase
+from ..query_analyzer import QueryBudget, analyze_query
+from ..query_cost import estimate_query_cost
+from ..registry_query import run_registry_query
+from ..utils import (
+    StrOrRegexList,
+    combine_strs_and_regex,
+    load_json_arg,
+    make_hashable,
+)
 
 if typing.TYPE_CHECKING:
     import aiohttp
     import graphql
 
 
+def convert_data_id(data_id: lsst.daf.butler.DataCoordinate) -> dict:
+    """Convert a data ID into a dict of dimension name: value."""
+    return {key.name: value for key, value in data_id.items()}
+
+
+def make_simple_data_id(data_id: lsst.daf.butler.DataCoordinate) -> dict:
+    """Convert a data ID to a SimpleDataId dict.
+
+    That is a dict with key=data_id, value=json-encoded dict
+    of dimension name: value.
+    """
+    return dict(data_id=json.dumps(convert_data_id(data_id)))
+
+
 async def simple_query_data_ids(
     app: aiohttp.web.Application,
-    _info: graphql.GraphQLResolveInfo,
+    info: graphql.GraphQLResolveInfo,
     dimensions: typing.List[str],
     dataid: typing.Optional[str] = None,
     datasets: typing.Optional[list] = None,
@@ -31,6 +58,10 @@ async def simple_query_data_ids(
     bind: typing.Optional[str] = None,
     check: bool = True,
     kwargs: typing.Optional[str] = None,
+    usecache: bool = True,
+    limit: typing.Optional[int] = None,
+    offset: int = 0,
+    convert_row: typing.Callable[[typing.Any], dict] = make_simple_data_id,
 ) -> typing.List[dict]:
     """Call registry.queryDataIds and return plain old data.
 
@@ -38,8 +69,20 @@ async def simple_query_data_ids(
     ----------
     app
         aiohttp application.
-    _info
-        Information about this request (ignored).
+    info
+        Information about this request.
+    limit
+        Maximum number of rows to return. If None, return all rows;
+        otherwise the rows are sorted, so that pages are consistent.
+        Not part of the schema for this field; used for pagination.
+    offset
+        Number of rows to skip. Ignored unless ``limit`` is specified.
+        Not part of the schema for this field; used for pagination.
+    convert_row
+        Function that converts one result row to the returned dict.
+        Must be a module-level function, since it is part of the cache key.
+        Not part of the schema for this field; used by other fields
+        that return the data in a different form.
     The remaining parameters are described in the schema.
 
     Returns
@@ -47,16 +90,16 @@ async def simple_query_data_ids(
     data_id_list
         List of data IDs as json-encoded dicts.
     """
-    registry = app["butlerservice/butler"].registry
+    registry_pool = app["butlerservice/registry_pool"]
 
     if dataid is not None:
         try:
-            dataid = json.loads(dataid)
+            dataid = load_json_arg(dataid)
         except json.JSONDecodeError as e:
             raise RuntimeError(f"Cannot decode dataid: {e}")
     if bind is not None:
         try:
-            bind = json.loads(bind)
+            bind = load_json_arg(bind)
         except json.JSONDecodeError as e:
             raise RuntimeError(f"Cannot decode bind: {e}")
 
@@ -70,11 +113,11 @@ async def simple_query_data_ids(
     if kwargs is None:
         kwargs_dict = {}
     else:
-        kwargs_dict = json.loads(kwargs)
+        kwargs_dict = load_json_arg(kwargs)
 
     query_func = functools.partial(
+        registry_pool.call,
         query_dimension_records,
-        registry=registry,
         dimensions=dimensions,
         dataid=dataid,
         datasets=all_datasets,
@@ -83,13 +126,43 @@ async def simple_query_data_ids(
         components=components,
         bind=bind,
         check=check,
+        limit=limit,
+        offset=offset,
+        convert_row=convert_row,
+        encoding_pool=app["butlerservice/encoding_pool"],
+        budget=app["butlerservice/query_budget"],
         **kwargs_dict,
     )
 
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(
-        None,
-        query_func,
+    cache_key = make_hashable(
+        (
+            "simple_query_data_ids",
+            dimensions,
+            dataid,
+            all_datasets,
+            all_collections,
+            where,
+            components,
+            bind,
+            check,
+            kwargs_dict,
+            limit,
+            offset,
+            convert_row,
+        )
+    )
+    return await run_registry_query(
+        app=app,
+        info=info,
+        cache_key=cache_key,
+        query_func=query_func,
+        usecache=usecache,
+        cost=estimate_query_cost(
+            app["butlerservice/butler"].registry.dimensions,
+            dimensions=dimensions,
+            datasets=all_datasets,
+            where=where,
+        ),
     )
 
 
@@ -103,6 +176,11 @@ def query_dimension_records(
     components: list,
     bind: dict,
     check: bool,
+    limit: typing.Optional[int] = None,
+    offset: int = 0,
+    convert_row: typing.Callable[[typing.Any], dict] = make_simple_data_id,
+    encoding_pool: typing.Optional[EncodingPool] = None,
+    budget: typing.Optional[QueryBudget] = None,
     **kwargs: dict,
 ) -> typing.List[dict]:
     """Call queryDataIds on a butler registry.
@@ -111,34 +189,71 @@ def query_dimension_records(
     ----------
     registry
         Butler registry.
+    limit
+        Maximum number of rows to return. If None, return all rows;
+        otherwise sort the rows by primary key and return at most
+        this many, starting at ``offset``.
+    offset
+        Number of rows to skip. Ignored unless ``limit`` is specified.
+    convert_row
+        Function that converts one result row to the returned dict.
+    encoding_pool
+        Pool with which to json-encode the data IDs,
+        if ``convert_row`` is `make_simple_data_id`.
+        This is faster than calling ``convert_row`` for each data ID,
+        and may encode large results in other processes.
+    budget
+        Limits on the estimated cost of the query, checked before it is run;
+        see `butlerservice.query_analyzer.QueryBudget`.
     The remaining fields are described in
     `lsst.daf.butler.Registry.queryDataIds`.
 
     Returns
     -------
     data_id_list
-        List of data IDs as dicts with key=data_id, value=json-encoded dict.
+        List of data IDs converted by ``convert_row``; by default
+        dicts with key=data_id, value=json-encoded dict.
+
+    Raises
+    ------
+    QueryBudgetError
+        If the query exceeds the budget.
     """
-    try:
-        data_id_list = registry.queryDataIds(
-            dimensions=dimensions,
-            dataId=dataid,
-            datasets=datasets,
-            collections=collections,
-            where=where,
-            components=components,
-            bind=bind,
-            check=check,
-            **kwargs,
-        ).toSequence()
-        data_id_dicts = [
-            {key.name: value for key, value in data_id.items()}
-            for data_id in data_id_list
-        ]
-        return [
-            dict(data_id=json.dumps(data_id_dict))
-            for data_id_dict in data_id_dicts
-        ]
-    except Exception as e:
-        print(f"Error in Registry.queryDataIds: {e}")
-    return []
+    results = registry.queryDataIds(
+        dimensions=dimensions,
+        dataId=dataid,
+        datasets=datasets,
+        collections=collections,
+        where=where,
+        components=components,
+        bind=bind,
+        check=check,
+        **kwargs,
+    )
+    if limit is not None:
+        order = registry.dimensions.extract(dimensions).required.names
+        results = results.order_by(*order).limit(limit, offset)
+    if budget is not None and budget.enabled:
+        budget.check(
+            analyze_query(
+                registry,
+                results if budget.explain else None,
+                dimensions=dimensions,
+                dataid=dataid,
+                datasets=datasets,
+                collections=collections,
+                where=where,
+                kwargs=kwargs,
+            ),
+            paginated=limit is not None,
+        )
+    with time_phase("registry_query"):
+        data_ids = list(results)
+    with time_phase("encoding"):
+        if convert_row is make_simple_data_id and encoding_pool is not None:
+            batch = make_data_id_batch(data_ids)
+            return [
+                dict(data_id=encoded_data_id)
+                for encoded_data_id in encoding_pool.encode_lines(batch)
+            ]
+        return [convert_row(data_id) for data_id in data_ids]
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+__all__ = ["simple_query_data_ids_changes"]
+
+import json
+import typing
+
+from ..utils import load_json_arg
+from ..watermark import (
+    add_watermark_constraint,
+    check_watermark_dimension,
+    decode_watermark,
+    default_watermark_dimension,
+    encode_watermark,
+    update_watermark,
+)
+from .simple_query_data_ids import convert_data_id, simple_query_data_ids
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+async def simple_query_data_ids_changes(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    dimensions: typing.List[str],
+    since: typing.Optional[str] = None,
+    watermark_dimension: typing.Optional[str] = None,
+    where: typing.Optional[str] = None,
+    bind: typing.Optional[str] = None,
+    **kwargs: typing.Any,
+) -> dict:
+    """Call simple_query_data_ids and return the data IDs
+    added since a watermark, and a new watermark.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    dimensions
+        The dimensions of the data IDs.
+    since
+        Watermark returned by the previous query.
+        If None then return all data IDs.
+    watermark_dimension
+        Dimension whose values increase as data IDs are added.
+        If None then use the finest required dimension
+        that has an integer primary key and is not a governor;
+        see `butlerservice.watermark.default_watermark_dimension`.
+    where
+        A string expression similar to a SQL WHERE clause.
+    bind
+        Json-encoded values for the ``where`` expression.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    changes
+        Dict with items "nodes" (a list of SimpleDataId dicts)
+        and "watermark" (the watermark for the next query).
+    """
+    universe = app["butlerservice/butler"].registry.dimensions
+    if not dimensions:
+        raise RuntimeError("Must specify at least one dimension")
+    try:
+        required_names = list(universe.extract(dimensions).required.names)
+    except LookupError as e:
+        raise RuntimeError(f"Unknown dimension: {e}")
+    if watermark_dimension is None:
+        watermark_dimension = default_watermark_dimension(
+            universe, required_names
+        )
+    group_names = check_watermark_dimension(
+        universe, watermark_dimension, required_names
+    )
+    max_values = decode_watermark(since, watermark_dimension)
+    if bind is not None:
+        try:
+            bind = load_json_arg(bind)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Cannot decode bind: {e}")
+    where, new_bind = add_watermark_constraint(
+        where=where,
+        bind=bind,
+        dimension=watermark_dimension,
+        group_names=group_names,
+        max_values=max_values,
+    )
+    rows = await simple_query_data_ids(
+        app,
+        info,
+        dimensions=dimensions,
+        where=where,
+        bind=None if new_bind is None else json.dumps(new_bind),
+        convert_row=convert_data_id,
+        **kwargs,
+    )
+    max_values = update_watermark(
+        max_values,
+        rows,
+        dimension=watermark_dimension,
+        group_names=group_names,
+    )
+    return dict(
+        nodes=[dict(data_id=json.dumps(row)) for row in rows],
+        watermark=encode_watermark(watermark_dimension, max_values),
+    )
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-__all__ = ["simple_query_dimension_records"]
+__all__ = [
+    "convert_record_dict",
+    "encode_record_dict",
+    "make_simple_record",
+    "simple_query_dimension_records",
+]
 
-import asyncio
 import functools
 import json
 import typing
@@ -10,16 +14,36 @@ import typing
 import lsst.daf.butler
 import lsst.sphgeom
 
-from ..utils import StrOrRegexList, combine_strs_and_regex
+from ..encoding_pool import EncodingPool, make_record_batch
+from ..metrics import time_phase
+from ..query_analyzer import QueryBudget, analyze_query
+from ..query_cost import estimate_query_cost
+from ..record_encoder import get_record_encoder
+from ..registry_query import cache_bypass_requested, run_registry_query
+from ..utils import (
+    StrOrRegexList,
+    combine_strs_and_regex,
+    load_json_arg,
+    make_hashable,
+)
 
 if typing.TYPE_CHECKING:
     import aiohttp
     import graphql
 
+# Type of the convert_results argument.
+ConvertResultsT = typing.Callable[
+    [
+        lsst.daf.butler.DimensionElement,
+        typing.Iterable[lsst.daf.butler.DimensionRecord],
+    ],
+    typing.Any,
+]
 
-def encode_record_dict(raw_dict: dict) -> str:
+
+def convert_record_dict(raw_dict: dict) -> dict:
     """Convert the values in a record dict returned by the registry
-    into plain old data types and json-encode the result.
+    into plain old data types.
 
     Encode `sphgeom.Region` using `sphgeom.Region.encode`.
     Encode `lsst.daf.butler.Timespan` as ``(begin time, end time)``,
@@ -34,12 +58,32 @@ def encode_record_dict(raw_dict: dict) -> str:
         else:
             encoded_value = raw_value
         encoded_dict[key] = encoded_value
-    return json.dumps(encoded_dict)
+    return encoded_dict
+
+
+def encode_record_dict(raw_dict: dict) -> str:
+    """Convert the values in a record dict returned by the registry
+    into plain old data types and json-encode the result.
+
+    See `convert_record_dict` for details. This is slow, because it checks
+    the type of every value; to encode many records of the same element
+    use `butlerservice.record_encoder.RecordEncoder`.
+    """
+    return json.dumps(convert_record_dict(raw_dict))
+
+
+def make_simple_record(record: lsst.daf.butler.DimensionRecord) -> dict:
+    """Convert a dimension record to a SimpleRecord dict.
+
+    That is a dict with key=record, value=json-encoded dict;
+    see `butlerservice.record_encoder.RecordEncoder` for details.
+    """
+    return dict(record=get_record_encoder(record.definition).encode(record))
 
 
 async def simple_query_dimension_records(
     app: aiohttp.web.Application,
-    _info: graphql.GraphQLResolveInfo,
+    info: graphql.GraphQLResolveInfo,
     element: str,
     dataid: typing.Optional[str] = None,
     datasets: typing.Optional[list] = None,
@@ -51,32 +95,67 @@ async def simple_query_dimension_records(
     bind: typing.Optional[str] = None,
     check: bool = True,
     kwargs: typing.Optional[str] = None,
-) -> typing.List[dict]:
+    usecache: bool = True,
+    limit: typing.Optional[int] = None,
+    offset: int = 0,
+    order_by: typing.Optional[typing.Tuple[str, ...]] = None,
+    convert_row: typing.Callable[[typing.Any], dict] = make_simple_record,
+    convert_results: typing.Optional[ConvertResultsT] = None,
+) -> typing.Any:
     """Call registry.queryDimensionRecords and return plain old data.
 
+    Queries that only have data ID constraints are answered from
+    the record snapshot, if it holds the element and the cache
+    is not bypassed; see `butlerservice.record_snapshot.RecordSnapshot`.
+
     Parameters
     ----------
     app
         aiohttp application.
-    _info
-        Information about this request (ignored).
+    info
+        Information about this request.
+    limit
+        Maximum number of rows to return. If None, return all rows;
+        otherwise the rows are sorted, so that pages are consistent.
+        Not part of the schema for this field; used for pagination.
+    offset
+        Number of rows to skip. Ignored unless ``limit`` is specified.
+        Not part of the schema for this field; used for pagination.
+    order_by
+        The order of the rows if ``limit`` is specified, as for
+        ``order_by`` of the query results, e.g. ("-exposure",).
+        If None, sort by the required dimensions of the element.
+        Not part of the schema for this field; used for watermarks.
+    convert_row
+        Function that converts one result row to the returned dict.
+        Must be a module-level function, since it is part of the cache key.
+        Not part of the schema for this field; used by other fields
+        that return the data in a different form.
+    convert_results
+        Function that converts all the results at once; if specified
+        then ``convert_row`` is ignored. It is called with two arguments:
+        the dimension element and an iterable of the records.
+        Must be a module-level function, since it is part of the cache key.
+        Not part of the schema for this field; used by other fields
+        that return the data in a different form.
     The remaining parameters are described in the schema.
 
     Returns
     -------
     record_list
-        Found records.
+        Found records, converted by ``convert_row``,
+        or the value returned by ``convert_results``.
     """
-    registry = app["butlerservice/butler"].registry
+    registry_pool = app["butlerservice/registry_pool"]
 
     if dataid is not None:
         try:
-            dataid = json.loads(dataid)
+            dataid = load_json_arg(dataid)
         except json.JSONDecodeError as e:
             raise RuntimeError(f"Cannot decode dataid: {e}")
     if bind is not None:
         try:
-            bind = json.loads(bind)
+            bind = load_json_arg(bind)
         except json.JSONDecodeError as e:
             raise RuntimeError(f"Cannot decode bind: {e}")
 
@@ -89,12 +168,34 @@ async def simple_query_dimension_records(
     if kwargs is None:
         kwargs_dict = {}
     else:
-        kwargs_dict = json.loads(kwargs)
+        kwargs_dict = load_json_arg(kwargs)
+
+    # Answer queries that only constrain the data ID
+    # from the record snapshot, if it holds this element.
+    if (
+        not all_datasets
+        and not all_collections
+        and not where
+        and not bind
+        and not kwargs_dict
+        and order_by is None
+        and usecache
+        and not cache_bypass_requested(info)
+    ):
+        result = app["butlerservice/record_snapshot"].query(
+            element=element,
+            dataid=dataid,
+            convert_row=convert_row,
+            convert_results=convert_results,
+            limit=limit,
+            offset=offset,
+        )
+        if result is not None:
+            return result
 
-    loop = asyncio.get_running_loop()
     query_func = functools.partial(
+        registry_pool.call,
         query_dimension_records,
-        registry=registry,
         element=element,
         dataid=dataid,
         datasets=all_datasets,
@@ -103,11 +204,46 @@ async def simple_query_dimension_records(
         components=components,
         bind=bind,
         check=check,
+        limit=limit,
+        offset=offset,
+        order_by=order_by,
+        convert_row=convert_row,
+        convert_results=convert_results,
+        encoding_pool=app["butlerservice/encoding_pool"],
+        budget=app["butlerservice/query_budget"],
         **kwargs_dict,
     )
-    return await loop.run_in_executor(
-        None,
-        query_func,
+    cache_key = make_hashable(
+        (
+            "simple_query_dimension_records",
+            element,
+            dataid,
+            all_datasets,
+            all_collections,
+            where,
+            components,
+            bind,
+            check,
+            kwargs_dict,
+            limit,
+            offset,
+            order_by,
+            convert_row,
+            convert_results,
+        )
+    )
+    return await run_registry_query(
+        app=app,
+        info=info,
+        cache_key=cache_key,
+        query_func=query_func,
+        usecache=usecache,
+        cost=estimate_query_cost(
+            app["butlerservice/butler"].registry.dimensions,
+            element=element,
+            datasets=all_datasets,
+            where=where,
+        ),
     )
 
 
@@ -121,21 +257,58 @@ def query_dimension_records(
     components: list,
     bind: dict,
     check: bool,
+    limit: typing.Optional[int] = None,
+    offset: int = 0,
+    order_by: typing.Optional[typing.Tuple[str, ...]] = None,
+    convert_row: typing.Callable[[typing.Any], dict] = make_simple_record,
+    convert_results: typing.Optional[ConvertResultsT] = None,
+    encoding_pool: typing.Optional[EncodingPool] = None,
+    budget: typing.Optional[QueryBudget] = None,
     **kwargs: dict,
-) -> typing.List[dict]:
+) -> typing.Any:
     """Call queryDimensionRecords on a butler registry.
 
     Parameters
     ----------
     registry
         Butler registry.
+    limit
+        Maximum number of rows to return. If None, return all rows;
+        otherwise sort the rows by ``order_by`` and return at most
+        this many, starting at ``offset``.
+    offset
+        Number of rows to skip. Ignored unless ``limit`` is specified.
+    order_by
+        The order of the rows if ``limit`` is specified.
+        If None, sort by primary key.
+    convert_row
+        Function that converts one result row to the returned dict.
+    convert_results
+        Function that converts all the results at once, given the
+        dimension element and an iterable of the records.
+        If specified then ``convert_row`` is ignored.
+    encoding_pool
+        Pool with which to json-encode the records,
+        if ``convert_row`` is `make_simple_record`.
+        This is much faster than calling ``convert_row`` for each record,
+        and may encode large results in other processes.
+    budget
+        Limits on the estimated cost of the query, checked before it is run;
+        see `butlerservice.query_analyzer.QueryBudget`.
     The remaining fields are described in
     `lsst.daf.butler.Registry.queryDimensionRecords`.
 
     Returns
     -------
     record_list
-        List of data IDs as dicts with key=record, value=json-encoded dict.
+        List of records converted by ``convert_row``; by default
+        dicts with key=record, value=json-encoded dict.
+        Or the value returned by ``convert_results``, if specified.
+
+    Raises
+    ------
+    QueryBudgetError
+        If the query exceeds the budget.
     """
     recordclasses = registry.queryDimensionRecords(
         element=element,
@@ -148,7 +321,32 @@ def query_dimension_records(
         check=check,
         **kwargs,
     )
-    return [
-        dict(record=encode_record_dict(record.toDict()))
-        for record in recordclasses
-    ]
+    if limit is not None:
+        order = order_by or registry.dimensions[element].required.names
+        recordclasses = recordclasses.order_by(*order).limit(limit, offset)
+    if budget is not None and budget.enabled:
+        budget.check(
+            analyze_query(
+                registry,
+                recordclasses if budget.explain else None,
+                element=element,
+                dataid=dataid,
+                datasets=datasets,
+                collections=collections,
+                where=where,
+                kwargs=kwargs,
+            ),
+            paginated=limit is not None,
+        )
+    with time_phase("registry_query"):
+        records = list(recordclasses)
+    with time_phase("encoding"):
+        if convert_results is not None:
+            return convert_results(registry.dimensions[element], records)
+        if convert_row is make_simple_record and encoding_pool is not None:
+            batch = make_record_batch(registry.dimensions[element], records)
+            return [
+                dict(record=encoded_record)
+                for encoded_record in encoding_pool.encode_lines(batch)
+            ]
+        return [convert_row(record) for record in records]
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+__all__ = [
+    "get_dimension_records_watermark",
+    "make_simple_record_with_data_id",
+    "simple_query_dimension_records_changes",
+]
+
+import json
+import typing
+
+import lsst.daf.butler
+
+from ..record_encoder import get_record_encoder
+from ..utils import load_json_arg
+from ..watermark import (
+    MaxValuesT,
+    add_watermark_constraint,
+    check_watermark_dimension,
+    decode_watermark,
+    default_watermark_dimension,
+    encode_watermark,
+    update_watermark,
+)
+from .simple_query_data_ids import convert_data_id
+from .simple_query_dimension_records import simple_query_dimension_records
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+def make_simple_record_with_data_id(
+    record: lsst.daf.butler.DimensionRecord,
+) -> dict:
+    """Convert a dimension record to a SimpleRecord dict,
+    with an extra "data_id" item: a dict of dimension name: value.
+    """
+    return dict(
+        record=get_record_encoder(record.definition).encode(record),
+        data_id=convert_data_id(record.dataId),
+    )
+
+
+async def simple_query_dimension_records_changes(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    element: str,
+    since: typing.Optional[str] = None,
+    watermark_dimension: typing.Optional[str] = None,
+    where: typing.Optional[str] = None,
+    bind: typing.Optional[str] = None,
+    **kwargs: typing.Any,
+) -> dict:
+    """Call simple_query_dimension_records and return the records
+    added since a watermark, and a new watermark.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    element
+        The dimension element to obtain.
+    since
+        Watermark returned by the previous query.
+        If None then return all records.
+    watermark_dimension
+        Dimension whose values increase as records are added.
+        If None then use the finest required dimension of ``element``
+        that has an integer primary key and is not a governor;
+        see `butlerservice.watermark.default_watermark_dimension`.
+    where
+        A string expression similar to a SQL WHERE clause.
+    bind
+        Json-encoded values for the ``where`` expression.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    changes
+        Dict with items "nodes" (a list of SimpleRecord dicts)
+        and "watermark" (the watermark for the next query).
+    """
+    watermark_dimension, group_names, bind = _get_watermark_args(
+        app, element, watermark_dimension, bind
+    )
+    max_values = decode_watermark(since, watermark_dimension)
+    where, new_bind = add_watermark_constraint(
+        where=where,
+        bind=bind,
+        dimension=watermark_dimension,
+        group_names=group_names,
+        max_values=max_values,
+    )
+    rows = await simple_query_dimension_records(
+        app,
+        info,
+        element=element,
+        where=where,
+        bind=None if new_bind is None else json.dumps(new_bind),
+        convert_row=make_simple_record_with_data_id,
+        **kwargs,
+    )
+    max_values = update_watermark(
+        max_values,
+        (row["data_id"] for row in rows),
+        dimension=watermark_dimension,
+        group_names=group_names,
+    )
+    return dict(
+        nodes=[dict(record=row["record"]) for row in rows],
+        watermark=encode_watermark(watermark_dimension, max_values),
+    )
+
+
+async def get_dimension_records_watermark(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    element: str,
+    watermark_dimension: typing.Optional[str] = None,
+    where: typing.Optional[str] = None,
+    bind: typing.Optional[str] = None,
+    **kwargs: typing.Any,
+) -> str:
+    """Get the watermark that `simple_query_dimension_records_changes`
+    would return for a query with no ``since``, without fetching
+    all the records.
+
+    Each step queries the one record with the largest value of
+    the watermark dimension that is beyond the watermark so far,
+    which adds a new group to the watermark; so this runs one query
+    per group (e.g. per instrument), plus one.
+
+    The parameters are as for `simple_query_dimension_records_changes`.
+    """
+    watermark_dimension, group_names, bind = _get_watermark_args(
+        app, element, watermark_dimension, bind
+    )
+    max_values: MaxValuesT = {}
+    while True:
+        step_where, step_bind = add_watermark_constraint(
+            where=where,
+            bind=bind,
+            dimension=watermark_dimension,
+            group_names=group_names,
+            max_values=max_values,
+        )
+        rows = await simple_query_dimension_records(
+            app,
+            info,
+            element=element,
+            where=step_where,
+            bind=None if step_bind is None else json.dumps(step_bind),
+            limit=1,
+            order_by=(f"-{watermark_dimension}",),
+            convert_row=make_simple_record_with_data_id,
+            **kwargs,
+        )
+        new_max_values = update_watermark(
+            max_values,
+            (row["data_id"] for row in rows),
+            dimension=watermark_dimension,
+            group_names=group_names,
+        )
+        if new_max_values == max_values:
+            return encode_watermark(watermark_dimension, max_values)
+        max_values = new_max_values
+
+
+def _get_watermark_args(
+    app: aiohttp.web.Application,
+    element: str,
+    watermark_dimension: typing.Optional[str],
+    bind: typing.Optional[str],
+) -> typing.Tuple[str, typing.Tuple[str, ...], typing.Optional[dict]]:
+    """Check the watermark arguments of a dimension record query.
+
+    Returns
+    -------
+    watermark_dimension, group_names, bind
+        The watermark dimension (the default if not specified),
+        the dimensions that group its values,
+        and the decoded ``bind`` values.
+    """
+    universe = app["butlerservice/butler"].registry.dimensions
+    try:
+        required_names = list(universe[element].required.names)
+    except LookupError:
+        raise RuntimeError(f"Unknown dimension element {element!r}")
+    if watermark_dimension is None:
+        watermark_dimension = default_watermark_dimension(
+            universe, required_names
+        )
+    group_names = check_watermark_dimension(
+        universe, watermark_dimension, required_names
+    )
+    decoded_bind = None
+    if bind is not None:
+        try:
+            decoded_bind = load_json_arg(bind)
+        except json.JSONDecodeError as e:
+            raise RuntimeError(f"Cannot decode bind: {e}")
+    return watermark_dimension, group_names, decoded_bind
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+__all__ = ["simple_query_dimension_records_connection"]
+
+import typing
+
+from ..pagination import decode_cursor, make_connection
+from .simple_query_dimension_records import simple_query_dimension_records
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+
+async def simple_query_dimension_records_connection(
+    app: aiohttp.web.Application,
+    info: graphql.GraphQLResolveInfo,
+    first: int,
+    after: typing.Optional[str] = None,
+    **kwargs: typing.Any,
+) -> dict:
+    """Call simple_query_dimension_records and return one page of results
+    as a Relay-style connection.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    info
+        Information about this request.
+    first
+        Maximum number of rows to return.
+    after
+        Cursor of the row before the first row to return.
+        If None then start at the beginning.
+    kwargs
+        The remaining parameters are described in the schema.
+
+    Returns
+    -------
+    connection
+        Connection dict; see `butlerservice.pagination.make_connection`.
+    """
+    max_page_size = app["safir/config"].max_page_size
+    if not 0 < first <= max_page_size:
+        raise RuntimeError(
+            f"first={first} must be in range [1, {max_page_size}]"
+        )
+    offset = decode_cursor(after)
+    # Ask for one extra row, to determine if there is a next page.
+    rows = await simple_query_dimension_records(
+        app, info, limit=first + 1, offset=offset, **kwargs
+    )
+    return make_connection(rows, first=first, offset=offset)
@@ -0,0 +1,165 @@
+"""In-memory cache of query results."""
+
+from __future__ import annotations
+
+__all__ = ["ResultCache", "estimate_size"]
+
+import collections
+import sys
+import time
+import typing
+
+
+def estimate_size(value: typing.Any) -> int:
+    """Estimate the memory used by a query result, in bytes.
+
+    Handles nested lists, tuples and dicts of plain old data.
+    The estimate is rough, but it is cheap and grows with the data.
+    """
+    if isinstance(value, (str, bytes)):
+        return len(value) + 50
+    elif isinstance(value, dict):
+        return 100 + sum(
+            estimate_size(key) + estimate_size(item)
+            for key, item in value.items()
+        )
+    elif isinstance(value, (list, tuple)):
+        return 60 + sum(estimate_size(item) + 8 for item in value)
+    return sys.getsizeof(value)
+
+
+class _CacheEntry(typing.NamedTuple):
+    value: typing.Any
+    size: int
+    expiration_time: float
+
+
+class ResultCache:
+    """A least-recently-used cache of query results,
+    with a memory budget and a time limit for each entry.
+
+    Parameters
+    ----------
+    max_bytes
+        The maximum total size of the cached values, in bytes,
+        as estimated by `estimate_size`. If adding a value would exceed
+        this budget, the least recently used values are evicted.
+        If 0 then the cache is disabled.
+    ttl
+        The default time (sec) after which an entry expires.
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+
+    Each `clear` starts a new `generation`. A query that started before
+    a clear may have read old data, so pass the generation read when
+    the query started to `put`, which drops values of older generations.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.num_bytes = 0
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+        self.generation = 0
+        self._entries: typing.OrderedDict[typing.Hashable, _CacheEntry] = (
+            collections.OrderedDict()
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Is the cache enabled?"""
+        return self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        """Get a cached value, or None if not found or expired.
+
+        Updates the hit and miss counters.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.expiration_time < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.num_misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.num_hits += 1
+        return entry.value
+
+    def put(
+        self,
+        key: typing.Hashable,
+        value: typing.Any,
+        ttl: typing.Optional[float] = None,
+        generation: typing.Optional[int] = None,
+    ) -> None:
+        """Add a value to the cache.
+
+        Parameters
+        ----------
+        key
+            Key; typically a tuple of normalized query arguments.
+        value
+            Value to cache; must not be None.
+        ttl
+            Time (sec) after which the entry expires.
+            If None then use ``self.ttl``.
+        generation
+            The `generation` when the query that computed the value
+            started. If specified and older than the current generation,
+            the value is not cached.
+
+        Notes
+        -----
+        Values larger than the whole budget are silently not cached.
+        """
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        if ttl is None:
+            ttl = self.ttl
+        size = estimate_size(value)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return
+        while self.num_bytes + size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.num_evictions += 1
+        self._entries[key] = _CacheEntry(
+            value=value, size=size, expiration_time=time.monotonic() + ttl
+        )
+        self.num_bytes += size
+
+    def clear(self) -> None:
+        """Remove all entries and start a new generation,
+        without resetting the counters.
+        """
+        self._entries.clear()
+        self.generation += 1
+        self.num_bytes = 0
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the current state of the cache as a dict."""
+        num_lookups = self.num_hits + self.num_misses
+        return dict(
+            max_bytes=self.max_bytes,
+            num_bytes=self.num_bytes,
+            num_entries=len(self._entries),
+            num_hits=self.num_hits,
+            num_misses=self.num_misses,
+            num_evictions=self.num_evictions,
+            hit_rate=self.num_hits / num_lookups if num_lookups else 0.0,
+        )
+
+    def _remove(self, key: typing.Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.num_bytes -= entry.size
@@ -1,22 +1,98 @@
 """Configuration definition."""
 
-__all__ = ["app_schema"]
+__all__ = ["make_app_schema"]
 
 import graphql
+import lsst.daf.butler
 
+from butlerservice.schemas.batch_query_dimension_records_field import (
+    batch_query_dimension_records_field,
+)
+from butlerservice.schemas.data_id_record_fields import (
+    make_data_id_record_fields,
+)
+from butlerservice.schemas.dimension_records_added_field import (
+    dimension_records_added_field,
+)
+from butlerservice.schemas.dimension_types import (
+    make_data_id_type,
+    make_dimension_record_types,
+)
+from butlerservice.schemas.estimate_query_data_ids_field import (
+    estimate_query_data_ids_field,
+)
+from butlerservice.schemas.estimate_query_dimension_records_field import (
+    estimate_query_dimension_records_field,
+)
+from butlerservice.schemas.query_data_ids_field import (
+    make_query_data_ids_field,
+)
+from butlerservice.schemas.query_dimension_records_columnar_field import (
+    query_dimension_records_columnar_field,
+)
+from butlerservice.schemas.query_dimension_records_field import (
+    make_query_dimension_records_field,
+)
+from butlerservice.schemas.simple_query_data_ids_changes_field import (
+    simple_query_data_ids_changes_field,
+)
+from butlerservice.schemas.simple_query_data_ids_connection_field import (
+    simple_query_data_ids_connection_field,
+)
 from butlerservice.schemas.simple_query_data_ids_field import (
     simple_query_data_ids_field,
 )
+from butlerservice.schemas.simple_query_dimension_records_changes_field import (  # noqa
+    simple_query_dimension_records_changes_field,
+)
+from butlerservice.schemas.simple_query_dimension_records_connection_field import (  # noqa
+    simple_query_dimension_records_connection_field,
+)
 from butlerservice.schemas.simple_query_dimension_records_field import (
     simple_query_dimension_records_field,
 )
 
-app_schema = graphql.GraphQLSchema(
-    query=graphql.GraphQLObjectType(
-        name="Query",
-        fields=dict(
-            simple_query_data_ids=simple_query_data_ids_field,
-            simple_query_dimension_records=simple_query_dimension_records_field,  # noqa
+
+def make_app_schema(
+    universe: lsst.daf.butler.DimensionUniverse,
+) -> graphql.GraphQLSchema:
+    """Make the GraphQL schema for the butler service.
+
+    Parameters
+    ----------
+    universe
+        Dimension universe of the butler repository;
+        used to generate the types of typed data IDs and records.
+    """
+    record_types = make_dimension_record_types(universe)
+    data_id_type = make_data_id_type(
+        universe,
+        extra_fields=make_data_id_record_fields(universe, record_types),
+    )
+    return graphql.GraphQLSchema(
+        query=graphql.GraphQLObjectType(
+            name="Query",
+            fields=dict(
+                simple_query_data_ids=simple_query_data_ids_field,
+                simple_query_dimension_records=simple_query_dimension_records_field,  # noqa
+                simple_query_data_ids_connection=simple_query_data_ids_connection_field,  # noqa
+                simple_query_dimension_records_connection=simple_query_dimension_records_connection_field,  # noqa
+                simple_query_data_ids_changes=simple_query_data_ids_changes_field,  # noqa
+                simple_query_dimension_records_changes=simple_query_dimension_records_changes_field,  # noqa
+                query_data_ids=make_query_data_ids_field(data_id_type),
+                query_dimension_records=make_query_dimension_records_field(
+                    record_types
+                ),
+                query_dimension_records_columnar=query_dimension_records_columnar_field,  # noqa
+                batch_query_dimension_records=batch_query_dimension_records_field,  # noqa
+                estimate_query_data_ids=estimate_query_data_ids_field,
+                estimate_query_dimension_records=estimate_query_dimension_records_field,  # noqa
+            ),
         ),
-    ),
-)
+        subscription=graphql.GraphQLObjectType(
+            name="Subscription",
+            fields=dict(
+                dimension_records_added=dimension_records_added_field,
+            ),
+        ),
+    )
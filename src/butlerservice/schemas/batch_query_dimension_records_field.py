@@ -0,0 +1,52 @@
+"""Configuration definition."""
+
+__all__ = ["batch_query_dimension_records_field"]
+
+import graphql
+
+from butlerservice.resolvers.batch_query_dimension_records import (
+    batch_query_dimension_records,
+)
+from butlerservice.schemas.batch_query_entry_type import BatchQueryEntryType
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+from butlerservice.schemas.simple_record_type import SimpleRecordType
+
+# Arguments of simple_query_dimension_records that apply to every entry.
+SHARED_ARG_NAMES = (
+    "element",
+    "datasets",
+    "datasetregexs",
+    "collections",
+    "collectionregexs",
+    "components",
+    "check",
+    "kwargs",
+    "usecache",
+)
+
+batch_query_dimension_records_field = graphql.GraphQLField(
+    graphql.GraphQLList(graphql.GraphQLList(SimpleRecordType)),
+    args=dict(
+        entries=graphql.GraphQLArgument(
+            graphql.GraphQLNonNull(
+                graphql.GraphQLList(
+                    graphql.GraphQLNonNull(BatchQueryEntryType)
+                )
+            ),
+            description="The queries, each specified by a data ID "
+            "and/or a where expression with bind values.",
+        ),
+        **{
+            name: simple_query_dimension_records_field.args[name]
+            for name in SHARED_ARG_NAMES
+        },
+    ),
+    resolve=batch_query_dimension_records,
+    description="Run many dimension record queries for one element "
+    "in one request, and return one list of records per entry. "
+    "Compatible entries are combined into a single registry query: "
+    "for example entries with data IDs that differ only in the exposure "
+    "become one query with 'exposure IN (...)'.",
+)
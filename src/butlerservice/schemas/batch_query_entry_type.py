@@ -0,0 +1,31 @@
+"""Configuration definition."""
+
+__all__ = ["BatchQueryEntryType"]
+
+import graphql
+
+BatchQueryEntryType = graphql.GraphQLInputObjectType(
+    name="BatchQueryEntry",
+    fields=dict(
+        dataid=graphql.GraphQLInputField(
+            graphql.GraphQLString,
+            description="Data ID dict encoded as json. "
+            "If provided, the key-value pairs are used as "
+            "equality constraints in the query.",
+        ),
+        where=graphql.GraphQLInputField(
+            graphql.GraphQLString,
+            description="A string expression similar to a SQL WHERE clause. "
+            "Entries whose where expression is a simple equality "
+            "such as 'exposure.seq_num = seq' (with the value in bind) "
+            "can be combined with other entries into one registry query.",
+        ),
+        bind=graphql.GraphQLInputField(
+            graphql.GraphQLString,
+            description="Mapping containing literal values that should be "
+            "injected into the where expression, keyed by the identifiers "
+            "they replace. A json-encoded dict.",
+        ),
+    ),
+    description="One query in a batch query.",
+)
@@ -0,0 +1,56 @@
+"""Configuration definition."""
+
+__all__ = ["ColumnType", "ColumnarRecordsType"]
+
+import graphql
+
+from butlerservice.schemas.json_type import JSONType
+
+ColumnType = graphql.GraphQLObjectType(
+    name="Column",
+    fields=dict(
+        name=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLString),
+            description="Field name.",
+        ),
+        type=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLString),
+            description="Data type: one of int, float, string, bool, "
+            "timespan (a list of [begin, end] TAI ISO strings), "
+            "region (lsst.sphgeom.Region.encode() as a hex string), "
+            "or other.",
+        ),
+        values=graphql.GraphQLField(
+            JSONType,
+            description="List of values, one per row; "
+            "null if the column is dictionary-encoded.",
+        ),
+        dictionary=graphql.GraphQLField(
+            graphql.GraphQLList(graphql.GraphQLString),
+            description="The distinct values, if the column is "
+            "dictionary-encoded, else null.",
+        ),
+        indices=graphql.GraphQLField(
+            graphql.GraphQLList(graphql.GraphQLInt),
+            description="If the column is dictionary-encoded, then for "
+            "each row the index of the value in dictionary "
+            "(or null if the value is null), else null.",
+        ),
+    ),
+)
+
+ColumnarRecordsType = graphql.GraphQLObjectType(
+    name="ColumnarRecords",
+    fields=dict(
+        num_rows=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLInt),
+            description="The number of records.",
+        ),
+        columns=graphql.GraphQLField(
+            graphql.GraphQLNonNull(
+                graphql.GraphQLList(graphql.GraphQLNonNull(ColumnType))
+            ),
+            description="One column per field of the records.",
+        ),
+    ),
+)
@@ -0,0 +1,44 @@
+"""Configuration definition."""
+
+__all__ = ["make_data_id_record_fields"]
+
+import functools
+import typing
+
+import graphql
+import lsst.daf.butler
+
+from butlerservice.resolvers.record_loader import resolve_data_id_record
+
+
+def make_data_id_record_fields(
+    universe: lsst.daf.butler.DimensionUniverse,
+    record_types: typing.Dict[str, graphql.GraphQLObjectType],
+) -> typing.Dict[str, graphql.GraphQLField]:
+    """Make the fields of a typed data ID that return dimension records.
+
+    There is one field per dimension element, named ``<element>_record``,
+    e.g. ``exposure_record``. The records of each element are looked up
+    with one registry query per request, no matter how many data IDs
+    are returned; see `butlerservice.resolvers.record_loader.RecordLoader`.
+
+    Parameters
+    ----------
+    universe
+        Dimension universe.
+    record_types
+        Dict of element name: record type;
+        see `butlerservice.schemas.dimension_types`.
+    """
+    return {
+        f"{element.name}_record": graphql.GraphQLField(
+            record_types[element.name],
+            resolve=functools.partial(
+                resolve_data_id_record, element_name=element.name
+            ),
+            description=f"The {element.name} record of this data ID; "
+            f"null if the data ID does not include the required "
+            f"dimensions of {element.name}.",
+        )
+        for element in universe.getStaticElements()
+    }
@@ -0,0 +1,35 @@
+"""Configuration definition."""
+
+__all__ = ["dimension_records_added_field"]
+
+import graphql
+
+from butlerservice.resolvers.dimension_records_added import (
+    resolve_dimension_records_added,
+    subscribe_dimension_records_added,
+)
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+from butlerservice.schemas.simple_record_changes_type import (
+    SimpleRecordChangesType,
+)
+from butlerservice.schemas.watermark_args import watermark_args
+
+dimension_records_added_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(SimpleRecordChangesType),
+    args=dict(
+        {
+            name: arg
+            for name, arg in simple_query_dimension_records_field.args.items()
+            if name != "usecache"
+        },
+        watermark_dimension=watermark_args["watermark_dimension"],
+    ),
+    subscribe=subscribe_dimension_records_added,
+    resolve=resolve_dimension_records_added,
+    description="Dimension records matching the arguments of "
+    "simple_query_dimension_records, pushed as they are added. "
+    "Each event has the new records and a watermark that may be "
+    "specified as 'since' in simple_query_dimension_records_changes.",
+)
@@ -0,0 +1,153 @@
+"""GraphQL types generated from a dimension universe."""
+
+__all__ = [
+    "BigIntType",
+    "TimespanType",
+    "make_data_id_type",
+    "make_dimension_record_types",
+    "record_type_name",
+]
+
+import functools
+import typing
+
+import graphql
+import lsst.daf.butler
+import sqlalchemy
+
+
+def _parse_big_int_literal(
+    value_node: graphql.ValueNode, _variables: typing.Any = None
+) -> int:
+    if not isinstance(value_node, graphql.IntValueNode):
+        raise graphql.GraphQLError(
+            f"BigInt cannot represent non-integer value: {value_node}"
+        )
+    return int(value_node.value)
+
+
+BigIntType = graphql.GraphQLScalarType(
+    name="BigInt",
+    description="An integer that may not fit in 32 bits, "
+    "such as an exposure ID.",
+    serialize=int,
+    parse_value=int,
+    parse_literal=_parse_big_int_literal,
+)
+
+TimespanType = graphql.GraphQLObjectType(
+    name="Timespan",
+    fields=dict(
+        begin=graphql.GraphQLField(
+            graphql.GraphQLString,
+            description="Begin time (inclusive): TAI as an ISO string.",
+        ),
+        end=graphql.GraphQLField(
+            graphql.GraphQLString,
+            description="End time (exclusive): TAI as an ISO string.",
+        ),
+    ),
+)
+
+RegionType = graphql.GraphQLScalarType(
+    name="Region",
+    description="A region on the sky: "
+    "lsst.sphgeom.Region.encode() as a hex string.",
+    serialize=str,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def record_type_name(element_name: str) -> str:
+    """Get the name of the GraphQL record type for a dimension element,
+    e.g. "ExposureRecord" for "exposure".
+    """
+    return (
+        "".join(word.capitalize() for word in element_name.split("_"))
+        + "Record"
+    )
+
+
+def _get_graphql_type(
+    field_spec: lsst.daf.butler.ddl.FieldSpec,
+) -> graphql.GraphQLScalarType:
+    """Get the GraphQL scalar type for a dimension record field."""
+    python_type = field_spec.getPythonType()
+    if python_type is bool:
+        return graphql.GraphQLBoolean
+    elif python_type is int:
+        if issubclass(field_spec.dtype, sqlalchemy.BigInteger):
+            return BigIntType
+        return graphql.GraphQLInt
+    elif python_type is float:
+        return graphql.GraphQLFloat
+    # Strings, and anything else that we can represent as a string.
+    return graphql.GraphQLString
+
+
+def make_dimension_record_types(
+    universe: lsst.daf.butler.DimensionUniverse,
+) -> typing.Dict[str, graphql.GraphQLObjectType]:
+    """Make a GraphQL object type for the records of each
+    dimension element in a universe.
+
+    Returns
+    -------
+    record_types
+        Dict of element name: record type, where the name of each
+        record type is given by `record_type_name`.
+    """
+    record_types = {}
+    for element in universe.getStaticElements():
+        fields = {
+            field_spec.name: graphql.GraphQLField(
+                _get_graphql_type(field_spec),
+                description=field_spec.doc,
+            )
+            for field_spec in element.RecordClass.fields.standard
+        }
+        if element.temporal is not None:
+            fields["timespan"] = graphql.GraphQLField(TimespanType)
+        if element.spatial is not None:
+            fields["region"] = graphql.GraphQLField(RegionType)
+        record_types[element.name] = graphql.GraphQLObjectType(
+            name=record_type_name(element.name),
+            fields=fields,
+            description=f"Record of dimension element {element.name}.",
+        )
+    return record_types
+
+
+def make_data_id_type(
+    universe: lsst.daf.butler.DimensionUniverse,
+    extra_fields: typing.Optional[
+        typing.Dict[str, graphql.GraphQLField]
+    ] = None,
+) -> graphql.GraphQLObjectType:
+    """Make a GraphQL object type for data IDs,
+    with one field for each dimension in a universe.
+
+    Fields for dimensions not in a particular data ID are null.
+
+    Parameters
+    ----------
+    universe
+        Dimension universe.
+    extra_fields
+        Additional fields, if any, e.g. fields that return records;
+        see `butlerservice.schemas.data_id_record_fields`.
+    """
+    fields = {
+        dimension.name: graphql.GraphQLField(
+            _get_graphql_type(dimension.primaryKey)
+        )
+        for dimension in universe.getStaticDimensions()
+    }
+    if extra_fields:
+        fields.update(extra_fields)
+    return graphql.GraphQLObjectType(
+        name="DataId",
+        fields=fields,
+        description="Data ID; each field is the value of a dimension. "
+        "Dimensions not in the data ID are null.",
+    )
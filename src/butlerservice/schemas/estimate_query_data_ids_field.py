@@ -0,0 +1,23 @@
+"""Configuration definition."""
+
+__all__ = ["estimate_query_data_ids_field"]
+
+import graphql
+
+from butlerservice.resolvers.estimate_query import estimate_query_data_ids
+from butlerservice.schemas.query_estimate_type import QueryEstimateType
+from butlerservice.schemas.simple_query_data_ids_field import (
+    simple_query_data_ids_field,
+)
+
+estimate_query_data_ids_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(QueryEstimateType),
+    args={
+        name: arg
+        for name, arg in simple_query_data_ids_field.args.items()
+        if name != "usecache"
+    },
+    resolve=estimate_query_data_ids,
+    description="Estimate the cost of a simple_query_data_ids query "
+    "with the same arguments, without running it.",
+)
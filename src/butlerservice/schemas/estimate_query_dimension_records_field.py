@@ -0,0 +1,25 @@
+"""Configuration definition."""
+
+__all__ = ["estimate_query_dimension_records_field"]
+
+import graphql
+
+from butlerservice.resolvers.estimate_query import (
+    estimate_query_dimension_records,
+)
+from butlerservice.schemas.query_estimate_type import QueryEstimateType
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+
+estimate_query_dimension_records_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(QueryEstimateType),
+    args={
+        name: arg
+        for name, arg in simple_query_dimension_records_field.args.items()
+        if name != "usecache"
+    },
+    resolve=estimate_query_dimension_records,
+    description="Estimate the cost of a simple_query_dimension_records query "
+    "with the same arguments, without running it.",
+)
@@ -0,0 +1,12 @@
+"""Configuration definition."""
+
+__all__ = ["JSONType"]
+
+import graphql
+
+JSONType = graphql.GraphQLScalarType(
+    name="JSON",
+    description="Arbitrary json-compatible data, "
+    "returned as-is (not as a json-encoded string).",
+    serialize=lambda value: value,
+)
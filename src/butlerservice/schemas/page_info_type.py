@@ -0,0 +1,30 @@
+"""Configuration definition."""
+
+__all__ = ["PageInfoType"]
+
+import graphql
+
+PageInfoType = graphql.GraphQLObjectType(
+    name="PageInfo",
+    fields=dict(
+        has_next_page=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLBoolean),
+            description="Are there more rows after this page?",
+        ),
+        has_previous_page=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLBoolean),
+            description="Are there rows before this page?",
+        ),
+        start_cursor=graphql.GraphQLField(
+            graphql.GraphQLString,
+            description="Cursor of the first row in this page; "
+            "null if the page is empty.",
+        ),
+        end_cursor=graphql.GraphQLField(
+            graphql.GraphQLString,
+            description="Cursor of the last row in this page; "
+            "null if the page is empty. Specify this as the 'after' "
+            "argument to get the next page.",
+        ),
+    ),
+)
@@ -0,0 +1,20 @@
+"""Configuration definition."""
+
+__all__ = ["pagination_args"]
+
+import graphql
+
+pagination_args = dict(
+    first=graphql.GraphQLArgument(
+        graphql.GraphQLNonNull(graphql.GraphQLInt),
+        description="Maximum number of rows to return. "
+        "Must be positive and no larger than the service's maximum page size.",
+    ),
+    after=graphql.GraphQLArgument(
+        graphql.GraphQLString,
+        description="Return rows after the row with this cursor, "
+        "typically 'page_info.end_cursor' from the previous page. "
+        "If omitted, start at the beginning. Rows are sorted by "
+        "primary key, so pages are consistent if the data does not change.",
+    ),
+)
@@ -0,0 +1,29 @@
+"""Configuration definition."""
+
+__all__ = ["make_query_data_ids_field"]
+
+import graphql
+
+from butlerservice.resolvers.query_data_ids import query_data_ids
+from butlerservice.schemas.simple_query_data_ids_field import (
+    simple_query_data_ids_field,
+)
+
+
+def make_query_data_ids_field(
+    data_id_type: graphql.GraphQLObjectType,
+) -> graphql.GraphQLField:
+    """Make the query_data_ids field.
+
+    Parameters
+    ----------
+    data_id_type
+        Data ID type; see `butlerservice.schemas.dimension_types`.
+    """
+    return graphql.GraphQLField(
+        graphql.GraphQLList(data_id_type),
+        args=simple_query_data_ids_field.args,
+        resolve=query_data_ids,
+        description="Query for data IDs matching user-provided criteria, "
+        "as typed data IDs.",
+    )
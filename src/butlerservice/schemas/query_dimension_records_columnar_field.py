@@ -0,0 +1,22 @@
+"""Configuration definition."""
+
+__all__ = ["query_dimension_records_columnar_field"]
+
+import graphql
+
+from butlerservice.resolvers.query_dimension_records_columnar import (
+    query_dimension_records_columnar,
+)
+from butlerservice.schemas.columnar_records_type import ColumnarRecordsType
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+
+query_dimension_records_columnar_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(ColumnarRecordsType),
+    args=simple_query_dimension_records_field.args,
+    resolve=query_dimension_records_columnar,
+    description="Query for dimension records matching user-provided "
+    "criteria, and return them as columns. This is much more compact "
+    "than a list of records, and much faster for large results.",
+)
@@ -0,0 +1,41 @@
+"""Configuration definition."""
+
+__all__ = ["make_query_dimension_records_field"]
+
+import typing
+
+import graphql
+
+from butlerservice.resolvers.query_dimension_records import (
+    query_dimension_records,
+)
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+
+
+def make_query_dimension_records_field(
+    record_types: typing.Dict[str, graphql.GraphQLObjectType],
+) -> graphql.GraphQLField:
+    """Make the query_dimension_records field.
+
+    Parameters
+    ----------
+    record_types
+        Dict of element name: record type;
+        see `butlerservice.schemas.dimension_types`.
+    """
+    dimension_record_type = graphql.GraphQLUnionType(
+        name="DimensionRecord",
+        types=list(record_types.values()),
+        description="Record of any dimension element. "
+        "Use an inline fragment to select fields, e.g. "
+        "'... on ExposureRecord { id day_obs }'.",
+    )
+    return graphql.GraphQLField(
+        graphql.GraphQLList(dimension_record_type),
+        args=simple_query_dimension_records_field.args,
+        resolve=query_dimension_records,
+        description="Query for dimension records matching "
+        "user-provided criteria, as typed records.",
+    )
@@ -0,0 +1,67 @@
+"""Configuration definition."""
+
+__all__ = ["QueryEstimateType"]
+
+import graphql
+
+_StringListType = graphql.GraphQLNonNull(
+    graphql.GraphQLList(graphql.GraphQLNonNull(graphql.GraphQLString))
+)
+
+QueryEstimateType = graphql.GraphQLObjectType(
+    name="QueryEstimate",
+    fields=dict(
+        cost=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLFloat),
+            description="Rough relative cost of the query: the number "
+            "of dimensions, multiplied by the numbers of dataset types "
+            "and collections and by 4 for each unconstrained governor "
+            "dimension. A lookup of one dimension costs 1.",
+        ),
+        num_dimensions=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLInt),
+            description="The number of dimensions the query spans, "
+            "including implied dimensions.",
+        ),
+        num_dataset_types=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLInt),
+            description="The number of dataset types that constrain "
+            "the query, after expanding regular expressions.",
+        ),
+        num_collections=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLInt),
+            description="The number of collections searched for datasets, "
+            "after expanding regular expressions and chains.",
+        ),
+        unconstrained_governors=graphql.GraphQLField(
+            _StringListType,
+            description="Governor dimensions, such as 'instrument', "
+            "that the query spans but does not constrain "
+            "in dataid or where.",
+        ),
+        plan_cost=graphql.GraphQLField(
+            graphql.GraphQLFloat,
+            description="The database's estimate of the cost of the query, "
+            "in its own units; null if not known.",
+        ),
+        plan_rows=graphql.GraphQLField(
+            graphql.GraphQLFloat,
+            description="The database's estimate of the number of rows; "
+            "null if not known.",
+        ),
+        full_scans=graphql.GraphQLField(
+            _StringListType,
+            description="Tables that the database reads in full.",
+        ),
+        rejection=graphql.GraphQLField(
+            graphql.GraphQLString,
+            description="Why the query would be rejected, "
+            "or null if it would be run.",
+        ),
+        paginated_rejection=graphql.GraphQLField(
+            graphql.GraphQLString,
+            description="Why the query would be rejected if paginated "
+            "(by a _connection field), or null if it would be run.",
+        ),
+    ),
+)
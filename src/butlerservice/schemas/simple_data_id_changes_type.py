@@ -0,0 +1,24 @@
+"""Configuration definition."""
+
+__all__ = ["SimpleDataIdChangesType"]
+
+import graphql
+
+from butlerservice.schemas.simple_data_id_type import SimpleDataIdType
+
+SimpleDataIdChangesType = graphql.GraphQLObjectType(
+    name="SimpleDataIdChanges",
+    fields=dict(
+        nodes=graphql.GraphQLField(
+            graphql.GraphQLNonNull(
+                graphql.GraphQLList(graphql.GraphQLNonNull(SimpleDataIdType))
+            ),
+            description="Data IDs added since the watermark.",
+        ),
+        watermark=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLString),
+            description="Opaque watermark to specify as 'since' "
+            "in the next query.",
+        ),
+    ),
+)
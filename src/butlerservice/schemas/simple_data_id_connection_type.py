@@ -0,0 +1,37 @@
+"""Configuration definition."""
+
+__all__ = ["SimpleDataIdConnectionType", "SimpleDataIdEdgeType"]
+
+import graphql
+
+from butlerservice.schemas.page_info_type import PageInfoType
+from butlerservice.schemas.simple_data_id_type import SimpleDataIdType
+
+SimpleDataIdEdgeType = graphql.GraphQLObjectType(
+    name="SimpleDataIdEdge",
+    fields=dict(
+        cursor=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLString),
+            description="Opaque cursor identifying this row.",
+        ),
+        node=graphql.GraphQLField(
+            graphql.GraphQLNonNull(SimpleDataIdType),
+        ),
+    ),
+)
+
+SimpleDataIdConnectionType = graphql.GraphQLObjectType(
+    name="SimpleDataIdConnection",
+    fields=dict(
+        edges=graphql.GraphQLField(
+            graphql.GraphQLNonNull(
+                graphql.GraphQLList(
+                    graphql.GraphQLNonNull(SimpleDataIdEdgeType)
+                )
+            ),
+        ),
+        page_info=graphql.GraphQLField(
+            graphql.GraphQLNonNull(PageInfoType),
+        ),
+    ),
+)
@@ -0,0 +1,24 @@
+"""Configuration definition."""
+
+__all__ = ["simple_query_data_ids_changes_field"]
+
+import graphql
+
+from butlerservice.resolvers.simple_query_data_ids_changes import (
+    simple_query_data_ids_changes,
+)
+from butlerservice.schemas.simple_data_id_changes_type import (
+    SimpleDataIdChangesType,
+)
+from butlerservice.schemas.simple_query_data_ids_field import (
+    simple_query_data_ids_field,
+)
+from butlerservice.schemas.watermark_args import watermark_args
+
+simple_query_data_ids_changes_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(SimpleDataIdChangesType),
+    args=dict(**simple_query_data_ids_field.args, **watermark_args),
+    resolve=simple_query_data_ids_changes,
+    description="Like simple_query_data_ids, but only return "
+    "data IDs added since a watermark, and a new watermark.",
+)
@@ -0,0 +1,24 @@
+"""Configuration definition."""
+
+__all__ = ["simple_query_data_ids_connection_field"]
+
+import graphql
+
+from butlerservice.resolvers.simple_query_data_ids_connection import (
+    simple_query_data_ids_connection,
+)
+from butlerservice.schemas.pagination_args import pagination_args
+from butlerservice.schemas.simple_data_id_connection_type import (
+    SimpleDataIdConnectionType,
+)
+from butlerservice.schemas.simple_query_data_ids_field import (
+    simple_query_data_ids_field,
+)
+
+simple_query_data_ids_connection_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(SimpleDataIdConnectionType),
+    args=dict(**simple_query_data_ids_field.args, **pagination_args),
+    resolve=simple_query_data_ids_connection,
+    description="Like simple_query_data_ids, "
+    "but return one page of results as a Relay-style connection.",
+)
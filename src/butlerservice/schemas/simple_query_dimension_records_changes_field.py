@@ -0,0 +1,24 @@
+"""Configuration definition."""
+
+__all__ = ["simple_query_dimension_records_changes_field"]
+
+import graphql
+
+from butlerservice.resolvers.simple_query_dimension_records_changes import (
+    simple_query_dimension_records_changes,
+)
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+from butlerservice.schemas.simple_record_changes_type import (
+    SimpleRecordChangesType,
+)
+from butlerservice.schemas.watermark_args import watermark_args
+
+simple_query_dimension_records_changes_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(SimpleRecordChangesType),
+    args=dict(**simple_query_dimension_records_field.args, **watermark_args),
+    resolve=simple_query_dimension_records_changes,
+    description="Like simple_query_dimension_records, but only return "
+    "records added since a watermark, and a new watermark.",
+)
@@ -0,0 +1,24 @@
+"""Configuration definition."""
+
+__all__ = ["simple_query_dimension_records_connection_field"]
+
+import graphql
+
+from butlerservice.resolvers.simple_query_dimension_records_connection import (
+    simple_query_dimension_records_connection,
+)
+from butlerservice.schemas.pagination_args import pagination_args
+from butlerservice.schemas.simple_query_dimension_records_field import (
+    simple_query_dimension_records_field,
+)
+from butlerservice.schemas.simple_record_connection_type import (
+    SimpleRecordConnectionType,
+)
+
+simple_query_dimension_records_connection_field = graphql.GraphQLField(
+    graphql.GraphQLNonNull(SimpleRecordConnectionType),
+    args=dict(**simple_query_dimension_records_field.args, **pagination_args),
+    resolve=simple_query_dimension_records_connection,
+    description="Like simple_query_dimension_records, "
+    "but return one page of results as a Relay-style connection.",
+)
@@ -86,6 +86,14 @@ simple_query_dimension_records_field = graphql.GraphQLField(
             "when processing the dataId argument (and may be used to provide "
             "a constraining data ID even when the dataId argument is None).",
         ),
+        usecache=graphql.GraphQLArgument(
+            graphql.GraphQLBoolean,
+            default_value=True,
+            description="If True (default) return a cached result, "
+            "if available. If False then always run the query. "
+            "You may also bypass the cache by sending the HTTP header "
+            "'Cache-Control: no-cache'.",
+        ),
     ),
     resolve=simple_query_dimension_records,
     description="Query for data IDs matching user-provided criteria.",
@@ -0,0 +1,24 @@
+"""Configuration definition."""
+
+__all__ = ["SimpleRecordChangesType"]
+
+import graphql
+
+from butlerservice.schemas.simple_record_type import SimpleRecordType
+
+SimpleRecordChangesType = graphql.GraphQLObjectType(
+    name="SimpleRecordChanges",
+    fields=dict(
+        nodes=graphql.GraphQLField(
+            graphql.GraphQLNonNull(
+                graphql.GraphQLList(graphql.GraphQLNonNull(SimpleRecordType))
+            ),
+            description="Records added since the watermark.",
+        ),
+        watermark=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLString),
+            description="Opaque watermark to specify as 'since' "
+            "in the next query.",
+        ),
+    ),
+)
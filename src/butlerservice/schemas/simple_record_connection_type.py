@@ -0,0 +1,37 @@
+"""Configuration definition."""
+
+__all__ = ["SimpleRecordConnectionType", "SimpleRecordEdgeType"]
+
+import graphql
+
+from butlerservice.schemas.page_info_type import PageInfoType
+from butlerservice.schemas.simple_record_type import SimpleRecordType
+
+SimpleRecordEdgeType = graphql.GraphQLObjectType(
+    name="SimpleRecordEdge",
+    fields=dict(
+        cursor=graphql.GraphQLField(
+            graphql.GraphQLNonNull(graphql.GraphQLString),
+            description="Opaque cursor identifying this row.",
+        ),
+        node=graphql.GraphQLField(
+            graphql.GraphQLNonNull(SimpleRecordType),
+        ),
+    ),
+)
+
+SimpleRecordConnectionType = graphql.GraphQLObjectType(
+    name="SimpleRecordConnection",
+    fields=dict(
+        edges=graphql.GraphQLField(
+            graphql.GraphQLNonNull(
+                graphql.GraphQLList(
+                    graphql.GraphQLNonNull(SimpleRecordEdgeType)
+                )
+            ),
+        ),
+        page_info=graphql.GraphQLField(
+            graphql.GraphQLNonNull(PageInfoType),
+        ),
+    ),
+)
@@ -0,0 +1,22 @@
+"""Configuration definition."""
+
+__all__ = ["watermark_args"]
+
+import graphql
+
+watermark_args = dict(
+    since=graphql.GraphQLArgument(
+        graphql.GraphQLString,
+        description="Only return rows added since this watermark: "
+        "the 'watermark' returned by the previous query. "
+        "If omitted, return all rows.",
+    ),
+    watermark_dimension=graphql.GraphQLArgument(
+        graphql.GraphQLString,
+        description="Dimension with an integer primary key whose values "
+        "increase as rows are added, e.g. 'exposure' or 'visit'. "
+        "Must be a required dimension of the results. If omitted, use "
+        "the finest required dimension with an integer primary key "
+        "that is not a governor (such as 'instrument').",
+    ),
+)
@@ -0,0 +1,95 @@
+"""Coalesce identical concurrent queries."""
+
+from __future__ import annotations
+
+__all__ = ["SingleFlight"]
+
+import asyncio
+import functools
+import typing
+
+T = typing.TypeVar("T")
+
+
+class SingleFlight:
+    """Run only one of a set of identical concurrent operations,
+    and share its result with every caller.
+
+    Notes
+    -----
+    The shared operation runs in its own task, so cancelling one caller
+    (e.g. because its client disconnected) does not cancel the operation
+    for the other callers. The operation is cancelled when every caller
+    has been cancelled.
+
+    The task starts in the context of the first caller (including
+    context variables such as its deadline), so ``func`` should set
+    anything that must not depend on which caller came first.
+
+    Only use this from the event loop thread; it is not thread safe.
+    """
+
+    def __init__(self) -> None:
+        self.num_coalesced = 0
+        self._tasks: typing.Dict[typing.Hashable, asyncio.Future] = {}
+        # Dict of task: number of callers awaiting it.
+        self._num_waiters: typing.Dict[asyncio.Future, int] = {}
+
+    @property
+    def num_in_flight(self) -> int:
+        """The number of distinct operations in progress."""
+        return len(self._tasks)
+
+    def get_status(self) -> typing.Dict[str, int]:
+        """Get the current state as a dict."""
+        return dict(
+            num_in_flight=self.num_in_flight,
+            num_coalesced=self.num_coalesced,
+        )
+
+    async def run(
+        self,
+        key: typing.Hashable,
+        func: typing.Callable[[], typing.Awaitable[T]],
+    ) -> T:
+        """Await ``func()``, unless an operation with the same key
+        is already in progress, in which case await that instead.
+
+        Parameters
+        ----------
+        key
+            Key that identifies the operation,
+            e.g. the normalized query arguments.
+        func
+            Function that takes no arguments and returns an awaitable.
+
+        Returns
+        -------
+        result
+            The result of the operation.
+            If it raises, every caller gets the exception.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(functools.partial(self._forget, key))
+        else:
+            self.num_coalesced += 1
+        self._num_waiters[task] = self._num_waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._num_waiters[task] -= 1
+            if self._num_waiters[task] == 0:
+                del self._num_waiters[task]
+                # No caller is left to use the result.
+                task.cancel()
+
+    def _forget(self, key: typing.Hashable, task: asyncio.Future) -> None:
+        """Forget a finished operation."""
+        del self._tasks[key]
+        if not task.cancelled():
+            # Mark any exception as retrieved, to avoid a spurious warning
+            # if every caller was cancelled; callers still get it.
+            task.exception()
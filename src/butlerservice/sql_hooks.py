@@ -0,0 +1,174 @@
+"""One SQLAlchemy listener for the SQL statements of registry queries,
+which calls the hooks of the features that watch those statements
+in a fixed order.
+"""
+
+from __future__ import annotations
+
+__all__ = [
+    "HOOK_ORDER",
+    "StatementHook",
+    "get_dbapi_connection",
+    "get_statement_hook",
+    "hook_statements",
+]
+
+import contextlib
+import threading
+import typing
+
+import sqlalchemy
+import sqlalchemy.event
+
+# Names of the statement hooks, in the order they are called
+# before each statement (and after it):
+#
+# * "deadline": interrupt the statement if the query is cancelled;
+#   see `butlerservice.deadline.run_cancellable`. First, so that
+#   a cancelled query runs (or explains) no more statements.
+# * "query_analyzer": explain the statement instead of running it;
+#   see `butlerservice.query_analyzer.explain_query`. This stops the
+#   statement, so the hooks after it are not called for it.
+# * "profiling": record the statement and its duration;
+#   see `butlerservice.profiling.run_profiled`.
+HOOK_ORDER = ("deadline", "query_analyzer", "profiling")
+
+_thread_state = threading.local()
+
+_install_lock = threading.Lock()
+_listeners_installed = False
+
+
+class StatementHook:
+    """Called for the SQL statements executed by one thread,
+    while enabled by `hook_statements`.
+
+    Subclasses override one or both methods. Exceptions raised by
+    `before_execute` stop the statement.
+    """
+
+    def before_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        """Called before a statement is executed."""
+
+    def after_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        """Called after a statement is executed (if it succeeded)."""
+
+
+@contextlib.contextmanager
+def hook_statements(name: str, hook: StatementHook) -> typing.Iterator[None]:
+    """Call a hook for the SQL statements executed by this thread,
+    by any engine, while the context is active.
+
+    Parameters
+    ----------
+    name
+        The name of the hook, which sets the order in which
+        it is called; one of `HOOK_ORDER`. Replaces any hook
+        with that name until the context exits.
+    hook
+        The hook.
+    """
+    if name not in HOOK_ORDER:
+        raise ValueError(f"Unknown statement hook {name!r}")
+    _install_listeners()
+    hooks = _get_hooks()
+    previous_hook = hooks.get(name)
+    hooks[name] = hook
+    try:
+        yield
+    finally:
+        if previous_hook is None:
+            del hooks[name]
+        else:
+            hooks[name] = previous_hook
+
+
+def get_statement_hook(name: str) -> typing.Optional[StatementHook]:
+    """Get this thread's hook with the specified name, or None if none."""
+    return _get_hooks().get(name)
+
+
+def get_dbapi_connection(conn: sqlalchemy.engine.Connection) -> typing.Any:
+    """Get the DBAPI connection of a SQLAlchemy connection.
+
+    ``dbapi_connection`` is new in SQLAlchemy 1.4.24 (and ``connection``
+    is deprecated since 2.0); before that, attributes of the pooled
+    connection are looked up on the DBAPI connection, so the lookup fails.
+    """
+    pooled_connection = conn.connection
+    try:
+        return pooled_connection.dbapi_connection
+    except AttributeError:
+        return pooled_connection.connection
+
+
+def _get_hooks() -> typing.Dict[str, StatementHook]:
+    hooks = getattr(_thread_state, "hooks", None)
+    if hooks is None:
+        hooks = _thread_state.hooks = dict()
+    return hooks
+
+
+def _install_listeners() -> None:
+    """Listen for SQL statements executed by any engine (once)."""
+    global _listeners_installed
+    with _install_lock:
+        if _listeners_installed:
+            return
+        sqlalchemy.event.listen(
+            sqlalchemy.engine.Engine,
+            "before_cursor_execute",
+            _before_cursor_execute,
+        )
+        sqlalchemy.event.listen(
+            sqlalchemy.engine.Engine,
+            "after_cursor_execute",
+            _after_cursor_execute,
+        )
+        _listeners_installed = True
+
+
+def _before_cursor_execute(
+    conn: sqlalchemy.engine.Connection,
+    cursor: typing.Any,
+    statement: str,
+    parameters: typing.Any,
+    context: typing.Any,
+    executemany: bool,
+) -> None:
+    hooks = getattr(_thread_state, "hooks", None)
+    if not hooks:
+        return
+    for name in HOOK_ORDER:
+        hook = hooks.get(name)
+        if hook is not None:
+            hook.before_execute(conn, statement, parameters, executemany)
+
+
+def _after_cursor_execute(
+    conn: sqlalchemy.engine.Connection,
+    cursor: typing.Any,
+    statement: str,
+    parameters: typing.Any,
+    context: typing.Any,
+    executemany: bool,
+) -> None:
+    hooks = getattr(_thread_state, "hooks", None)
+    if not hooks:
+        return
+    for name in HOOK_ORDER:
+        hook = hooks.get(name)
+        if hook is not None:
+            hook.after_execute(conn, statement, parameters, executemany)
@@ -0,0 +1,326 @@
+"""Shared pollers that push newly added dimension records to subscribers."""
+
+from __future__ import annotations
+
+__all__ = [
+    "ChangePoller",
+    "SUBSCRIPTION_CLIENT",
+    "SubscriptionHub",
+    "Subscriber",
+    "run_subscription_hub",
+]
+
+import asyncio
+import contextlib
+import json
+import logging
+import types
+import typing
+
+from .client_identity import set_current_client
+from .resolvers.simple_query_dimension_records_changes import (
+    get_dimension_records_watermark,
+    simple_query_dimension_records_changes,
+)
+
+if typing.TYPE_CHECKING:
+    import aiohttp
+    import graphql
+
+# Client identity of the registry queries run by the pollers,
+# for fair scheduling; see `butlerservice.query_scheduler`.
+SUBSCRIPTION_CLIENT = "subscriptions"
+
+# The maximum number of events that may wait to be sent to one subscriber.
+# A subscriber that falls further behind is dropped.
+MAX_QUEUED_EVENTS = 100
+
+# Value put in the queue of a subscriber when it is dropped.
+_END = object()
+
+
+class SubscriberTooSlowError(RuntimeError):
+    """A subscriber did not keep up with its events."""
+
+
+class Subscriber:
+    """The stream of events of one subscription to a `ChangePoller`.
+
+    An async iterator of dicts with items "nodes" (a list of SimpleRecord
+    dicts) and "watermark"; see `simple_query_dimension_records_changes`.
+    Call `aclose` to unsubscribe.
+
+    Raises
+    ------
+    SubscriberTooSlowError
+        If the subscriber fell too far behind (when iterated).
+    """
+
+    def __init__(self, poller: ChangePoller) -> None:
+        self.poller = poller
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+        self.closed = False
+
+    def __aiter__(self) -> Subscriber:
+        return self
+
+    async def __anext__(self) -> dict:
+        if self.closed:
+            raise StopAsyncIteration
+        event = await self.queue.get()
+        if event is _END:
+            await self.aclose()
+            raise SubscriberTooSlowError(
+                f"More than {MAX_QUEUED_EVENTS} events were not sent in time"
+            )
+        return event
+
+    def put(self, event: dict) -> None:
+        """Queue an event, or drop the subscriber if the queue is full."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.poller.remove(self)
+            # Make room for the end marker.
+            self.queue.get_nowait()
+            self.queue.put_nowait(_END)
+
+    async def aclose(self) -> None:
+        """Unsubscribe."""
+        if not self.closed:
+            self.closed = True
+            self.poller.remove(self)
+
+
+class ChangePoller:
+    """Poll the registry for dimension records added since the previous
+    poll, and fan them out to all subscribers.
+
+    The first poll only sets the watermark: it returns no events.
+
+    Parameters
+    ----------
+    hub
+        The hub that owns this poller.
+    key
+        The key of the poller in the hub: its normalized filter.
+    query_args
+        Arguments for `simple_query_dimension_records_changes`
+        (other than ``since``).
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+    """
+
+    def __init__(
+        self,
+        hub: SubscriptionHub,
+        key: str,
+        query_args: typing.Dict[str, typing.Any],
+    ) -> None:
+        self.hub = hub
+        self.key = key
+        self.query_args = query_args
+        self.subscribers: typing.Set[Subscriber] = set()
+        self.watermark: typing.Optional[str] = None
+        self.ready: asyncio.Future = asyncio.get_event_loop().create_future()
+        self.task = asyncio.ensure_future(self._run())
+
+    def add(self) -> Subscriber:
+        """Add a subscriber."""
+        subscriber = Subscriber(self)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def remove(self, subscriber: Subscriber) -> None:
+        """Remove a subscriber, and stop polling if it was the last one."""
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop polling and remove this poller from the hub."""
+        self.task.cancel()
+        if self.hub.pollers.get(self.key) is self:
+            del self.hub.pollers[self.key]
+
+    async def poll(self) -> dict:
+        """Query the registry for records added since the watermark,
+        and update the watermark.
+
+        The first poll only sets the watermark, and returns no records.
+        """
+        # The query resolvers only use the context of the resolve info;
+        # each poll has its own, and so its own deadline.
+        info = typing.cast(
+            "graphql.GraphQLResolveInfo", types.SimpleNamespace(context={})
+        )
+        if self.watermark is None:
+            # Subscribers only get records added after they subscribed;
+            # find the latest ones without fetching them all.
+            self.watermark = await get_dimension_records_watermark(
+                self.hub.app, info, usecache=False, **self.query_args
+            )
+            self.hub.num_polls += 1
+            return dict(nodes=[], watermark=self.watermark)
+        changes = await simple_query_dimension_records_changes(
+            self.hub.app,
+            info,
+            since=self.watermark,
+            usecache=False,
+            **self.query_args,
+        )
+        self.watermark = changes["watermark"]
+        self.hub.num_polls += 1
+        return changes
+
+    def publish(self, changes: dict) -> None:
+        """Send the result of a poll to all subscribers,
+        if it has any records.
+        """
+        if changes["nodes"]:
+            self.hub.num_events += 1
+            for subscriber in list(self.subscribers):
+                subscriber.put(changes)
+
+    async def _run(self) -> None:
+        set_current_client(SUBSCRIPTION_CLIENT)
+        try:
+            await self.poll()
+        except Exception as e:
+            # The filter is probably invalid; report it to the subscribers.
+            self.ready.set_exception(e)
+            self.stop()
+            return
+        self.ready.set_result(None)
+        log = logging.getLogger("butlerservice")
+        while True:
+            await asyncio.sleep(self.hub.poll_interval)
+            try:
+                changes = await self.poll()
+            except Exception as e:
+                # Keep the subscriptions, and try again later.
+                self.hub.num_errors += 1
+                log.warning(f"Could not poll subscription {self.key}: {e}")
+                continue
+            self.publish(changes)
+
+
+class SubscriptionHub:
+    """Subscriptions to newly added dimension records.
+
+    Subscriptions with the same filter share one `ChangePoller`,
+    so the registry is polled once per interval for each distinct filter,
+    no matter how many clients subscribe.
+
+    Parameters
+    ----------
+    app
+        aiohttp application.
+    poll_interval
+        The interval at which the registry is polled for each filter (sec).
+        If 0 then subscriptions are disabled.
+
+    Notes
+    -----
+    Only use this from the event loop thread; it is not thread safe.
+    """
+
+    def __init__(
+        self, app: aiohttp.web.Application, poll_interval: float
+    ) -> None:
+        self.app = app
+        self.poll_interval = poll_interval
+        self.pollers: typing.Dict[str, ChangePoller] = dict()
+        self.num_polls = 0
+        self.num_events = 0
+        self.num_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Are subscriptions enabled?"""
+        return self.poll_interval > 0
+
+    async def subscribe(
+        self, element: str, **kwargs: typing.Any
+    ) -> Subscriber:
+        """Subscribe to the records of a dimension element
+        that are added from now on.
+
+        Parameters
+        ----------
+        element
+            The dimension element, e.g. "exposure".
+        kwargs
+            Other arguments of `simple_query_dimension_records_changes`,
+            other than ``since`` and ``usecache``.
+
+        Returns
+        -------
+        subscriber
+            The stream of events; see `Subscriber`.
+
+        Raises
+        ------
+        RuntimeError
+            If subscriptions are disabled, or the arguments are invalid.
+        """
+        if not self.enabled:
+            raise RuntimeError("Subscriptions are disabled")
+        query_args = dict(
+            element=element,
+            **{
+                name: value
+                for name, value in kwargs.items()
+                if value is not None
+            },
+        )
+        key = json.dumps(query_args, sort_keys=True)
+        poller = self.pollers.get(key)
+        if poller is None:
+            poller = self.pollers[key] = ChangePoller(
+                hub=self, key=key, query_args=query_args
+            )
+        subscriber = poller.add()
+        try:
+            await asyncio.shield(poller.ready)
+        except BaseException:
+            await subscriber.aclose()
+            raise
+        return subscriber
+
+    def close(self) -> None:
+        """Stop all pollers."""
+        for poller in list(self.pollers.values()):
+            poller.stop()
+
+    def get_status(self) -> typing.Dict[str, typing.Any]:
+        """Get the current state of the hub as a dict."""
+        return dict(
+            poll_interval=self.poll_interval,
+            num_pollers=len(self.pollers),
+            num_subscribers=sum(
+                len(poller.subscribers) for poller in self.pollers.values()
+            ),
+            num_polls=self.num_polls,
+            num_events=self.num_events,
+            num_errors=self.num_errors,
+        )
+
+
+async def run_subscription_hub(
+    app: aiohttp.web.Application,
+) -> typing.AsyncIterator[None]:
+    """Stop the pollers of the subscription hub of an application
+    when the application shuts down.
+
+    For use in ``app.cleanup_ctx``.
+    """
+    yield
+    hub = app["butlerservice/subscription_hub"]
+    tasks = [poller.task for poller in hub.pollers.values()]
+    hub.close()
+    for task in tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
@@ -1,8 +1,60 @@
+import functools
+import json
 import re
 import typing
 
 StrOrRegexList = typing.Sequence[typing.Union[str, re.Pattern]]
 
+# The maximum number of entries in each of the caches
+# of compiled regular expressions and decoded json arguments.
+ARG_CACHE_SIZE = 1000
+
+
+@functools.lru_cache(maxsize=ARG_CACHE_SIZE)
+def _compile_regex_list(
+    regex_strs: typing.Tuple[str, ...],
+) -> typing.Tuple[re.Pattern, ...]:
+    """Compile a tuple of regex strings (cached)."""
+    return tuple(re.compile(regex_str) for regex_str in regex_strs)
+
+
+@functools.lru_cache(maxsize=ARG_CACHE_SIZE)
+def load_json_arg(value: str) -> typing.Any:
+    """Decode a json-encoded query argument, such as ``dataid``.
+
+    The result is cached, so decoding an argument that clients
+    send over and over is cheap. Do not modify the returned value,
+    because it is shared by all callers.
+
+    Raises
+    ------
+    json.JSONDecodeError
+        If the value cannot be decoded.
+    """
+    return json.loads(value)
+
+
+def get_arg_cache_status() -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    """Get the state of the caches of compiled regular expressions
+    (item "regex_cache") and decoded json arguments
+    (item "json_arg_cache") as a dict.
+    """
+    status = dict()
+    for name, cached_func in (
+        ("regex_cache", _compile_regex_list),
+        ("json_arg_cache", load_json_arg),
+    ):
+        info = cached_func.cache_info()
+        num_lookups = info.hits + info.misses
+        status[name] = dict(
+            max_size=info.maxsize,
+            num_entries=info.currsize,
+            num_hits=info.hits,
+            num_misses=info.misses,
+            hit_rate=info.hits / num_lookups if num_lookups else 0.0,
+        )
+    return status
+
 
 def combine_strs_and_regex(
     str_list: typing.Union[typing.Sequence[str], None],
@@ -19,6 +71,8 @@ def combine_strs_and_regex(
         Optional list of regex strings.
 
     If str_list and regex_list are both None, returns []
+
+    Compiled regular expressions are cached.
     """
     result: StrOrRegexList
     if str_list:
@@ -26,5 +80,24 @@ def combine_strs_and_regex(
     else:
         result = []
     if regex_list:
-        result += [re.compile(regex_str) for regex_str in regex_list]
+        result += _compile_regex_list(tuple(regex_list))
     return result
+
+
+def make_hashable(value: typing.Any) -> typing.Hashable:
+    """Convert a query argument into a hashable, normalized form,
+    suitable for use as (part of) a cache key.
+
+    Dicts become sorted tuples of (key, value) pairs, lists and tuples
+    become tuples, and compiled regular expressions are represented
+    by their pattern string. This is applied recursively.
+    """
+    if isinstance(value, dict):
+        return tuple(
+            sorted((key, make_hashable(item)) for key, item in value.items())
+        )
+    elif isinstance(value, (list, tuple)):
+        return tuple(make_hashable(item) for item in value)
+    elif isinstance(value, re.Pattern):
+        return ("re.Pattern", value.pattern)
+    return value
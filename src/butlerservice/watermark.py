@@ -0,0 +1,278 @@
+"""Support for incremental ("changes since") queries.
+
+A watermark records the maximum value of a dimension with an integer
+primary key, such as ``exposure``, for each value of the other dimensions
+that identify it (e.g. ``instrument``), in the rows returned so far.
+The next query only returns rows with larger values, which the database
+finds with the primary key index.
+"""
+
+from __future__ import annotations
+
+__all__ = [
+    "WATERMARK_BIND_PREFIX",
+    "add_watermark_constraint",
+    "check_watermark_dimension",
+    "decode_watermark",
+    "default_watermark_dimension",
+    "encode_watermark",
+    "update_watermark",
+]
+
+import base64
+import binascii
+import json
+import typing
+
+import lsst.daf.butler
+
+# Prefix of a decoded watermark; see `CURSOR_PREFIX` in pagination.py.
+WATERMARK_PREFIX = "watermark:"
+
+# Prefix of the names of the bind values added by
+# `add_watermark_constraint`; reserved, so not allowed in a query's bind.
+WATERMARK_BIND_PREFIX = "watermark_"
+
+# Type of the maximum values of a watermark:
+# dict of (group values): maximum value.
+MaxValuesT = typing.Dict[typing.Tuple[typing.Any, ...], int]
+
+
+def check_watermark_dimension(
+    universe: lsst.daf.butler.DimensionUniverse,
+    dimension: str,
+    required_names: typing.Collection[str],
+) -> typing.Tuple[str, ...]:
+    """Check that a dimension can be used for a watermark,
+    and return the names of the dimensions that group its values.
+
+    Parameters
+    ----------
+    universe
+        Dimension universe.
+    dimension
+        Name of the dimension whose values increase as rows are added,
+        e.g. "exposure".
+    required_names
+        Names of the required dimensions of the query results.
+
+    Returns
+    -------
+    group_names
+        Names of the other required dimensions of ``dimension``,
+        e.g. ("instrument",) for "exposure".
+
+    Raises
+    ------
+    RuntimeError
+        If the dimension does not have an integer primary key,
+        or is not a required dimension of the results.
+    """
+    try:
+        primary_key = universe[dimension].primaryKey
+    except (AttributeError, LookupError):
+        raise RuntimeError(f"Unknown watermark dimension {dimension!r}")
+    if primary_key.getPythonType() is not int:
+        raise RuntimeError(
+            f"Watermark dimension {dimension!r} "
+            "does not have an integer primary key"
+        )
+    if dimension not in required_names:
+        raise RuntimeError(
+            f"Watermark dimension {dimension!r} is not one of "
+            f"the required dimensions {sorted(required_names)}"
+        )
+    return tuple(
+        name
+        for name in universe[dimension].required.names
+        if name != dimension
+    )
+
+
+def default_watermark_dimension(
+    universe: lsst.daf.butler.DimensionUniverse,
+    required_names: typing.Sequence[str],
+) -> str:
+    """Get the default watermark dimension of a query:
+    the finest of its required dimensions that can be used.
+
+    Parameters
+    ----------
+    universe
+        Dimension universe.
+    required_names
+        Names of the required dimensions of the query results,
+        in the order of the universe (coarsest first),
+        e.g. ("instrument", "detector", "exposure").
+
+    Returns
+    -------
+    dimension
+        The last of ``required_names`` that has an integer primary key
+        and is not a governor, e.g. "exposure".
+
+    Raises
+    ------
+    RuntimeError
+        If no required dimension can be used.
+    """
+    for name in reversed(required_names):
+        dimension = universe[name]
+        if isinstance(dimension, lsst.daf.butler.GovernorDimension):
+            continue
+        if dimension.primaryKey.getPythonType() is int:
+            return name
+    raise RuntimeError(
+        f"None of the required dimensions {list(required_names)} "
+        "can be a watermark dimension; it must have an integer primary key "
+        "and not be a governor such as 'instrument'"
+    )
+
+
+def encode_watermark(dimension: str, max_values: MaxValuesT) -> str:
+    """Encode a watermark as an opaque string."""
+    data = dict(
+        dimension=dimension,
+        max=[[list(group), value] for group, value in max_values.items()],
+    )
+    return base64.b64encode(
+        (WATERMARK_PREFIX + json.dumps(data)).encode()
+    ).decode()
+
+
+def decode_watermark(
+    watermark: typing.Optional[str], dimension: str
+) -> MaxValuesT:
+    """Decode a watermark string into its maximum values.
+
+    Return {} if watermark is None (meaning return all rows).
+
+    Raises
+    ------
+    RuntimeError
+        If the watermark is invalid, or is for a different dimension.
+    """
+    if watermark is None:
+        return {}
+    try:
+        decoded = base64.b64decode(watermark.encode()).decode()
+        if not decoded.startswith(WATERMARK_PREFIX):
+            raise ValueError("wrong prefix")
+        data = json.loads(decoded[len(WATERMARK_PREFIX) :])
+        max_values = {tuple(group): int(value) for group, value in data["max"]}
+        watermark_dimension = data["dimension"]
+    except (
+        binascii.Error,
+        UnicodeDecodeError,
+        KeyError,
+        TypeError,
+        ValueError,
+    ) as e:
+        raise RuntimeError(f"Invalid watermark {watermark!r}: {e}")
+    if watermark_dimension != dimension:
+        raise RuntimeError(
+            f"Watermark is for dimension {watermark_dimension!r}, "
+            f"not {dimension!r}"
+        )
+    return max_values
+
+
+def add_watermark_constraint(
+    where: typing.Optional[str],
+    bind: typing.Optional[typing.Mapping[str, typing.Any]],
+    dimension: str,
+    group_names: typing.Sequence[str],
+    max_values: MaxValuesT,
+) -> typing.Tuple[typing.Optional[str], typing.Optional[dict]]:
+    """Constrain a query to rows added since a watermark.
+
+    That is rows whose value of ``dimension`` is larger than
+    the maximum for their group, and rows of groups not in the watermark.
+
+    Parameters
+    ----------
+    where
+        The ``where`` expression of the query, if any.
+    bind
+        The ``bind`` values of the query, if any.
+    dimension
+        Name of the watermark dimension.
+    group_names
+        Names of the dimensions that group its values;
+        see `check_watermark_dimension`.
+    max_values
+        Maximum values; see `decode_watermark`.
+
+    Returns
+    -------
+    where, bind
+        The constrained ``where`` expression and its ``bind`` values.
+
+    Raises
+    ------
+    RuntimeError
+        If ``bind`` has a name that starts with `WATERMARK_BIND_PREFIX`.
+    """
+    reserved_names = sorted(
+        name for name in bind or () if name.startswith(WATERMARK_BIND_PREFIX)
+    )
+    if reserved_names:
+        raise RuntimeError(
+            f"Bind names starting with {WATERMARK_BIND_PREFIX!r} "
+            f"are reserved for the watermark: {reserved_names}"
+        )
+    if not max_values:
+        return where, None if bind is None else dict(bind)
+    new_bind = dict(bind or {})
+    since_terms = []
+    group_terms = []
+    for i, (group, value) in enumerate(sorted(max_values.items())):
+        group_conditions = []
+        for name, group_value in zip(group_names, group):
+            bind_name = f"{WATERMARK_BIND_PREFIX}{i}_{name}"
+            new_bind[bind_name] = group_value
+            group_conditions.append(f"{name} = {bind_name}")
+        bind_name = f"{WATERMARK_BIND_PREFIX}{i}"
+        new_bind[bind_name] = value
+        since_terms.append(
+            " AND ".join(group_conditions + [f"{dimension} > {bind_name}"])
+        )
+        if group_conditions:
+            group_terms.append(" AND ".join(group_conditions))
+    since_where = " OR ".join(f"({term})" for term in since_terms)
+    if group_terms:
+        new_groups_where = " OR ".join(f"({term})" for term in group_terms)
+        since_where += f" OR NOT ({new_groups_where})"
+    if where:
+        since_where = f"({where}) AND ({since_where})"
+    return since_where, new_bind
+
+
+def update_watermark(
+    max_values: MaxValuesT,
+    data_ids: typing.Iterable[typing.Mapping[str, typing.Any]],
+    dimension: str,
+    group_names: typing.Sequence[str],
+) -> MaxValuesT:
+    """Return the maximum values of a watermark,
+    updated with the values of newly returned rows.
+
+    Parameters
+    ----------
+    max_values
+        Maximum values before the query.
+    data_ids
+        Data IDs of the rows returned by the query,
+        as dicts of dimension name: value.
+    dimension
+        Name of the watermark dimension.
+    group_names
+        Names of the dimensions that group its values.
+    """
+    new_max_values = dict(max_values)
+    for data_id in data_ids:
+        group = tuple(data_id[name] for name in group_names)
+        value = data_id[dimension]
+        if value > new_max_values.get(group, value - 1):
+            new_max_values[group] = value
+    return new_max_values
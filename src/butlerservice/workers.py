@@ -0,0 +1,153 @@
+"""Serve the application from several worker processes."""
+
+from __future__ import annotations
+
+__all__ = ["WorkerStartupError", "run_workers"]
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import tempfile
+import time
+import typing
+
+import prometheus_client.multiprocess
+from aiohttp.web import run_app
+
+from butlerservice.app import create_app
+from butlerservice.metrics import MULTIPROCESS_DIR_ENV
+
+# A worker that exits sooner than this after it was started (sec)
+# is assumed to have failed to start (e.g. due to a configuration error),
+# so it is not restarted; instead all workers are stopped.
+MIN_WORKER_UPTIME = 10
+
+# Time to wait for workers to finish handling requests when stopping (sec).
+# Must be longer than the aiohttp shutdown timeout (60 sec by default).
+STOP_TIMEOUT = 70
+
+
+class WorkerStartupError(RuntimeError):
+    """A worker process failed to start."""
+
+
+def run_worker(port: int) -> None:
+    """Run the application in a worker process.
+
+    The worker creates its own butler, registry pool and executor.
+    It listens on ``port`` with SO_REUSEPORT, so that all workers
+    can listen on the same port and the kernel can distribute
+    connections among them.
+    """
+    app = create_app()
+    run_app(app, port=port, reuse_port=True, print=None)
+
+
+class _Worker:
+    """A worker process and its start time."""
+
+    def __init__(
+        self, context: multiprocessing.context.BaseContext, port: int
+    ) -> None:
+        self.process = context.Process(
+            target=run_worker, kwargs=dict(port=port), daemon=False
+        )
+        self.process.start()
+        self.start_time = time.monotonic()
+
+
+def run_workers(port: int, num_workers: int) -> None:
+    """Run the application in ``num_workers`` worker processes
+    that share one port.
+
+    The workers write their metrics to a temporary directory
+    (or to the directory in `~butlerservice.metrics.MULTIPROCESS_DIR_ENV`,
+    if set), so that each one reports the totals over all workers.
+
+    Workers that exit unexpectedly are restarted.
+    On SIGTERM or SIGINT all workers are sent SIGTERM,
+    which makes each one stop accepting connections,
+    finish handling its current requests, and shut down cleanly;
+    workers that have not stopped after `STOP_TIMEOUT` are killed.
+
+    Parameters
+    ----------
+    port
+        Port on which to run the application.
+    num_workers
+        Number of worker processes.
+
+    Raises
+    ------
+    WorkerStartupError
+        If a worker exits too soon after it was started.
+    """
+    if num_workers < 1:
+        raise ValueError(f"num_workers={num_workers} must be positive")
+    log = logging.getLogger("butlerservice")
+    # Use "spawn" so no worker inherits state from this process.
+    context = multiprocessing.get_context("spawn")
+
+    stopping = False
+
+    def handle_stop_signal(signum: int, frame: typing.Any) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+    signal.signal(signal.SIGINT, handle_stop_signal)
+
+    metrics_dir = None
+    if not os.environ.get(MULTIPROCESS_DIR_ENV):
+        # Inherited by the workers, which import prometheus_client afresh.
+        metrics_dir = tempfile.mkdtemp(prefix="butlerservice-metrics-")
+        os.environ[MULTIPROCESS_DIR_ENV] = metrics_dir
+
+    workers: typing.List[_Worker] = []
+    try:
+        for _ in range(num_workers):
+            workers.append(_Worker(context, port=port))
+        while not stopping:
+            multiprocessing.connection.wait(
+                [worker.process.sentinel for worker in workers], timeout=1
+            )
+            if stopping:
+                break
+            for i, worker in enumerate(workers):
+                if worker.process.is_alive():
+                    continue
+                exitcode = worker.process.exitcode
+                if time.monotonic() - worker.start_time < MIN_WORKER_UPTIME:
+                    raise WorkerStartupError(
+                        f"Worker process {worker.process.pid} failed to "
+                        f"start; exit code {exitcode}"
+                    )
+                log.warning(
+                    f"Worker process {worker.process.pid} exited "
+                    f"with exit code {exitcode}; restarting it"
+                )
+                prometheus_client.multiprocess.mark_process_dead(
+                    worker.process.pid
+                )
+                workers[i] = _Worker(context, port=port)
+    finally:
+        _stop_workers(workers)
+        if metrics_dir is not None:
+            del os.environ[MULTIPROCESS_DIR_ENV]
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def _stop_workers(workers: typing.List[_Worker]) -> None:
+    """Stop worker processes gracefully, or forcibly if they take too long."""
+    for worker in workers:
+        if worker.process.is_alive():
+            worker.process.terminate()
+    deadline = time.monotonic() + STOP_TIMEOUT
+    for worker in workers:
+        worker.process.join(timeout=max(0, deadline - time.monotonic()))
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import typing
+
+import lsst.daf.butler
+
+from butlerservice.app import create_app
+from butlerservice.resolvers.batch_query_dimension_records import (
+    plan_batch_queries,
+)
+from butlerservice.testutils import (
+    Requestor,
+    assert_good_response,
+    expected_exposure_id_list,
+)
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def make_entry(
+    dataid: dict,
+    where: typing.Optional[str] = None,
+    bind: typing.Optional[dict] = None,
+) -> dict:
+    entry = dict(dataid=json.dumps(dataid))
+    if where is not None:
+        entry["where"] = where
+    if bind is not None:
+        entry["bind"] = json.dumps(bind)
+    return entry
+
+
+def test_plan_batch_queries() -> None:
+    element = lsst.daf.butler.DimensionUniverse()["exposure"]
+    entries = [
+        make_entry(dict(instrument="HSC", exposure=exposure_id))
+        for exposure_id in (1, 2, 3, 2)
+    ]
+    entries += [
+        make_entry(
+            dict(instrument="HSC"),
+            where="exposure.seq_num = seq",
+            bind=dict(seq=seq_num),
+        )
+        for seq_num in (5, 6)
+    ]
+    entries.append(make_entry(dict(instrument="HSC"), where="exposure > 5"))
+    queries = plan_batch_queries(element, entries)
+    assert len(queries) == 3
+    queries_by_first_index = {query.indices[0]: query for query in queries}
+
+    # Entries with data IDs that differ only in exposure
+    query = queries_by_first_index[0]
+    assert query.dataid == dict(instrument="HSC")
+    assert query.where == "exposure IN (batch_in)"
+    assert query.bind == dict(batch_in=[1, 2, 3])
+    assert query.indices == (0, 1, 2, 3)
+    assert query.split_key == "exposure"
+    assert query.split_values == (1, 2, 3, 2)
+
+    # Entries with simple equality where expressions
+    query = queries_by_first_index[4]
+    assert query.where == "exposure.seq_num IN (batch_in)"
+    assert query.bind == dict(batch_in=[5, 6])
+    assert query.indices == (4, 5)
+
+    # Other entries are run as is
+    query = queries_by_first_index[6]
+    assert query.where == "exposure > 5"
+    assert query.indices == (6,)
+    assert query.split_key is None
+
+
+async def test_batch_query_dimension_records(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command="batch_query_dimension_records",
+        fields=["record"],
+        url_suffix=name,
+    )
+    exposure_ids = expected_exposure_id_list[:3] + [1]
+    entries = [
+        make_entry(dict(instrument="HSC", exposure=exposure_id))
+        for exposure_id in exposure_ids
+    ]
+    entries.append(make_entry(dict(instrument="HSC")))
+    response = await requestor(
+        args_dict=dict(element="exposure", entries=entries)
+    )
+    record_lists = await assert_good_response(
+        response, command="batch_query_dimension_records"
+    )
+    assert len(record_lists) == len(entries)
+    for exposure_id, record_list in zip(exposure_ids, record_lists):
+        expected_ids = [] if exposure_id == 1 else [exposure_id]
+        assert [
+            json.loads(record["record"])["id"] for record in record_list
+        ] == expected_ids
+    assert len(record_lists[-1]) == len(expected_exposure_id_list)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import types
+import typing
+
+import lsst.daf.butler
+import pytest
+
+from butlerservice.app import create_app
+from butlerservice.resolvers.simple_query_dimension_records_changes import (
+    get_dimension_records_watermark,
+    simple_query_dimension_records_changes,
+)
+from butlerservice.testutils import (
+    Requestor,
+    assert_bad_response,
+    assert_good_response,
+)
+from butlerservice.watermark import (
+    add_watermark_constraint,
+    decode_watermark,
+    default_watermark_dimension,
+    encode_watermark,
+    update_watermark,
+)
+
+if typing.TYPE_CHECKING:
+    import graphql
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def test_watermark() -> None:
+    assert decode_watermark(None, "exposure") == {}
+    max_values = {("HSC",): 5, ("LATISS",): 7}
+    watermark = encode_watermark("exposure", max_values)
+    assert decode_watermark(watermark, "exposure") == max_values
+    for bad_watermark in ("", "5", "not base64!"):
+        with pytest.raises(RuntimeError):
+            decode_watermark(bad_watermark, "exposure")
+    with pytest.raises(RuntimeError):
+        decode_watermark(watermark, "visit")
+
+    assert add_watermark_constraint(
+        "a = 1", None, "exposure", ("instrument",), {}
+    ) == ("a = 1", None)
+    where, bind = add_watermark_constraint(
+        "a = b", dict(b=1), "exposure", ("instrument",), max_values
+    )
+    assert where == (
+        "(a = b) AND ("
+        "(instrument = watermark_0_instrument AND exposure > watermark_0) OR "
+        "(instrument = watermark_1_instrument AND exposure > watermark_1) OR "
+        "NOT ((instrument = watermark_0_instrument) OR "
+        "(instrument = watermark_1_instrument)))"
+    )
+    assert bind == dict(
+        b=1,
+        watermark_0_instrument="HSC",
+        watermark_0=5,
+        watermark_1_instrument="LATISS",
+        watermark_1=7,
+    )
+
+    # Bind names of the watermark are reserved.
+    for bad_max_values in ({}, max_values):
+        with pytest.raises(RuntimeError):
+            add_watermark_constraint(
+                None,
+                dict(watermark_0=1),
+                "exposure",
+                ("instrument",),
+                bad_max_values,
+            )
+
+    data_ids = [
+        dict(instrument="HSC", exposure=9),
+        dict(instrument="HSC", exposure=8),
+        dict(instrument="DECam", exposure=1),
+    ]
+    assert update_watermark(
+        max_values, data_ids, "exposure", ("instrument",)
+    ) == {("HSC",): 9, ("LATISS",): 7, ("DECam",): 1}
+
+
+def test_default_watermark_dimension() -> None:
+    universe = lsst.daf.butler.DimensionUniverse()
+    for dimensions, watermark_dimension in (
+        (["exposure"], "exposure"),
+        (["instrument", "exposure", "detector"], "exposure"),
+        (["visit", "detector"], "visit"),
+        (["tract", "patch"], "patch"),
+        (["detector"], "detector"),
+    ):
+        required_names = list(universe.extract(dimensions).required.names)
+        assert (
+            default_watermark_dimension(universe, required_names)
+            == watermark_dimension
+        )
+    for dimensions in (["instrument"], ["instrument", "physical_filter"]):
+        required_names = list(universe.extract(dimensions).required.names)
+        with pytest.raises(RuntimeError):
+            default_watermark_dimension(universe, required_names)
+
+
+async def test_changes_queries(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    for command, args_dict, id_name, field in (
+        (
+            "simple_query_data_ids_changes",
+            dict(dimensions=["exposure"]),
+            "exposure",
+            "data_id",
+        ),
+        (
+            # The default watermark dimension is "exposure".
+            "simple_query_data_ids_changes",
+            dict(dimensions=["instrument", "exposure"]),
+            "exposure",
+            "data_id",
+        ),
+        (
+            "simple_query_dimension_records_changes",
+            dict(element="exposure"),
+            "id",
+            "record",
+        ),
+    ):
+        requestor = Requestor(
+            client=client,
+            category="query",
+            command=command,
+            fields=[f"nodes {{ {field} }}", "watermark"],
+            url_suffix=name,
+        )
+
+        async def query_ids(
+            **kwargs: typing.Any,
+        ) -> typing.Tuple[typing.List[int], str]:
+            response = await requestor(args_dict=dict(args_dict, **kwargs))
+            changes = await assert_good_response(response, command=command)
+            ids = [
+                json.loads(node[field])[id_name] for node in changes["nodes"]
+            ]
+            return sorted(ids), changes["watermark"]
+
+        all_ids, _ = await query_ids()
+        assert len(all_ids) > 2
+
+        # Pretend that only the first few exposures had been added;
+        # then tail the rest.
+        mid_id = all_ids[len(all_ids) // 2]
+        ids, watermark = await query_ids(
+            where="instrument = 'HSC' AND exposure <= mid_id",
+            bind=json.dumps(dict(mid_id=mid_id)),
+        )
+        assert ids == [id for id in all_ids if id <= mid_id]
+        ids, watermark = await query_ids(since=watermark)
+        assert ids == [id for id in all_ids if id > mid_id]
+        ids, new_watermark = await query_ids(since=watermark)
+        assert ids == []
+        assert new_watermark == watermark
+
+        # Combine with a where expression.
+        ids, _ = await query_ids(
+            since=watermark, where="instrument = 'HSC'", usecache=False
+        )
+        assert ids == []
+
+        # Invalid watermarks and watermark dimensions.
+        for bad_args in (
+            dict(since="not a watermark"),
+            dict(watermark_dimension="physical_filter"),
+            dict(watermark_dimension="visit"),
+            dict(bind=json.dumps(dict(watermark_0=1))),
+        ):
+            response = await requestor(args_dict=dict(args_dict, **bad_args))
+            await assert_bad_response(response)
+
+
+async def test_dimension_records_watermark(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    await aiohttp_client(app)
+    info = typing.cast(
+        "graphql.GraphQLResolveInfo", types.SimpleNamespace(context={})
+    )
+
+    # The watermark is the same as that of a query for all records.
+    for args in (
+        dict(element="exposure"),
+        dict(
+            element="exposure",
+            where="instrument = 'HSC' AND exposure < 903340",
+        ),
+        dict(element="exposure", where="instrument = 'HSC' AND exposure < 0"),
+    ):
+        changes = await simple_query_dimension_records_changes(
+            app, info, usecache=False, **args
+        )
+        watermark = await get_dimension_records_watermark(
+            app, info, usecache=False, **args
+        )
+        assert watermark == changes["watermark"]
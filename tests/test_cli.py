@@ -23,6 +23,11 @@ TERMINATE_TIMEOUT = 5
 # before trying to use it (sec).
 RUN_DELAY = 2
 
+# Time to pause after executing `butlerservice run --workers N`
+# before trying to use it (sec). Each worker process imports
+# the service and creates its own butler, which takes a while.
+RUN_WORKERS_DELAY = 10
+
 
 @pytest.mark.asyncio
 async def test_cli() -> None:
@@ -39,9 +44,13 @@ async def test_cli() -> None:
     for port in (None, 8001):
         await check_run(port=port)
 
+    # Check `butlerservice run` with multiple worker processes
+    await check_run(port=8002, workers=2)
+
 
 async def check_run(
     port: Optional[int],
+    workers: Optional[int] = None,
 ) -> None:
     """Run `butlerservice run` and use it to add one message.
 
@@ -53,6 +62,9 @@ async def check_run(
         Port on which to run the butlerservice service.
         If None then run without specifying a port,
         which uses the default port 8080.
+    workers
+        Number of worker processes.
+        If None then run without specifying the number of workers.
     message_id
         Expected ID of the added message.
     """
@@ -62,6 +74,8 @@ async def check_run(
         port = 8080
     else:
         cmdline_args += ["--port", str(port)]
+    if workers is not None:
+        cmdline_args += ["--workers", str(workers)]
 
     run_process = await asyncio.create_subprocess_exec(
         *cmdline_args,
@@ -71,7 +85,9 @@ async def check_run(
         async with aiohttp.ClientSession() as session:
 
             # Give the exposure log service time to start.
-            await asyncio.sleep(RUN_DELAY)
+            await asyncio.sleep(
+                RUN_DELAY if workers is None else RUN_WORKERS_DELAY
+            )
 
             # Find an item
             query_record_args = dict(
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import lsst.daf.butler
+
+from butlerservice.columnar import make_columnar_records
+
+
+def test_make_columnar_records() -> None:
+    universe = lsst.daf.butler.DimensionUniverse()
+    element = universe["detector"]
+    records = [
+        element.RecordClass(
+            instrument="HSC",
+            id=i,
+            full_name=f"det{i}",
+            name_in_raft=None,
+            raft=None,
+            purpose="SCIENCE" if i < 5 else "GUIDER",
+        )
+        for i in range(2000)
+    ]
+    columnar_records = make_columnar_records(element, records)
+    assert columnar_records["num_rows"] == len(records)
+    columns = {
+        column["name"]: column for column in columnar_records["columns"]
+    }
+
+    # Numeric column
+    assert columns["id"]["type"] == "int"
+    assert columns["id"]["values"] == list(range(len(records)))
+    assert columns["id"]["dictionary"] is None
+
+    # Strings with few distinct values are dictionary-encoded
+    assert columns["instrument"]["values"] is None
+    assert columns["instrument"]["dictionary"] == ["HSC"]
+    assert columns["instrument"]["indices"] == [0] * len(records)
+    assert columns["purpose"]["dictionary"] == ["SCIENCE", "GUIDER"]
+    assert columns["purpose"]["indices"] == [0] * 5 + [1] * (len(records) - 5)
+
+    # Other strings are not
+    assert columns["full_name"]["values"] == [
+        record.full_name for record in records
+    ]
+    assert columns["full_name"]["dictionary"] is None
+
+    # Nulls
+    assert columns["raft"]["indices"] is None
+    assert columns["raft"]["values"] == [None] * len(records)
+
+    # No records
+    columnar_records = make_columnar_records(element, [])
+    assert columnar_records["num_rows"] == 0
+    assert all(
+        column["values"] == [] for column in columnar_records["columns"]
+    )
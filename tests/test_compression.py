@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import gzip
+import pathlib
+import typing
+
+from butlerservice.app import create_app
+from butlerservice.compression import choose_encoding, compress, get_encodings
+from butlerservice.format_http_request import format_http_request
+from butlerservice.testutils import assert_good_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def test_choose_encoding() -> None:
+    assert "gzip" in get_encodings()
+    assert choose_encoding("") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("GZIP;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*;q=0.1, gzip;q=0") != "gzip"
+    assert choose_encoding("*") == get_encodings()[0]
+    assert choose_encoding("br;q=1, zstd", encodings=["gzip"]) is None
+    for encoding in get_encodings():
+        assert choose_encoding(f"gzip;q=0.5, {encoding}") == encoding
+
+    data = b"repetitive " * 1000
+    compressed = compress(data, "gzip", 6)
+    assert len(compressed) < len(data) // 10
+    assert gzip.decompress(compressed) == data
+    # The output depends only on the data and the level.
+    assert compress(data, "gzip", 99) == compress(data, "gzip", 9)
+
+
+async def test_compress_response(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+    compressed_cache = app["butlerservice/compressed_cache"]
+
+    client = await aiohttp_client(app)
+    command = "simple_query_dimension_records"
+    args_data, headers = format_http_request(
+        category="query",
+        command=command,
+        args_dict=dict(element="exposure"),
+        fields=["record"],
+    )
+
+    # The first response runs a registry query, so it is compressed
+    # but not cached. The second is built from the result cache,
+    # so its compressed body is cached and used for the third.
+    records = None
+    for i in range(3):
+        response = await client.post(
+            name,
+            json=args_data,
+            headers={**headers, "Accept-Encoding": "gzip"},
+        )
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        new_records = await assert_good_response(response, command=command)
+        assert records is None or new_records == records
+        records = new_records
+    assert compressed_cache.num_misses == 1
+    assert compressed_cache.num_hits == 1
+
+    # Clients that do not accept compression get the plain body.
+    response = await client.post(
+        name,
+        json=args_data,
+        headers={**headers, "Accept-Encoding": "identity"},
+    )
+    assert "Content-Encoding" not in response.headers
+    assert await assert_good_response(response, command=command) == records
+
+    # Small responses are not compressed.
+    response = await client.get(
+        f"/{name}/status", headers={"Accept-Encoding": "gzip"}
+    )
+    data = await response.json()
+    assert data["compressed_cache"]["num_hits"] == 1
+    response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+    # Streamed responses are compressed with gzip.
+    response = await client.get(
+        f"/{name}/stream/dimension_records",
+        params=dict(element="exposure"),
+        headers={"Accept-Encoding": "gzip"},
+    )
+    assert response.status == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len((await response.text()).splitlines()) == len(records)
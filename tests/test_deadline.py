@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import pathlib
+import threading
+import time
+import types
+import typing
+
+import pytest
+import sqlalchemy
+
+import butlerservice.deadline
+from butlerservice.app import create_app
+from butlerservice.config import Configuration
+from butlerservice.deadline import (
+    DEADLINE_CONTEXT_KEY,
+    TIMEOUT_HEADER,
+    QueryCanceller,
+    QueryTimeoutError,
+    run_cancellable,
+    start_deadline,
+)
+from butlerservice.format_http_request import format_http_request
+from butlerservice.registry_executor import RegistryExecutor
+from butlerservice.registry_query import run_registry_query
+from butlerservice.result_cache import ResultCache
+from butlerservice.single_flight import SingleFlight
+from butlerservice.testutils import assert_bad_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+# A query that takes far longer than any test.
+SLOW_SQL = (
+    "WITH RECURSIVE counter(n) AS "
+    "(SELECT 1 UNION ALL SELECT n + 1 FROM counter WHERE n < 1000000000) "
+    "SELECT count(*) FROM counter"
+)
+
+
+@pytest.mark.asyncio
+async def test_executor_deadline() -> None:
+    engine = sqlalchemy.create_engine("sqlite://")
+    executor = RegistryExecutor(max_workers=1, max_queued=1)
+    release_event = threading.Event()
+
+    def run_slow_query() -> int:
+        with engine.connect() as connection:
+            return connection.execute(sqlalchemy.text(SLOW_SQL)).scalar()
+
+    try:
+        # No deadline
+        assert await executor.run(lambda: 5) == 5
+
+        # The SQL statement is interrupted when the deadline passes,
+        # which frees the worker thread.
+        start_time = time.monotonic()
+        with start_deadline(time.monotonic() + 0.2):
+            with pytest.raises(QueryTimeoutError):
+                await executor.run(run_slow_query)
+        for i in range(100):
+            if executor.num_active == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.num_active == 0
+        assert time.monotonic() - start_time < 5
+
+        # A query that is still waiting for a thread
+        # when the deadline passes is never run.
+        was_run = threading.Event()
+        blocking_task = asyncio.create_task(executor.run(release_event.wait))
+        for i in range(100):
+            await asyncio.sleep(0.01)
+            if executor.num_active == 1:
+                break
+        assert executor.num_active == 1
+        with start_deadline(time.monotonic() + 0.1):
+            with pytest.raises(QueryTimeoutError):
+                await executor.run(was_run.set)
+        release_event.set()
+        await blocking_task
+        await executor.run(lambda: None)
+        assert not was_run.is_set()
+
+        # A deadline that has already passed.
+        with start_deadline(time.monotonic() - 1):
+            with pytest.raises(QueryTimeoutError):
+                await executor.run(lambda: 5)
+
+        # An earlier deadline is kept, unless replaced.
+        with start_deadline(time.monotonic() - 1):
+            with start_deadline(time.monotonic() + 100):
+                with pytest.raises(QueryTimeoutError):
+                    await executor.run(lambda: 5)
+            with start_deadline(time.monotonic() + 100, replace=True):
+                assert await executor.run(lambda: 5) == 5
+    finally:
+        release_event.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shared_query_deadline() -> None:
+    # A query shared by several requests is not limited
+    # by the deadline of the request that started it.
+    executor = RegistryExecutor(max_workers=1, max_queued=2)
+    app = {
+        "butlerservice/executor": executor,
+        "butlerservice/result_cache": ResultCache(max_bytes=0, ttl=60),
+        "butlerservice/single_flight": SingleFlight(),
+        "safir/config": Configuration(query_timeout=100),
+    }
+    release_event = threading.Event()
+
+    def query() -> typing.List[dict]:
+        release_event.wait()
+        return [dict(id=1)]
+
+    def make_info(timeout: float) -> types.SimpleNamespace:
+        return types.SimpleNamespace(
+            context={DEADLINE_CONTEXT_KEY: time.monotonic() + timeout}
+        )
+
+    try:
+        short_task = asyncio.create_task(
+            run_registry_query(app, make_info(0.1), "key", query)
+        )
+        await asyncio.sleep(0)
+        long_task = asyncio.create_task(
+            run_registry_query(app, make_info(100), "key", query)
+        )
+        with pytest.raises(QueryTimeoutError):
+            await short_task
+        release_event.set()
+        assert await long_task == [dict(id=1)]
+        assert app["butlerservice/single_flight"].num_coalesced == 1
+    finally:
+        release_event.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_executor_registry_query() -> None:
+    # Registry queries run by the executor go through run_cancellable's
+    # SQL statement listener.
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    executor = app["butlerservice/executor"]
+    registry_pool = app["butlerservice/registry_pool"]
+
+    def query_exposures() -> int:
+        with registry_pool.registry() as registry:
+            return len(
+                list(
+                    registry.queryDimensionRecords(
+                        "exposure", where="instrument = 'HSC'"
+                    )
+                )
+            )
+
+    try:
+        num_exposures = await executor.run(query_exposures)
+        assert num_exposures > 0
+        with start_deadline(time.monotonic() + 60):
+            assert await executor.run(query_exposures) == num_exposures
+    finally:
+        executor.shutdown()
+
+
+def test_release_cancellable_connection(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # The connection of a registry returned to the pool
+    # is not interrupted if the query is cancelled after that.
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    registry_pool = app["butlerservice/registry_pool"]
+    interrupted: typing.List[typing.Any] = []
+    monkeypatch.setattr(
+        butlerservice.deadline, "_interrupt", interrupted.append
+    )
+
+    def cancel_query(canceller: QueryCanceller, released: bool) -> None:
+        with registry_pool.registry() as registry:
+            list(registry.queryDimensionRecords("instrument"))
+            if not released:
+                canceller.cancel(RuntimeError("Cancelled"))
+        if released:
+            canceller.cancel(RuntimeError("Cancelled"))
+
+    for released in (False, True):
+        interrupted.clear()
+        canceller = QueryCanceller()
+        run_cancellable(
+            functools.partial(cancel_query, canceller, released=released),
+            canceller,
+        )
+        assert len(interrupted) == (0 if released else 1)
+
+
+async def test_request_timeout(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+    command = "simple_query_dimension_records"
+    args_data, headers = format_http_request(
+        category="query",
+        command=command,
+        args_dict=dict(element="exposure", usecache=False),
+        fields=["record"],
+    )
+    response = await client.post(
+        name, json=args_data, headers={**headers, TIMEOUT_HEADER: "1e-9"}
+    )
+    data = await assert_bad_response(response)
+    assert "timed out" in data["errors"][0]["message"]
+
+    response = await client.post(
+        name, json=args_data, headers={**headers, TIMEOUT_HEADER: "-1"}
+    )
+    data = await assert_bad_response(response)
+    assert TIMEOUT_HEADER in data["errors"][0]["message"]
+
+    response = await client.get(
+        f"/{name}/stream/dimension_records",
+        params=dict(element="exposure"),
+        headers={TIMEOUT_HEADER: "1e-9"},
+    )
+    assert response.status == 504
+    assert "timed out" in (await response.json())["error"]
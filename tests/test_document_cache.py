@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import typing
+
+import graphql
+
+from butlerservice.app import create_app
+from butlerservice.document_cache import DocumentCache, hash_query
+from butlerservice.format_http_request import format_http_request
+from butlerservice.graphql_view import (
+    PERSISTED_QUERY_NOT_FOUND,
+    ButlerGraphQLView,
+)
+from butlerservice.testutils import assert_good_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def test_document_cache() -> None:
+    schema = graphql.build_schema("type Query { a: Int b: Int }")
+    cache = DocumentCache(max_size=2)
+    assert cache.enabled
+
+    entry = cache.parse(schema=schema, query="{ a }")
+    assert entry.errors == []
+    assert cache.parse(schema=schema, query="{ a }") is entry
+    assert cache.get(hash_query("{ a }")) is entry
+
+    # Invalid queries are cached with their errors
+    entry = cache.parse(schema=schema, query="{ c }")
+    assert len(entry.errors) == 1
+    assert cache.parse(schema=schema, query="{ c }") is entry
+
+    # Adding another query evicts the least recently used ("{ a }")
+    cache.parse(schema=schema, query="{ b }")
+    assert cache.get(hash_query("{ a }")) is None
+
+    # Unparseable queries are not cached
+    entry = cache.parse(schema=schema, query="{")
+    assert entry.document is None
+    assert len(entry.errors) == 1
+
+    status = cache.get_status()
+    assert status["num_entries"] == 2
+    assert status["num_hits"] == 3
+    assert status["num_misses"] == 5
+    assert status["num_evictions"] == 1
+
+
+def test_view_hooks() -> None:
+    # The view defines these itself, because older versions
+    # of graphql-server do not.
+    schema = graphql.build_schema("type Query { a: Int }")
+    view = ButlerGraphQLView(schema=schema)
+    assert view.get_validation_rules() == graphql.specified_rules
+    assert view.get_execution_context_class() is graphql.ExecutionContext
+    rules = [graphql.validation.ExecutableDefinitionsRule]
+    view = ButlerGraphQLView(schema=schema, validation_rules=rules)
+    assert view.get_validation_rules() == rules
+
+
+async def test_persisted_queries(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+    document_cache = app["butlerservice/document_cache"]
+
+    client = await aiohttp_client(app)
+
+    command = "simple_query_dimension_records"
+    args_data, headers = format_http_request(
+        category="query",
+        command=command,
+        args_dict=dict(element="instrument"),
+        fields=["record"],
+    )
+    query = args_data["query"]
+    extensions = dict(
+        persistedQuery=dict(version=1, sha256Hash=hash_query(query))
+    )
+
+    # Send the hash of an unknown query
+    response = await client.post(
+        name, json=dict(extensions=extensions), headers=headers
+    )
+    data = await response.json()
+    assert data["errors"][0]["message"] == PERSISTED_QUERY_NOT_FOUND
+
+    # Send the query and its hash, then just the hash (with POST and GET)
+    response = await client.post(
+        name, json=dict(query=query, extensions=extensions), headers=headers
+    )
+    records = await assert_good_response(response, command=command)
+    assert len(records) == 1
+    response = await client.post(
+        name, json=dict(extensions=extensions), headers=headers
+    )
+    assert await assert_good_response(response, command=command) == records
+    response = await client.get(
+        name,
+        params=dict(extensions=json.dumps(extensions)),
+        headers=dict(Accept="application/json"),
+    )
+    assert await assert_good_response(response, command=command) == records
+    assert document_cache.num_hits == 2
+
+    # Send the query with the wrong hash
+    bad_extensions = dict(persistedQuery=dict(version=1, sha256Hash="0"))
+    response = await client.post(
+        name,
+        json=dict(query=query, extensions=bad_extensions),
+        headers=headers,
+    )
+    assert response.status == 400
+
+    # Repeated queries use the cached parsed query
+    response = await client.post(name, json=args_data, headers=headers)
+    assert await assert_good_response(response, command=command) == records
+    assert document_cache.num_hits == 3
+
+    response = await client.get(f"/{name}/status")
+    data = await response.json()
+    assert data["document_cache"]["num_hits"] == 3
+    assert set(data["argument_caches"]) == {"regex_cache", "json_arg_cache"}
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import astropy.time
+import lsst.daf.butler
+
+from butlerservice.encoding_pool import EncodingPool, make_record_batch
+from butlerservice.record_encoder import get_record_encoder
+
+
+def test_encoding_pool() -> None:
+    universe = lsst.daf.butler.DimensionUniverse()
+    element = universe["exposure"]
+    begin = astropy.time.Time("2020-01-01T00:00:00", scale="tai")
+    timespans = [
+        lsst.daf.butler.Timespan(
+            begin=begin + astropy.time.TimeDelta(i, format="sec"),
+            end=begin + astropy.time.TimeDelta(i + 30.5, format="sec"),
+        )
+        for i in range(5)
+    ]
+    timespans += [
+        None,
+        lsst.daf.butler.Timespan(begin=None, end=begin),
+        lsst.daf.butler.Timespan(begin=begin, end=None),
+    ]
+    records = [
+        element.RecordClass(
+            instrument="HSC",
+            id=i,
+            physical_filter="HSC-R",
+            obs_id=f"HSCA{i:08d}",
+            exposure_time=30.0,
+            timespan=timespan,
+        )
+        for i, timespan in enumerate(timespans)
+    ]
+    record_encoder = get_record_encoder(element)
+    expected_lines = [record_encoder.encode(record) for record in records]
+
+    batch = make_record_batch(element, records)
+    assert len(batch.rows) == len(records)
+
+    # Encode in this thread
+    pool = EncodingPool(max_workers=0, min_rows=1)
+    assert not pool.enabled
+    assert pool.encode_lines(batch) == expected_lines
+    assert pool.encode_lines(batch._replace(rows=[])) == []
+    assert pool.get_status()["num_thread_batches"] == 2
+
+    # Encode in worker processes, in more than one part
+    pool = EncodingPool(max_workers=2, min_rows=3)
+    try:
+        assert pool.enabled
+        assert pool.encode_lines(batch) == expected_lines
+        status = pool.get_status()
+        assert status["num_process_batches"] == 2
+        assert status["num_thread_batches"] == 0
+    finally:
+        pool.shutdown()
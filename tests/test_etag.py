@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import pathlib
+import typing
+
+import pytest
+
+from butlerservice.app import create_app
+from butlerservice.change_marker import (
+    get_dimension_table_names,
+    refresh_change_marker,
+    resolve_table_names,
+    sample_change_marker,
+)
+from butlerservice.format_http_request import format_http_request
+from butlerservice.testutils import assert_good_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_etag(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(
+        butler_uri=repo_path,
+        preload_elements="instrument",
+        preload_refresh_interval=0,
+    )
+    name = app["safir/config"].name
+    change_marker = app["butlerservice/change_marker"]
+    result_cache = app["butlerservice/result_cache"]
+    assert change_marker.value is not None
+    registry = app["butlerservice/butler"].registry
+    with pytest.raises(ValueError):
+        sample_change_marker(registry, ["no_such_table"])
+
+    # By default only integer keys are sampled; counting rows is opt-in.
+    assert not change_marker.count_rows
+    assert sample_change_marker(registry, ["physical_filter"]) == ""
+    assert sample_change_marker(registry, ["physical_filter"], count_rows=True)
+    assert sample_change_marker(
+        registry, ["exposure"], count_rows=True
+    ) != sample_change_marker(registry, ["exposure"])
+
+    # By default the tables of all dimension elements are sampled,
+    # so the ETag of any dimension record query changes with them.
+    dimension_table_names = get_dimension_table_names(registry)
+    for element_name in ("detector", "exposure", "physical_filter", "visit"):
+        assert element_name in dimension_table_names
+    assert "band" not in dimension_table_names
+    assert "htm7" not in dimension_table_names
+    assert change_marker.table_names == [
+        "collection",
+        "dataset",
+        *dimension_table_names,
+    ]
+    assert resolve_table_names(
+        registry, ["exposure", "dimensions", "dataset"]
+    ) == [
+        "exposure",
+        *(name for name in dimension_table_names if name != "exposure"),
+        "dataset",
+    ]
+
+    client = await aiohttp_client(app)
+    command = "simple_query_dimension_records"
+    args_data, headers = format_http_request(
+        category="query",
+        command=command,
+        args_dict=dict(element="exposure"),
+        fields=["record"],
+    )
+    query = args_data["query"]
+    get_headers = dict(Accept="application/json")
+
+    response = await client.get(
+        name, params=dict(query=query), headers=get_headers
+    )
+    records = await assert_good_response(response, command=command)
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    # The same query with different formatting has the same ETag.
+    response = await client.get(
+        name,
+        params=dict(query="  " + query.replace(" ", "\n  ")),
+        headers=get_headers,
+    )
+    assert response.headers["ETag"] == etag
+
+    # A matching If-None-Match header is answered without running the query.
+    num_lookups = result_cache.num_hits + result_cache.num_misses
+    for if_none_match in (etag, f'"other", {etag[2:]}', "*"):
+        response = await client.get(
+            name,
+            params=dict(query=query),
+            headers={**get_headers, "If-None-Match": if_none_match},
+        )
+        assert response.status == 304
+        assert response.headers["ETag"] == etag
+    assert result_cache.num_hits + result_cache.num_misses == num_lookups
+
+    # Responses with errors have no ETag, since the errors
+    # may be temporary.
+    bad_args_data, _ = format_http_request(
+        category="query",
+        command=command,
+        args_dict=dict(element="exposure", where="no_such_column = 1"),
+        fields=["record"],
+    )
+    response = await client.get(
+        name,
+        params=dict(query=bad_args_data["query"]),
+        headers=get_headers,
+    )
+    assert response.status == 200
+    assert (await response.json())["errors"]
+    assert "ETag" not in response.headers
+
+    # POST requests have no ETag.
+    response = await client.post(name, json=args_data, headers=headers)
+    assert await assert_good_response(response, command=command) == records
+    assert "ETag" not in response.headers
+
+    # Sampling an unchanged registry does not change the marker.
+    await refresh_change_marker(app)
+    assert change_marker.num_samples == 2
+    assert change_marker.num_changes == 0
+    assert len(result_cache) > 0
+
+    # A change to the registry changes the ETag, clears cached results,
+    # and reloads the record snapshot.
+    record_snapshot = app["butlerservice/record_snapshot"]
+    assert record_snapshot.num_refreshes == 1
+    change_marker.set_value("changed")
+    response = await client.get(
+        name,
+        params=dict(query=query),
+        headers={**get_headers, "If-None-Match": etag},
+    )
+    assert await assert_good_response(response, command=command) == records
+    assert response.headers["ETag"] != etag
+    await refresh_change_marker(app)
+    assert change_marker.num_changes == 2
+    assert len(result_cache) == 0
+    assert record_snapshot.num_refreshes == 2
+    assert record_snapshot.generation == 1
+    assert record_snapshot.get_status()["elements"]["instrument"] > 0
+
+    # The marker can be disabled.
+    app = create_app(butler_uri=repo_path, change_marker_interval=0)
+    client = await aiohttp_client(app)
+    response = await client.get(
+        name, params=dict(query=query), headers=get_headers
+    )
+    assert await assert_good_response(response, command=command) == records
+    assert "ETag" not in response.headers
+    assert app["butlerservice/change_marker"].value is None
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+import pathlib
+import subprocess
+import sys
+import typing
+
+import prometheus_client
+from prometheus_client.parser import text_string_to_metric_families
+
+from butlerservice.app import create_app
+from butlerservice.metrics import (
+    MULTIPLE_FIELDS_LABEL,
+    MULTIPROCESS_DIR_ENV,
+    StatusCollector,
+    get_fields_label,
+)
+from butlerservice.testutils import Requestor, assert_good_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def test_status_collector() -> None:
+    class Component:
+        def get_status(self) -> dict:
+            return dict(num_queued=3, enabled=True, name="x", hit_rate=0.5)
+
+    registry = prometheus_client.CollectorRegistry()
+    registry.register(
+        StatusCollector(dict({"butlerservice/executor": Component()}))
+    )
+    lines = prometheus_client.generate_latest(registry).decode().splitlines()
+    assert "# TYPE butlerservice_executor_num_queued gauge" in lines
+    assert "butlerservice_executor_num_queued 3.0" in lines
+    assert "butlerservice_executor_hit_rate 0.5" in lines
+    # Only numeric items are reported.
+    assert not any("enabled" in line or "_name" in line for line in lines)
+
+
+def test_get_fields_label() -> None:
+    assert get_fields_label(["a"]) == "a"
+    assert get_fields_label(["a", "a"]) == "a"
+    assert get_fields_label(["a", "b"]) == MULTIPLE_FIELDS_LABEL
+    assert get_fields_label(["b", "a", "c"]) == MULTIPLE_FIELDS_LABEL
+
+
+def test_multiprocess_metrics(tmp_path: pathlib.Path) -> None:
+    # The metrics of each process (like those of the workers)
+    # are included in the metrics rendered by any of them.
+    script = """
+import sys
+from butlerservice.metrics import ServiceMetrics
+metrics = ServiceMetrics(dict())
+metrics.field_requests.labels(field="f", status="ok").inc(int(sys.argv[1]))
+print(metrics.render())
+"""
+    env = dict(os.environ, **{MULTIPROCESS_DIR_ENV: str(tmp_path)})
+    for num_requests in (2, 3):
+        text = subprocess.run(
+            [sys.executable, "-c", script, str(num_requests)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    samples = {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+    }
+    key = (
+        "butlerservice_field_requests_total",
+        (("field", "f"), ("status", "ok")),
+    )
+    assert samples[key] == 5
+
+
+async def test_metrics_endpoint(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    command = "simple_query_dimension_records"
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command=command,
+        fields=["record"],
+        url_suffix=name,
+    )
+    response = await requestor(
+        args_dict=dict(
+            element="exposure", where="instrument='HSC'", usecache=False
+        )
+    )
+    records = await assert_good_response(response, command=command)
+
+    response = await client.get("/metrics")
+    assert response.status == 200
+    assert response.content_type == "text/plain"
+    samples = {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(await response.text())
+        for sample in family.samples
+    }
+
+    def get_sample(name: str, **labels: str) -> float:
+        return samples[(name, tuple(sorted(labels.items())))]
+
+    assert (
+        get_sample(
+            "butlerservice_field_requests_total", field=command, status="ok"
+        )
+        == 1
+    )
+    assert get_sample(
+        "butlerservice_rows_returned_total", field=command
+    ) == len(records)
+    for phase in ("queue_wait", "registry_query", "encoding", "serialization"):
+        assert (
+            get_sample(
+                "butlerservice_phase_seconds_count", field=command, phase=phase
+            )
+            == 1
+        )
+    assert (
+        get_sample(
+            "butlerservice_http_requests_total",
+            route=f"/{name}",
+            method="POST",
+            status="200",
+        )
+        == 1
+    )
+    assert get_sample("butlerservice_executor_num_queued") == 0
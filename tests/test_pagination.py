@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import typing
+
+import pytest
+
+from butlerservice.app import create_app
+from butlerservice.pagination import (
+    decode_cursor,
+    encode_cursor,
+    make_connection,
+)
+from butlerservice.testutils import (
+    Requestor,
+    assert_bad_response,
+    assert_good_response,
+    expected_exposure_id_list,
+)
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def test_cursor() -> None:
+    assert decode_cursor(None) == 0
+    for offset in (0, 1, 57):
+        assert decode_cursor(encode_cursor(offset)) == offset + 1
+    for bad_cursor in ("", "5", encode_cursor(-1), "not base64!"):
+        with pytest.raises(RuntimeError):
+            decode_cursor(bad_cursor)
+
+
+def test_make_connection() -> None:
+    rows = [dict(value=i) for i in range(4)]
+    connection = make_connection(rows, first=3, offset=5)
+    assert [edge["node"] for edge in connection["edges"]] == rows[0:3]
+    assert decode_cursor(connection["page_info"]["end_cursor"]) == 8
+    assert connection["page_info"]["has_next_page"]
+    assert connection["page_info"]["has_previous_page"]
+
+    connection = make_connection(rows, first=4, offset=0)
+    assert len(connection["edges"]) == 4
+    assert not connection["page_info"]["has_next_page"]
+    assert not connection["page_info"]["has_previous_page"]
+
+    connection = make_connection([], first=4, offset=0)
+    assert connection["edges"] == []
+    assert connection["page_info"]["end_cursor"] is None
+
+
+async def test_paginated_queries(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    for command, args_dict, id_name, field in (
+        (
+            "simple_query_data_ids_connection",
+            dict(dimensions=["exposure"]),
+            "exposure",
+            "data_id",
+        ),
+        (
+            "simple_query_dimension_records_connection",
+            dict(element="exposure"),
+            "id",
+            "record",
+        ),
+    ):
+        requestor = Requestor(
+            client=client,
+            category="query",
+            command=command,
+            fields=[
+                f"edges {{ cursor node {{ {field} }} }}",
+                "page_info { has_next_page end_cursor }",
+            ],
+            url_suffix=name,
+        )
+        args_dict["where"] = "instrument='HSC'"
+
+        # Read 11 exposures in pages of 4
+        ids: typing.List[int] = []
+        after = None
+        for i in range(3):
+            query_args = dict(args_dict, first=4)
+            if after is not None:
+                query_args["after"] = after
+            response = await requestor(args_dict=query_args)
+            connection = await assert_good_response(response, command=command)
+            ids += [
+                json.loads(edge["node"][field])[id_name]
+                for edge in connection["edges"]
+            ]
+            assert connection["page_info"]["has_next_page"] == (i < 2)
+            after = connection["page_info"]["end_cursor"]
+        assert ids == sorted(expected_exposure_id_list)
+
+        # first must be positive
+        response = await requestor(args_dict=dict(args_dict, first=0))
+        await assert_bad_response(response)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import pathlib
+import typing
+
+import pytest
+import sqlalchemy
+import structlog.testing
+
+from butlerservice import profiling
+from butlerservice.app import create_app
+from butlerservice.format_http_request import format_http_request
+from butlerservice.profiling import PROFILE_HEADER, explain_statement
+from butlerservice.testutils import assert_good_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+COMMAND = "simple_query_dimension_records"
+ARGS = dict(element="exposure", where="instrument='HSC'", usecache=False)
+
+
+def test_explain_statement(monkeypatch: pytest.MonkeyPatch) -> None:
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.connect() as conn, conn.begin():
+        conn.execute(sqlalchemy.text("CREATE TABLE t (a INTEGER)"))
+        conn.execute(sqlalchemy.text("INSERT INTO t VALUES (1)"))
+        # Without and with a savepoint (used for PostgreSQL).
+        for dialects in (frozenset(), frozenset(["sqlite"])):
+            monkeypatch.setattr(profiling, "_SAVEPOINT_DIALECTS", dialects)
+            plan = explain_statement(conn, "SELECT a FROM t", ())
+            assert plan is not None and "SCAN" in plan[0]
+            plan = explain_statement(conn, "SELECT b FROM t", ())
+            assert plan is not None and plan[0].startswith("EXPLAIN failed")
+            # The transaction can still be used.
+            result = conn.execute(sqlalchemy.text("SELECT a FROM t"))
+            assert result.scalar() == 1
+
+
+async def test_profile_header(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path, allow_profile_header=True)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+    args_data, headers = format_http_request(
+        category="query", command=COMMAND, args_dict=ARGS, fields=["record"]
+    )
+
+    # Without the header there is no profile.
+    response = await client.post(name, json=args_data, headers=headers)
+    await assert_good_response(response, command=COMMAND)
+    data = await response.json()
+    assert "extensions" not in data
+
+    for mode in ("1", "cprofile"):
+        response = await client.post(
+            name, json=args_data, headers={**headers, PROFILE_HEADER: mode}
+        )
+        records = await assert_good_response(response, command=COMMAND)
+        data = await response.json()
+        (profile,) = data["extensions"]["profile"]
+        assert profile["field"] == COMMAND
+        assert profile["args"]["element"] == "exposure"
+        assert profile["num_rows"] == len(records)
+        assert profile["error"] is None
+        assert profile["duration"] > 0
+        assert "registry_query" in profile["phases"]
+        assert len(profile["sql"]) > 0
+        for statement_info in profile["sql"]:
+            assert statement_info["statement"]
+            assert statement_info["execute_duration"] >= 0
+        assert any(
+            statement_info.get("explain") for statement_info in profile["sql"]
+        )
+        if mode == "cprofile":
+            assert "cumulative" in profile["cprofile"]
+        else:
+            assert "cprofile" not in profile
+
+
+async def test_profile_header_not_allowed(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+    args_data, headers = format_http_request(
+        category="query", command=COMMAND, args_dict=ARGS, fields=["record"]
+    )
+    response = await client.post(
+        name, json=args_data, headers={**headers, PROFILE_HEADER: "1"}
+    )
+    await assert_good_response(response, command=COMMAND)
+    data = await response.json()
+    assert "extensions" not in data
+
+
+async def test_slow_query_log(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path, slow_query_threshold=1e-9)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+    args_data, headers = format_http_request(
+        category="query", command=COMMAND, args_dict=ARGS, fields=["record"]
+    )
+    with structlog.testing.capture_logs() as logs:
+        response = await client.post(name, json=args_data, headers=headers)
+        records = await assert_good_response(response, command=COMMAND)
+        response = await client.get(
+            f"/{name}/stream/dimension_records",
+            params=dict(element="exposure"),
+        )
+        assert response.status == 200
+        await response.read()
+        # The streaming handler logs after the response is sent.
+        for _ in range(100):
+            slow_logs = [log for log in logs if log["event"] == "Slow query"]
+            if len(slow_logs) >= 2:
+                break
+            await asyncio.sleep(0.01)
+
+    assert [log["field"] for log in slow_logs] == [
+        COMMAND,
+        "stream/queryDimensionRecords",
+    ]
+    assert slow_logs[0]["log_level"] == "warning"
+    assert slow_logs[0]["num_rows"] == len(records)
+    # SQL statements are only captured on request.
+    assert all("sql" not in log for log in slow_logs)
+    assert all(log["phases"]["registry_query"] > 0 for log in slow_logs)
+    # The response does not include the profile.
+    response = await client.post(name, json=args_data, headers=headers)
+    data = await response.json()
+    assert "extensions" not in data
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import pathlib
+import typing
+
+import pytest
+
+from butlerservice.app import create_app
+from butlerservice.query_analyzer import (
+    QueryBudget,
+    QueryBudgetError,
+    QueryEstimate,
+    find_unconstrained_governors,
+    parse_query_plan,
+)
+from butlerservice.query_cost import estimate_query_cost
+from butlerservice.testutils import (
+    Requestor,
+    assert_bad_response,
+    assert_good_response,
+)
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+def test_parse_query_plan() -> None:
+    assert parse_query_plan(None) == (None, None, ())
+    postgres_plan = [
+        "Hash Join  (cost=1.09..2245.22 rows=1830 width=40)",
+        "  Hash Cond: (exposure.instrument = detector.instrument)",
+        "  ->  Seq Scan on exposure  (cost=0.00..20.70 rows=1070 width=36)",
+        "  ->  Index Scan using detector_pkey on detector  "
+        "(cost=0.00..1.04 rows=4 width=36)",
+    ]
+    assert parse_query_plan(postgres_plan) == (2245.22, 1830, ("exposure",))
+    sqlite_plan = [
+        "2 0 0 SCAN exposure",
+        "6 0 0 SEARCH detector USING COVERING INDEX "
+        "sqlite_autoindex_detector_1 (instrument=?)",
+        "9 0 0 SCAN CONSTANT ROW",
+    ]
+    assert parse_query_plan(sqlite_plan) == (None, None, ("exposure",))
+
+
+def test_query_budget() -> None:
+    estimate = QueryEstimate(
+        cost=10,
+        num_dimensions=5,
+        num_dataset_types=1,
+        num_collections=3,
+        unconstrained_governors=("instrument",),
+        plan_cost=1000,
+        plan_rows=500,
+    )
+    budget = QueryBudget()
+    assert not budget.enabled
+    assert budget.get_violation(estimate, paginated=False) is None
+
+    budget = QueryBudget(max_cost=5)
+    assert budget.enabled and not budget.explain
+    reason = budget.get_violation(estimate, paginated=True)
+    assert reason is not None
+    assert "instrument" in reason
+    assert "3 collections" in reason
+    with pytest.raises(QueryBudgetError):
+        budget.check(estimate, paginated=True)
+    budget.check(estimate._replace(cost=5), paginated=True)
+    assert budget.get_status()["num_checked"] == 2
+    assert budget.get_status()["num_rejected"] == 1
+
+    budget = QueryBudget(max_plan_cost=100)
+    assert budget.explain
+    assert budget.get_violation(estimate, paginated=True) is not None
+    assert (
+        budget.get_violation(estimate._replace(plan_cost=None), paginated=True)
+        is None
+    )
+
+    # Large results must be paginated.
+    budget = QueryBudget(max_unpaginated_rows=100)
+    assert "paginated" in budget.get_violation(estimate, paginated=False)
+    assert budget.get_violation(estimate, paginated=True) is None
+
+
+def test_find_unconstrained_governors() -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    universe = app["butlerservice/butler"].registry.dimensions
+
+    dimensions = ["exposure", "detector"]
+    assert find_unconstrained_governors(universe, dimensions) == (
+        "instrument",
+    )
+    for kwargs in (
+        dict(dataid=dict(instrument="HSC")),
+        dict(kwargs=dict(instrument="HSC")),
+        dict(where="instrument = 'HSC' AND exposure > 5"),
+    ):
+        assert (
+            find_unconstrained_governors(universe, dimensions, **kwargs) == ()
+        )
+    # Queries of governors alone are cheap.
+    assert find_unconstrained_governors(universe, ["instrument"]) == ()
+
+    cost = estimate_query_cost(universe, dimensions=dimensions)
+    assert (
+        estimate_query_cost(
+            universe, dimensions=dimensions, num_unconstrained_governors=1
+        )
+        == cost * 4
+    )
+    assert estimate_query_cost(
+        universe,
+        dimensions=dimensions,
+        datasets=["raw"],
+        num_dataset_types=2,
+        num_collections=3,
+    ) == estimate_query_cost(
+        universe, dimensions=dimensions, datasets=["raw"]
+    ) * (
+        2 * 3
+    )
+
+
+async def test_query_budget_fields(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path, max_query_cost=15)
+    name = app["safir/config"].name
+    budget = app["butlerservice/query_budget"]
+
+    client = await aiohttp_client(app)
+
+    for command, args_dict in (
+        (
+            "estimate_query_data_ids",
+            dict(dimensions=["exposure", "detector"]),
+        ),
+        (
+            "estimate_query_dimension_records",
+            dict(element="exposure"),
+        ),
+    ):
+        requestor = Requestor(
+            client=client,
+            category="query",
+            command=command,
+            fields=[
+                "cost",
+                "num_dimensions",
+                "unconstrained_governors",
+                "full_scans",
+                "plan_rows",
+                "rejection",
+                "paginated_rejection",
+            ],
+            url_suffix=name,
+        )
+        response = await requestor(args_dict=args_dict)
+        estimate = await assert_good_response(response, command=command)
+        assert estimate["unconstrained_governors"] == ["instrument"]
+        assert estimate["cost"] > 15
+        assert "instrument" in estimate["rejection"]
+        assert "instrument" in estimate["paginated_rejection"]
+        # SQLite has no row estimates, but reports full table scans.
+        assert estimate["plan_rows"] is None
+        assert estimate["full_scans"]
+
+        response = await requestor(
+            args_dict=dict(args_dict, where="instrument = 'HSC'")
+        )
+        estimate = await assert_good_response(response, command=command)
+        assert estimate["unconstrained_governors"] == []
+        assert estimate["cost"] <= 15
+        assert estimate["rejection"] is None
+
+    # Queries over the budget are rejected before they are run;
+    # queries within it are run.
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command="simple_query_data_ids",
+        fields=["data_id"],
+        url_suffix=name,
+    )
+    response = await requestor(args_dict=dict(dimensions=["exposure"]))
+    await assert_bad_response(response)
+    assert budget.num_rejected == 1
+    response = await requestor(
+        args_dict=dict(dimensions=["exposure"], where="instrument = 'HSC'")
+    )
+    data_ids = await assert_good_response(
+        response, command="simple_query_data_ids"
+    )
+    assert len(data_ids) > 0
+    assert budget.num_checked == 2
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from butlerservice.client_identity import get_client_identity
+from butlerservice.query_scheduler import (
+    QueryScheduler,
+    RegistryBusyError,
+    parse_client_weights,
+)
+
+
+async def start_queries(
+    scheduler: QueryScheduler,
+    queries: typing.List[typing.Tuple[str, float]],
+    order: typing.List[str],
+) -> typing.List[asyncio.Task]:
+    """Start waiting for the scheduler to run each query,
+    specified as (client, cost), in order.
+
+    When a query may run, its client is appended to ``order``.
+    """
+
+    async def acquire(client: str, cost: float) -> None:
+        await scheduler.acquire(client, cost)
+        order.append(client)
+
+    tasks = []
+    for client, cost in queries:
+        tasks.append(asyncio.create_task(acquire(client, cost)))
+        await asyncio.sleep(0)
+    return tasks
+
+
+@pytest.mark.asyncio
+async def test_fair_queuing() -> None:
+    scheduler = QueryScheduler(max_running=1, max_queued=10)
+    order: typing.List[str] = []
+
+    # Client a fills the queue before b arrives,
+    # but b does not wait for all of a's queries.
+    await start_queries(
+        scheduler, [("a", 1), ("a", 1), ("a", 1), ("b", 1)], order
+    )
+    assert order == ["a"]
+    assert scheduler.num_running == 1
+    assert scheduler.num_waiting == 3
+    status = scheduler.get_status()
+    assert status["clients"]["a"]["num_waiting"] == 2
+    for i in range(3):
+        scheduler.release(order[-1])
+        await asyncio.sleep(0)
+    assert order == ["a", "b", "a", "a"]
+    scheduler.release("a")
+    assert scheduler.num_running == 0
+    assert scheduler.get_status()["num_clients"] == 0
+
+    # Cheap queries skip ahead of expensive ones.
+    order.clear()
+    await start_queries(
+        scheduler, [("a", 1), ("a", 10), ("b", 10), ("c", 1), ("a", 2)], order
+    )
+    for i in range(4):
+        scheduler.release(order[-1])
+        await asyncio.sleep(0)
+    assert order == ["a", "c", "a", "b", "a"]
+    scheduler.release("a")
+
+    # Clients with a higher weight get a larger share.
+    scheduler = QueryScheduler(max_running=1, max_queued=10, weights=dict(b=2))
+    order.clear()
+    await start_queries(
+        scheduler, [("a", 1)] + [("a", 1), ("b", 1)] * 3, order
+    )
+    for i in range(6):
+        scheduler.release(order[-1])
+        await asyncio.sleep(0)
+    # b's queries finish at virtual times 0.5, 1, 1.5;
+    # a's at 1 (already running), 2, 3, 4.
+    assert order == ["a", "b", "b", "b", "a", "a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_limits() -> None:
+    scheduler = QueryScheduler(max_running=2, max_queued=1, max_per_client=1)
+    order: typing.List[str] = []
+
+    # Client a may only run one query at a time, even if threads are free.
+    await start_queries(scheduler, [("a", 1), ("a", 1)], order)
+    assert order == ["a"]
+    assert scheduler.num_waiting == 1
+    await start_queries(scheduler, [("b", 1)], order)
+    assert order == ["a", "b"]
+
+    # The queue is full.
+    with pytest.raises(RegistryBusyError):
+        await scheduler.acquire("c", 1)
+    assert scheduler.num_waiting == 1
+
+    scheduler.release("b")
+    await asyncio.sleep(0)
+    assert order == ["a", "b"]
+    scheduler.release("a")
+    await asyncio.sleep(0)
+    assert order == ["a", "b", "a"]
+    scheduler.release("a")
+    assert scheduler.num_running == 0
+    assert scheduler.num_waiting == 0
+
+    # A cancelled query stops waiting.
+    scheduler = QueryScheduler(max_running=1, max_queued=1)
+    await scheduler.acquire("a", 1)
+    task = asyncio.create_task(scheduler.acquire("b", 1))
+    await asyncio.sleep(0)
+    assert scheduler.num_waiting == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert scheduler.num_waiting == 0
+    scheduler.release("a")
+    assert scheduler.num_running == 0
+    assert scheduler.get_status()["num_clients"] == 0
+
+
+def test_parse_client_weights() -> None:
+    assert parse_client_weights("") == {}
+    assert parse_client_weights("user:alice=2, ip:10.0.0.5=0.5") == {
+        "user:alice": 2,
+        "ip:10.0.0.5": 0.5,
+    }
+    for bad_value in ("user:alice", "=2", "user:alice=0", "user:alice=x"):
+        with pytest.raises(ValueError):
+            parse_client_weights(bad_value)
+
+
+def test_get_client_identity() -> None:
+    headers = {
+        "X-Auth-Request-User": "alice",
+        "Authorization": "Bearer secret",
+        "X-Forwarded-For": "10.0.0.5, 10.0.0.1",
+    }
+    request = make_mocked_request("GET", "/", headers=headers)
+    assert get_client_identity(request, trust_proxy_headers=True) == (
+        "user:alice"
+    )
+    token_identity = get_client_identity(request)
+    assert token_identity.startswith("token:")
+    assert "secret" not in token_identity
+
+    del headers["Authorization"]
+    request = make_mocked_request("GET", "/", headers=headers)
+    assert get_client_identity(request) != "ip:10.0.0.5"
+    del headers["X-Auth-Request-User"]
+    request = make_mocked_request("GET", "/", headers=headers)
+    assert get_client_identity(request, trust_proxy_headers=True) == (
+        "ip:10.0.0.5"
+    )
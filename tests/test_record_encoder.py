@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+
+import astropy.time
+import lsst.daf.butler
+import lsst.sphgeom
+import pytest
+
+from butlerservice import record_encoder
+from butlerservice.record_encoder import dumps_lines, get_record_encoder
+from butlerservice.resolvers.simple_query_dimension_records import (
+    encode_record_dict,
+)
+
+
+def test_record_encoder() -> None:
+    universe = lsst.daf.butler.DimensionUniverse()
+    element = universe["detector"]
+    record = element.RecordClass(
+        instrument="HSC",
+        id=5,
+        full_name="det5",
+        name_in_raft=None,
+        raft=None,
+        purpose="SCIENCE",
+    )
+    encoder = get_record_encoder(element)
+    assert get_record_encoder(element) is encoder
+    assert encoder.to_dict(record) == record.toDict()
+    assert json.loads(encoder.encode(record)) == json.loads(
+        encode_record_dict(record.toDict())
+    )
+
+
+def test_record_encoder_timespan() -> None:
+    universe = lsst.daf.butler.DimensionUniverse()
+    element = universe["exposure"]
+    begin = astropy.time.Time("2013-11-02T10:00:00", scale="tai")
+    end = astropy.time.Time("2013-11-02T10:00:30", scale="tai")
+    record = element.RecordClass(
+        instrument="HSC",
+        id=903334,
+        physical_filter="HSC-R",
+        timespan=lsst.daf.butler.Timespan(begin, end),
+    )
+    encoder = get_record_encoder(element)
+    timespan = record.timespan
+    record_dict = json.loads(encoder.encode(record))
+    assert record_dict["timespan"] == [timespan.begin.isot, timespan.end.isot]
+    assert record_dict == json.loads(encode_record_dict(record.toDict()))
+
+    # Unbounded and missing timespans.
+    record = element.RecordClass(
+        instrument="HSC",
+        id=903334,
+        timespan=lsst.daf.butler.Timespan(begin, None),
+    )
+    assert encoder.to_dict(record)["timespan"] == (
+        record.timespan.begin.isot,
+        None,
+    )
+    record = element.RecordClass(instrument="HSC", id=903334)
+    assert encoder.to_dict(record)["timespan"] is None
+
+
+def test_record_encoder_region() -> None:
+    universe = lsst.daf.butler.DimensionUniverse()
+    element = universe["visit"]
+    region = lsst.sphgeom.Circle(
+        lsst.sphgeom.UnitVector3d(1, 0, 0), lsst.sphgeom.Angle(0.01)
+    )
+    record = element.RecordClass(instrument="HSC", id=5, region=region)
+    encoder = get_record_encoder(element)
+    record_dict = json.loads(encoder.encode(record))
+    assert "timespan" in record_dict
+    assert record_dict["region"] == region.encode().hex()
+    assert (
+        lsst.sphgeom.Region.decode(bytes.fromhex(record_dict["region"]))
+        == region
+    )
+    record = element.RecordClass(instrument="HSC", id=5)
+    assert encoder.to_dict(record)["region"] is None
+
+
+def test_dumps() -> None:
+    values = [dict(a=1, b=[1.5, None, "x y"]), dict(c="é")]
+    assert record_encoder._json_dumps(values[0]) == (
+        '{"a":1,"b":[1.5,null,"x y"]}'
+    )
+    assert dumps_lines(values) == (
+        '{"a":1,"b":[1.5,null,"x y"]}\n{"c":"é"}\n'.encode()
+    )
+    # orjson, if installed, gives the same output.
+    pytest.importorskip("orjson")
+    for value in values:
+        assert record_encoder._orjson_dumps(
+            value
+        ) == record_encoder._json_dumps(value)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import pathlib
+import typing
+
+from butlerservice.app import create_app
+from butlerservice.resolvers.record_loader import RecordLoader
+from butlerservice.testutils import (
+    Requestor,
+    assert_good_response,
+    expected_day_obs_list,
+    expected_exposure_id_list,
+)
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_data_id_record_fields(
+    aiohttp_client: TestClient, monkeypatch: typing.Any
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    # Record the element and number of keys of each registry query
+    query_list: typing.List[typing.Tuple[str, int]] = []
+    original_query = RecordLoader._query
+
+    async def query(
+        self: RecordLoader, element_name: str, keys: typing.List[tuple]
+    ) -> typing.List[typing.List[dict]]:
+        query_list.append((element_name, len(keys)))
+        return await original_query(self, element_name, keys)
+
+    monkeypatch.setattr(RecordLoader, "_query", query)
+
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command="query_data_ids",
+        fields=[
+            "exposure",
+            "exposure_record { id day_obs }",
+            "instrument_record { name }",
+            "visit_record { id }",
+        ],
+        url_suffix=name,
+    )
+    response = await requestor(
+        args_dict=dict(
+            dimensions=["exposure"], where="instrument='HSC'", usecache=False
+        )
+    )
+    data_ids = await assert_good_response(response, command="query_data_ids")
+    assert [
+        data_id["exposure"] for data_id in data_ids
+    ] == expected_exposure_id_list
+    assert [
+        data_id["exposure_record"]["id"] for data_id in data_ids
+    ] == expected_exposure_id_list
+    assert [
+        data_id["exposure_record"]["day_obs"] for data_id in data_ids
+    ] == expected_day_obs_list
+    for data_id in data_ids:
+        assert data_id["instrument_record"] == {"name": "HSC"}
+        # The data IDs do not include visit
+        assert data_id["visit_record"] is None
+
+    # One registry query per element, no matter how many rows
+    assert sorted(query_list) == [
+        ("exposure", len(expected_exposure_id_list)),
+        ("instrument", 1),
+    ]
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import typing
+
+from butlerservice.app import create_app
+from butlerservice.record_snapshot import load_element_records
+from butlerservice.testutils import Requestor, assert_good_response
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_record_snapshot(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(
+        butler_uri=repo_path,
+        preload_elements="instrument,physical_filter",
+        preload_refresh_interval=0,
+    )
+    name = app["safir/config"].name
+    record_snapshot = app["butlerservice/record_snapshot"]
+    assert set(record_snapshot.get_status()["elements"]) == {
+        "instrument",
+        "physical_filter",
+    }
+
+    client = await aiohttp_client(app)
+
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command="simple_query_dimension_records",
+        fields=["record"],
+        url_suffix=name,
+    )
+    num_queries = 0
+    for dataid in (
+        None,
+        dict(instrument="HSC"),
+        dict(instrument="HSC", physical_filter="HSC-R"),
+        dict(instrument="HSC", band="r"),
+        dict(instrument="HSC", band="no_such_band"),
+    ):
+        args_dict: typing.Dict[str, typing.Any] = dict(
+            element="physical_filter"
+        )
+        if dataid is not None:
+            args_dict["dataid"] = json.dumps(dataid)
+        # Query the snapshot and the registry; the results should match
+        result_list = []
+        for usecache in (True, False):
+            response = await requestor(
+                args_dict=dict(args_dict, usecache=usecache)
+            )
+            records = await assert_good_response(
+                response, command="simple_query_dimension_records"
+            )
+            result_list.append(
+                sorted(
+                    json.loads(record["record"])["name"] for record in records
+                )
+            )
+        num_queries += 1
+        assert result_list[0] == result_list[1]
+        if dataid is not None and "band" in dataid:
+            assert len(result_list[0]) <= 1
+    assert record_snapshot.num_hits == num_queries
+
+    # A query with a where expression is sent to the registry
+    response = await requestor(
+        args_dict=dict(element="physical_filter", where="band='r'")
+    )
+    await assert_good_response(
+        response, command="simple_query_dimension_records"
+    )
+    assert record_snapshot.num_hits == num_queries
+
+    # Refresh on demand
+    response = await client.post(f"/{name}/snapshot/refresh")
+    assert response.status == 200
+    data = await response.json()
+    assert data["num_refreshes"] == 2
+
+    # A cleared snapshot answers no queries,
+    # and ignores records loaded before the clear.
+    universe = app["butlerservice/butler"].registry.dimensions
+    old_records = load_element_records(
+        app["butlerservice/butler"].registry, ["instrument"]
+    )
+    generation = record_snapshot.generation
+    record_snapshot.clear()
+    assert record_snapshot.get_status()["elements"] == {}
+    assert record_snapshot.query("instrument", None, convert_row=str) is None
+    record_snapshot.set_records(
+        universe=universe, records=old_records, generation=generation
+    )
+    assert record_snapshot.get_status()["elements"] == {}
+    record_snapshot.set_records(
+        universe=universe,
+        records=old_records,
+        generation=record_snapshot.generation,
+    )
+    assert record_snapshot.get_status()["elements"] == dict(
+        instrument=len(old_records["instrument"])
+    )
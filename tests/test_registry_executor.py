@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from butlerservice.registry_executor import RegistryBusyError, RegistryExecutor
+
+
+@pytest.mark.asyncio
+async def test_registry_executor() -> None:
+    executor = RegistryExecutor(max_workers=2, max_queued=1)
+    try:
+        assert executor.get_status() == dict(
+            max_workers=2, max_queued=1, num_active=0, num_queued=0
+        )
+        assert await executor.run(lambda: 5) == 5
+
+        # Fill the workers and the queue with blocked queries.
+        release_event = threading.Event()
+        tasks = [
+            asyncio.create_task(executor.run(release_event.wait))
+            for i in range(3)
+        ]
+        for i in range(100):
+            await asyncio.sleep(0.01)
+            if executor.num_active == 2:
+                break
+        assert executor.num_active == 2
+        assert executor.num_queued == 1
+
+        # Another query is rejected.
+        with pytest.raises(RegistryBusyError):
+            await executor.run(lambda: 5)
+
+        release_event.set()
+        await asyncio.gather(*tasks)
+        assert executor.num_active == 0
+        assert executor.num_queued == 0
+    finally:
+        executor.shutdown()
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import concurrent.futures
+import threading
+import typing
+
+import lsst.daf.butler
+import pytest
+
+from butlerservice.registry_pool import RegistryPool
+
+
+class MockRegistry:
+    """Minimal stand-in for a butler registry."""
+
+    def __init__(self) -> None:
+        self.healthy = True
+
+    def queryDimensionRecords(self, element: str) -> typing.List[str]:
+        if not self.healthy:
+            raise RuntimeError("connection lost")
+        return []
+
+
+class MockButler:
+    """Minimal stand-in for a butler, that counts instances."""
+
+    num_created = 0
+
+    def __init__(self, uri: str, writeable: bool = True) -> None:
+        self.registry = MockRegistry()
+        MockButler.num_created += 1
+
+
+def get_registry(registry: MockRegistry) -> MockRegistry:
+    return registry
+
+
+def test_registry_pool(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(lsst.daf.butler, "Butler", MockButler)
+    MockButler.num_created = 0
+    pool = RegistryPool(
+        butler_uri="unused", max_size=2, health_check_interval=0
+    )
+    assert pool.get_status() == dict(max_size=2, num_created=0, num_idle=0)
+
+    # Butlers are created lazily, and each thread reuses its own.
+    registry = pool.call(get_registry)
+    assert pool.call(get_registry) is registry
+    assert MockButler.num_created == 1
+    assert pool.num_idle == 1
+
+    # Concurrent users get different registries, up to max_size.
+    barrier = threading.Barrier(2)
+
+    def get_registry_concurrently(registry: MockRegistry) -> MockRegistry:
+        barrier.wait(timeout=5)
+        return registry
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(pool.call, get_registry_concurrently)
+            for i in range(2)
+        ]
+        registries = [future.result(timeout=5) for future in futures]
+    assert registries[0] is not registries[1]
+    assert pool.num_created == 2
+
+    # An unhealthy registry is replaced.
+    for registry in registries:
+        registry.healthy = False
+    new_registry = pool.call(get_registry)
+    assert new_registry not in registries
+    assert new_registry.healthy
+    assert pool.num_created == 1
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import re
+import time
+
+from butlerservice.result_cache import ResultCache, estimate_size
+from butlerservice.utils import make_hashable
+
+
+def test_result_cache() -> None:
+    value = [dict(record="a" * 100)]
+    value_size = estimate_size(value)
+    cache = ResultCache(max_bytes=value_size * 2, ttl=60)
+    assert cache.enabled
+    assert cache.get("a") is None
+    cache.put("a", value)
+    cache.put("b", value)
+    assert cache.get("a") is value
+    assert cache.num_bytes == value_size * 2
+
+    # Adding another value evicts the least recently used ("b").
+    cache.put("c", value)
+    assert cache.get("b") is None
+    assert cache.get("a") is value
+    assert cache.get("c") is value
+    assert len(cache) == 2
+
+    # Values larger than the budget are not cached.
+    cache.put("d", value * 3)
+    assert cache.get("d") is None
+
+    # Expired entries are not returned.
+    cache.put("e", value, ttl=0)
+    time.sleep(0.001)
+    assert cache.get("e") is None
+
+    # Values computed before a clear are not cached.
+    generation = cache.generation
+    cache.clear()
+    assert cache.generation == generation + 1
+    cache.put("f", value, generation=generation)
+    assert cache.get("f") is None
+    cache.put("f", value, generation=cache.generation)
+    assert cache.get("f") is value
+
+    status = cache.get_status()
+    assert status["num_hits"] == 4
+    assert status["num_misses"] == 5
+    assert status["num_evictions"] == 2
+
+    disabled_cache = ResultCache(max_bytes=0, ttl=60)
+    assert not disabled_cache.enabled
+    disabled_cache.put("a", value)
+    assert disabled_cache.get("a") is None
+
+
+def test_make_hashable() -> None:
+    key1 = make_hashable(
+        ("field", dict(b=1, a=[1, 2]), [re.compile("x.*"), "y"])
+    )
+    key2 = make_hashable(
+        ("field", dict(a=[1, 2], b=1), [re.compile("x.*"), "y"])
+    )
+    assert key1 == key2
+    assert hash(key1) == hash(key2)
+    assert make_hashable(re.compile("x.*")) != make_hashable(re.compile("x"))
@@ -81,3 +81,16 @@ async def test_simple_query_dimension_records(
     )
     response = await requestor(args_dict=query_record_args)
     await assert_good_query_response(response)
+
+    # Repeat a query; the result should come from the cache
+    result_cache = app["butlerservice/result_cache"]
+    num_hits = result_cache.num_hits
+    response = await requestor(args_dict=query_record_args)
+    await assert_good_query_response(response)
+    assert result_cache.num_hits == num_hits + 1
+
+    # Repeat the query with usecache=false; the cache should not be used
+    query_record_args["usecache"] = False
+    response = await requestor(args_dict=query_record_args)
+    await assert_good_query_response(response)
+    assert result_cache.num_hits == num_hits + 1
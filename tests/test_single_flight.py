@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from butlerservice.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight() -> None:
+    single_flight = SingleFlight()
+    num_calls = 0
+    release_event = asyncio.Event()
+
+    async def query() -> int:
+        nonlocal num_calls
+        num_calls += 1
+        await release_event.wait()
+        return num_calls
+
+    tasks = [
+        asyncio.create_task(single_flight.run("a", query)) for i in range(5)
+    ]
+    other_task = asyncio.create_task(single_flight.run("b", query))
+    await asyncio.sleep(0)
+    assert single_flight.num_in_flight == 2
+
+    # Cancelling one caller does not affect the others.
+    tasks[0].cancel()
+    release_event.set()
+    results = await asyncio.gather(*tasks[1:])
+    assert results == [1] * 4 or results == [2] * 4
+    assert await other_task in (1, 2)
+    assert num_calls == 2
+    assert single_flight.get_status() == dict(num_in_flight=0, num_coalesced=4)
+
+    # Exceptions are shared.
+    async def fail() -> None:
+        await asyncio.sleep(0)
+        raise RuntimeError("failed")
+
+    failing_tasks = [
+        asyncio.create_task(single_flight.run("c", fail)) for i in range(2)
+    ]
+    for task in failing_tasks:
+        with pytest.raises(RuntimeError):
+            await task
+
+    # The operation is cancelled when every caller is cancelled.
+    operation_cancelled = asyncio.Event()
+
+    async def wait_forever() -> None:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            operation_cancelled.set()
+            raise
+
+    waiting_tasks = [
+        asyncio.create_task(single_flight.run("d", wait_forever))
+        for i in range(2)
+    ]
+    await asyncio.sleep(0)
+    waiting_tasks[0].cancel()
+    await asyncio.sleep(0)
+    assert not operation_cancelled.is_set()
+    waiting_tasks[1].cancel()
+    await asyncio.wait_for(operation_cancelled.wait(), 1)
+    await asyncio.gather(*waiting_tasks, return_exceptions=True)
+    assert single_flight.num_in_flight == 0
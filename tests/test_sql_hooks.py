@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import sqlite3
+import typing
+
+import pytest
+import sqlalchemy
+
+from butlerservice.sql_hooks import (
+    HOOK_ORDER,
+    StatementHook,
+    get_dbapi_connection,
+    get_statement_hook,
+    hook_statements,
+)
+
+
+class RecordingHook(StatementHook):
+    def __init__(
+        self,
+        name: str,
+        calls: typing.List[typing.Tuple[str, str]],
+        stop: bool = False,
+    ) -> None:
+        self.name = name
+        self.calls = calls
+        self.stop = stop
+
+    def before_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        self.calls.append(("before", self.name))
+        if self.stop:
+            raise RuntimeError("Stopped")
+
+    def after_execute(
+        self,
+        conn: sqlalchemy.engine.Connection,
+        statement: str,
+        parameters: typing.Any,
+        executemany: bool,
+    ) -> None:
+        self.calls.append(("after", self.name))
+
+
+def test_get_dbapi_connection() -> None:
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.connect() as connection:
+        assert isinstance(get_dbapi_connection(connection), sqlite3.Connection)
+
+
+def test_hook_order() -> None:
+    engine = sqlalchemy.create_engine("sqlite://")
+    calls: typing.List[typing.Tuple[str, str]] = []
+    with engine.connect() as connection:
+        # Hooks are called in HOOK_ORDER, whatever the order
+        # in which they are enabled.
+        with hook_statements(
+            "profiling", RecordingHook("profiling", calls)
+        ), hook_statements(
+            "query_analyzer", RecordingHook("query_analyzer", calls)
+        ), hook_statements(
+            "deadline", RecordingHook("deadline", calls)
+        ):
+            connection.execute(sqlalchemy.text("SELECT 1"))
+        assert calls == [("before", name) for name in HOOK_ORDER] + [
+            ("after", name) for name in HOOK_ORDER
+        ]
+
+        # A hook that stops a statement stops the hooks after it.
+        calls.clear()
+        with hook_statements(
+            "profiling", RecordingHook("profiling", calls)
+        ), hook_statements(
+            "query_analyzer",
+            RecordingHook("query_analyzer", calls, stop=True),
+        ):
+            with pytest.raises(RuntimeError):
+                connection.execute(sqlalchemy.text("SELECT 1"))
+        assert calls == [("before", "query_analyzer")]
+
+        # Hooks are only called while enabled.
+        calls.clear()
+        connection.execute(sqlalchemy.text("SELECT 1"))
+        assert calls == []
+
+
+def test_hook_statements() -> None:
+    outer_hook = StatementHook()
+    inner_hook = StatementHook()
+    assert get_statement_hook("deadline") is None
+    with hook_statements("deadline", outer_hook):
+        assert get_statement_hook("deadline") is outer_hook
+        with hook_statements("deadline", inner_hook):
+            assert get_statement_hook("deadline") is inner_hook
+        assert get_statement_hook("deadline") is outer_hook
+    assert get_statement_hook("deadline") is None
+
+    with pytest.raises(ValueError):
+        with hook_statements("no_such_hook", outer_hook):
+            pass
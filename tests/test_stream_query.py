@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import pathlib
+import typing
+
+import pytest
+
+from butlerservice.app import create_app
+from butlerservice.testutils import (
+    expected_day_obs_list,
+    expected_exposure_id_list,
+)
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_stream_query(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    # Use a small chunk size, so results are sent in several chunks.
+    app = create_app(butler_uri=repo_path, stream_chunk_size=3)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    # Stream dimension records using GET
+    response = await client.get(
+        f"/{name}/stream/dimension_records",
+        params=dict(
+            element="exposure", dataid=json.dumps(dict(instrument="HSC"))
+        ),
+    )
+    assert response.status == 200
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    records = [
+        json.loads(line) for line in (await response.text()).splitlines()
+    ]
+    assert [record["day_obs"] for record in records] == expected_day_obs_list
+    assert [record["id"] for record in records] == expected_exposure_id_list
+
+    # Stream data IDs using POST
+    response = await client.post(
+        f"/{name}/stream/data_ids",
+        json=dict(dimensions=["exposure"], where="instrument='HSC'"),
+    )
+    assert response.status == 200
+    data_ids = [
+        json.loads(line) for line in (await response.text()).splitlines()
+    ]
+    assert [
+        data_id["exposure"] for data_id in data_ids
+    ] == expected_exposure_id_list
+
+    # Invalid queries
+    for args in (
+        dict(where="instrument='HSC'"),  # missing element
+        dict(element="exposure", dataid="not json"),
+        dict(element="exposure", where="no_such_column = 5"),
+        dict(element="exposure", format="no_such_format"),
+    ):
+        response = await client.get(
+            f"/{name}/stream/dimension_records", params=args
+        )
+        assert response.status == 400
+        assert "error" in await response.json()
+
+
+async def test_stream_query_arrow(
+    aiohttp_client: TestClient,
+) -> None:
+    pyarrow = pytest.importorskip("pyarrow")
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path, stream_chunk_size=3)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    for where, expected_ids in (
+        ("instrument='HSC'", expected_exposure_id_list),
+        # An empty result is a valid stream with just the schema.
+        ("instrument='HSC' AND exposure < 0", []),
+    ):
+        response = await client.get(
+            f"/{name}/stream/dimension_records",
+            params=dict(element="exposure", where=where, format="arrow"),
+        )
+        assert response.status == 200
+        table = pyarrow.ipc.open_stream(await response.read()).read_all()
+        assert sorted(table.column("id").to_pylist()) == sorted(expected_ids)
+        assert table.schema.field("id").type == pyarrow.int64()
+        assert table.schema.field("timespan").type == pyarrow.list_(
+            pyarrow.string()
+        )
+
+        response = await client.get(
+            f"/{name}/stream/data_ids",
+            params=dict(dimensions="exposure", where=where),
+            headers={"Accept": "application/vnd.apache.arrow.stream"},
+        )
+        assert response.status == 200
+        table = pyarrow.ipc.open_stream(await response.read()).read_all()
+        assert sorted(table.column("exposure").to_pylist()) == sorted(
+            expected_ids
+        )
+        assert table.schema.field("instrument").type == pyarrow.string()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import pathlib
+import typing
+
+import aiohttp
+import pytest
+
+from butlerservice.app import create_app
+from butlerservice.graphql_view import GRAPHQL_TRANSPORT_WS_PROTOCOL
+from butlerservice.watermark import encode_watermark
+
+if typing.TYPE_CHECKING:
+    from aiohttp import ClientWebSocketResponse
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+SUBSCRIPTION = """subscription($where: String) {
+    dimension_records_added(element: "exposure", where: $where) {
+        nodes { record }
+        watermark
+    }
+}"""
+
+
+async def receive(ws: ClientWebSocketResponse) -> typing.Dict[str, typing.Any]:
+    return json.loads(await ws.receive_str(timeout=10))
+
+
+async def wait_for(condition: typing.Callable[[], bool]) -> None:
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("Timed out")
+
+
+async def test_subscriptions(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path, subscription_poll_interval=3600)
+    name = app["safir/config"].name
+    hub = app["butlerservice/subscription_hub"]
+
+    client = await aiohttp_client(app)
+
+    async def connect() -> ClientWebSocketResponse:
+        ws = await client.ws_connect(
+            name, protocols=(GRAPHQL_TRANSPORT_WS_PROTOCOL,)
+        )
+        await ws.send_json(dict(type="connection_init"))
+        assert await receive(ws) == dict(type="connection_ack")
+        return ws
+
+    # Subscribe before initialising the connection.
+    ws = await client.ws_connect(
+        name, protocols=(GRAPHQL_TRANSPORT_WS_PROTOCOL,)
+    )
+    await ws.send_json(
+        dict(type="subscribe", id="1", payload=dict(query=SUBSCRIPTION))
+    )
+    await ws.receive()
+    assert ws.close_code == 4401
+
+    # Queries may also be sent over the connection.
+    ws = await connect()
+    await ws.send_json(dict(type="ping"))
+    assert await receive(ws) == dict(type="pong")
+    await ws.send_json(
+        dict(
+            type="subscribe",
+            id="q",
+            payload=dict(
+                query='{ simple_query_dimension_records(element: "exposure") '
+                "{ record } }"
+            ),
+        )
+    )
+    message = await receive(ws)
+    assert message["type"] == "next"
+    all_ids = sorted(
+        json.loads(row["record"])["id"]
+        for row in message["payload"]["data"]["simple_query_dimension_records"]
+    )
+    assert len(all_ids) > 2
+    assert await receive(ws) == dict(id="q", type="complete")
+
+    # Invalid subscriptions are reported as errors.
+    await ws.send_json(
+        dict(
+            type="subscribe",
+            id="bad",
+            payload=dict(
+                query='subscription { dimension_records_added(element: "x") '
+                "{ watermark } }"
+            ),
+        )
+    )
+    message = await receive(ws)
+    assert message["type"] == "error"
+    assert message["id"] == "bad"
+    assert len(hub.pollers) == 0
+
+    # Subscribers with the same arguments share one poller.
+    websockets = [ws, await connect()]
+    for ws in websockets:
+        await ws.send_json(
+            dict(
+                type="subscribe",
+                id="1",
+                payload=dict(
+                    query=SUBSCRIPTION,
+                    variables=dict(where="instrument = 'HSC'"),
+                ),
+            )
+        )
+    await wait_for(lambda: hub.get_status()["num_subscribers"] == 2)
+    assert len(hub.pollers) == 1
+    (poller,) = hub.pollers.values()
+    await poller.ready
+
+    # Pretend that the later exposures were just added.
+    mid_id = all_ids[len(all_ids) // 2]
+    poller.watermark = encode_watermark("exposure", {("HSC",): mid_id})
+    num_polls = hub.num_polls
+    poller.publish(await poller.poll())
+    for ws in websockets:
+        message = await receive(ws)
+        assert message["type"] == "next"
+        assert message["id"] == "1"
+        changes = message["payload"]["data"]["dimension_records_added"]
+        ids = sorted(
+            json.loads(node["record"])["id"] for node in changes["nodes"]
+        )
+        assert ids == [id for id in all_ids if id > mid_id]
+        assert changes["watermark"] == poller.watermark
+    # One poll for both subscribers.
+    assert hub.num_polls == num_polls + 1
+    assert hub.num_events == 1
+
+    # Polls with nothing new send nothing.
+    poller.publish(await poller.poll())
+    assert hub.num_events == 1
+
+    # The poller stops when the last subscriber leaves.
+    await websockets[0].send_json(dict(type="complete", id="1"))
+    await wait_for(lambda: hub.get_status()["num_subscribers"] == 1)
+    await websockets[1].close()
+    await wait_for(lambda: len(hub.pollers) == 0)
+    await websockets[0].close()
+
+
+async def test_subscriptions_disabled(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path, subscription_poll_interval=0)
+    name = app["safir/config"].name
+    client = await aiohttp_client(app)
+    with pytest.raises(aiohttp.WSServerHandshakeError):
+        await client.ws_connect(
+            name, protocols=(GRAPHQL_TRANSPORT_WS_PROTOCOL,)
+        )
+
+    # Subscriptions cannot be sent with POST.
+    response = await client.post(name, json=dict(query=SUBSCRIPTION))
+    assert response.status == 400
+    errors = (await response.json())["errors"]
+    assert "WebSocket" in errors[0]["message"]
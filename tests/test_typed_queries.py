@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import pathlib
+import typing
+
+from butlerservice.app import create_app
+from butlerservice.testutils import (
+    Requestor,
+    assert_good_response,
+    expected_day_obs_list,
+    expected_exposure_id_list,
+)
+
+if typing.TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_typed_queries(
+    aiohttp_client: TestClient,
+) -> None:
+    repo_path = pathlib.Path(__file__).parent / "data" / "hsc_raw"
+    app = create_app(butler_uri=repo_path)
+    name = app["safir/config"].name
+
+    client = await aiohttp_client(app)
+
+    # Query dimension records, selecting a few fields
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command="query_dimension_records",
+        fields=[
+            "__typename",
+            "... on ExposureRecord { id day_obs timespan { begin end } }",
+        ],
+        url_suffix=name,
+    )
+    response = await requestor(
+        args_dict=dict(element="exposure", where="instrument='HSC'")
+    )
+    records = await assert_good_response(
+        response, command="query_dimension_records"
+    )
+    assert {record["__typename"] for record in records} == {"ExposureRecord"}
+    assert [record["id"] for record in records] == expected_exposure_id_list
+    assert [record["day_obs"] for record in records] == expected_day_obs_list
+    for record in records:
+        assert set(record.keys()) == {
+            "__typename",
+            "id",
+            "day_obs",
+            "timespan",
+        }
+        assert set(record["timespan"].keys()) == {"begin", "end"}
+
+    # Query data IDs
+    requestor = Requestor(
+        client=client,
+        category="query",
+        command="query_data_ids",
+        fields=["instrument", "exposure", "visit"],
+        url_suffix=name,
+    )
+    response = await requestor(
+        args_dict=dict(dimensions=["exposure"], where="instrument='HSC'")
+    )
+    data_ids = await assert_good_response(response, command="query_data_ids")
+    assert [
+        data_id["exposure"] for data_id in data_ids
+    ] == expected_exposure_id_list
+    for data_id in data_ids:
+        assert data_id["instrument"] == "HSC"
+        assert data_id["visit"] is None